@@ -4,13 +4,14 @@ import os
 class APIRequestError(Exception):
     pass
 os.environ["GRPC_DNS_RESOLVER"] = "native"
-from google import genai
 from google.genai import types
 from pydantic import BaseModel, Field
 from typing import Optional
 
 import datetime
 import db_manager as db
+from services.llm_gateway import llm_gateway, usage_of, TokenBudgetExceeded
+from services.tool_cache import tool_cache
 
 import os
 
@@ -35,6 +36,8 @@ def get_store_orders_stat(store_id: str):
     return f"최근 {days}일간 총 {order_count}건의 주문이 있으며, 매출액은 {total_sales:,}원 입니다."
 
 
+# 공공데이터 조회 도구 결과 캐시 (TTL, stale 허용 구간) — 시세/시간표는 하루 안에서 거의 변하지 않음
+@tool_cache.cached("get_agricultural_price", ttl=3600, stale=6 * 3600)
 def get_agricultural_price(item_name: str):
     """KAMIS API를 통해 농산물(item_name)의 실시간 가격(시세)을 조회합니다."""
     if "에러테스트" in item_name:
@@ -65,6 +68,7 @@ def get_agricultural_price(item_name: str):
             time.sleep(1)
 
 
+@tool_cache.cached("get_train_schedule", ttl=600, stale=3600)
 def get_train_schedule(dep_sttn: str = "태백역", arr_sttn: str = "청량리역", date: str = None):
     """코레일 오픈 API를 통해 열차 시간표 및 잔여 좌석(예상)을 조회합니다."""
     if not dep_sttn: dep_sttn = "태백역"
@@ -94,6 +98,7 @@ def get_train_schedule(dep_sttn: str = "태백역", arr_sttn: str = "청량리
             time.sleep(1)
 
 
+@tool_cache.cached("get_agricultural_standard_code", ttl=86400, stale=7 * 86400)
 def get_agricultural_standard_code(category: str, keyword: str):
     """공공데이터포털 농축수산물 표준코드 API를 호출하여 품목/산지/단위 코드를 조회합니다.
     category: '품목', '산지', '단위', '포장', '크기', '등급', '도매시장', '법인' 중 하나
@@ -131,6 +136,25 @@ def get_agricultural_standard_code(category: str, keyword: str):
             time.sleep(1)
 
 
+@tool_cache.cached("get_spot_details", ttl=86400, stale=6 * 86400)
+def get_spot_descriptions(destination: str, top_spots: list) -> dict:
+    """관광 명소별 상세 해설 (AI 컨시어지). 반환: {장소명: 설명}"""
+    import json
+    prompt = (
+        f"당신은 {destination} 지역 전문 최고급 여행 컨시어지입니다. "
+        f"다음 장소들에 대해 고객이 왜 이곳에 꼭 가야만 하는지 완벽하게 설득하고, "
+        f"관광을 위한 구체적인 **도로명 주소, 전화번호(또는 관련 부서 연락처), 대략적인 도보/등반 소요 시간 및 관람 거리**를 반드시 포함하여 매우 전문적인 어조로 설명해주세요. "
+        f"마크다운이나 JSON 코드블록(```json) 없이 순수 JSON 객체(키: 장소명, 값: 설명)로만 작성하세요.\\n"
+        f"장소목록: {top_spots}"
+    )
+    txt = llm_gateway.generate_sync(prompt, model='gemini-3.5-flash', config={"temperature": 0.7})["text"]
+    if txt.startswith('```json'):
+        txt = txt[7:]
+    if txt.endswith('```'):
+        txt = txt[:-3]
+    return json.loads(txt.strip())
+
+
 def plan_travel_schedule(origin: str, budget: str, destination: str, duration: str, purpose: str):
     """입력된 자택(origin)부터 목적지까지의 경로를 포함한 실시간 관광 정보와 철도/대중교통 정보를 조합한 여행 추천 일정을 생성합니다.
     origin: 출발지/자택 주소 (예: '서울특별시 강남구')
@@ -162,35 +186,12 @@ def plan_travel_schedule(origin: str, budget: str, destination: str, duration: s
     if not top_spots:
         top_spots = ["태백산 국립공원", "구문소", "황지연못"]
 
-    # 2. 관광 명소별 상세 해설 및 설득 멘트 동적 생성 (AI 컨시어지)
-    import json
-    import os
-    from google import genai
-    from google.genai import types
-
-    dynamic_details = {}
+    # 2. 관광 명소별 상세 해설 및 설득 멘트 동적 생성 (AI 컨시어지, 목적지+명소 조합별 캐시)
     try:
-        tmp_client = genai.Client(api_key=os.environ.get('GOOGLE_API_KEY') or os.environ.get('GEMINI_API_KEY'))
-        prompt = (
-            f"당신은 {destination} 지역 전문 최고급 여행 컨시어지입니다. "
-            f"다음 장소들에 대해 고객이 왜 이곳에 꼭 가야만 하는지 완벽하게 설득하고, "
-            f"관광을 위한 구체적인 **도로명 주소, 전화번호(또는 관련 부서 연락처), 대략적인 도보/등반 소요 시간 및 관람 거리**를 반드시 포함하여 매우 전문적인 어조로 설명해주세요. "
-            f"마크다운이나 JSON 코드블록(```json) 없이 순수 JSON 객체(키: 장소명, 값: 설명)로만 작성하세요.\\n"
-            f"장소목록: {top_spots}"
-        )
-        resp = tmp_client.models.generate_content(
-            model='gemini-3.5-flash',
-            contents=prompt,
-            config=types.GenerateContentConfig(temperature=0.7)
-        )
-        txt = resp.text.strip()
-        if txt.startswith('```json'):
-            txt = txt[7:]
-        if txt.endswith('```'):
-            txt = txt[:-3]
-        dynamic_details = json.loads(txt.strip())
+        dynamic_details = get_spot_descriptions(destination, list(top_spots))
     except Exception as e:
         print(f"Dynamic spot generation failed: {e}")
+        dynamic_details = {}
 
     def get_spot_details(spot_name: str) -> str:
         fallback = f"✨ **[전문가 추천]** {spot_name}만의 고유한 매력을 느낄 수 있는 특별한 힐링 포인트입니다. 여유로운 관람을 권장합니다."
@@ -325,29 +326,46 @@ def get_project_structure():
 admin_tools = [get_current_time, get_store_orders_stat, read_file_content, plan_travel_schedule, submit_travel_feedback]
 customer_tools = [get_current_time, get_agricultural_price, get_train_schedule, get_agricultural_standard_code, plan_travel_schedule, submit_travel_feedback] # Do NOT expose read_file_content to customers!
 
+# 도구 캐시 미리 갱신 대상 (자주 묻는 항목) — 쉼표 구분 환경변수로 변경 가능
+PREFETCH_PRODUCE = [s.strip() for s in os.getenv("AI_PREFETCH_PRODUCE", "배추,무,감자,양파,사과").split(",") if s.strip()]
+PREFETCH_TRAIN_ROUTES = [("태백역", "청량리역"), ("태백역", "동해역"), ("청량리역", "태백역"), ("동해역", "태백역")]
+PREFETCH_DESTINATIONS = ["태백"]
+
+
+def prefetch_tool_cache():
+    """지역 농산물 시세/표준코드, 태백역 노선, 태백 관광 해설을 만료 전에 백그라운드 갱신 (cron_jobs 주기 호출)."""
+    scheduled = tool_cache.warm(get_agricultural_price, [{"item_name": item} for item in PREFETCH_PRODUCE])
+    scheduled += tool_cache.warm(get_agricultural_standard_code,
+                                 [{"category": "품목", "keyword": item} for item in PREFETCH_PRODUCE]
+                                 + [{"category": "산지", "keyword": d} for d in PREFETCH_DESTINATIONS])
+    scheduled += tool_cache.warm(get_train_schedule,
+                                 [{"dep_sttn": dep, "arr_sttn": arr} for dep, arr in PREFETCH_TRAIN_ROUTES])
+    try:
+        import tourism_adapter
+        spots = []
+        for destination in PREFETCH_DESTINATIONS:
+            top_spots = tourism_adapter.get_area_demand_scores(destination).get("top_spots") or []
+            if top_spots:
+                spots.append({"destination": destination, "top_spots": list(top_spots)})
+        scheduled += tool_cache.warm(get_spot_descriptions, spots)
+    except Exception as e:
+        print(f"[AI Tool] 관광 해설 미리 갱신 건너뜀: {e}")
+    purged = tool_cache.purge_expired()
+    return {"scheduled": scheduled, "purged": purged}
+
 def get_gemini_client():
-    """Gemini API 클라이언트 초기화"""
+    """Gemini API 클라이언트 (services.llm_gateway 공용 클라이언트 재사용)"""
     try:
-        api_key = config.get_settings().app.gemini_api_key
-        if not api_key:
-            return None
-        return genai.Client(api_key=api_key)
+        return llm_gateway.client()
     except Exception as e:
         print(f"Exception in get_gemini_client: {e}")
         return None
 
 def classify_store_type(store_name):
     """상호명을 기반으로 업종 분류 (AI) - 도구 사용 안 함"""
-    client = get_gemini_client()
-    if not client: return "기타 일반사업자"
-
     try:
         prompt = f"상호명 '{store_name}'을 분석하여 '식당', '편의점', '택배/물류', '카페', '미용실', '기타' 중 하나로만 대답해줘."
-        response = client.models.generate_content(
-            model='gemini-flash-latest',
-            contents=prompt
-        )
-        return response.text.strip()
+        return llm_gateway.generate_sync(prompt, model='gemini-flash-latest')["text"]
     except Exception:
         return "기타 일반사업자"
 
@@ -399,25 +417,134 @@ def calculate_cost_and_intent(user_input):
         
     return 10, "Simple Query"
 
-def get_ai_response(user_input, chat_history=None, system_prompt=None, tool_set='customer', user_id=None):
-    """AI 상담원 응답 생성 (Composite Mode: Function Calling Enabled & Billing/Auth injected)"""
-    
-    # [Authentication & Billing Phase]
+DEFAULT_SYSTEM_PROMPT = """너는 소상공인과 농부, 그리고 지역 주민을 돕는 '동네비서'다.
+이제 동네비서는 '수동형 3종 리포트 생성(Passive Mode)'로 동작한다.
+고객이 예산, 기간, 목적지를 바탕으로 여행 코스를 질문하면 도구를 사용하여 매우 상세한 '완성형 여행 계획서'를 출력하라.
+이 리포트는 그 자체로 완벽하여 고객이 인쇄해서 다닐 수 있어야 한다.
+
+[매우 중요: Passive Mode 규정]
+1. 리포트를 제공한 후에는 "결제를 진행하시겠습니까?", "추가로 궁금한 점이 있으신가요?", "어떤 코스가 마음에 드시나요?"와 같은 어떤 질문이나 제안도 먼저 하지 마라.
+2. 어떠한 예약 권유나 결제 유도도 해서는 안 된다. 모든 리포트는 '고객 자율 여행용'이다.
+3. 무조건 리포트를 출력하고 대화(응답)를 즉각 종료하라.
+4. 절대 캐주얼한 이모티콘(^^, ㅠㅠ, ㅎㅎ 등)을 사용하지 말고, 항상 정중하고 프로페셔널한 비즈니스 톤을 유지하라.
+5. 질문이 다른 분야인 경우 "저는 비즈니스를 돕는 동네비서 AI입니다. 업무와 관련 없는 질문은 사양하고 있습니다."라고 안내하라."""
+
+FREE_LIMIT_MESSAGE = "무료 이용 횟수(3회)를 모두 소진하셨습니다. 더 많은 서비스를 이용하시려면 <a href='/token_recharge' style='color: #00f2fe; font-weight: bold; text-decoration: underline;'>회원 가입 및 적립금 충전</a>을 진행해주세요."
+EMPTY_USAGE = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+
+
+def _charge_for_ai(user_input, user_id):
+    """[Authentication & Billing Phase] 반환: (is_premium, credit_cost, intent_category, 차단 메시지 | None)"""
     is_premium = False
     credit_cost, intent_category = calculate_cost_and_intent(user_input)
-    
+
     if user_id:
         is_premium = db.check_ai_member(user_id)
         if is_premium:
             # Premium Mode: Deduct credits atomically
             success, msg = db.deduct_credit_atomically(user_id, amount=credit_cost)
             if not success:
-                return {"text": msg, "usage": {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}}
+                return is_premium, credit_cost, intent_category, msg
         else:
             # Simple Mode: Check free usage limits
             allowed, count = db.check_and_increment_free_usage(user_id, max_count=3)
             if not allowed:
-                return {"text": "무료 이용 횟수(3회)를 모두 소진하셨습니다. 더 많은 서비스를 이용하시려면 <a href='/token_recharge' style='color: #00f2fe; font-weight: bold; text-decoration: underline;'>회원 가입 및 적립금 충전</a>을 진행해주세요.", "usage": {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}}
+                return is_premium, credit_cost, intent_category, FREE_LIMIT_MESSAGE
+    return is_premium, credit_cost, intent_category, None
+
+
+def _build_system_prompt(system_prompt, tool_set, user_id):
+    """시스템 프롬프트 설정 (기본값 또는 사용자 정의) + 자택 주소 / 매장 ID 동적 주입"""
+    if not system_prompt:
+        system_prompt = DEFAULT_SYSTEM_PROMPT
+
+    # 사용자 자택 주소 동적 주입 (고객용)
+    if user_id and tool_set != 'admin':
+        home_address = db.get_user_home_address(user_id)
+        system_prompt += f"\n\n[중요] 고객의 자택 주소(Origin)는 '{home_address}'입니다. 여행 일정 예약 시 반드시 이 주소를 출발지(origin) 파라미터로 사용하세요."
+
+    # 가맹점 매장 ID 동적 주입 (사장님용)
+    if user_id and tool_set == 'admin':
+        system_prompt += f"\n\n[가맹점 정보] 현재 로그인한 가맹점 사장님의 매장 ID(store_id / subdomain)는 '{user_id}'입니다. 매장 주문 통계 등 매장 관련 도구를 호출할 때 이 ID를 사용하세요."
+    return system_prompt
+
+
+def _extract_actions(text):
+    """응답 본문의 [ACTIONS]...[/ACTIONS] 블록 분리. 반환: (본문, actions)"""
+    import re
+    import json
+    actions = []
+    match = re.search(r'\[ACTIONS\](.*?)\[/ACTIONS\]', text, re.DOTALL)
+    if match:
+        try:
+            actions = json.loads(match.group(1).strip())
+            text = text.replace(match.group(0), "").strip()
+        except:
+            pass
+
+    if not actions and "[프리미엄 AI 지능형 맞춤 패키지]" in text:
+        actions = [
+            {"label": "🏨 숙소 즉시 결제/예약", "type": "BOOK_HOTEL", "payload": "hotel"},
+            {"label": "🍽️ 맛집 테이블 확정", "type": "BOOK_REST", "payload": "restaurant"},
+            {"label": "🚕 지역 택시/렌터카 호출", "type": "BOOK_TAXI", "payload": "taxi"}
+        ]
+    return text, actions
+
+
+class _ActionsFilter:
+    """스트리밍 조각에서 [ACTIONS]...[/ACTIONS] 블록을 걸러냄 (표식이 조각 경계에 걸쳐도 처리).
+    블록은 마지막 done 이벤트의 actions 로만 전달."""
+    START, END = "[ACTIONS]", "[/ACTIONS]"
+
+    def __init__(self):
+        self._buf = ""
+        self._in_block = False
+
+    @staticmethod
+    def _partial(buf, marker):
+        """buf 끝이 marker 의 앞부분과 겹치는 길이 (다음 조각을 봐야 판단 가능한 부분)."""
+        for n in range(min(len(buf), len(marker) - 1), 0, -1):
+            if marker.startswith(buf[-n:]):
+                return n
+        return 0
+
+    def feed(self, text):
+        self._buf += text
+        out = []
+        while self._buf:
+            if self._in_block:
+                end = self._buf.find(self.END)
+                if end < 0:
+                    keep = self._partial(self._buf, self.END)
+                    self._buf = self._buf[len(self._buf) - keep:] if keep else ""
+                    break
+                self._buf = self._buf[end + len(self.END):]
+                self._in_block = False
+            else:
+                start = self._buf.find(self.START)
+                if start < 0:
+                    keep = self._partial(self._buf, self.START)
+                    out.append(self._buf[:len(self._buf) - keep])
+                    self._buf = self._buf[len(self._buf) - keep:]
+                    break
+                out.append(self._buf[:start])
+                self._buf = self._buf[start + len(self.START):]
+                self._in_block = True
+        return "".join(out)
+
+    def flush(self):
+        rest = "" if self._in_block else self._buf
+        self._buf = ""
+        return rest
+
+
+def get_ai_response(user_input, chat_history=None, system_prompt=None, tool_set='customer', user_id=None):
+    """AI 상담원 응답 생성 (Composite Mode: Function Calling Enabled & Billing/Auth injected)"""
+    
+    # [Authentication & Billing Phase]
+    is_premium, credit_cost, intent_category, blocked = _charge_for_ai(user_input, user_id)
+    if blocked:
+        return {"text": blocked, "usage": dict(EMPTY_USAGE)}
     
     # [Routing] Determine Model
     model_name = determine_model_tier(user_input)
@@ -431,31 +558,17 @@ def get_ai_response(user_input, chat_history=None, system_prompt=None, tool_set=
         return "죄송합니다. 현재 AI 시스템이 오프라인 상태입니다. 나중에 다시 시도해주세요."
     
     try:
-        # 시스템 프롬프트 설정 (기본값 또는 사용자 정의)
-        if not system_prompt:
-             system_prompt = """너는 소상공인과 농부, 그리고 지역 주민을 돕는 '동네비서'다.
-이제 동네비서는 '수동형 3종 리포트 생성(Passive Mode)'로 동작한다.
-고객이 예산, 기간, 목적지를 바탕으로 여행 코스를 질문하면 도구를 사용하여 매우 상세한 '완성형 여행 계획서'를 출력하라.
-이 리포트는 그 자체로 완벽하여 고객이 인쇄해서 다닐 수 있어야 한다.
-
-[매우 중요: Passive Mode 규정]
-1. 리포트를 제공한 후에는 "결제를 진행하시겠습니까?", "추가로 궁금한 점이 있으신가요?", "어떤 코스가 마음에 드시나요?"와 같은 어떤 질문이나 제안도 먼저 하지 마라.
-2. 어떠한 예약 권유나 결제 유도도 해서는 안 된다. 모든 리포트는 '고객 자율 여행용'이다.
-3. 무조건 리포트를 출력하고 대화(응답)를 즉각 종료하라.
-4. 절대 캐주얼한 이모티콘(^^, ㅠㅠ, ㅎㅎ 등)을 사용하지 말고, 항상 정중하고 프로페셔널한 비즈니스 톤을 유지하라.
-5. 질문이 다른 분야인 경우 "저는 비즈니스를 돕는 동네비서 AI입니다. 업무와 관련 없는 질문은 사양하고 있습니다."라고 안내하라."""
+        system_prompt = _build_system_prompt(system_prompt, tool_set, user_id)
 
-        # 사용자 자택 주소 동적 주입 (고객용)
-        if user_id and tool_set != 'admin':
-            home_address = db.get_user_home_address(user_id)
-            system_prompt += f"\n\n[중요] 고객의 자택 주소(Origin)는 '{home_address}'입니다. 여행 일정 예약 시 반드시 이 주소를 출발지(origin) 파라미터로 사용하세요."
-            
-        # 가맹점 매장 ID 동적 주입 (사장님용)
-        if user_id and tool_set == 'admin':
-            system_prompt += f"\n\n[가맹점 정보] 현재 로그인한 가맹점 사장님의 매장 ID(store_id / subdomain)는 '{user_id}'입니다. 매장 주문 통계 등 매장 관련 도구를 호출할 때 이 ID를 사용하세요."
+        selected_tools = admin_tools if tool_set == 'admin' else customer_tools
+        llm_gateway.check_budget(user_id)
 
+        def _send(message):
+            with llm_gateway.limit(model_name):
+                resp = chat.send_message(message)
+            llm_gateway.record_usage(user_id, model_name, resp)
+            return resp
 
-        selected_tools = admin_tools if tool_set == 'admin' else customer_tools
         chat = client.chats.create(
             model=model_name,
             config=types.GenerateContentConfig(
@@ -467,7 +580,7 @@ def get_ai_response(user_input, chat_history=None, system_prompt=None, tool_set=
             )
         )
         
-        response = chat.send_message(user_input)
+        response = _send(user_input)
         
         loop_count = 0
         max_loops = 5
@@ -494,7 +607,7 @@ def get_ai_response(user_input, chat_history=None, system_prompt=None, tool_set=
                 else:
                     # Send result back to model for other tools
                     part = types.Part.from_function_response(name=func_name, response={"result": result_str})
-                    response = chat.send_message(part)
+                    response = _send(part)
             else:
                 break
                 
@@ -504,46 +617,27 @@ def get_ai_response(user_input, chat_history=None, system_prompt=None, tool_set=
             else:
                 text = "죄송합니다. 오류가 발생하여 답변을 생성하지 못했습니다."
         
-        try:
-            usage = {
-                "input_tokens": response.usage_metadata.prompt_token_count,
-                "output_tokens": response.usage_metadata.candidates_token_count,
-                "total_tokens": response.usage_metadata.total_token_count
-            }
-        except:
-            usage = {
-                "input_tokens": len(full_prompt) // 4,
-                "output_tokens": len(text) // 4,
-                "total_tokens": (len(full_prompt) + len(text)) // 4
-            }
+        usage = usage_of(response)
             
         # Log Usage for Platform OS Analytics
         if is_premium and user_id:
             db.log_ai_usage_analytics(user_id, intent_category, credit_cost)
             
-        actions = []
-        import re
-        import json
-        match = re.search(r'\[ACTIONS\](.*?)\[/ACTIONS\]', text, re.DOTALL)
-        if match:
-            try:
-                actions = json.loads(match.group(1).strip())
-                text = text.replace(match.group(0), "").strip()
-            except:
-                pass
-        
-        if not actions and "[프리미엄 AI 지능형 맞춤 패키지]" in text:
-            actions = [
-                {"label": "🏨 숙소 즉시 결제/예약", "type": "BOOK_HOTEL", "payload": "hotel"},
-                {"label": "🍽️ 맛집 테이블 확정", "type": "BOOK_REST", "payload": "restaurant"},
-                {"label": "🚕 지역 택시/렌터카 호출", "type": "BOOK_TAXI", "payload": "taxi"}
-            ]
+        text, actions = _extract_actions(text)
 
         return {
             "text": text,
             "actions": actions,
             "usage": usage
         }
+    except TokenBudgetExceeded as e:
+        print(f"AI Budget: {e}")
+        if is_premium and user_id:
+            db.refund_credit(user_id, amount=credit_cost)
+        return {
+            "text": "오늘 AI 이용 한도를 모두 사용하셨습니다. 내일 다시 이용해 주세요.",
+            "usage": {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+        }
     except APIRequestError as e:
         print(f"API Request Error: {e}")
         if is_premium and user_id:
@@ -565,6 +659,181 @@ def get_ai_response(user_input, chat_history=None, system_prompt=None, tool_set=
             "usage": {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
         }
 
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+# 비동기 함수 호출 루프 (스트리밍)
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+# get_ai_response 와 같은 과금/프롬프트/도구 규칙을 따르되
+#   - 한 턴에 모델이 요청한 도구들을 스레드에서 동시에 실행 (도구별 타임아웃)
+#   - 공공데이터 조회 도구(시간표·시세·표준코드)는 services.tool_cache 로 결과 재사용
+#   - 모델 텍스트는 생성되는 대로 이벤트로 흘려보냄
+BYPASS_TOOLS = ("plan_travel_schedule", "submit_travel_feedback")
+MAX_TOOL_LOOPS = 5
+DEFAULT_TOOL_TIMEOUT_SEC = 10.0
+TOOL_TIMEOUT_SEC = {
+    "plan_travel_schedule": 30.0,
+    "get_agricultural_price": 8.0,
+    "get_train_schedule": 8.0,
+    "get_agricultural_standard_code": 8.0,
+}
+
+
+def _call_args(fc):
+    return fc.args if isinstance(fc.args, dict) else (fc.args.model_dump() if hasattr(fc.args, 'model_dump') else dict(fc.args or {}))
+
+
+async def _run_tool(selected_tools, name, args):
+    """도구 1개 실행 (스레드 실행 + 타임아웃). 오류는 결과 문자열로 모델에 전달."""
+    import asyncio
+    func_obj = next((f for f in selected_tools if f.__name__ == name), None)
+    if func_obj is None:
+        return f"'{name}' 도구를 사용할 수 없습니다."
+    try:
+        return await asyncio.wait_for(asyncio.to_thread(func_obj, **args),
+                                      TOOL_TIMEOUT_SEC.get(name, DEFAULT_TOOL_TIMEOUT_SEC))
+    except asyncio.TimeoutError:
+        print(f"[AI Tool] {name} timeout")
+        return f"{name} 응답 시간이 초과되었습니다. 잠시 후 다시 시도해 주세요."
+    except Exception as e:
+        return str(e)
+
+
+async def stream_ai_response(user_input, system_prompt=None, tool_set='customer', user_id=None):
+    """
+    get_ai_response 의 비동기 스트리밍 버전. 이벤트 dict 를 순서대로 생성:
+      {"type": "text", "text": 조각}    — 모델 텍스트 (생성되는 대로, [ACTIONS] 블록 제외)
+      {"type": "tool", "name": 도구명}  — 도구 실행 시작
+      {"type": "done", "text", "actions", "usage"} — 최종 결과 (get_ai_response 반환 형식)
+    모델 스트림은 별도 태스크가 동시성 슬롯을 잡고 큐로 넘김 → 느린 SSE 소비자가 슬롯을 붙잡지 않음
+    """
+    import asyncio
+
+    _END = object()
+
+    async def _pump(message, q):
+        """모델 턴 1회 — 슬롯은 업스트림을 읽는 동안만 점유 (큐는 무제한이라 소비자를 기다리지 않음)."""
+        try:
+            async with llm_gateway.alimit(model_name):
+                async for chunk in await chat.send_message_stream(message):
+                    q.put_nowait(chunk)
+            q.put_nowait(_END)
+        except Exception as e:
+            q.put_nowait(e)
+
+    is_premium, credit_cost, intent_category, blocked = await asyncio.to_thread(_charge_for_ai, user_input, user_id)
+    if blocked:
+        yield {"type": "done", "text": blocked, "actions": [], "usage": dict(EMPTY_USAGE)}
+        return
+
+    async def _refund():
+        if is_premium and user_id:
+            await asyncio.to_thread(db.refund_credit, user_id, credit_cost)
+            print(f"Refunded {credit_cost} credits to {user_id} due to AI error.")
+
+    model_name = determine_model_tier(user_input)
+    client = get_gemini_client()
+    if not client:
+        await _refund()
+        yield {"type": "done", "text": "죄송합니다. 현재 AI 시스템이 오프라인 상태입니다. 나중에 다시 시도해주세요.",
+               "actions": [], "usage": dict(EMPTY_USAGE)}
+        return
+
+    try:
+        system_prompt = await asyncio.to_thread(_build_system_prompt, system_prompt, tool_set, user_id)
+        selected_tools = admin_tools if tool_set == 'admin' else customer_tools
+        llm_gateway.check_budget(user_id)
+
+        chat = client.aio.chats.create(
+            model=model_name,
+            config=types.GenerateContentConfig(
+                tools=selected_tools,
+                max_output_tokens=1000,
+                temperature=0.7,
+                system_instruction=system_prompt,
+                automatic_function_calling={"disable": True}
+            )
+        )
+
+        message = user_input
+        text_parts = []
+        bypass_text = None
+        usage = dict(EMPTY_USAGE)
+        shown = _ActionsFilter()
+        for loop_count in range(MAX_TOOL_LOOPS + 1):
+            calls, last = [], None
+            q = asyncio.Queue()
+            pump = asyncio.create_task(_pump(message, q))
+            try:
+                while True:
+                    chunk = await q.get()
+                    if chunk is _END:
+                        break
+                    if isinstance(chunk, Exception):
+                        raise chunk
+                    last = chunk
+                    if chunk.function_calls:
+                        calls.extend(chunk.function_calls)
+                    elif chunk.text:
+                        text_parts.append(chunk.text)
+                        visible = shown.feed(chunk.text)
+                        if visible:
+                            yield {"type": "text", "text": visible}
+            finally:
+                if not pump.done():
+                    pump.cancel()   # 소비자 중단(aclose) → 업스트림도 종료
+            if last is not None:
+                usage = llm_gateway.record_usage(user_id, model_name, last)
+            if not calls or loop_count == MAX_TOOL_LOOPS:
+                break
+
+            # 같은 턴의 도구 호출은 서로 독립 → 동시에 실행
+            for fc in calls:
+                yield {"type": "tool", "name": fc.name}
+            results = await asyncio.gather(*(_run_tool(selected_tools, fc.name, _call_args(fc)) for fc in calls))
+
+            # Direct bypass for formatted tools (prevent AI summarization/truncation)
+            bypass_text = next((r for fc, r in zip(calls, results) if fc.name in BYPASS_TOOLS), None)
+            if bypass_text is not None:
+                tool_filter = _ActionsFilter()
+                visible = shown.flush() + tool_filter.feed(bypass_text) + tool_filter.flush()
+                if visible:
+                    yield {"type": "text", "text": visible}
+                break
+            message = [types.Part.from_function_response(name=fc.name, response={"result": r})
+                       for fc, r in zip(calls, results)]
+
+        tail = shown.flush() if bypass_text is None else ""
+        if tail:
+            yield {"type": "text", "text": tail}
+        text = bypass_text if bypass_text is not None else "".join(text_parts).strip()
+        if not text:
+            text = "죄송합니다. 오류가 발생하여 답변을 생성하지 못했습니다."
+
+        # Log Usage for Platform OS Analytics
+        if is_premium and user_id:
+            await asyncio.to_thread(db.log_ai_usage_analytics, user_id, intent_category, credit_cost)
+
+        text, actions = _extract_actions(text)
+        yield {"type": "done", "text": text, "actions": actions, "usage": usage}
+    except TokenBudgetExceeded as e:
+        print(f"AI Budget: {e}")
+        await _refund()
+        yield {"type": "done", "text": "오늘 AI 이용 한도를 모두 사용하셨습니다. 내일 다시 이용해 주세요.",
+               "actions": [], "usage": dict(EMPTY_USAGE)}
+    except Exception as e:
+        print(f"AI Error: {e}")
+        await _refund()
+        yield {"type": "done", "text": "죄송합니다. 오류가 발생하여 답변을 생성하지 못했습니다. (차감된 적립금은 환불되었습니다)",
+               "actions": [], "usage": dict(EMPTY_USAGE)}
+
+
+async def get_ai_response_async(user_input, chat_history=None, system_prompt=None, tool_set='customer', user_id=None):
+    """get_ai_response 의 비동기 버전 (async 라우터용). 반환 형식 동일: {"text", "actions", "usage"}"""
+    result = {"text": "", "actions": [], "usage": dict(EMPTY_USAGE)}
+    async for event in stream_ai_response(user_input, system_prompt=system_prompt, tool_set=tool_set, user_id=user_id):
+        if event["type"] == "done":
+            result = {k: event[k] for k in ("text", "actions", "usage")}
+    return result
+
 async def parse_call_audio(audio_url: str) -> str:
     """통화 녹음 파일(URL)을 텍스트(STT)로 변환합니다."""
     # 실제 프로덕션에서는 Google Cloud STT API 또는 Whisper API를 호출합니다.
@@ -598,24 +867,16 @@ async def summarize_call_text(transcript: str, store_id: str = "UNKNOWN", custom
     {transcript}
     """
     try:
-        client = get_gemini_client()
-        if not client:
-            raise Exception("Client not initialized")
-            
-        config = types.GenerateContentConfig(
-            temperature=0.1,
-            response_mime_type="application/json",
-            response_schema=CallSummarySchema
-        )
-        
-        response = client.models.generate_content(
+        result = await llm_gateway.generate(
+            prompt,
             model='gemini-pro-latest',
-            contents=prompt,
-            config=config
+            config={"temperature": 0.1, "response_mime_type": "application/json",
+                    "response_schema": CallSummarySchema},
+            store_id=store_id,
         )
-        
+
         import json
-        return json.loads(response.text)
+        return json.loads(result["text"])
     except Exception as e:
         print("Call Parsing Error:", e)
         try:
@@ -674,22 +935,12 @@ async def draft_courier_greeting_message(customer_phone: str) -> str:
     """
 
     try:
-        api_key = config.get_secret("GOOGLE_API_KEY")
-        if not api_key:
-            api_key = config.get_settings().app.gemini_api_key
-        client = genai.Client(api_key=api_key)
-        
-        config = types.GenerateContentConfig(
-            temperature=0.7,
-            max_output_tokens=150
-        )
-        
-        response = client.models.generate_content(
+        result = await llm_gateway.generate(
+            prompt,
             model='gemini-flash-latest',
-            contents=prompt,
-            config=config
+            config={"temperature": 0.7, "max_output_tokens": 150},
         )
-        return response.text.strip()
+        return result["text"]
     except Exception as e:
         print("AI Draft Error:", e)
         return f"[동네비서 AI]\n통화량이 많습니다.\n택배예약: {booking_link}\n화물추적: {tracking_link}"
@@ -23,8 +23,8 @@ async def lifespan(app: FastAPI):
     """
     FastAPI 생명주기 관리 (현대적 lifespan 패턴)
     ─────────────────────────────────────────────
-    Startup  : cron_jobs + 배치 스케줄러 순차 시작
-    Shutdown : 배치 스케줄러 안전 종료 후 cron_jobs 정리
+    Startup  : cron_jobs + 배치 스케줄러 작업 등록 (services.job_runtime, 리더 프로세스만 실행)
+    Shutdown : 배치 작업 해제 후 작업 런타임 종료 (리더 리스 반납)
     """
     # ── Startup ──────────────────────────────────────────────
     _logger.info("[App] 서버 시작 — 스케줄러 초기화 중...")
@@ -37,7 +37,7 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         _logger.warning(f"[App] cron_jobs 시작 실패 (비필수): {e}")
 
-    # 2. 탄탄제작소 야간 배치 스케줄러 (APScheduler)
+    # 2. 탄탄제작소 야간 배치 스케줄러 (job_runtime)
     try:
         from routers.batch_scheduler import start as batch_start
         batch_start()
@@ -45,6 +45,34 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         _logger.warning(f"[App] 배치 스케줄러 시작 실패 (비필수): {e}")
 
+    # 3. 송장 발급 워커 (REQUESTED 로 남은 주문 재투입 포함)
+    try:
+        from routers.waybill_worker import waybill_worker
+        waybill_worker.start()
+    except Exception as e:
+        _logger.warning(f"[App] 송장 발급 워커 시작 실패 (비필수): {e}")
+
+    # 4. 주소 정제 캐시 시드 (별칭 + 단골 주소 프리패치, 백그라운드)
+    try:
+        from services.address_cache import address_cache
+        address_cache.warm()
+    except Exception as e:
+        _logger.warning(f"[App] 주소 정제 캐시 시드 실패 (비필수): {e}")
+
+    # 5. OCR 주소 교정 인덱스 로드 (백그라운드 스레드)
+    try:
+        from services.correction_index import correction_index
+        correction_index.warm()
+    except Exception as e:
+        _logger.warning(f"[App] OCR 교정 인덱스 로드 실패 (비필수): {e}")
+
+    # 6. GPU 워커 상태 모니터 (Control Tower 인프라 감시 스냅샷)
+    try:
+        from services.worker_monitor import worker_monitor
+        worker_monitor.start()
+    except Exception as e:
+        _logger.warning(f"[App] 워커 모니터 시작 실패 (비필수): {e}")
+
     _logger.info("[App] 탄탄제작소 엔진 구동 완료 ✅")
 
     yield  # ← 이 시점에 API 서비스 정상 운영
@@ -57,6 +85,41 @@ async def lifespan(app: FastAPI):
         _logger.info("[App] 배치 스케줄러 안전 종료")
     except Exception as e:
         _logger.warning(f"[App] 배치 스케줄러 종료 실패: {e}")
+    try:
+        from routers.waybill_worker import waybill_worker
+        await waybill_worker.stop()
+    except Exception as e:
+        _logger.warning(f"[App] 송장 발급 워커 종료 실패: {e}")
+    try:
+        from services.tracking_gateway import tracking_gateway
+        await tracking_gateway.aclose()
+    except Exception as e:
+        _logger.warning(f"[App] 배송 조회 게이트웨이 종료 실패: {e}")
+    try:
+        from services.address_cache import address_cache
+        await address_cache.aclose()
+    except Exception as e:
+        _logger.warning(f"[App] 주소 정제 캐시 종료 실패: {e}")
+    try:
+        from services.ocr_pipeline import ocr_pipeline
+        await ocr_pipeline.aclose()
+    except Exception as e:
+        _logger.warning(f"[App] OCR 클라이언트 종료 실패: {e}")
+    try:
+        from services.worker_monitor import worker_monitor
+        worker_monitor.stop()
+    except Exception as e:
+        _logger.warning(f"[App] 워커 모니터 종료 실패: {e}")
+    try:
+        from services.job_runtime import job_runtime
+        job_runtime.stop()
+    except Exception as e:
+        _logger.warning(f"[App] 작업 런타임 종료 실패: {e}")
+    try:
+        from services.redis_registry import redis_registry
+        await redis_registry.aclose()
+    except Exception as e:
+        _logger.warning(f"[App] Redis 공용 풀 종료 실패: {e}")
 
 
 app = FastAPI(title="AI Store API", redirect_slashes=True, lifespan=lifespan)
@@ -296,24 +359,6 @@ def _load_webhook_token():
     if not os.path.exists("uploads"):
         os.makedirs("uploads")
 
-@app.on_event("startup")
-def _start_batch_scheduler():
-    """KST 기준 심야 배치 스케줄러 시작 (00:00/00:10/06:30/07:00 KST)"""
-    try:
-        from routers.batch_scheduler import start as _batch_start
-        _batch_start()
-        print("[OK] 심야 배치 스케줄러 시작 (Asia/Seoul 기준)")
-    except Exception as e:
-        print(f"[WARN] 배치 스케줄러 시작 실패 (비필수): {e}")
-
-@app.on_event("shutdown")
-def _stop_batch_scheduler():
-    try:
-        from routers.batch_scheduler import stop as _batch_stop
-        _batch_stop()
-    except Exception:
-        pass
-
 from routers import admin, auth, citizen, courier, crm, market, system, webhooks, search, webhook_atalk, schedule_manager, comm, api_admin_market, monitor, ocr, kiosk
 from routers import callback_click
 from routers import video_shortform          # ★ 숏폼 영상 생성 키오스크
@@ -360,19 +405,23 @@ app.include_router(tantan_auth_router)     # ★ /api/v1/admin/* (인증/세션)
 @app.get("/api/tantan/kiosk/status", tags=["kiosk"])
 async def kiosk_status():
     """점검 모드 여부 반환 — kiosk.html이 30초마다 폴링."""
-    import redis as _redis, os as _os
+    import os as _os
     from datetime import datetime
     import pytz
+    from services.redis_registry import redis_registry
     try:
-        rdb = _redis.from_url(
-            _os.environ.get("DONGNE_REDIS_URL", _os.environ.get("REDIS_URL", "redis://localhost:6379/1")),
-            decode_responses=True,
+        # 공용 비동기 풀 + 파이프라인 1회 왕복 (키오스크 다수가 30초마다 폴링)
+        flags = await redis_registry.apipelined(
+            lambda p: (p.get("tantan:maintenance:active"), p.get("tantan:batch:running"),
+                       p.get("tantan:batch:soft_shutdown"), p.get("tantan:batch:count_today"),
+                       p.zcard("tantan:orders:pending_index")),
+            url=_os.environ.get("DONGNE_REDIS_URL", _os.environ.get("REDIS_URL", "redis://localhost:6379/1")),
         )
-        maintenance = rdb.get("tantan:maintenance:active") == "1"
-        batch_running = rdb.get("tantan:batch:running") == "1"
-        soft_shutdown = rdb.get("tantan:batch:soft_shutdown") == "1"
-        count_today   = int(rdb.get("tantan:batch:count_today") or 0)
-        pending_count = rdb.zcard("tantan:orders:pending_index")
+        maintenance   = flags[0] == "1"
+        batch_running = flags[1] == "1"
+        soft_shutdown = flags[2] == "1"
+        count_today   = int(flags[3] or 0)
+        pending_count = flags[4]
         kst = pytz.timezone("Asia/Seoul")
         now_kst = datetime.now(kst)
         return {
@@ -5,6 +5,8 @@
 """
 from db_backend import db
 import pandas as pd
+from product_index import product_index
+from services.security_detector import security_detector
 
 # ==========================================
 # 상수의 호환성 유지
@@ -119,8 +121,22 @@ def get_wallet_balance(store_id):
     return db.get_wallet_balance(store_id)
 
 
-def update_wallet_balance(store_id, new_balance):
-    return db.update_wallet_balance(store_id, new_balance)
+def update_wallet_balance(store_id, new_balance, memo="잔액 조정"):
+    return db.update_wallet_balance(store_id, new_balance, memo)
+
+
+def wallet_post(store_id, amount, change_type, memo="", tier="points", require_funds=True, low_alert=False):
+    """포인트·지갑 원장 기록 + 잔액 원자 갱신. 반환: 갱신 후 잔액 | None (잔액 부족)"""
+    return db.wallet_post(store_id, amount, change_type, memo, tier=tier, require_funds=require_funds,
+                          low_alert=low_alert)
+
+
+def refresh_wallet_snapshots():
+    return db.refresh_wallet_snapshots()
+
+
+def auto_refill_wallets(default_target=10000, memo="자동 충전"):
+    return db.auto_refill_wallets(default_target, memo)
 
 
 def save_virtual_number(virtual_number, store_id, label="", status="active"):
@@ -172,15 +188,15 @@ def get_all_riders():
 # Wallet / Logs Interface
 # ==========================================
 
-def append_wallet_log(store_id, change_type, amount, balance_after, memo="", related_id=""):
-    return db.log_wallet(store_id, change_type, amount, balance_after, memo)
+def append_wallet_log(store_id, change_type, amount, balance_after, memo="", related_id="", tier="wallet"):
+    return db.log_wallet(store_id, change_type, amount, balance_after, memo, tier=tier)
 
 def append_topup_request(store_id, amount, depositor):
     return db.request_topup(store_id, amount, depositor)
 
 
-def get_wallet_logs(store_id=None, limit=200):
-    return db.get_wallet_logs(store_id, limit)
+def get_wallet_logs(store_id=None, limit=200, before_id=None, period=None, tier=None):
+    return db.get_wallet_logs(store_id, limit, before_id=before_id, period=period, tier=tier)
 
 def append_message_log(store_id, receiver, length, cost, status="성공", channel="biztalk"):
     # Legacy wrapper compatibility
@@ -193,6 +209,10 @@ def log_sms(store_id, phone, category, message, status, response=""):
     """SMS 로그 저장 Wrapper"""
     sqlite_fallback.log_sms(store_id, phone, category, message, status, response)
 
+def log_sms_many(rows):
+    """SMS 로그 일괄 저장 Wrapper — rows: [(store_id, phone, category, message, status, response), ...]"""
+    return sqlite_fallback.log_sms_many(rows)
+
 def get_sms_logs(store_id=None, limit=50):
     """SMS 로그 조회 Wrapper"""
     return sqlite_fallback.get_sms_logs(store_id, limit)
@@ -203,13 +223,17 @@ def get_sms_logs(store_id=None, limit=50):
 
 def save_product_info(store_id, data):
     data['store_id'] = store_id
-    return db.save_product(data)
+    result = db.save_product(data)
+    product_index.invalidate()
+    return result
 
 def get_store_products(store_id):
     return db.get_products(store_id)
 
 def delete_store_product(product_id):
-    return db.delete_product(product_id)
+    result = db.delete_product(product_id)
+    product_index.invalidate()
+    return result
 
 def save_reservation_record(store_id, data):
     data['store_id'] = store_id
@@ -263,6 +287,10 @@ def delete_store_ledger(record_id):
 def save_store_delivery(data):
     return db.save_delivery(data)
 
+def save_delivery_batch(deliveries, orders):
+    """대량 접수 청크 일괄 저장 (트랜잭션 1회)"""
+    return db.save_delivery_batch(deliveries, orders)
+
 def save_delivery_order(data):
     if hasattr(db, 'save_delivery_order'):
         return db.save_delivery_order(data)
@@ -282,6 +310,12 @@ def acquire_delivery_order_lock(order_id):
     import db_sqlite
     return db_sqlite.acquire_delivery_order_lock(order_id)
 
+def save_waybill_job(order_id, job_json):
+    return db.save_waybill_job(order_id, job_json)
+
+def get_requested_waybill_jobs(limit=200):
+    return db.get_requested_waybill_jobs(limit)
+
 def update_delivery_order_status(order_id, status, waybill_number=None, error_message=None):
     if hasattr(db, 'update_delivery_order_status'):
         return db.update_delivery_order_status(order_id, status, waybill_number, error_message)
@@ -313,6 +347,18 @@ def get_today_stats(store_id):
 # Auto Reply Settings
 # ==========================================
 
+def claim_schedule_reminders(day):
+    return db.claim_schedule_reminders(day)
+
+def release_schedule_reminders(store_ids, day):
+    return db.release_schedule_reminders(store_ids, day)
+
+def claim_unanswered_schedules(day):
+    return db.claim_unanswered_schedules(day)
+
+def confirm_store_schedule(store_id, closed_message, day):
+    return db.confirm_store_schedule(store_id, closed_message, day)
+
 def update_store_auto_reply(store_id, msg, missed, end, refill_on=0, refill_amount=50000):
     return db.update_store_auto_reply(store_id, msg, missed, end, refill_on, refill_amount)
 
@@ -328,7 +374,9 @@ def charge_wallet(store_id, amount, bonus, memo):
 # ==========================================
 
 def save_product(store_id, name, price, image_path):
-    return db.save_product(store_id, name, price, image_path)
+    result = db.save_product(store_id, name, price, image_path)
+    product_index.invalidate()
+    return result
 
 def get_all_products():
     return db.get_all_products()
@@ -337,7 +385,10 @@ def get_product_detail(product_id):
     return db.get_product_detail(product_id)
 
 def decrease_product_inventory(product_id, quantity):
-    return db.decrease_product_inventory(product_id, quantity)
+    ok, msg = db.decrease_product_inventory(product_id, quantity)
+    if ok:
+        product_index.adjust_inventory(product_id, -quantity)
+    return ok, msg
 
 # ==========================================
 # Orders (webhook_app.py signatures)
@@ -423,7 +474,9 @@ def verify_password(pw, hashed):
 # ==========================================
 
 def delete_product(product_id, store_id):
-    return db.delete_product(product_id, store_id)
+    result = db.delete_product(product_id, store_id)
+    product_index.invalidate()
+    return result
 
 def get_sales_stats(store_id, days=30):
     return db.get_sales_stats(store_id, days)
@@ -478,9 +531,9 @@ def get_system_stats():
         return db.get_system_stats()
     return {}
 
-def get_wallet_details(store_id):
+def get_wallet_details(store_id, limit=20, before_id=None, period=None):
     try:
-        return db.get_wallet_details(store_id)
+        return db.get_wallet_details(store_id, limit=limit, before_id=before_id, period=period)
     except AttributeError:
         # Fallback if backend doesn't implement it
         return {
@@ -662,11 +715,14 @@ def mark_ai_call_read(log_id, store_id):
 # ★ Webhook Blackbox Logging Wrappers
 # ==========================================
 def save_webhook_log(**kwargs):
-    if hasattr(db, 'save_webhook_log'):
-        return db.save_webhook_log(**kwargs)
-    return None
+    log_id = db.save_webhook_log(**kwargs) if hasattr(db, 'save_webhook_log') else None
+    security_detector.observe_webhook_saved(log_id, **kwargs)
+    return log_id
 
 def update_webhook_log(log_id, **kwargs):
+    """kwargs 의 token(인증 실패 토큰 앞자리)은 저장하지 않고 이상 감지기에만 전달"""
+    token = kwargs.pop('token', None)
+    security_detector.observe_webhook_updated(log_id, token=token, **kwargs)
     if hasattr(db, 'update_webhook_log'):
         return db.update_webhook_log(log_id, **kwargs)
     return False
@@ -687,6 +743,7 @@ def delete_store(store_id):
     return False
 
 def log_security_event(store_id, customer_phone, event_type, payload):
+    security_detector.observe_security_event(store_id, customer_phone, event_type)
     if hasattr(db, 'log_security_event'):
         return db.log_security_event(store_id, customer_phone, event_type, payload)
     return False
@@ -1,22 +1,28 @@
 import psycopg2
 import psycopg2.extras
+import psycopg2.pool
 import os
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 import json
 import pandas as pd
 
 DB_FILE = "database.db"
 
+_PG_PARAMS = dict(
+    dbname="dongnebiseo",
+    user="tandan",
+    password="대표님비밀번호",
+    host="localhost",
+    port="5432"
+)
+
 def get_connection():
     try:
         # Connect to local postgresql
-        conn = psycopg2.connect(
-            dbname="dongnebiseo",
-            user="tandan",
-            password="대표님비밀번호",
-            host="localhost",
-            port="5432"
-        )
+        conn = psycopg2.connect(**_PG_PARAMS)
         # Use RealDictCursor to act like sqlite3.Row
         conn.cursor_factory = psycopg2.extras.RealDictCursor
         return conn
@@ -295,6 +301,9 @@ def init_db():
     try:
         c.execute("ALTER TABLE delivery_orders ADD COLUMN payload TEXT")
     except: pass
+    try:
+        c.execute("ALTER TABLE delivery_orders ADD COLUMN waybill_job TEXT")
+    except: pass
     try:
         c.execute("ALTER TABLE stores ADD COLUMN fee_rate REAL DEFAULT 0.033")
     except: pass
@@ -378,6 +387,13 @@ def init_db():
         c.execute("ALTER TABLE stores ADD COLUMN auto_refill_amount INTEGER DEFAULT 50000")
     except: pass
 
+    # ★ 익일 영업 확인 (22:00 문의 / 점주 응답 / 23:59 기본 스케줄 전환) — 날짜(YYYY-MM-DD)로 1일 1회 보장
+    for col in ("closed_message TEXT DEFAULT ''", "schedule_asked_date TEXT", "schedule_confirmed_date TEXT",
+                "schedule_fallback_date TEXT"):
+        try:
+            c.execute(f"ALTER TABLE stores ADD COLUMN {col}")
+        except: pass
+
     # ★ stores.my_referral_code — DNBXK7A2 형식 고유 추천인 코드 (PostgreSQL)
     try:
         c.execute("ALTER TABLE stores ADD COLUMN my_referral_code TEXT DEFAULT ''")
@@ -659,6 +675,39 @@ def init_db():
         )
     ''')
 
+    # ★ wallet_logs → 포인트·지갑 원장 저널 (append-only, tier = 'points' | 'wallet')
+    c.execute("SELECT 1 FROM information_schema.columns WHERE table_name = 'wallet_logs' AND column_name = 'tier'")
+    if c.fetchone() is None:
+        c.execute("ALTER TABLE wallet_logs ADD COLUMN tier TEXT DEFAULT 'points'")
+        # 기존 기록 중 지갑 잔액(wallet_balance) 변동분: charge_wallet('charge'), 문자 과금('sms')
+        c.execute("UPDATE wallet_logs SET tier = 'wallet' WHERE change_type IN ('charge', 'sms')")
+    c.execute('CREATE INDEX IF NOT EXISTS idx_wallet_logs_store ON wallet_logs(store_id, id)')
+    c.execute('''
+        CREATE OR REPLACE FUNCTION wallet_logs_append_only() RETURNS trigger AS $$
+        BEGIN RAISE EXCEPTION 'wallet_logs is append-only'; END
+        $$ LANGUAGE plpgsql
+    ''')
+    c.execute("DROP TRIGGER IF EXISTS trg_wallet_logs_append_only ON wallet_logs")
+    c.execute('''
+        CREATE TRIGGER trg_wallet_logs_append_only BEFORE UPDATE OR DELETE ON wallet_logs
+        FOR EACH ROW EXECUTE PROCEDURE wallet_logs_append_only()
+    ''')
+
+    # ★ wallet_snapshots — 마감된 월별 원장 스냅샷 (저널 id 범위 + 입출 합계 + 기말 잔액)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS wallet_snapshots (
+            store_id TEXT NOT NULL,
+            tier TEXT NOT NULL,
+            period TEXT NOT NULL,
+            first_id INTEGER NOT NULL,
+            last_id INTEGER NOT NULL,
+            entries INTEGER NOT NULL,
+            credits INTEGER NOT NULL,
+            debits INTEGER NOT NULL,
+            closing_balance INTEGER,
+            PRIMARY KEY (store_id, tier, period)
+        )
+    ''')
 
     try:
         if not conn.autocommit:
@@ -721,6 +770,27 @@ def log_sms(store_id, phone, category, message, status, response=""):
     finally:
         conn.close()
 
+def log_sms_many(rows):
+    """
+    SMS 발송 이력 일괄 저장 (한 트랜잭션)
+    rows: [(store_id, phone, category, message, status, response), ...]
+    """
+    if not rows:
+        return 0
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    conn = get_connection()
+    c = conn.cursor()
+    try:
+        c.executemany("INSERT INTO sms_logs (store_id, phone, category, message, status, response, created_at) VALUES (%s, %s, %s, %s, %s, %s, %s)",
+                      [(*r[:5], str(r[5]), now) for r in rows])
+        conn.commit()
+        return len(rows)
+    except Exception as e:
+        print(f"Log Error: {e}")
+        return 0
+    finally:
+        conn.close()
+
 def get_sms_logs(store_id=None, limit=50):
     conn = get_connection()
     try:
@@ -1097,6 +1167,80 @@ def update_store_auto_reply(store_id, msg, missed, end, refill_on=0, refill_amou
         conn.close()
 
 
+def claim_schedule_reminders(day):
+    """
+    익일 영업 확인 문의 대상 선점 — 전화번호가 있고 day 에 아직 문의하지 않은 매장을
+    한 번의 UPDATE ... RETURNING 으로 표시 (재실행·리더 교체 시 중복 발송 없음).
+    반환: [{"store_id", "name", "phone"}]
+    """
+    conn = get_connection()
+    c = conn.cursor()
+    try:
+        c.execute('''
+            UPDATE stores SET schedule_asked_date = %s
+            WHERE COALESCE(phone, '') <> '' AND COALESCE(schedule_asked_date, '') <> %s
+            RETURNING store_id, name, phone
+        ''', (day, day))
+        rows = [dict(r) for r in c.fetchall()]
+        conn.commit()
+        return rows
+    finally:
+        conn.close()
+
+
+def release_schedule_reminders(store_ids, day):
+    """문의 발송에 실패한 매장의 day 선점 해제 (무응답 기본 스케줄 전환 대상에서 제외, 재실행 시 재발송)."""
+    if not store_ids:
+        return 0
+    conn = get_connection()
+    c = conn.cursor()
+    try:
+        c.execute("UPDATE stores SET schedule_asked_date = NULL WHERE schedule_asked_date = %s AND store_id = ANY(%s)",
+                  (day, list(store_ids)))
+        conn.commit()
+        return c.rowcount
+    finally:
+        conn.close()
+
+
+def claim_unanswered_schedules(day):
+    """
+    day 에 문의를 받고 응답하지 않은 매장을 기본 스케줄(정상 영업, closed_message 초기화)로 일괄 전환.
+    반환: 전환된 매장 [{"store_id", "name", "phone"}]
+    """
+    conn = get_connection()
+    c = conn.cursor()
+    try:
+        c.execute('''
+            UPDATE stores SET schedule_fallback_date = %s, closed_message = ''
+            WHERE schedule_asked_date = %s
+              AND COALESCE(schedule_confirmed_date, '') <> %s
+              AND COALESCE(schedule_fallback_date, '') <> %s
+            RETURNING store_id, name, phone
+        ''', (day, day, day, day))
+        rows = [dict(r) for r in c.fetchall()]
+        conn.commit()
+        return rows
+    finally:
+        conn.close()
+
+
+def confirm_store_schedule(store_id, closed_message, day):
+    """점주의 익일 스케줄 응답 저장 (day 응답 완료 표시 → 23:59 기본 스케줄 전환 대상에서 제외)."""
+    conn = get_connection()
+    c = conn.cursor()
+    try:
+        c.execute("UPDATE stores SET closed_message = %s, schedule_confirmed_date = %s WHERE store_id = %s",
+                  (closed_message, day, store_id))
+        conn.commit()
+        return c.rowcount > 0
+    except Exception as e:
+        print(f"Schedule Confirm Error: {e}")
+        return False
+    finally:
+        conn.close()
+
+
 def update_store_agreement(store_id, owner_name, marketing_agreed):
     """
     Update agreement status for a store (SQLite).
@@ -1332,21 +1476,144 @@ def get_all_stores():
         conn.close()
 
 # ==========================================
-# Wallet Logic
+# Wallet Logic — 포인트·지갑 원장
 # ==========================================
+# - 잔액: stores.points (포인트) / stores.wallet_balance (지갑). 변경은 모두 wallet_post() 경유
+#   UPDATE ... SET col = col + %s WHERE store_id = %s [AND col >= 차감액] RETURNING col
+#   → 조회 후 파이썬에서 계산해 다시 쓰던 경쟁(동시 차감 시 잔액 유실·음수) 제거
+# - 저널: wallet_logs (append-only 트리거, tier 컬럼) — 잔액 갱신과 같은 트랜잭션에서 기록
+# - 연결: ThreadedConnectionPool (WALLET_DB_POOL_MAX) — 호출마다 connect 하지 않음
+#   psycopg2 풀은 비어 있으면 대기 없이 PoolError → 세마포어로 동시 사용을 풀 크기 이하로 묶어 대기시킴
+#   (WALLET_DB_POOL_TIMEOUT 초 넘게 못 얻으면 예외)
+# - 잔액 캐시: 프로세스 내 WALLET_CACHE_TTL 초, 쓰기 시 즉시 갱신 (화면 표시용, 차감 판단에는 미사용)
+# - 기간 스냅샷: wallet_snapshots (매장·tier·월) → 월별 내역은 저널 id 범위로, 월 요약은 스냅샷 1행으로
+
+WALLET_TIERS = {"points": "points", "wallet": "wallet_balance"}
+WALLET_CACHE_TTL = float(os.getenv("WALLET_CACHE_TTL", "5"))
+WALLET_DB_POOL_MAX = int(os.getenv("WALLET_DB_POOL_MAX", "8"))
+WALLET_DB_POOL_TIMEOUT = float(os.getenv("WALLET_DB_POOL_TIMEOUT", "10"))
+LOW_POINTS_ALERT = 1000
+
+_wallet_pool = None
+_wallet_pool_lock = threading.Lock()
+_wallet_pool_slots = threading.BoundedSemaphore(WALLET_DB_POOL_MAX)
+_balance_cache = {}     # (store_id, tier) → (잔액, 기록 시각)
+_balance_lock = threading.Lock()
+
+
+def _get_wallet_pool():
+    global _wallet_pool
+    if _wallet_pool is None:
+        with _wallet_pool_lock:
+            if _wallet_pool is None:
+                _wallet_pool = psycopg2.pool.ThreadedConnectionPool(
+                    1, WALLET_DB_POOL_MAX, cursor_factory=psycopg2.extras.RealDictCursor, **_PG_PARAMS)
+    return _wallet_pool
+
+
+@contextmanager
+def _wallet_txn():
+    """풀 연결 1개로 트랜잭션 (정상 종료 시 COMMIT, 예외 시 ROLLBACK). 커서를 넘겨줌."""
+    pool = _get_wallet_pool()
+    if not _wallet_pool_slots.acquire(timeout=WALLET_DB_POOL_TIMEOUT):
+        raise psycopg2.pool.PoolError(f"wallet pool exhausted ({WALLET_DB_POOL_MAX}, {WALLET_DB_POOL_TIMEOUT}s)")
+    try:
+        conn = pool.getconn()
+        try:
+            with conn:
+                with conn.cursor() as c:
+                    yield c
+        finally:
+            pool.putconn(conn, close=bool(conn.closed))
+    finally:
+        _wallet_pool_slots.release()
 
-def log_wallet(store_id, change_type, amount, balance_after, memo):
-    conn = get_connection()
-    c = conn.cursor()
+
+def _cache_balance(store_id, tier, balance):
+    with _balance_lock:
+        _balance_cache[(store_id, tier)] = (balance, time.monotonic())
+
+
+def _wallet_balance(store_id, tier):
+    """캐시 → stores 순으로 잔액 조회."""
+    entry = _balance_cache.get((store_id, tier))
+    if entry and time.monotonic() - entry[1] < WALLET_CACHE_TTL:
+        return entry[0]
+    col = WALLET_TIERS[tier]
+    with _wallet_txn() as c:
+        c.execute(f"SELECT {col} AS balance FROM stores WHERE store_id = %s", (store_id,))
+        row = c.fetchone()
+    balance = int(row["balance"]) if row and row["balance"] is not None else 0
+    _cache_balance(store_id, tier, balance)
+    return balance
+
+
+def _apply_balance(c, store_id, tier, amount, require_funds=True):
+    """잔액 원자 갱신. 반환: 갱신 후 잔액 | None (매장 없음 또는 잔액 부족)"""
+    col = WALLET_TIERS[tier]
+    sql = f"UPDATE stores SET {col} = COALESCE({col}, 0) + %s WHERE store_id = %s"
+    params = [amount, store_id]
+    if amount < 0 and require_funds:
+        sql += f" AND COALESCE({col}, 0) >= %s"
+        params.append(-amount)
+    c.execute(sql + f" RETURNING {col} AS balance", params)
+    row = c.fetchone()
+    return None if row is None else int(row["balance"])
+
+
+def _append_journal(c, store_id, tier, change_type, amount, balance_after, memo):
+    c.execute('''
+        INSERT INTO wallet_logs (store_id, tier, change_type, amount, balance_after, memo, created_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+    ''', (store_id, tier, change_type, amount, balance_after, memo, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+
+
+def _low_points_alert(store_id, points):
+    """포인트 잔액 부족 알림 (트랜잭션 밖에서 호출)."""
     try:
-        c.execute('''
-            INSERT INTO wallet_logs (store_id, change_type, amount, balance_after, memo, created_at)
-            VALUES (%s, %s, %s, %s, %s, %s)
-        ''', (store_id, change_type, amount, balance_after, memo, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
-        conn.commit()
-        return True
-    finally:
-        conn.close()
+        with _wallet_txn() as c:
+            c.execute("SELECT phone, name FROM stores WHERE store_id = %s", (store_id,))
+            row = c.fetchone()
+        if row:
+            print(f"[Threshold Alert] Store {store_id} points: {points}")
+            import sms_manager
+            phone = row['phone'] or store_id
+            name = row['name'] or "가맹점"
+            clean_phone = phone.replace("-", "").replace(" ", "").strip()
+            msg = f"[동네비서] {name} 사장님, 현재 보유 토큰 잔액이 {points}개로 부족합니다. 원활한 서비스 이용을 위해 즉시 충전해주세요."
+            sms_manager.send_sms(clean_phone, msg, store_id=store_id)
+    except Exception as alert_err:
+        print(f"Failed to send threshold alert: {alert_err}")
+
+
+def wallet_post(store_id, amount, change_type, memo="", tier="points", require_funds=True, low_alert=False):
+    """
+    잔액 변경 + 저널 기록 (한 트랜잭션). amount 음수 = 차감.
+    require_funds=True 이면 잔액이 모자랄 때 아무것도 바꾸지 않음.
+    low_alert=True 이면 차감 후 포인트가 LOW_POINTS_ALERT 미만일 때 사장님께 잔액 부족 알림 (단체 문자·deduct_points 만 사용)
+    반환: 갱신 후 잔액 | None (잔액 부족 또는 매장 없음)
+    """
+    amount = int(amount)
+    with _wallet_txn() as c:
+        balance = _apply_balance(c, store_id, tier, amount, require_funds)
+        if balance is None:
+            return None
+        _append_journal(c, store_id, tier, change_type, amount, balance, memo)
+    _cache_balance(store_id, tier, balance)
+    if low_alert and tier == "points" and amount < 0 and balance < LOW_POINTS_ALERT:
+        _low_points_alert(store_id, balance)
+    return balance
+
+
+def get_points_balance(store_id):
+    return _wallet_balance(store_id, "points")
+
+
+def log_wallet(store_id, change_type, amount, balance_after, memo, tier="wallet"):
+    """저널만 기록 (잔액은 이미 반영된 경우). 잔액 변경은 wallet_post() 사용."""
+    with _wallet_txn() as c:
+        _append_journal(c, store_id, tier, change_type, amount, balance_after, memo)
+    return True
 
 def request_topup(store_id, amount, depositor):
     conn = get_connection()
@@ -1362,24 +1629,143 @@ def request_topup(store_id, amount, depositor):
         conn.close()
 
 
-def get_wallet_logs(store_id=None, limit=200):
-    conn = get_connection()
-    try:
+def _wallet_log_filter(c, store_id=None, before_id=None, period=None, tier=None):
+    """
+    저널 조회 조건. before_id = 이전 페이지 마지막 id (커서, 최신순).
+    period('YYYY-MM')에 스냅샷이 있으면 id 범위, 없으면(이번 달 등) created_at 접두어로 제한.
+    """
+    where, params = [], []
+    if store_id:
+        where.append("store_id = %s")
+        params.append(store_id)
+    if tier:
+        where.append("tier = %s")
+        params.append(tier)
+    if before_id:
+        where.append("id < %s")
+        params.append(int(before_id))
+    if period:
+        snap_sql = "SELECT MIN(first_id) AS lo, MAX(last_id) AS hi FROM wallet_snapshots WHERE period = %s"
+        snap_params = [period]
         if store_id:
-            return pd.read_sql(
-                "SELECT * FROM wallet_logs WHERE store_id = %s ORDER BY id DESC LIMIT %s",
-                conn,
-                params=(store_id, limit),
-            )
-        return pd.read_sql(
-            "SELECT * FROM wallet_logs ORDER BY id DESC LIMIT %s",
-            conn,
-            params=(limit,),
-        )
+            snap_sql += " AND store_id = %s"
+            snap_params.append(store_id)
+        c.execute(snap_sql, snap_params)
+        bounds = c.fetchone()
+        if bounds and bounds["lo"] is not None:
+            where.append("id BETWEEN %s AND %s")
+            params += [bounds["lo"], bounds["hi"]]
+            if not store_id:
+                where.append("substr(created_at, 1, 7) = %s")
+                params.append(period)
+        else:
+            where.append("created_at LIKE %s")
+            params.append(f"{period}%")
+    return (" WHERE " + " AND ".join(where)) if where else "", params
+
+
+def get_wallet_logs(store_id=None, limit=200, before_id=None, period=None, tier=None):
+    """원장 내역 (최신순, 커서 페이지). 다음 페이지는 before_id = 마지막 행의 id."""
+    try:
+        with _wallet_txn() as c:
+            where, params = _wallet_log_filter(c, store_id, before_id, period, tier)
+            c.execute(f"SELECT * FROM wallet_logs{where} ORDER BY id DESC LIMIT %s", params + [int(limit)])
+            return pd.DataFrame(c.fetchall())
     except Exception:
         return pd.DataFrame()
-    finally:
-        conn.close()
+
+
+def refresh_wallet_snapshots():
+    """
+    마감된 월(이번 달 이전) 중 아직 스냅샷이 없는 (매장, tier, 월) 을 생성.
+    마지막 스냅샷 이후 저널만 집계하므로 매일 호출해도 비용이 작음. 반환: 생성 행 수
+    """
+    this_month = datetime.now().strftime("%Y-%m")
+    with _wallet_txn() as c:
+        c.execute("SELECT COALESCE(MAX(last_id), 0) AS w FROM wallet_snapshots")
+        watermark = c.fetchone()["w"]
+        c.execute('''
+            INSERT INTO wallet_snapshots
+                (store_id, tier, period, first_id, last_id, entries, credits, debits, closing_balance)
+            SELECT g.store_id, g.tier, g.period, g.first_id, g.last_id, g.entries, g.credits, g.debits,
+                   l.balance_after
+            FROM (
+                SELECT store_id, COALESCE(tier, 'points') AS tier, substr(created_at, 1, 7) AS period,
+                       MIN(id) AS first_id, MAX(id) AS last_id, COUNT(*) AS entries,
+                       SUM(CASE WHEN amount > 0 THEN amount ELSE 0 END) AS credits,
+                       SUM(CASE WHEN amount < 0 THEN -amount ELSE 0 END) AS debits
+                FROM wallet_logs
+                WHERE id > %s AND store_id IS NOT NULL AND substr(created_at, 1, 7) < %s
+                GROUP BY store_id, COALESCE(tier, 'points'), substr(created_at, 1, 7)
+            ) g
+            JOIN wallet_logs l ON l.id = g.last_id
+            ON CONFLICT (store_id, tier, period) DO NOTHING
+        ''', (watermark, this_month))
+        return c.rowcount
+
+
+def get_wallet_period_summary(store_id, period=None):
+    """
+    tier 별 월 요약 {tier: {entries, credits, debits, closing_balance}}.
+    마감된 월은 스냅샷 1행, 그 외(이번 달)는 마지막 스냅샷 이후 저널만 집계.
+    """
+    period = period or datetime.now().strftime("%Y-%m")
+    with _wallet_txn() as c:
+        c.execute('''
+            SELECT tier, entries, credits, debits, closing_balance FROM wallet_snapshots
+            WHERE store_id = %s AND period = %s
+        ''', (store_id, period))
+        rows = c.fetchall()
+        if rows:
+            return {r["tier"]: {k: r[k] for k in ("entries", "credits", "debits", "closing_balance")} for r in rows}
+        c.execute("SELECT COALESCE(MAX(last_id), 0) AS w FROM wallet_snapshots WHERE store_id = %s", (store_id,))
+        after = c.fetchone()["w"]
+        c.execute('''
+            SELECT g.tier, g.entries, g.credits, g.debits, l.balance_after AS closing_balance
+            FROM (
+                SELECT COALESCE(tier, 'points') AS tier, COUNT(*) AS entries,
+                       SUM(CASE WHEN amount > 0 THEN amount ELSE 0 END) AS credits,
+                       SUM(CASE WHEN amount < 0 THEN -amount ELSE 0 END) AS debits,
+                       MAX(id) AS last_id
+                FROM wallet_logs
+                WHERE store_id = %s AND id > %s AND created_at LIKE %s
+                GROUP BY COALESCE(tier, 'points')
+            ) g
+            JOIN wallet_logs l ON l.id = g.last_id
+        ''', (store_id, after, f"{period}%"))
+        return {r["tier"]: {k: r[k] for k in ("entries", "credits", "debits", "closing_balance")}
+                for r in c.fetchall()}
+
+
+def auto_refill_wallets(default_target=10000, memo="자동 충전"):
+    """
+    자동 충전: auto_refill_on=1 이고 지갑 잔액이 목표액(auto_refill_amount, 0 이하면 default_target)
+    미만인 매장을 목표액까지 일괄 충전. 대상 잠금·잔액 갱신·원장 기록이 한 문장 (매장 수와 무관하게 쿼리 1회).
+    반환: [{"store_id", "amount", "balance"}]
+    """
+    with _wallet_txn() as c:
+        c.execute('''
+            WITH due AS (
+                SELECT store_id, COALESCE(wallet_balance, 0) AS before,
+                       CASE WHEN auto_refill_amount > 0 THEN auto_refill_amount ELSE %s END AS target
+                FROM stores
+                WHERE auto_refill_on = 1
+                  AND COALESCE(wallet_balance, 0) < CASE WHEN auto_refill_amount > 0 THEN auto_refill_amount ELSE %s END
+                FOR UPDATE
+            ), refilled AS (
+                UPDATE stores s SET wallet_balance = due.target
+                FROM due WHERE s.store_id = due.store_id
+                RETURNING s.store_id, due.target - due.before AS amount, due.target AS balance
+            )
+            INSERT INTO wallet_logs (store_id, tier, change_type, amount, balance_after, memo, created_at)
+            SELECT store_id, 'wallet', 'auto_refill', amount, balance, %s, %s FROM refilled
+            RETURNING store_id, amount, balance_after AS balance
+        ''', (default_target, default_target, memo, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+        refilled = [dict(r) for r in c.fetchall()]
+    for r in refilled:
+        _cache_balance(r["store_id"], "wallet", r["balance"])
+    return refilled
+
 
 def get_pending_topups():
     conn = get_connection()
@@ -1550,25 +1936,6 @@ def request_topup(store_id, amount, depositor):
         conn.close()
 
 
-def get_wallet_logs(store_id=None, limit=200):
-    conn = get_connection()
-    try:
-        if store_id:
-            return pd.read_sql(
-                "SELECT * FROM wallet_logs WHERE store_id = %s ORDER BY id DESC LIMIT %s",
-                conn,
-                params=(store_id, limit),
-            )
-        return pd.read_sql(
-            "SELECT * FROM wallet_logs ORDER BY id DESC LIMIT %s",
-            conn,
-            params=(limit,),
-        )
-    except Exception:
-        return pd.DataFrame()
-    finally:
-        conn.close()
-
 def get_pending_topups():
     conn = get_connection()
     try:
@@ -1873,6 +2240,88 @@ def save_delivery_order(data):
     finally:
         conn.close()
 
+def save_delivery_batch(deliveries, orders):
+    """
+    대량 접수용 일괄 저장 — 연결 1개 / 트랜잭션 1개 / executemany.
+    deliveries: save_delivery 와 같은 dict 목록, orders: save_delivery_order 와 같은 dict 목록 (단일 수령인)
+    실패 시 청크 전체 롤백. 반환: (성공 여부, 저장 건수 또는 오류)
+    """
+    conn = get_connection()
+    if conn is None:
+        return False, "Database connection failed"
+    try:
+        c = conn.cursor()
+        c.execute("ALTER TABLE deliveries ADD COLUMN IF NOT EXISTS payment_type TEXT DEFAULT 'prepaid'")
+        now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        psycopg2.extras.execute_batch(c, '''
+            INSERT INTO deliveries (store_id, sender_name, sender_phone, sender_addr,
+                                    receiver_name, receiver_phone, receiver_addr,
+                                    item_name, weight, fare, status, tracking_number, created_at, payment_type)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ''', [(
+            d.get('store_id'), d.get('sender_name'), d.get('sender_phone'), d.get('sender_addr'),
+            d.get('receiver_name'), d.get('receiver_phone'), d.get('receiver_addr'),
+            d.get('item_name') or d.get('item_type'), d.get('weight', 1),
+            d.get('fare') or d.get('fee', 3000), d.get('status', '접수완료'),
+            d.get('tracking_code'), now_str, d.get('payment_type', 'prepaid')
+        ) for d in deliveries])
+
+        # delivery_users: 같은 발송인이 여러 행이면 마지막 행 기준으로 갱신
+        latest = {o.get('sender_phone'): o for o in orders}
+        phones = list(latest)
+        user_ids = {}
+        for i in range(0, len(phones), 500):
+            part = phones[i:i + 500]
+            c.execute(f"SELECT user_id, phone_number FROM delivery_users WHERE phone_number IN ({','.join(['%s'] * len(part))})", part)
+            user_ids.update({row['phone_number']: row['user_id'] for row in c.fetchall()})
+        user_rows = [(o.get('sender_name'), o.get('sender_postcode') or "", o.get('sender_base_address') or "",
+                      o.get('sender_detail_address') or "", now_str, p) for p, o in latest.items()]
+        psycopg2.extras.execute_batch(c, '''
+            UPDATE delivery_users
+            SET recent_sender_name = %s, recent_zip_code = %s, recent_road_address = %s, recent_detailed_address = %s, updated_at = %s
+            WHERE phone_number = %s
+        ''', [r for r in user_rows if r[-1] in user_ids])
+        new_users = [r for r in user_rows if r[-1] not in user_ids]
+        if new_users:
+            psycopg2.extras.execute_batch(c, '''
+                INSERT INTO delivery_users (recent_sender_name, recent_zip_code, recent_road_address, recent_detailed_address, updated_at, phone_number)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            ''', new_users)
+            new_phones = [r[-1] for r in new_users]
+            for i in range(0, len(new_phones), 500):
+                part = new_phones[i:i + 500]
+                c.execute(f"SELECT user_id, phone_number FROM delivery_users WHERE phone_number IN ({','.join(['%s'] * len(part))})", part)
+                user_ids.update({row['phone_number']: row['user_id'] for row in c.fetchall()})
+
+        psycopg2.extras.execute_batch(c, '''
+            INSERT INTO delivery_orders (order_id, user_id, sender_name, sender_phone, pickup_zip_code, pickup_road_address, pickup_detailed_address, order_status, created_at, payload)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ''', [(
+            o.get('order_id'), user_ids.get(o.get('sender_phone')), o.get('sender_name'), o.get('sender_phone'),
+            o.get('sender_postcode') or "", o.get('sender_base_address') or "", o.get('sender_detail_address') or "",
+            o.get('order_status') or o.get('status') or 'REQUESTED', now_str, o.get('payload')
+        ) for o in orders])
+        psycopg2.extras.execute_batch(c, '''
+            INSERT INTO order_recipients (order_id, receiver_name, receiver_phone, delivery_zip_code, delivery_road_address, delivery_detailed_address)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        ''', [(
+            o.get('order_id'), o.get('receiver_name'), o.get('receiver_phone'),
+            o.get('postcode') or "", o.get('address') or "", o.get('detail_address') or ""
+        ) for o in orders])
+
+        conn.commit()
+        return True, len(orders)
+    except Exception as e:
+        print(f"Delivery Batch Save Error (Postgres): {e}")
+        try:
+            conn.rollback()
+        except:
+            pass
+        return False, str(e)
+    finally:
+        conn.close()
+
 def get_delivery_order(order_id):
     conn = get_connection()
     c = conn.cursor()
@@ -1886,6 +2335,37 @@ def get_delivery_order(order_id):
     finally:
         conn.close()
 
+def save_waybill_job(order_id, job_json):
+    """송장 발급 워커 투입 내역 저장 (재시작 후 REQUESTED 주문 재투입용)."""
+    conn = get_connection()
+    c = conn.cursor()
+    try:
+        c.execute("UPDATE delivery_orders SET waybill_job = %s WHERE order_id = %s", (job_json, order_id))
+        conn.commit()
+        return c.rowcount > 0
+    except Exception as e:
+        print(f"Error saving waybill job (Postgres): {e}")
+        return False
+    finally:
+        conn.close()
+
+def get_requested_waybill_jobs(limit=200):
+    """투입 내역이 있는데 아직 REQUESTED 인 주문 [{"order_id", "waybill_job"}] (오래된 순)."""
+    conn = get_connection()
+    c = conn.cursor()
+    try:
+        c.execute('''
+            SELECT order_id, waybill_job FROM delivery_orders
+            WHERE order_status = 'REQUESTED' AND waybill_job IS NOT NULL
+            ORDER BY created_at LIMIT %s
+        ''', (limit,))
+        return [dict(row) for row in c.fetchall()]
+    except Exception as e:
+        print(f"Error fetching requested waybill jobs (Postgres): {e}")
+        return []
+    finally:
+        conn.close()
+
 def acquire_delivery_order_lock(order_id):
     conn = get_connection()
     c = conn.cursor()
@@ -1994,28 +2474,27 @@ def update_delivery_status(delivery_id, store_id, status):
 # ==========================================
 
 def get_wallet_balance(store_id):
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("SELECT wallet_balance FROM stores WHERE store_id = %s", (store_id,))
-    row = c.fetchone()
-    conn.close()
-    if row and row["wallet_balance"] is not None:
-        return int(row["wallet_balance"])
-    return 0
+    return _wallet_balance(store_id, "wallet")
 
 
-def update_wallet_balance(store_id, new_balance):
-    conn = get_connection()
-    c = conn.cursor()
+def update_wallet_balance(store_id, new_balance, memo="잔액 조정"):
+    """지갑 잔액을 지정 값으로 맞춤 — 차액을 'adjust' 로 저널에 기록."""
     try:
-        c.execute("UPDATE stores SET wallet_balance = %s WHERE store_id = %s", (int(new_balance), store_id))
-        conn.commit()
+        with _wallet_txn() as c:
+            c.execute("SELECT COALESCE(wallet_balance, 0) AS balance FROM stores WHERE store_id = %s FOR UPDATE",
+                      (store_id,))
+            row = c.fetchone()
+            if row is None:
+                return False
+            delta = int(new_balance) - int(row["balance"])
+            if delta:
+                balance = _apply_balance(c, store_id, "wallet", delta, require_funds=False)
+                _append_journal(c, store_id, "wallet", "adjust", delta, balance, memo)
+        _cache_balance(store_id, "wallet", int(new_balance))
         return True
     except Exception as exc:
         print(f"Wallet Update Error: {exc}")
         return False
-    finally:
-        conn.close()
 
 
 def get_store_id_by_virtual_number(virtual_number):
@@ -2572,28 +3051,11 @@ def get_today_stats(store_id):
 
 
 def charge_wallet(store_id, amount, bonus, memo):
-    conn = get_connection()
-    c = conn.cursor()
     try:
-        c.execute("SELECT wallet_balance FROM stores WHERE store_id = %s", (store_id,))
-        row = c.fetchone()
-        current = row['wallet_balance'] if row and row['wallet_balance'] else 0
-
-        new_balance = current + amount + bonus
-
-        c.execute("UPDATE stores SET wallet_balance = %s WHERE store_id = %s", (new_balance, store_id))
-        c.execute('''
-            INSERT INTO wallet_logs (store_id, change_type, amount, balance_after, memo, created_at)
-            VALUES (%s, %s, %s, %s, %s, %s)
-        ''', (store_id, 'charge', amount + bonus, new_balance, memo, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
-
-        conn.commit()
-        return new_balance
+        return wallet_post(store_id, amount + bonus, 'charge', memo, tier="wallet")
     except Exception as e:
         print(f"Charge Wallet Error: {e}")
         return None
-    finally:
-        conn.close()
 
 
 def decrease_product_inventory(product_id, quantity):
@@ -2811,11 +3273,7 @@ def log_ai_usage(store_id, input_tokens, output_tokens):
     """
     Log AI usage and deduct points.
     """
-    conn = get_connection()
-    c = conn.cursor()
     try:
-        pass # Transaction start implicitly
-        
         total_tokens = input_tokens + output_tokens
         
         # Cost calculation (Simple model: 1 token = 1 point? Or 1000 tokens = 100 points?)
@@ -2827,28 +3285,26 @@ def log_ai_usage(store_id, input_tokens, output_tokens):
         
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
-        # 1. Log Usage
-        c.execute('''
-            INSERT INTO ai_usage_logs (store_id, tokens_input, tokens_output, cost, timestamp)
-            VALUES (%s, %s, %s, %s, %s)
-        ''', (store_id, input_tokens, output_tokens, cost, timestamp))
-        
-        # 2. Update Store (Deduct Points, Increment Usage)
-        c.execute('''
-            UPDATE stores 
-            SET points = points - %s, 
-                current_usage = current_usage + %s
-            WHERE store_id = %s
-        ''', (cost, total_tokens, store_id))
-        
-        conn.commit()
+        with _wallet_txn() as c:
+            # 1. Log Usage
+            c.execute('''
+                INSERT INTO ai_usage_logs (store_id, tokens_input, tokens_output, cost, timestamp)
+                VALUES (%s, %s, %s, %s, %s)
+            ''', (store_id, input_tokens, output_tokens, cost, timestamp))
+
+            # 2. Update Store (Increment Usage, Deduct Points — 사용 후 과금이므로 잔액 검사 없음)
+            c.execute("UPDATE stores SET current_usage = current_usage + %s WHERE store_id = %s", (total_tokens, store_id))
+            balance = _apply_balance(c, store_id, "points", -cost, require_funds=False)
+            if balance is not None:
+                _append_journal(c, store_id, "points", "AI", -cost, balance, f"AI 상담 ({total_tokens} tokens)")
+
+        if balance is not None:
+            _cache_balance(store_id, "points", balance)
         return True, cost
         
     except Exception as e:
         print(f"Logging Error: {e}")
         return False, 0
-    finally:
-        conn.close()
 
 
 
@@ -2917,26 +3373,6 @@ def save_cached_response(store_id, question, answer):
 # 💰 Wallet & Usage (SQLite Stub)
 # ==========================================
 
-def get_wallet_details(store_id):
-    """
-    Get wallet balance and recent logs for a store.
-    """
-    store = get_store(store_id)
-    if not store:
-        return {
-            "current_points": 0,
-            "wallet_logs": [],
-            "ai_usage_today": {"tokens": 0, "cost": 0},
-            "sms_usage_today": {"count": 0, "cost": 0}
-        }
-        
-    return {
-        "current_points": store.get('points', 0),
-        "wallet_logs": [], # SQLite version doesn't track detailed logs yet
-        "ai_usage_today": {"tokens": 0, "cost": 0},
-        "sms_usage_today": {"count": 0, "cost": 0}
-    }
-
 def get_daily_usage_stats(store_id):
     return {
         "ai": {"tokens": 0, "cost": 0},
@@ -2950,22 +3386,10 @@ def confirm_payment(store_id, amount, order_id, payment_key):
     Simulate payment confirmation for SQLite (Local Dev).
     """
     try:
-        conn = get_connection()
-        c = conn.cursor()
-        
-        # 1. Update Points
-        c.execute("UPDATE stores SET points = COALESCE(points, 0) + %s WHERE store_id = %s", (amount, store_id))
-        
-        # 2. Log
-        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        c.execute('''
-            INSERT INTO wallet_logs (store_id, change_type, amount, balance_after, memo, created_at)
-            VALUES (%s, %s, %s, (SELECT points FROM stores WHERE store_id = %s), %s, %s)
-        ''', (store_id, 'CHARGE', amount, store_id, '포인트 충전', now))
-        
+        balance = wallet_post(store_id, amount, 'CHARGE', '포인트 충전')
+        if balance is None:
+            return False
         print(f"[SQLite] Payment Confirmed: Store {store_id} +{amount}P")
-        
-        conn.commit()
         return True
     except Exception as e:
         print(f"[!] SQLite Payment Error: {e}")
@@ -3015,117 +3439,35 @@ def deduct_points_for_sms(store_id, total_cost, customer_count):
     """
     Atomic Point Deduction for Batch SMS (SQLite).
     """
-    conn = get_connection()
     try:
-        c = conn.cursor()
-        
-        # 1. Check Balance
-        c.execute("SELECT points FROM stores WHERE store_id = %s", (store_id,))
-        row = c.fetchone()
-        current_points = row['points'] if row and row['points'] else 0
-        
-        if current_points < total_cost:
-            return False, "잔액이 부족합니다.", None
-        
-        # 2. Deduct
-        new_balance = current_points - total_cost
-        c.execute("UPDATE stores SET points = %s WHERE store_id = %s", (new_balance, store_id))
-        
-        # 3. Log
-        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         memo = f"단체 문자 발송 ({customer_count}명)"
-        
-        c.execute('''
-            INSERT INTO wallet_logs (store_id, change_type, amount, balance_after, memo, created_at)
-            VALUES (%s, %s, %s, %s, %s, %s)
-        ''', (store_id, 'USE', -total_cost, new_balance, memo, now))
-        
-        # Threshold Alert Check
-        try:
-            if new_balance < 1000:
-                c.execute("SELECT phone, name FROM stores WHERE store_id = %s", (store_id,))
-                row = c.fetchone()
-                if row:
-                    print(f"[Threshold Alert] Store {store_id} points: {new_balance}")
-                    import sms_manager
-                    phone = row['phone'] or store_id
-                    name = row['name'] or "가맹점"
-                    clean_phone = phone.replace("-", "").replace(" ", "").strip()
-                    msg = f"[동네비서] {name} 사장님, 현재 보유 토큰 잔액이 {new_balance}개로 부족합니다. 원활한 서비스 이용을 위해 즉시 충전해주세요."
-                    sms_manager.send_sms(clean_phone, msg, store_id=store_id)
-        except Exception as alert_err:
-            print(f"Failed to send threshold alert: {alert_err}")
-
-        conn.commit()
+        if wallet_post(store_id, -total_cost, 'USE', memo, low_alert=True) is None:
+            return False, "잔액이 부족합니다.", None
         return True, "성공", "TX_" + datetime.now().strftime("%Y%m%d%H%M%S")
-        
     except Exception as e:
         print(f"[!] Point Deduction Error: {e}")
         return False, f"시스템 오류: {e}", None
-    finally:
-        conn.close()
 
 def refund_points(store_id, amount, reason):
     """
     Refund points (e.g., for failed SMS).
     """
-    conn = get_connection()
     try:
         if amount <= 0: return True
-        c = conn.cursor()
-        
-        # 1. Refund
-        c.execute("UPDATE stores SET points = points + %s WHERE store_id = %s", (amount, store_id))
-        
-        # 2. Log
-        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        c.execute('''
-            INSERT INTO wallet_logs (store_id, change_type, amount, balance_after, memo, created_at)
-            VALUES (%s, %s, %s, (SELECT points FROM stores WHERE store_id = %s), %s, %s)
-        ''', (store_id, 'REFUND', amount, store_id, reason, now))
-        
-        conn.commit()
-        return True
+        return wallet_post(store_id, amount, 'REFUND', reason) is not None
     except Exception as e:
         print(f"[!] Refund Error: {e}")
         return False
-    finally:
-        conn.close()
 
 def deduct_fixed_cost(store_id, amount, reason):
     """
     Deduct fixed amount (SQLite).
     """
-    conn = get_connection()
     try:
-        c = conn.cursor()
-        
-        # 1. Check Balance
-        c.execute("SELECT points FROM stores WHERE store_id = %s", (store_id,))
-        row = c.fetchone()
-        current = row['points'] if row and row['points'] else 0
-        
-        if current < amount:
-            return False
-        
-        # 2. Deduct
-        c.execute("UPDATE stores SET points = points - %s WHERE store_id = %s", (amount, store_id))
-        
-        # 3. Log
-        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        c.execute('''
-            INSERT INTO wallet_logs (store_id, change_type, amount, balance_after, memo, created_at)
-            VALUES (%s, %s, %s, (SELECT points FROM stores WHERE store_id = %s), %s, %s)
-        ''', (store_id, 'USE', -amount, store_id, reason, now))
-        
-        conn.commit()
-        return True
+        return wallet_post(store_id, -amount, 'USE', reason) is not None
     except Exception as e:
         print(f"[!] Deduct Error: {e}")
         return False
-    finally:
-        conn.close()
 
 def get_daily_usage_stats(store_id):
     """
@@ -3136,40 +3478,43 @@ def get_daily_usage_stats(store_id):
         "sms": {"count": 0, "cost": 0}
     }
 
-def get_wallet_details(store_id):
+def get_wallet_details(store_id, limit=20, before_id=None, period=None):
     """
     Get wallet balance and logs (SQLite).
+    before_id: 이전 페이지 마지막 id (커서) / period: 'YYYY-MM' 월 필터
     """
     details = {
         "current_points": 0,
+        "wallet_balance": 0,
         "wallet_logs": [],
+        "next_cursor": None,
+        "period_summary": {},
         "ai_usage_today": {"tokens": 0, "cost": 0},
         "sms_usage_today": {"count": 0, "cost": 0}
     }
-    conn = get_connection()
     try:
-        c = conn.cursor()
-        
-        # 1. Current Points
-        c.execute("SELECT points FROM stores WHERE store_id = %s", (store_id,))
-        row = c.fetchone()
-        details["current_points"] = row['points'] if row and row['points'] else 0
-        
-        # 2. Recent Wallet Logs
-        c.execute('''
-            SELECT change_type as type, amount, created_at, memo 
-            FROM wallet_logs 
-            WHERE store_id = %s 
-            ORDER BY id DESC LIMIT 20
-        ''', (store_id,))
-        rows = c.fetchall()
+        # 1. Current Balances (캐시)
+        details["current_points"] = _wallet_balance(store_id, "points")
+        details["wallet_balance"] = _wallet_balance(store_id, "wallet")
+
+        # 2. Wallet Logs (커서 페이지)
+        with _wallet_txn() as c:
+            where, params = _wallet_log_filter(c, store_id, before_id, period)
+            c.execute(f'''
+                SELECT id, tier, change_type as type, amount, balance_after, created_at, memo
+                FROM wallet_logs{where}
+                ORDER BY id DESC LIMIT %s
+            ''', params + [int(limit)])
+            rows = c.fetchall()
         details["wallet_logs"] = [dict(row) for row in rows]
-        
+        if len(rows) == int(limit):
+            details["next_cursor"] = rows[-1]["id"]
+
+        # 3. Period Summary (스냅샷)
+        details["period_summary"] = get_wallet_period_summary(store_id, period)
     except Exception as e:
         print(f"Wallet Details Error: {e}")
-    finally:
-        conn.close()
-        
+
     # Get Usage Stats
     usage = get_daily_usage_stats(store_id)
     details["ai_usage_today"] = usage.get("ai")
@@ -3388,39 +3733,13 @@ def get_courier_requests(citizen_id=None):
 
 def deduct_points(store_id, amount):
     """
-    Deduct Points from Store
+    Deduct Points from Store (잔액이 부족하면 차감하지 않고 False)
     """
-    conn = get_connection()
-    c = conn.cursor()
     try:
-        # Check current points first to avoid negative? 
-        # For now, let's just subtract. verification happened in app.
-        c.execute("UPDATE stores SET points = points - %s WHERE store_id = %s", (amount, store_id))
-        
-        # Threshold Alert Check
-        try:
-            c.execute("SELECT points, phone, name FROM stores WHERE store_id = %s", (store_id,))
-            row = c.fetchone()
-            if row:
-                pts = row['points'] if row['points'] is not None else 0
-                if pts < 1000:
-                    print(f"[Threshold Alert] Store {store_id} points: {pts}")
-                    import sms_manager
-                    phone = row['phone'] or store_id
-                    name = row['name'] or "가맹점"
-                    clean_phone = phone.replace("-", "").replace(" ", "").strip()
-                    msg = f"[동네비서] {name} 사장님, 현재 보유 토큰 잔액이 {pts}개로 부족합니다. 원활한 서비스 이용을 위해 즉시 충전해주세요."
-                    sms_manager.send_sms(clean_phone, msg, store_id=store_id)
-        except Exception as alert_err:
-            print(f"Failed to send threshold alert: {alert_err}")
-
-        conn.commit()
-        return True
+        return wallet_post(store_id, -amount, 'USE', '포인트 차감', low_alert=True) is not None
     except Exception as e:
         print(f"[!] SQLite deduct_points Error: {e}")
         return False
-    finally:
-        conn.close()
 
 def update_courier_payment_success(tracking_code, method):
     """
@@ -3444,44 +3763,45 @@ def check_and_complete_referral_reward(store_id, fee_amount):
     고객의 누적결제액이 일정 조건(예: 10,000원 이상)을 돌파하면 기사님께 리워드 지급
     first_tx_completed 컬럼을 누적 결제액 척도 및 지급 완료 플래그(-1)로 사용
     """
-    conn = get_connection()
-    c = conn.cursor()
     try:
-        c.execute("SELECT referrer_id, first_tx_completed, subscription_tier FROM stores WHERE store_id = %s", (store_id,))
-        store = c.fetchone()
-        
-        if not store:
-            return False
-            
-        referrer_id = store['referrer_id']
-        current_amount = store['first_tx_completed']
-        tier = store['subscription_tier']
-        
-        if current_amount == -1 or not referrer_id:
-            return False
-            
-        # 첫 번째 픽업 예약(택배 접수) 시 누적 금액 무관하게 기사님께 리워드 즉시 지급
-        reward_amount = 30000 if tier == 'vip' else 15000
-        
-        c.execute('''
-            INSERT INTO rewards (driver_id, store_id, amount, status, created_at)
-            VALUES (%s, %s, %s, 'completed', CURRENT_TIMESTAMP AT TIME ZONE 'Asia/Seoul')
-        ''', (referrer_id, store_id, reward_amount))
-        
-        # 기사님(추천인) 지갑에 리워드 포인트 즉시 충전
-        c.execute("UPDATE stores SET points = COALESCE(points, 0) + %s WHERE store_id = %s", (reward_amount, referrer_id))
-        
-        # 사장님 상태 반영 (-1은 발송 및 리워드 지급 완료 상태)
-        c.execute("UPDATE stores SET first_tx_completed = -1 WHERE store_id = %s", (store_id,))
-        conn.commit()
-        
+        with _wallet_txn() as c:
+            # FOR UPDATE — 동시 호출 시 리워드 중복 지급 방지
+            c.execute("SELECT referrer_id, first_tx_completed, subscription_tier FROM stores WHERE store_id = %s FOR UPDATE", (store_id,))
+            store = c.fetchone()
+
+            if not store:
+                return False
+
+            referrer_id = store['referrer_id']
+            current_amount = store['first_tx_completed']
+            tier = store['subscription_tier']
+
+            if current_amount == -1 or not referrer_id:
+                return False
+
+            # 첫 번째 픽업 예약(택배 접수) 시 누적 금액 무관하게 기사님께 리워드 즉시 지급
+            reward_amount = 30000 if tier == 'vip' else 15000
+
+            c.execute('''
+                INSERT INTO rewards (driver_id, store_id, amount, status, created_at)
+                VALUES (%s, %s, %s, 'completed', CURRENT_TIMESTAMP AT TIME ZONE 'Asia/Seoul')
+            ''', (referrer_id, store_id, reward_amount))
+
+            # 기사님(추천인) 지갑에 리워드 포인트 즉시 충전 (원장 기록)
+            balance = _apply_balance(c, referrer_id, "points", reward_amount)
+            if balance is not None:
+                _append_journal(c, referrer_id, "points", "REWARD", reward_amount, balance, f"추천 리워드 ({store_id})")
+
+            # 사장님 상태 반영 (-1은 발송 및 리워드 지급 완료 상태)
+            c.execute("UPDATE stores SET first_tx_completed = -1 WHERE store_id = %s", (store_id,))
+
+        if balance is not None:
+            _cache_balance(referrer_id, "points", balance)
         return {"driver_id": referrer_id, "reward": reward_amount}
-            
+
     except Exception as e:
         print(f"Reward error: {e}")
         return False
-    finally:
-        conn.close()
 
 # --- SQLAlchemy Async Database Connection ---
 from typing import AsyncGenerator
@@ -3536,60 +3856,42 @@ def log_usage_cost(store_id, service_type, units_used, unit_price, calculated_co
     Log usage cost to usage_costs_log and wallet_transactions, and deduct points (PostgreSQL).
     All timestamps align to Asia/Seoul timezone.
     """
-    conn = get_connection()
-    if not conn:
-        return False, 0
-    c = conn.cursor()
     try:
-        # 1. Deduct points from store
-        c.execute("UPDATE stores SET points = points - %s WHERE store_id = %s", (calculated_cost, store_id))
-        
-        # 2. Get current balance
-        c.execute("SELECT points, phone, name FROM stores WHERE store_id = %s", (store_id,))
-        row = c.fetchone()
-        points_after = row['points'] if row and row['points'] is not None else 0
-        phone = row['phone'] if row and row['phone'] else store_id
-        name = row['name'] if row and row['name'] else "가맹점"
-        
-        # 3. Log to usage_costs_log
         from datetime import datetime, timedelta, timezone
         kst = timezone(timedelta(hours=9))
         now_kst_str = datetime.now(kst).strftime("%Y-%m-%d %H:%M:%S")
-        
         metadata_str = str(request_metadata) if request_metadata else None
-        
-        c.execute('''
-            INSERT INTO usage_costs_log (store_id, service_type, units_used, unit_price, calculated_cost, request_metadata, status, created_at)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s) RETURNING id
-        ''', (store_id, service_type, units_used, unit_price, calculated_cost, metadata_str, 'SUCCESS', now_kst_str))
-        
-        usage_log_id = c.fetchone()['id']
-        
-        # 4. Log to wallet_transactions
         memo = memo or f"{service_type} 사용 요금"
-        c.execute('''
-            INSERT INTO wallet_transactions (store_id, transaction_type, amount, balance_after, reference_table, reference_id, memo, created_at)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        ''', (store_id, 'USE', -calculated_cost, points_after, 'usage_costs_log', usage_log_id, memo, now_kst_str))
-        
+
+        with _wallet_txn() as c:
+            # 1. Deduct points from store (사용 후 과금 — 잔액이 모자라도 차감)
+            points_after = _apply_balance(c, store_id, "points", -calculated_cost, require_funds=False)
+
+            # 2. Log to usage_costs_log
+            c.execute('''
+                INSERT INTO usage_costs_log (store_id, service_type, units_used, unit_price, calculated_cost, request_metadata, status, created_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s) RETURNING id
+            ''', (store_id, service_type, units_used, unit_price, calculated_cost, metadata_str, 'SUCCESS', now_kst_str))
+            usage_log_id = c.fetchone()['id']
+
+            # 3. Log to wallet_transactions + 원장
+            c.execute('''
+                INSERT INTO wallet_transactions (store_id, transaction_type, amount, balance_after, reference_table, reference_id, memo, created_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            ''', (store_id, 'USE', -calculated_cost, points_after or 0, 'usage_costs_log', usage_log_id, memo, now_kst_str))
+            if points_after is not None:
+                _append_journal(c, store_id, "points", "USE", -calculated_cost, points_after, memo)
+
+        points_after = points_after or 0
+        _cache_balance(store_id, "points", points_after)
+
         # Threshold Alert check (1,000 points)
-        if points_after < 1000:
-            try:
-                print(f"[Threshold Alert] Store {store_id} points: {points_after}")
-                import sms_manager
-                clean_phone = phone.replace("-", "").replace(" ", "").strip()
-                msg = f"[동네비서] {name} 사장님, 현재 보유 토큰 잔액이 {points_after}개로 부족합니다. 원활한 서비스 이용을 위해 즉시 충전해주세요."
-                sms_manager.send_sms(clean_phone, msg, store_id=store_id)
-            except Exception as alert_err:
-                print(f"Failed to send threshold alert: {alert_err}")
-                
-        conn.commit()
+        if points_after < LOW_POINTS_ALERT:
+            _low_points_alert(store_id, points_after)
         return True, points_after
     except Exception as e:
         print(f"[!] log_usage_cost Error: {e}")
         return False, 0
-    finally:
-        conn.close()
 
 
 # ==========================================
@@ -1,6 +1,8 @@
 import sqlite3
 import threading
 import os
+import time
+from contextlib import contextmanager
 
 _sqlite_lock = threading.Lock()
 from datetime import datetime
@@ -279,6 +281,9 @@ def init_db():
     try:
         c.execute("ALTER TABLE delivery_orders ADD COLUMN payload TEXT")
     except: pass
+    try:
+        c.execute("ALTER TABLE delivery_orders ADD COLUMN waybill_job TEXT")
+    except: pass
     try:
         c.execute("ALTER TABLE stores ADD COLUMN fee_rate REAL DEFAULT 0.033")
     except: pass
@@ -375,6 +380,13 @@ def init_db():
         c.execute("ALTER TABLE stores ADD COLUMN auto_refill_amount INTEGER DEFAULT 50000")
     except: pass
 
+    # ★ 익일 영업 확인 (22:00 문의 / 점주 응답 / 23:59 기본 스케줄 전환) — 날짜(YYYY-MM-DD)로 1일 1회 보장
+    for col in ("closed_message TEXT DEFAULT ''", "schedule_asked_date TEXT", "schedule_confirmed_date TEXT",
+                "schedule_fallback_date TEXT"):
+        try:
+            c.execute(f"ALTER TABLE stores ADD COLUMN {col}")
+        except: pass
+
     # Product Inventory
     try:
         c.execute("ALTER TABLE products ADD COLUMN inventory INTEGER DEFAULT 100")
@@ -847,6 +859,39 @@ def init_db():
     for _c2, _d, _m, _r in _tpls:
         c.execute('INSERT OR IGNORE INTO callback_templates (category, display_name, message_template, redirect_path) VALUES (?,?,?,?)', (_c2, _d, _m, _r))
 
+    # ★ wallet_logs → 포인트·지갑 원장 저널 (append-only, tier = 'points' | 'wallet')
+    try:
+        c.execute("ALTER TABLE wallet_logs ADD COLUMN tier TEXT DEFAULT 'points'")
+        # 기존 기록 중 지갑 잔액(wallet_balance) 변동분: charge_wallet('charge'), 문자 과금('sms')
+        c.execute("UPDATE wallet_logs SET tier = 'wallet' WHERE change_type IN ('charge', 'sms')")
+    except Exception:
+        pass  # 이미 존재하면 무시
+    c.execute('CREATE INDEX IF NOT EXISTS idx_wallet_logs_store ON wallet_logs(store_id, id)')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_wallet_logs_no_update BEFORE UPDATE ON wallet_logs
+        BEGIN SELECT RAISE(ABORT, 'wallet_logs is append-only'); END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_wallet_logs_no_delete BEFORE DELETE ON wallet_logs
+        BEGIN SELECT RAISE(ABORT, 'wallet_logs is append-only'); END
+    ''')
+
+    # ★ wallet_snapshots — 마감된 월별 원장 스냅샷 (저널 id 범위 + 입출 합계 + 기말 잔액)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS wallet_snapshots (
+            store_id TEXT NOT NULL,
+            tier TEXT NOT NULL,
+            period TEXT NOT NULL,
+            first_id INTEGER NOT NULL,
+            last_id INTEGER NOT NULL,
+            entries INTEGER NOT NULL,
+            credits INTEGER NOT NULL,
+            debits INTEGER NOT NULL,
+            closing_balance INTEGER,
+            PRIMARY KEY (store_id, tier, period)
+        )
+    ''')
+
     conn.commit()
     conn.close()
 
@@ -1022,6 +1067,27 @@ def log_sms(store_id, phone, category, message, status, response=""):
     finally:
         conn.close()
 
+def log_sms_many(rows):
+    """
+    SMS 발송 이력 일괄 저장 (한 트랜잭션)
+    rows: [(store_id, phone, category, message, status, response), ...]
+    """
+    if not rows:
+        return 0
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    conn = get_connection()
+    c = conn.cursor()
+    try:
+        c.executemany("INSERT INTO sms_logs (store_id, phone, category, message, status, response, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                      [(*r[:5], str(r[5]), now) for r in rows])
+        conn.commit()
+        return len(rows)
+    except Exception as e:
+        print(f"Log Error: {e}")
+        return 0
+    finally:
+        conn.close()
+
 def get_sms_logs(store_id=None, limit=50):
     conn = get_connection()
     try:
@@ -1571,6 +1637,85 @@ def update_store_auto_reply(store_id, msg, missed, end, refill_on=0, refill_amou
         conn.close()
 
 
+def claim_schedule_reminders(day):
+    """
+    익일 영업 확인 문의 대상 선점 — 전화번호가 있고 day 에 아직 문의하지 않은 매장을
+    한 번의 UPDATE ... RETURNING 으로 표시 (재실행·리더 교체 시 중복 발송 없음).
+    반환: [{"store_id", "name", "phone"}]
+    """
+    conn = get_connection()
+    c = conn.cursor()
+    try:
+        c.execute('''
+            UPDATE stores SET schedule_asked_date = ?
+            WHERE COALESCE(phone, '') <> '' AND COALESCE(schedule_asked_date, '') <> ?
+            RETURNING store_id, name, phone
+        ''', (day, day))
+        rows = [dict(r) for r in c.fetchall()]
+        conn.commit()
+        return rows
+    finally:
+        conn.close()
+
+
+def release_schedule_reminders(store_ids, day):
+    """문의 발송에 실패한 매장의 day 선점 해제 (무응답 기본 스케줄 전환 대상에서 제외, 재실행 시 재발송)."""
+    if not store_ids:
+        return 0
+    conn = get_connection()
+    c = conn.cursor()
+    try:
+        released = 0
+        for i in range(0, len(store_ids), 500):
+            chunk = store_ids[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            c.execute(f"UPDATE stores SET schedule_asked_date = NULL WHERE schedule_asked_date = ? AND store_id IN ({placeholders})",
+                      (day, *chunk))
+            released += c.rowcount
+        conn.commit()
+        return released
+    finally:
+        conn.close()
+
+
+def claim_unanswered_schedules(day):
+    """
+    day 에 문의를 받고 응답하지 않은 매장을 기본 스케줄(정상 영업, closed_message 초기화)로 일괄 전환.
+    반환: 전환된 매장 [{"store_id", "name", "phone"}]
+    """
+    conn = get_connection()
+    c = conn.cursor()
+    try:
+        c.execute('''
+            UPDATE stores SET schedule_fallback_date = ?, closed_message = ''
+            WHERE schedule_asked_date = ?
+              AND COALESCE(schedule_confirmed_date, '') <> ?
+              AND COALESCE(schedule_fallback_date, '') <> ?
+            RETURNING store_id, name, phone
+        ''', (day, day, day, day))
+        rows = [dict(r) for r in c.fetchall()]
+        conn.commit()
+        return rows
+    finally:
+        conn.close()
+
+
+def confirm_store_schedule(store_id, closed_message, day):
+    """점주의 익일 스케줄 응답 저장 (day 응답 완료 표시 → 23:59 기본 스케줄 전환 대상에서 제외)."""
+    conn = get_connection()
+    c = conn.cursor()
+    try:
+        c.execute("UPDATE stores SET closed_message = ?, schedule_confirmed_date = ? WHERE store_id = ?",
+                  (closed_message, day, store_id))
+        conn.commit()
+        return c.rowcount > 0
+    except Exception as e:
+        print(f"Schedule Confirm Error: {e}")
+        return False
+    finally:
+        conn.close()
+
+
 def update_store_agreement(store_id, owner_name, marketing_agreed):
     """
     Update agreement status for a store (SQLite).
@@ -1787,21 +1932,128 @@ def get_all_stores():
         conn.close()
 
 # ==========================================
-# Wallet Logic
+# Wallet Logic — 포인트·지갑 원장
 # ==========================================
+# - 잔액: stores.points (포인트) / stores.wallet_balance (지갑). 변경은 모두 wallet_post() 경유
+#   UPDATE ... SET col = col + ? WHERE store_id = ? [AND col >= 차감액] RETURNING col
+#   → 조회 후 파이썬에서 계산해 다시 쓰던 경쟁(동시 차감 시 잔액 유실·음수) 제거
+# - 저널: wallet_logs (append-only, tier 컬럼) — 잔액 갱신과 같은 트랜잭션에서 기록
+# - 연결: 스레드별 연결 1개 재사용 (호출마다 connect/close 하지 않음)
+# - 잔액 캐시: 프로세스 내 WALLET_CACHE_TTL 초, 쓰기 시 즉시 갱신 (화면 표시용, 차감 판단에는 미사용)
+# - 기간 스냅샷: wallet_snapshots (매장·tier·월) → 월별 내역은 저널 id 범위로, 월 요약은 스냅샷 1행으로
+
+WALLET_TIERS = {"points": "points", "wallet": "wallet_balance"}
+WALLET_CACHE_TTL = float(os.getenv("WALLET_CACHE_TTL", "5"))
+LOW_POINTS_ALERT = 1000
+
+_wallet_local = threading.local()
+_balance_cache = {}     # (store_id, tier) → (잔액, 기록 시각)
+_balance_lock = threading.Lock()
+
+
+def _wallet_conn():
+    """원장 전용 스레드별 연결 (autocommit — 트랜잭션은 _wallet_txn 에서 명시)."""
+    conn = getattr(_wallet_local, "conn", None)
+    if conn is None or getattr(_wallet_local, "key", None) != (os.getpid(), DB_FILE):
+        conn = sqlite3.connect(DB_FILE, timeout=10, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        _wallet_local.conn, _wallet_local.key = conn, (os.getpid(), DB_FILE)
+    return conn
 
-def log_wallet(store_id, change_type, amount, balance_after, memo):
-    conn = get_connection()
-    c = conn.cursor()
+
+@contextmanager
+def _wallet_txn():
+    """BEGIN IMMEDIATE ~ COMMIT (예외 시 ROLLBACK). 커서를 넘겨줌."""
+    conn = _wallet_conn()
+    conn.execute("BEGIN IMMEDIATE")
     try:
-        c.execute('''
-            INSERT INTO wallet_logs (store_id, change_type, amount, balance_after, memo, created_at)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (store_id, change_type, amount, balance_after, memo, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
-        conn.commit()
-        return True
-    finally:
-        conn.close()
+        yield conn.cursor()
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _cache_balance(store_id, tier, balance):
+    with _balance_lock:
+        _balance_cache[(store_id, tier)] = (balance, time.monotonic())
+
+
+def _wallet_balance(store_id, tier):
+    """캐시 → stores 순으로 잔액 조회."""
+    entry = _balance_cache.get((store_id, tier))
+    if entry and time.monotonic() - entry[1] < WALLET_CACHE_TTL:
+        return entry[0]
+    col = WALLET_TIERS[tier]
+    row = _wallet_conn().execute(f"SELECT {col} AS balance FROM stores WHERE store_id = ?", (store_id,)).fetchone()
+    balance = int(row["balance"]) if row and row["balance"] is not None else 0
+    _cache_balance(store_id, tier, balance)
+    return balance
+
+
+def _apply_balance(c, store_id, tier, amount, require_funds=True):
+    """잔액 원자 갱신. 반환: 갱신 후 잔액 | None (매장 없음 또는 잔액 부족)"""
+    col = WALLET_TIERS[tier]
+    sql = f"UPDATE stores SET {col} = COALESCE({col}, 0) + ? WHERE store_id = ?"
+    params = [amount, store_id]
+    if amount < 0 and require_funds:
+        sql += f" AND COALESCE({col}, 0) >= ?"
+        params.append(-amount)
+    row = c.execute(sql + f" RETURNING {col} AS balance", params).fetchone()
+    return None if row is None else int(row["balance"])
+
+
+def _append_journal(c, store_id, tier, change_type, amount, balance_after, memo):
+    c.execute('''
+        INSERT INTO wallet_logs (store_id, tier, change_type, amount, balance_after, memo, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (store_id, tier, change_type, amount, balance_after, memo, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+
+
+def _low_points_alert(store_id, points):
+    """포인트 잔액 부족 알림 (트랜잭션 밖에서 호출)."""
+    try:
+        row = _wallet_conn().execute("SELECT phone, name FROM stores WHERE store_id = ?", (store_id,)).fetchone()
+        if row:
+            print(f"[Threshold Alert] Store {store_id} points: {points}")
+            import sms_manager
+            phone = row['phone'] or store_id
+            name = row['name'] or "가맹점"
+            clean_phone = phone.replace("-", "").replace(" ", "").strip()
+            msg = f"[동네비서] {name} 사장님, 현재 보유 토큰 잔액이 {points}개로 부족합니다. 원활한 서비스 이용을 위해 즉시 충전해주세요."
+            sms_manager.send_sms(clean_phone, msg, store_id=store_id)
+    except Exception as alert_err:
+        print(f"Failed to send threshold alert: {alert_err}")
+
+
+def wallet_post(store_id, amount, change_type, memo="", tier="points", require_funds=True, low_alert=False):
+    """
+    잔액 변경 + 저널 기록 (한 트랜잭션). amount 음수 = 차감.
+    require_funds=True 이면 잔액이 모자랄 때 아무것도 바꾸지 않음.
+    low_alert=True 이면 차감 후 포인트가 LOW_POINTS_ALERT 미만일 때 사장님께 잔액 부족 알림 (단체 문자·deduct_points 만 사용)
+    반환: 갱신 후 잔액 | None (잔액 부족 또는 매장 없음)
+    """
+    amount = int(amount)
+    with _wallet_txn() as c:
+        balance = _apply_balance(c, store_id, tier, amount, require_funds)
+        if balance is None:
+            return None
+        _append_journal(c, store_id, tier, change_type, amount, balance, memo)
+    _cache_balance(store_id, tier, balance)
+    if low_alert and tier == "points" and amount < 0 and balance < LOW_POINTS_ALERT:
+        _low_points_alert(store_id, balance)
+    return balance
+
+
+def get_points_balance(store_id):
+    return _wallet_balance(store_id, "points")
+
+
+def log_wallet(store_id, change_type, amount, balance_after, memo, tier="wallet"):
+    """저널만 기록 (잔액은 이미 반영된 경우). 잔액 변경은 wallet_post() 사용."""
+    with _wallet_txn() as c:
+        _append_journal(c, store_id, tier, change_type, amount, balance_after, memo)
+    return True
 
 def request_topup(store_id, amount, depositor):
     conn = get_connection()
@@ -1817,24 +2069,132 @@ def request_topup(store_id, amount, depositor):
         conn.close()
 
 
-def get_wallet_logs(store_id=None, limit=200):
-    conn = get_connection()
-    try:
+def _wallet_log_filter(store_id=None, before_id=None, period=None, tier=None):
+    """
+    저널 조회 조건. before_id = 이전 페이지 마지막 id (커서, 최신순).
+    period('YYYY-MM')에 스냅샷이 있으면 id 범위, 없으면(이번 달 등) created_at 접두어로 제한.
+    """
+    where, params = [], []
+    if store_id:
+        where.append("store_id = ?")
+        params.append(store_id)
+    if tier:
+        where.append("tier = ?")
+        params.append(tier)
+    if before_id:
+        where.append("id < ?")
+        params.append(int(before_id))
+    if period:
+        snap_sql = "SELECT MIN(first_id) AS lo, MAX(last_id) AS hi FROM wallet_snapshots WHERE period = ?"
+        snap_params = [period]
         if store_id:
-            return pd.read_sql(
-                "SELECT * FROM wallet_logs WHERE store_id = ? ORDER BY id DESC LIMIT ?",
-                conn,
-                params=(store_id, limit),
-            )
-        return pd.read_sql(
-            "SELECT * FROM wallet_logs ORDER BY id DESC LIMIT ?",
-            conn,
-            params=(limit,),
-        )
+            snap_sql += " AND store_id = ?"
+            snap_params.append(store_id)
+        bounds = _wallet_conn().execute(snap_sql, snap_params).fetchone()
+        if bounds and bounds["lo"] is not None:
+            where.append("id BETWEEN ? AND ?")
+            params += [bounds["lo"], bounds["hi"]]
+            if not store_id:
+                where.append("substr(created_at, 1, 7) = ?")
+                params.append(period)
+        else:
+            where.append("created_at LIKE ?")
+            params.append(f"{period}%")
+    return (" WHERE " + " AND ".join(where)) if where else "", params
+
+
+def get_wallet_logs(store_id=None, limit=200, before_id=None, period=None, tier=None):
+    """원장 내역 (최신순, 커서 페이지). 다음 페이지는 before_id = 마지막 행의 id."""
+    try:
+        where, params = _wallet_log_filter(store_id, before_id, period, tier)
+        return pd.read_sql(f"SELECT * FROM wallet_logs{where} ORDER BY id DESC LIMIT ?",
+                           _wallet_conn(), params=params + [int(limit)])
     except Exception:
         return pd.DataFrame()
-    finally:
-        conn.close()
+
+
+def refresh_wallet_snapshots():
+    """
+    마감된 월(이번 달 이전) 중 아직 스냅샷이 없는 (매장, tier, 월) 을 생성.
+    마지막 스냅샷 이후 저널만 집계하므로 매일 호출해도 비용이 작음. 반환: 생성 행 수
+    """
+    this_month = datetime.now().strftime("%Y-%m")
+    with _wallet_txn() as c:
+        watermark = c.execute("SELECT COALESCE(MAX(last_id), 0) AS w FROM wallet_snapshots").fetchone()["w"]
+        c.execute('''
+            INSERT OR IGNORE INTO wallet_snapshots
+                (store_id, tier, period, first_id, last_id, entries, credits, debits, closing_balance)
+            SELECT g.store_id, g.tier, g.period, g.first_id, g.last_id, g.entries, g.credits, g.debits,
+                   l.balance_after
+            FROM (
+                SELECT store_id, COALESCE(tier, 'points') AS tier, substr(created_at, 1, 7) AS period,
+                       MIN(id) AS first_id, MAX(id) AS last_id, COUNT(*) AS entries,
+                       SUM(CASE WHEN amount > 0 THEN amount ELSE 0 END) AS credits,
+                       SUM(CASE WHEN amount < 0 THEN -amount ELSE 0 END) AS debits
+                FROM wallet_logs
+                WHERE id > ? AND store_id IS NOT NULL AND substr(created_at, 1, 7) < ?
+                GROUP BY store_id, COALESCE(tier, 'points'), substr(created_at, 1, 7)
+            ) g
+            JOIN wallet_logs l ON l.id = g.last_id
+        ''', (watermark, this_month))
+        return c.rowcount
+
+
+def get_wallet_period_summary(store_id, period=None):
+    """
+    tier 별 월 요약 {tier: {entries, credits, debits, closing_balance}}.
+    마감된 월은 스냅샷 1행, 그 외(이번 달)는 마지막 스냅샷 이후 저널만 집계.
+    """
+    period = period or datetime.now().strftime("%Y-%m")
+    conn = _wallet_conn()
+    rows = conn.execute('''
+        SELECT tier, entries, credits, debits, closing_balance FROM wallet_snapshots
+        WHERE store_id = ? AND period = ?
+    ''', (store_id, period)).fetchall()
+    if rows:
+        return {r["tier"]: {k: r[k] for k in ("entries", "credits", "debits", "closing_balance")} for r in rows}
+    after = conn.execute("SELECT COALESCE(MAX(last_id), 0) AS w FROM wallet_snapshots WHERE store_id = ?",
+                         (store_id,)).fetchone()["w"]
+    rows = conn.execute('''
+        SELECT COALESCE(tier, 'points') AS tier, COUNT(*) AS entries,
+               SUM(CASE WHEN amount > 0 THEN amount ELSE 0 END) AS credits,
+               SUM(CASE WHEN amount < 0 THEN -amount ELSE 0 END) AS debits,
+               MAX(id) AS last_id
+        FROM wallet_logs
+        WHERE store_id = ? AND id > ? AND created_at LIKE ?
+        GROUP BY COALESCE(tier, 'points')
+    ''', (store_id, after, f"{period}%")).fetchall()
+    summary = {}
+    for r in rows:
+        closing = conn.execute("SELECT balance_after FROM wallet_logs WHERE id = ?", (r["last_id"],)).fetchone()
+        summary[r["tier"]] = {"entries": r["entries"], "credits": r["credits"], "debits": r["debits"],
+                              "closing_balance": closing["balance_after"] if closing else None}
+    return summary
+
+
+def auto_refill_wallets(default_target=10000, memo="자동 충전"):
+    """
+    자동 충전: auto_refill_on=1 이고 지갑 잔액이 목표액(auto_refill_amount, 0 이하면 default_target)
+    미만인 매장을 목표액까지 일괄 충전. 대상 선정·원장 기록·잔액 갱신이 한 트랜잭션 (매장 수와 무관하게 쿼리 2회).
+    반환: [{"store_id", "amount", "balance"}]
+    """
+    target = "(CASE WHEN auto_refill_amount > 0 THEN auto_refill_amount ELSE ? END)"
+    eligible = f"auto_refill_on = 1 AND COALESCE(wallet_balance, 0) < {target}"
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with _wallet_txn() as c:
+        rows = c.execute(f'''
+            INSERT INTO wallet_logs (store_id, tier, change_type, amount, balance_after, memo, created_at)
+            SELECT store_id, 'wallet', 'auto_refill', {target} - COALESCE(wallet_balance, 0), {target}, ?, ?
+            FROM stores WHERE {eligible}
+            RETURNING store_id, amount, balance_after AS balance
+        ''', (default_target, default_target, memo, now, default_target)).fetchall()
+        if rows:
+            c.execute(f"UPDATE stores SET wallet_balance = {target} WHERE {eligible}", (default_target, default_target))
+    refilled = [dict(r) for r in rows]
+    for r in refilled:
+        _cache_balance(r["store_id"], "wallet", r["balance"])
+    return refilled
+
 
 def get_pending_topups():
     conn = get_connection()
@@ -2136,6 +2496,89 @@ def save_delivery_order(data):
     finally:
         conn.close()
 
+def save_delivery_batch(deliveries, orders):
+    """
+    대량 접수용 일괄 저장 — 연결 1개 / 트랜잭션 1개 / executemany.
+    deliveries: save_delivery 와 같은 dict 목록, orders: save_delivery_order 와 같은 dict 목록 (단일 수령인)
+    실패 시 청크 전체 롤백. 반환: (성공 여부, 저장 건수 또는 오류)
+    """
+    conn = get_connection()
+    try:
+        c = conn.cursor()
+        try:
+            c.execute("ALTER TABLE deliveries ADD COLUMN payment_type TEXT DEFAULT 'prepaid'")
+        except:
+            pass
+        now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        c.executemany('''
+            INSERT INTO deliveries (store_id, sender_name, sender_phone, sender_addr,
+                                    receiver_name, receiver_phone, receiver_addr,
+                                    item_name, weight, fare, status, tracking_number, created_at, payment_type)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [(
+            d.get('store_id'), d.get('sender_name'), d.get('sender_phone'), d.get('sender_addr'),
+            d.get('receiver_name'), d.get('receiver_phone'), d.get('receiver_addr'),
+            d.get('item_name') or d.get('item_type'), d.get('weight', 1),
+            d.get('fare') or d.get('fee', 3000), d.get('status', '접수완료'),
+            d.get('tracking_code'), now_str, d.get('payment_type', 'prepaid')
+        ) for d in deliveries])
+
+        # delivery_users: 같은 발송인이 여러 행이면 마지막 행 기준으로 갱신
+        latest = {o.get('sender_phone'): o for o in orders}
+        phones = list(latest)
+        user_ids = {}
+        for i in range(0, len(phones), 500):
+            part = phones[i:i + 500]
+            c.execute(f"SELECT user_id, phone_number FROM delivery_users WHERE phone_number IN ({','.join('?' * len(part))})", part)
+            user_ids.update({row['phone_number']: row['user_id'] for row in c.fetchall()})
+        user_rows = [(o.get('sender_name'), o.get('sender_postcode') or "", o.get('sender_base_address') or "",
+                      o.get('sender_detail_address') or "", now_str, p) for p, o in latest.items()]
+        c.executemany('''
+            UPDATE delivery_users
+            SET recent_sender_name = ?, recent_zip_code = ?, recent_road_address = ?, recent_detailed_address = ?, updated_at = ?
+            WHERE phone_number = ?
+        ''', [r for r in user_rows if r[-1] in user_ids])
+        new_users = [r for r in user_rows if r[-1] not in user_ids]
+        if new_users:
+            c.executemany('''
+                INSERT INTO delivery_users (recent_sender_name, recent_zip_code, recent_road_address, recent_detailed_address, updated_at, phone_number)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', new_users)
+            new_phones = [r[-1] for r in new_users]
+            for i in range(0, len(new_phones), 500):
+                part = new_phones[i:i + 500]
+                c.execute(f"SELECT user_id, phone_number FROM delivery_users WHERE phone_number IN ({','.join('?' * len(part))})", part)
+                user_ids.update({row['phone_number']: row['user_id'] for row in c.fetchall()})
+
+        c.executemany('''
+            INSERT INTO delivery_orders (order_id, user_id, sender_name, sender_phone, pickup_zip_code, pickup_road_address, pickup_detailed_address, order_status, created_at, payload)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [(
+            o.get('order_id'), user_ids.get(o.get('sender_phone')), o.get('sender_name'), o.get('sender_phone'),
+            o.get('sender_postcode') or "", o.get('sender_base_address') or "", o.get('sender_detail_address') or "",
+            o.get('order_status') or o.get('status') or 'REQUESTED', now_str, o.get('payload')
+        ) for o in orders])
+        c.executemany('''
+            INSERT INTO order_recipients (order_id, receiver_name, receiver_phone, delivery_zip_code, delivery_road_address, delivery_detailed_address)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', [(
+            o.get('order_id'), o.get('receiver_name'), o.get('receiver_phone'),
+            o.get('postcode') or "", o.get('address') or "", o.get('detail_address') or ""
+        ) for o in orders])
+
+        conn.commit()
+        return True, len(orders)
+    except Exception as e:
+        print(f"Delivery Batch Save Error: {e}")
+        try:
+            conn.rollback()
+        except:
+            pass
+        return False, str(e)
+    finally:
+        conn.close()
+
 def get_delivery_order(order_id):
     conn = get_connection()
     try:
@@ -2149,6 +2592,37 @@ def get_delivery_order(order_id):
     finally:
         conn.close()
 
+def save_waybill_job(order_id, job_json):
+    """송장 발급 워커 투입 내역 저장 (재시작 후 REQUESTED 주문 재투입용)."""
+    conn = get_connection()
+    c = conn.cursor()
+    try:
+        c.execute("UPDATE delivery_orders SET waybill_job = ? WHERE order_id = ?", (job_json, order_id))
+        conn.commit()
+        return c.rowcount > 0
+    except Exception as e:
+        print(f"Error saving waybill job: {e}")
+        return False
+    finally:
+        conn.close()
+
+def get_requested_waybill_jobs(limit=200):
+    """투입 내역이 있는데 아직 REQUESTED 인 주문 [{"order_id", "waybill_job"}] (오래된 순)."""
+    conn = get_connection()
+    c = conn.cursor()
+    try:
+        c.execute('''
+            SELECT order_id, waybill_job FROM delivery_orders
+            WHERE order_status = 'REQUESTED' AND waybill_job IS NOT NULL
+            ORDER BY created_at LIMIT ?
+        ''', (limit,))
+        return [dict(row) for row in c.fetchall()]
+    except Exception as e:
+        print(f"Error fetching requested waybill jobs: {e}")
+        return []
+    finally:
+        conn.close()
+
 def acquire_delivery_order_lock(order_id):
     conn = get_connection()
     try:
@@ -2257,28 +2731,26 @@ def update_delivery_status(delivery_id, store_id, status):
 # ==========================================
 
 def get_wallet_balance(store_id):
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("SELECT wallet_balance FROM stores WHERE store_id = ?", (store_id,))
-    row = c.fetchone()
-    conn.close()
-    if row and row["wallet_balance"] is not None:
-        return int(row["wallet_balance"])
-    return 0
-
-
-def update_wallet_balance(store_id, new_balance):
-    conn = get_connection()
-    c = conn.cursor()
-    try:
-        c.execute("UPDATE stores SET wallet_balance = ? WHERE store_id = ?", (int(new_balance), store_id))
-        conn.commit()
+    return _wallet_balance(store_id, "wallet")
+
+
+def update_wallet_balance(store_id, new_balance, memo="잔액 조정"):
+    """지갑 잔액을 지정 값으로 맞춤 — 차액을 'adjust' 로 저널에 기록."""
+    try:
+        with _wallet_txn() as c:
+            row = c.execute("SELECT COALESCE(wallet_balance, 0) AS balance FROM stores WHERE store_id = ?",
+                            (store_id,)).fetchone()
+            if row is None:
+                return False
+            delta = int(new_balance) - int(row["balance"])
+            if delta:
+                balance = _apply_balance(c, store_id, "wallet", delta, require_funds=False)
+                _append_journal(c, store_id, "wallet", "adjust", delta, balance, memo)
+        _cache_balance(store_id, "wallet", int(new_balance))
         return True
     except Exception as exc:
         print(f"Wallet Update Error: {exc}")
         return False
-    finally:
-        conn.close()
 
 
 def get_store_id_by_virtual_number(virtual_number):
@@ -2925,28 +3397,11 @@ def get_today_stats(store_id):
 
 
 def charge_wallet(store_id, amount, bonus, memo):
-    conn = get_connection()
-    c = conn.cursor()
     try:
-        c.execute("SELECT wallet_balance FROM stores WHERE store_id = ?", (store_id,))
-        row = c.fetchone()
-        current = row['wallet_balance'] if row and row['wallet_balance'] else 0
-
-        new_balance = current + amount + bonus
-
-        c.execute("UPDATE stores SET wallet_balance = ? WHERE store_id = ?", (new_balance, store_id))
-        c.execute('''
-            INSERT INTO wallet_logs (store_id, change_type, amount, balance_after, memo, created_at)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (store_id, 'charge', amount + bonus, new_balance, memo, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
-
-        conn.commit()
-        return new_balance
+        return wallet_post(store_id, amount + bonus, 'charge', memo, tier="wallet")
     except Exception as e:
         print(f"Charge Wallet Error: {e}")
         return None
-    finally:
-        conn.close()
 
 
 def decrease_product_inventory(product_id, quantity):
@@ -3164,11 +3619,7 @@ def log_ai_usage(store_id, input_tokens, output_tokens):
     """
     Log AI usage and deduct points.
     """
-    conn = get_connection()
-    c = conn.cursor()
     try:
-        pass # Transaction start implicitly
-        
         total_tokens = input_tokens + output_tokens
         
         # Cost calculation (Simple model: 1 token = 1 point? Or 1000 tokens = 100 points?)
@@ -3180,28 +3631,26 @@ def log_ai_usage(store_id, input_tokens, output_tokens):
         
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
-        # 1. Log Usage
-        c.execute('''
-            INSERT INTO ai_usage_logs (store_id, tokens_input, tokens_output, cost, timestamp)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (store_id, input_tokens, output_tokens, cost, timestamp))
-        
-        # 2. Update Store (Deduct Points, Increment Usage)
-        c.execute('''
-            UPDATE stores 
-            SET points = points - ?, 
-                current_usage = current_usage + ?
-            WHERE store_id = ?
-        ''', (cost, total_tokens, store_id))
-        
-        conn.commit()
+        with _wallet_txn() as c:
+            # 1. Log Usage
+            c.execute('''
+                INSERT INTO ai_usage_logs (store_id, tokens_input, tokens_output, cost, timestamp)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (store_id, input_tokens, output_tokens, cost, timestamp))
+
+            # 2. Update Store (Increment Usage, Deduct Points — 사용 후 과금이므로 잔액 검사 없음)
+            c.execute("UPDATE stores SET current_usage = current_usage + ? WHERE store_id = ?", (total_tokens, store_id))
+            balance = _apply_balance(c, store_id, "points", -cost, require_funds=False)
+            if balance is not None:
+                _append_journal(c, store_id, "points", "AI", -cost, balance, f"AI 상담 ({total_tokens} tokens)")
+
+        if balance is not None:
+            _cache_balance(store_id, "points", balance)
         return True, cost
         
     except Exception as e:
         print(f"Logging Error: {e}")
         return False, 0
-    finally:
-        conn.close()
 
 
 
@@ -3270,26 +3719,6 @@ def save_cached_response(store_id, question, answer):
 # 💰 Wallet & Usage (SQLite Stub)
 # ==========================================
 
-def get_wallet_details(store_id):
-    """
-    Get wallet balance and recent logs for a store.
-    """
-    store = get_store(store_id)
-    if not store:
-        return {
-            "current_points": 0,
-            "wallet_logs": [],
-            "ai_usage_today": {"tokens": 0, "cost": 0},
-            "sms_usage_today": {"count": 0, "cost": 0}
-        }
-        
-    return {
-        "current_points": store.get('points', 0),
-        "wallet_logs": [], # SQLite version doesn't track detailed logs yet
-        "ai_usage_today": {"tokens": 0, "cost": 0},
-        "sms_usage_today": {"count": 0, "cost": 0}
-    }
-
 def get_daily_usage_stats(store_id):
     return {
         "ai": {"tokens": 0, "cost": 0},
@@ -3303,22 +3732,10 @@ def confirm_payment(store_id, amount, order_id, payment_key):
     Simulate payment confirmation for SQLite (Local Dev).
     """
     try:
-        conn = get_connection()
-        c = conn.cursor()
-        
-        # 1. Update Points
-        c.execute("UPDATE stores SET points = COALESCE(points, 0) + ? WHERE store_id = ?", (amount, store_id))
-        
-        # 2. Log
-        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        c.execute('''
-            INSERT INTO wallet_logs (store_id, change_type, amount, balance_after, memo, created_at)
-            VALUES (?, ?, ?, (SELECT points FROM stores WHERE store_id = ?), ?, ?)
-        ''', (store_id, 'CHARGE', amount, store_id, '포인트 충전', now))
-        
+        balance = wallet_post(store_id, amount, 'CHARGE', '포인트 충전')
+        if balance is None:
+            return False
         print(f"[SQLite] Payment Confirmed: Store {store_id} +{amount}P")
-        
-        conn.commit()
         return True
     except Exception as e:
         print(f"[!] SQLite Payment Error: {e}")
@@ -3368,117 +3785,35 @@ def deduct_points_for_sms(store_id, total_cost, customer_count):
     """
     Atomic Point Deduction for Batch SMS (SQLite).
     """
-    conn = get_connection()
     try:
-        c = conn.cursor()
-        
-        # 1. Check Balance
-        c.execute("SELECT points FROM stores WHERE store_id = ?", (store_id,))
-        row = c.fetchone()
-        current_points = row['points'] if row and row['points'] else 0
-        
-        if current_points < total_cost:
-            return False, "잔액이 부족합니다.", None
-        
-        # 2. Deduct
-        new_balance = current_points - total_cost
-        c.execute("UPDATE stores SET points = ? WHERE store_id = ?", (new_balance, store_id))
-        
-        # 3. Log
-        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         memo = f"단체 문자 발송 ({customer_count}명)"
-        
-        c.execute('''
-            INSERT INTO wallet_logs (store_id, change_type, amount, balance_after, memo, created_at)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (store_id, 'USE', -total_cost, new_balance, memo, now))
-        
-        # Threshold Alert Check
-        try:
-            if new_balance < 1000:
-                c.execute("SELECT phone, name FROM stores WHERE store_id = ?", (store_id,))
-                row = c.fetchone()
-                if row:
-                    print(f"[Threshold Alert] Store {store_id} points: {new_balance}")
-                    import sms_manager
-                    phone = row['phone'] or store_id
-                    name = row['name'] or "가맹점"
-                    clean_phone = phone.replace("-", "").replace(" ", "").strip()
-                    msg = f"[동네비서] {name} 사장님, 현재 보유 토큰 잔액이 {new_balance}개로 부족합니다. 원활한 서비스 이용을 위해 즉시 충전해주세요."
-                    sms_manager.send_sms(clean_phone, msg, store_id=store_id)
-        except Exception as alert_err:
-            print(f"Failed to send threshold alert: {alert_err}")
-
-        conn.commit()
+        if wallet_post(store_id, -total_cost, 'USE', memo, low_alert=True) is None:
+            return False, "잔액이 부족합니다.", None
         return True, "성공", "TX_" + datetime.now().strftime("%Y%m%d%H%M%S")
-        
     except Exception as e:
         print(f"[!] Point Deduction Error: {e}")
         return False, f"시스템 오류: {e}", None
-    finally:
-        conn.close()
 
 def refund_points(store_id, amount, reason):
     """
     Refund points (e.g., for failed SMS).
     """
-    conn = get_connection()
     try:
         if amount <= 0: return True
-        c = conn.cursor()
-        
-        # 1. Refund
-        c.execute("UPDATE stores SET points = points + ? WHERE store_id = ?", (amount, store_id))
-        
-        # 2. Log
-        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        c.execute('''
-            INSERT INTO wallet_logs (store_id, change_type, amount, balance_after, memo, created_at)
-            VALUES (?, ?, ?, (SELECT points FROM stores WHERE store_id = ?), ?, ?)
-        ''', (store_id, 'REFUND', amount, store_id, reason, now))
-        
-        conn.commit()
-        return True
+        return wallet_post(store_id, amount, 'REFUND', reason) is not None
     except Exception as e:
         print(f"[!] Refund Error: {e}")
         return False
-    finally:
-        conn.close()
 
 def deduct_fixed_cost(store_id, amount, reason):
     """
     Deduct fixed amount (SQLite).
     """
-    conn = get_connection()
     try:
-        c = conn.cursor()
-        
-        # 1. Check Balance
-        c.execute("SELECT points FROM stores WHERE store_id = ?", (store_id,))
-        row = c.fetchone()
-        current = row['points'] if row and row['points'] else 0
-        
-        if current < amount:
-            return False
-        
-        # 2. Deduct
-        c.execute("UPDATE stores SET points = points - ? WHERE store_id = ?", (amount, store_id))
-        
-        # 3. Log
-        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        c.execute('''
-            INSERT INTO wallet_logs (store_id, change_type, amount, balance_after, memo, created_at)
-            VALUES (?, ?, ?, (SELECT points FROM stores WHERE store_id = ?), ?, ?)
-        ''', (store_id, 'USE', -amount, store_id, reason, now))
-        
-        conn.commit()
-        return True
+        return wallet_post(store_id, -amount, 'USE', reason) is not None
     except Exception as e:
         print(f"[!] Deduct Error: {e}")
         return False
-    finally:
-        conn.close()
 
 def get_daily_usage_stats(store_id):
     """
@@ -3489,40 +3824,41 @@ def get_daily_usage_stats(store_id):
         "sms": {"count": 0, "cost": 0}
     }
 
-def get_wallet_details(store_id):
+def get_wallet_details(store_id, limit=20, before_id=None, period=None):
     """
     Get wallet balance and logs (SQLite).
+    before_id: 이전 페이지 마지막 id (커서) / period: 'YYYY-MM' 월 필터
     """
     details = {
         "current_points": 0,
+        "wallet_balance": 0,
         "wallet_logs": [],
+        "next_cursor": None,
+        "period_summary": {},
         "ai_usage_today": {"tokens": 0, "cost": 0},
         "sms_usage_today": {"count": 0, "cost": 0}
     }
-    conn = get_connection()
     try:
-        c = conn.cursor()
-        
-        # 1. Current Points
-        c.execute("SELECT points FROM stores WHERE store_id = ?", (store_id,))
-        row = c.fetchone()
-        details["current_points"] = row['points'] if row and row['points'] else 0
-        
-        # 2. Recent Wallet Logs
-        c.execute('''
-            SELECT change_type as type, amount, created_at, memo 
-            FROM wallet_logs 
-            WHERE store_id = ? 
-            ORDER BY id DESC LIMIT 20
-        ''', (store_id,))
-        rows = c.fetchall()
+        # 1. Current Balances (캐시)
+        details["current_points"] = _wallet_balance(store_id, "points")
+        details["wallet_balance"] = _wallet_balance(store_id, "wallet")
+
+        # 2. Wallet Logs (커서 페이지)
+        where, params = _wallet_log_filter(store_id, before_id, period)
+        rows = _wallet_conn().execute(f'''
+            SELECT id, tier, change_type as type, amount, balance_after, created_at, memo
+            FROM wallet_logs{where}
+            ORDER BY id DESC LIMIT ?
+        ''', params + [int(limit)]).fetchall()
         details["wallet_logs"] = [dict(row) for row in rows]
-        
+        if len(rows) == int(limit):
+            details["next_cursor"] = rows[-1]["id"]
+
+        # 3. Period Summary (스냅샷)
+        details["period_summary"] = get_wallet_period_summary(store_id, period)
     except Exception as e:
         print(f"Wallet Details Error: {e}")
-    finally:
-        conn.close()
-        
+
     # Get Usage Stats
     usage = get_daily_usage_stats(store_id)
     details["ai_usage_today"] = usage.get("ai")
@@ -3764,39 +4100,13 @@ def get_courier_requests(citizen_id=None):
 
 def deduct_points(store_id, amount):
     """
-    Deduct Points from Store
+    Deduct Points from Store (잔액이 부족하면 차감하지 않고 False)
     """
-    conn = get_connection()
-    c = conn.cursor()
     try:
-        # Check current points first to avoid negative? 
-        # For now, let's just subtract. verification happened in app.
-        c.execute("UPDATE stores SET points = points - ? WHERE store_id = ?", (amount, store_id))
-        
-        # Threshold Alert Check
-        try:
-            c.execute("SELECT points, phone, name FROM stores WHERE store_id = ?", (store_id,))
-            row = c.fetchone()
-            if row:
-                pts = row['points'] if row['points'] is not None else 0
-                if pts < 1000:
-                    print(f"[Threshold Alert] Store {store_id} points: {pts}")
-                    import sms_manager
-                    phone = row['phone'] or store_id
-                    name = row['name'] or "가맹점"
-                    clean_phone = phone.replace("-", "").replace(" ", "").strip()
-                    msg = f"[동네비서] {name} 사장님, 현재 보유 토큰 잔액이 {pts}개로 부족합니다. 원활한 서비스 이용을 위해 즉시 충전해주세요."
-                    sms_manager.send_sms(clean_phone, msg, store_id=store_id)
-        except Exception as alert_err:
-            print(f"Failed to send threshold alert: {alert_err}")
-
-        conn.commit()
-        return True
+        return wallet_post(store_id, -amount, 'USE', '포인트 차감', low_alert=True) is not None
     except Exception as e:
         print(f"[!] SQLite deduct_points Error: {e}")
         return False
-    finally:
-        conn.close()
 
 def update_courier_payment_success(tracking_code, method):
     """
@@ -3820,44 +4130,44 @@ def check_and_complete_referral_reward(store_id, fee_amount):
     고객의 누적결제액이 일정 조건(예: 10,000원 이상)을 돌파하면 기사님께 리워드 지급
     first_tx_completed 컬럼을 누적 결제액 척도 및 지급 완료 플래그(-1)로 사용
     """
-    conn = get_connection()
-    c = conn.cursor()
     try:
-        c.execute("SELECT referrer_id, first_tx_completed, subscription_tier FROM stores WHERE store_id = ?", (store_id,))
-        store = c.fetchone()
-        
-        if not store:
-            return False
-            
-        referrer_id = store['referrer_id']
-        current_amount = store['first_tx_completed']
-        tier = store['subscription_tier']
-        
-        if current_amount == -1 or not referrer_id:
-            return False
-            
-        # 첫 번째 픽업 예약(택배 접수) 시 누적 금액 무관하게 기사님께 리워드 즉시 지급
-        reward_amount = 30000 if tier == 'vip' else 15000
-        
-        c.execute('''
-            INSERT INTO rewards (driver_id, store_id, amount, status, created_at)
-            VALUES (?, ?, ?, 'completed', datetime('now', 'localtime'))
-        ''', (referrer_id, store_id, reward_amount))
-        
-        # 기사님(추천인) 지갑에 리워드 포인트 즉시 충전
-        c.execute("UPDATE stores SET points = COALESCE(points, 0) + ? WHERE store_id = ?", (reward_amount, referrer_id))
-        
-        # 사장님 상태 반영 (-1은 발송 및 리워드 지급 완료 상태)
-        c.execute("UPDATE stores SET first_tx_completed = -1 WHERE store_id = ?", (store_id,))
-        conn.commit()
-        
+        with _wallet_txn() as c:
+            c.execute("SELECT referrer_id, first_tx_completed, subscription_tier FROM stores WHERE store_id = ?", (store_id,))
+            store = c.fetchone()
+
+            if not store:
+                return False
+
+            referrer_id = store['referrer_id']
+            current_amount = store['first_tx_completed']
+            tier = store['subscription_tier']
+
+            if current_amount == -1 or not referrer_id:
+                return False
+
+            # 첫 번째 픽업 예약(택배 접수) 시 누적 금액 무관하게 기사님께 리워드 즉시 지급
+            reward_amount = 30000 if tier == 'vip' else 15000
+
+            c.execute('''
+                INSERT INTO rewards (driver_id, store_id, amount, status, created_at)
+                VALUES (?, ?, ?, 'completed', datetime('now', 'localtime'))
+            ''', (referrer_id, store_id, reward_amount))
+
+            # 기사님(추천인) 지갑에 리워드 포인트 즉시 충전 (원장 기록)
+            balance = _apply_balance(c, referrer_id, "points", reward_amount)
+            if balance is not None:
+                _append_journal(c, referrer_id, "points", "REWARD", reward_amount, balance, f"추천 리워드 ({store_id})")
+
+            # 사장님 상태 반영 (-1은 발송 및 리워드 지급 완료 상태)
+            c.execute("UPDATE stores SET first_tx_completed = -1 WHERE store_id = ?", (store_id,))
+
+        if balance is not None:
+            _cache_balance(referrer_id, "points", balance)
         return {"driver_id": referrer_id, "reward": reward_amount}
-            
+
     except Exception as e:
         print(f"Reward error: {e}")
         return False
-    finally:
-        conn.close()
 
 def get_crm_customers_by_tag(store_id, tag):
     """
@@ -3879,58 +4189,42 @@ def log_usage_cost(store_id, service_type, units_used, unit_price, calculated_co
     Log usage cost to usage_costs_log and wallet_transactions, and deduct points.
     All timestamps align to Asia/Seoul timezone.
     """
-    conn = get_connection()
-    c = conn.cursor()
     try:
-        # 1. Deduct points from store
-        c.execute("UPDATE stores SET points = points - ? WHERE store_id = ?", (calculated_cost, store_id))
-        
-        # 2. Get current balance
-        c.execute("SELECT points, phone, name FROM stores WHERE store_id = ?", (store_id,))
-        row = c.fetchone()
-        points_after = row['points'] if row and row['points'] is not None else 0
-        
-        # 3. Log to usage_costs_log
         from datetime import datetime, timedelta, timezone
         kst = timezone(timedelta(hours=9))
         now_kst_str = datetime.now(kst).strftime("%Y-%m-%d %H:%M:%S")
-        
         metadata_str = str(request_metadata) if request_metadata else None
-        
-        c.execute('''
-            INSERT INTO usage_costs_log (store_id, service_type, units_used, unit_price, calculated_cost, request_metadata, status, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (store_id, service_type, units_used, unit_price, calculated_cost, metadata_str, 'SUCCESS', now_kst_str))
-        
-        usage_log_id = c.lastrowid
-        
-        # 4. Log to wallet_transactions
         memo = memo or f"{service_type} 사용 요금"
-        c.execute('''
-            INSERT INTO wallet_transactions (store_id, transaction_type, amount, balance_after, reference_table, reference_id, memo, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (store_id, 'USE', -calculated_cost, points_after, 'usage_costs_log', usage_log_id, memo, now_kst_str))
-        
+
+        with _wallet_txn() as c:
+            # 1. Deduct points from store (사용 후 과금 — 잔액이 모자라도 차감)
+            points_after = _apply_balance(c, store_id, "points", -calculated_cost, require_funds=False)
+
+            # 2. Log to usage_costs_log
+            c.execute('''
+                INSERT INTO usage_costs_log (store_id, service_type, units_used, unit_price, calculated_cost, request_metadata, status, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (store_id, service_type, units_used, unit_price, calculated_cost, metadata_str, 'SUCCESS', now_kst_str))
+            usage_log_id = c.lastrowid
+
+            # 3. Log to wallet_transactions + 원장
+            c.execute('''
+                INSERT INTO wallet_transactions (store_id, transaction_type, amount, balance_after, reference_table, reference_id, memo, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (store_id, 'USE', -calculated_cost, points_after or 0, 'usage_costs_log', usage_log_id, memo, now_kst_str))
+            if points_after is not None:
+                _append_journal(c, store_id, "points", "USE", -calculated_cost, points_after, memo)
+
+        points_after = points_after or 0
+        _cache_balance(store_id, "points", points_after)
+
         # Threshold Alert check (1,000 points)
-        if points_after < 1000:
-            try:
-                print(f"[Threshold Alert] Store {store_id} points: {points_after}")
-                import sms_manager
-                phone = row['phone'] or store_id
-                name = row['name'] or "가맹점"
-                clean_phone = phone.replace("-", "").replace(" ", "").strip()
-                msg = f"[동네비서] {name} 사장님, 현재 보유 토큰 잔액이 {points_after}개로 부족합니다. 원활한 서비스 이용을 위해 즉시 충전해주세요."
-                sms_manager.send_sms(clean_phone, msg, store_id=store_id)
-            except Exception as alert_err:
-                print(f"Failed to send threshold alert: {alert_err}")
-                
-        conn.commit()
+        if points_after < LOW_POINTS_ALERT:
+            _low_points_alert(store_id, points_after)
         return True, points_after
     except Exception as e:
         print(f"[!] log_usage_cost Error: {e}")
         return False, 0
-    finally:
-        conn.close()
 
 
 
@@ -11,10 +11,10 @@ import logging
 import os
 from typing import Optional
 
-import google.generativeai as genai
 from pydantic import BaseModel, Field
 
 from dongnebiseo_app.config.settings import get_settings
+from services.llm_gateway import llm_gateway
 
 logger = logging.getLogger(__name__)
 
@@ -65,34 +65,13 @@ _CUSTOMER_TOOLS = [_get_current_time]
 
 
 class AIService:
-    """Google Gemini API client service."""
+    """Google Gemini service — all calls go through the shared services.llm_gateway."""
 
     def __init__(self):
         self._cfg = get_settings()
-        self._api_key = self._cfg.app.gemini_api_key
-        self._initialized = False
-        self._init_client()
-
-    def _init_client(self) -> None:
-        if not self._api_key:
-            logger.warning("[AI] GOOGLE_API_KEY not set — AI service disabled")
-            return
-        try:
-            genai.configure(api_key=self._api_key)
-            self._initialized = True
-            logger.info("[AI] Gemini client initialized")
-        except Exception as e:
-            logger.error("[AI] Gemini init failed: %s", e)
-
-    def _get_model(self, model_name: str, tool_set: str = "customer"):
+        self._initialized = llm_gateway.client() is not None
         if not self._initialized:
-            return None
-        try:
-            tools = _ADMIN_TOOLS if tool_set == "admin" else _CUSTOMER_TOOLS
-            return genai.GenerativeModel(model_name, tools=tools)
-        except Exception as e:
-            logger.error("[AI] Model creation failed: %s", e)
-            return None
+            logger.warning("[AI] GOOGLE_API_KEY not set — AI service disabled")
 
     def _route_model(self, query: str) -> str:
         cfg = self._cfg.app
@@ -110,17 +89,13 @@ class AIService:
         if not self._initialized:
             return ""
         try:
-            model = genai.GenerativeModel(self._cfg.app.gemini_model_flash)
-            gen_cfg = genai.types.GenerationConfig(
-                max_output_tokens=self._cfg.app.ai_max_output_tokens,
-                temperature=self._cfg.app.ai_temperature,
-            )
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None,
-                lambda: model.generate_content(grounded_prompt, generation_config=gen_cfg),
+            result = await llm_gateway.generate(
+                grounded_prompt,
+                model=self._cfg.app.gemini_model_flash,
+                config={"max_output_tokens": self._cfg.app.ai_max_output_tokens,
+                        "temperature": self._cfg.app.ai_temperature},
             )
-            return response.text.strip() if response.text else ""
+            return result["text"]
         except Exception as e:
             logger.error("[AI] generate_grounded error: %s", e)
             return ""
@@ -129,35 +104,23 @@ class AIService:
         """Legacy ai_manager.get_ai_response() compatible."""
         cfg = self._cfg.app
         model_name = self._route_model(user_input)
-        model = self._get_model(model_name, tool_set=tool_set)
-        if not model:
+        if not self._initialized:
             return {
                 "text": "죄송합니다. 현재 AI 시스템이 오프라인 상태입니다. 잠시 후 다시 시도해 주세요.",
                 "usage": {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0},
             }
         sp = system_prompt or "당신은 동네비서 AI 상담원입니다."
-        full_prompt = f"{sp}\n\n사용자: {user_input}"
         try:
-            gen_cfg = genai.types.GenerationConfig(
-                max_output_tokens=cfg.ai_max_output_tokens,
-                temperature=cfg.ai_temperature,
+            # callable tools → google-genai automatic function calling
+            result = llm_gateway.generate_sync(
+                user_input,
+                model=model_name,
+                system=sp,
+                config={"tools": _ADMIN_TOOLS if tool_set == "admin" else _CUSTOMER_TOOLS,
+                        "max_output_tokens": cfg.ai_max_output_tokens,
+                        "temperature": cfg.ai_temperature},
             )
-            chat = model.start_chat(enable_automatic_function_calling=True)
-            response = chat.send_message(full_prompt, generation_config=gen_cfg)
-            text = response.text.strip()
-            try:
-                usage = {
-                    "input_tokens": response.usage_metadata.prompt_token_count,
-                    "output_tokens": response.usage_metadata.candidates_token_count,
-                    "total_tokens": response.usage_metadata.total_token_count,
-                }
-            except Exception:
-                usage = {
-                    "input_tokens": len(full_prompt) // 4,
-                    "output_tokens": len(text) // 4,
-                    "total_tokens": (len(full_prompt) + len(text)) // 4,
-                }
-            return {"text": text, "usage": usage}
+            return {"text": result["text"], "usage": result["usage"]}
         except Exception as e:
             logger.error("[AI] get_ai_response error: %s", e)
             return {
@@ -169,10 +132,8 @@ class AIService:
         if not self._initialized:
             return "기타 일반사업자"
         try:
-            model = genai.GenerativeModel(self._cfg.app.gemini_model_flash)
             prompt = f"상호명 '{store_name}'을 분석하여 '식당', '편의점', '택배/물류', '카페', '미용실', '기타' 중 하나로만 대답해줘."
-            response = model.generate_content(prompt)
-            return response.text.strip()
+            return llm_gateway.generate_sync(prompt, model=self._cfg.app.gemini_model_flash)["text"]
         except Exception:
             return "기타 일반사업자"
 
@@ -189,17 +150,14 @@ class AIService:
         try:
             if not self._initialized:
                 raise RuntimeError("AI not initialized")
-            model = genai.GenerativeModel(self._cfg.app.gemini_model_pro)
-            gen_cfg = genai.types.GenerationConfig(
-                temperature=0.1,
-                response_mime_type="application/json",
-                response_schema=CallSummarySchema,
-            )
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None, lambda: model.generate_content(prompt, generation_config=gen_cfg),
+            result = await llm_gateway.generate(
+                prompt,
+                model=self._cfg.app.gemini_model_pro,
+                config={"temperature": 0.1, "response_mime_type": "application/json",
+                        "response_schema": CallSummarySchema},
+                store_id=store_id,
             )
-            return json.loads(response.text)
+            return json.loads(result["text"])
         except Exception as e:
             logger.error("[AI] summarize_call_text error: store=%s err=%s", store_id, e)
             return {"name": "이름 미상", "event_details": None}
@@ -234,13 +192,12 @@ class AIService:
         if not self._initialized:
             return fallback
         try:
-            model = genai.GenerativeModel(self._cfg.app.gemini_model_flash)
-            gen_cfg = genai.types.GenerationConfig(temperature=0.7, max_output_tokens=150)
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None, lambda: model.generate_content(prompt, generation_config=gen_cfg),
+            result = await llm_gateway.generate(
+                prompt,
+                model=self._cfg.app.gemini_model_flash,
+                config={"temperature": 0.7, "max_output_tokens": 150},
             )
-            return response.text.strip()
+            return result["text"]
         except Exception as e:
             logger.error("[AI] draft_courier_greeting error: %s", e)
             return fallback
@@ -28,6 +28,10 @@ class WorkerConfig(BaseSettings):
     output_dir: str = "/var/www/dnbsir/static/output"
     max_video_duration_sec: int = 60
     default_fps: int = 8
+
+    # 스테이지 캐시 — pipeline/stage_cache.get_stage_cache (MEDIA_WORKER_CACHE_DIR / MEDIA_WORKER_CACHE_MAX_GB)
+    cache_dir: str = ""          # 비우면 {output_dir}/_stage_cache
+    cache_max_gb: float = 20.0
     
     class Config:
         env_file = ".env"
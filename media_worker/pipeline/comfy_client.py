@@ -0,0 +1,223 @@
+"""
+ComfyUI 클라이언트 — 웹소켓 이벤트 기반 완료 추적 + 파이프라인 제출
+
+기존 방식: POST /prompt → time.sleep(2) + GET /history/{id} 반복 → POST /free → sleep(3~5)
+변경 방식:
+  1. 완료 추적  — ws://{host}/ws?clientId=... 의 executing(node=None)/execution_success/
+                 execution_error 이벤트로 즉시 깨어남 (폴링 지연 0)
+  2. 파이프라인 — 최대 depth 개를 미리 큐에 넣어 GPU 큐가 비지 않게 유지
+  3. 모델 재사용 — 연속 작업의 체크포인트가 같으면 /free 생략 (로드된 모델 그대로 사용)
+                 체크포인트가 바뀔 때만 큐를 비운 뒤 1회 /free
+
+websocket-client 미설치 시 /history 짧은 간격 폴링으로 자동 대체.
+"""
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+FALLBACK_POLL_SEC = 0.5
+
+
+def workflow_checkpoint(workflow: dict):
+    """워크플로우가 로드하는 체크포인트 이름 (없으면 None)."""
+    for node in workflow.values():
+        if "CheckpointLoader" in node.get("class_type", ""):
+            return node.get("inputs", {}).get("ckpt_name")
+    return None
+
+
+class ComfyJobError(RuntimeError):
+    """ComfyUI 실행 오류 (execution_error / 타임아웃)."""
+
+
+class ComfyClient:
+    def __init__(self, server: str = "http://127.0.0.1:8188", timeout: float = 900):
+        self.server = server.rstrip("/")
+        self.timeout = timeout
+        self.client_id = uuid.uuid4().hex
+        self._events: dict = {}      # prompt_id → threading.Event
+        self._results: dict = {}     # prompt_id → {"ok": bool, "error": str|None}
+        self._progress: dict = {}    # prompt_id → (value, max)
+        self._lock = threading.Lock()
+        self._ws = None
+        self._ws_thread = None
+        self._last_ckpt = None
+        self._connect_ws()
+
+    # ── 웹소켓 ─────────────────────────────────────────────────
+    def _connect_ws(self):
+        try:
+            import websocket  # websocket-client
+        except ImportError:
+            print(" -> websocket-client 미설치: /history 폴링 모드")
+            return
+        ws_url = self.server.replace("http://", "ws://").replace("https://", "wss://")
+        try:
+            self._ws = websocket.create_connection(f"{ws_url}/ws?clientId={self.client_id}", timeout=10)
+            self._ws.settimeout(None)
+        except Exception as e:
+            print(f" -> ComfyUI 웹소켓 연결 실패, 폴링 모드: {e}")
+            self._ws = None
+            return
+        self._ws_thread = threading.Thread(target=self._ws_loop, daemon=True)
+        self._ws_thread.start()
+
+    def _ws_loop(self):
+        while self._ws is not None:
+            try:
+                msg = self._ws.recv()
+            except Exception:
+                break
+            if not isinstance(msg, str):
+                continue   # 미리보기 바이너리 프레임
+            try:
+                evt = json.loads(msg)
+            except ValueError:
+                continue
+            data = evt.get("data", {})
+            pid = data.get("prompt_id")
+            etype = evt.get("type")
+            if etype == "progress" and pid:
+                self._progress[pid] = (data.get("value"), data.get("max"))
+            elif etype == "executing" and pid and data.get("node") is None:
+                self._finish(pid, True)
+            elif etype == "execution_success" and pid:
+                self._finish(pid, True)
+            elif etype in ("execution_error", "execution_interrupted") and pid:
+                self._finish(pid, False, data.get("exception_message") or etype)
+        # 연결이 끊기면 대기 중인 작업은 폴링으로 마무리
+        self._ws = None
+
+    def _finish(self, pid, ok, error=None):
+        with self._lock:
+            if pid not in self._results:
+                self._results[pid] = {"ok": ok, "error": error}
+            evt = self._events.setdefault(pid, threading.Event())
+        evt.set()
+
+    # ── HTTP ───────────────────────────────────────────────────
+    def _post(self, path, payload, timeout=10):
+        data = json.dumps(payload).encode("utf-8")
+        req = urllib.request.Request(f"{self.server}{path}", data=data,
+                                     headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            body = resp.read()
+            return json.loads(body) if body else {}
+
+    def history(self, prompt_id):
+        try:
+            with urllib.request.urlopen(f"{self.server}/history/{prompt_id}", timeout=10) as resp:
+                return json.loads(resp.read()).get(prompt_id)
+        except urllib.error.URLError:
+            return None
+
+    def submit(self, workflow: dict) -> str:
+        """워크플로우 큐 등록 → prompt_id. 제출 시점에 직렬화되므로 호출 후 workflow 수정 가능."""
+        resp = self._post("/prompt", {"prompt": workflow, "client_id": self.client_id})
+        pid = resp["prompt_id"]
+        with self._lock:
+            self._events.setdefault(pid, threading.Event())
+        return pid
+
+    def free(self):
+        """VRAM 해제 — 체크포인트가 바뀔 때만 호출."""
+        try:
+            self._post("/free", {"unload_models": True, "free_memory": True})
+        except Exception:
+            pass
+
+    # ── 대기 ───────────────────────────────────────────────────
+    def wait(self, prompt_id: str, timeout: float = None) -> dict:
+        """완료까지 대기 후 history 엔트리 반환. 실패 시 ComfyJobError."""
+        timeout = timeout or self.timeout
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            evt = self._events.setdefault(prompt_id, threading.Event())
+        while not evt.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise ComfyJobError(f"timeout after {timeout}s: {prompt_id}")
+            if self._ws is not None:
+                evt.wait(min(remaining, 5))
+                continue
+            # 폴링 모드 (웹소켓 없음/끊김)
+            hist = self.history(prompt_id)
+            if hist and hist.get("status", {}).get("completed", True):
+                status = hist.get("status", {})
+                self._finish(prompt_id, status.get("status_str", "success") != "error")
+                break
+            evt.wait(min(remaining, FALLBACK_POLL_SEC))
+
+        with self._lock:
+            result = self._results.pop(prompt_id, {"ok": True})
+            self._events.pop(prompt_id, None)
+            self._progress.pop(prompt_id, None)
+        if not result["ok"]:
+            raise ComfyJobError(result.get("error") or "execution_error")
+        return self.history(prompt_id) or {}
+
+    def run(self, workflow: dict) -> dict:
+        """단건 제출 + 대기."""
+        self.prepare_model(workflow)
+        return self.wait(self.submit(workflow))
+
+    def prepare_model(self, workflow: dict, drain=None):
+        """체크포인트가 바뀌면 (진행 중 작업을 비운 뒤) /free. 같으면 로드된 모델 재사용."""
+        ckpt = workflow_checkpoint(workflow)
+        if self._last_ckpt is not None and ckpt != self._last_ckpt:
+            if drain:
+                drain()
+            self.free()
+        self._last_ckpt = ckpt
+
+    # ── 파이프라인 ─────────────────────────────────────────────
+    def run_pipeline(self, jobs, depth: int = 2):
+        """
+        jobs: (workflow, on_done) 이터러블. on_done(history) 는 완료 순서대로 호출.
+        최대 depth 개를 미리 제출해 GPU 큐를 항상 채워둠. 실패한 작업은 on_done 대신 건너뜀.
+        반환: (성공 수, 실패 수)
+        """
+        inflight = []   # [(prompt_id, on_done)]
+        ok = failed = 0
+
+        def _collect_one():
+            nonlocal ok, failed
+            pid, on_done = inflight.pop(0)
+            try:
+                hist = self.wait(pid)
+            except ComfyJobError as e:
+                print(f" -> ComfyUI job failed: {e}")
+                failed += 1
+                return
+            ok += 1
+            if on_done:
+                on_done(hist)
+
+        def _drain():
+            while inflight:
+                _collect_one()
+
+        for workflow, on_done in jobs:
+            self.prepare_model(workflow, drain=_drain)
+            try:
+                pid = self.submit(workflow)
+            except Exception as e:
+                print(f" -> ComfyUI submit failed: {e}")
+                failed += 1
+                continue
+            inflight.append((pid, on_done))
+            if len(inflight) >= depth:
+                _collect_one()
+        _drain()
+        return ok, failed
+
+    def close(self):
+        ws, self._ws = self._ws, None
+        if ws is not None:
+            try:
+                ws.close()
+            except Exception:
+                pass
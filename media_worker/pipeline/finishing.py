@@ -0,0 +1,149 @@
+"""
+FFmpeg 피니싱 스테이지 — 클립 도착 즉시 병렬 정규화 + 최종 스트림 복사 병합
+
+기존 방식: 모든 SVD 클립 렌더 종료 → concat_list 작성 → ffmpeg -c copy 1회
+          (코덱/프레임레이트/타임스탬프가 다른 클립이 섞이면 병합 결과가 깨짐)
+변경 방식:
+  1. add(index, path)  — 클립이 도착하는 즉시 제한된 워커 풀에서 정규화 인코딩 시작
+                         (해상도·fps·yuv420p·타임스탬프 0 기준 → MPEG-TS 세그먼트)
+  2. GPU가 다음 클립을 렌더하는 동안 CPU/NVENC가 앞 클립을 정규화 (겹쳐서 진행)
+  3. finalize()        — 세그먼트가 모두 같은 규격이므로 concat demuxer + -c copy 만 수행
+
+인코더는 하드웨어 인식: h264_nvenc → h264_qsv → h264_amf → h264_videotoolbox → libx264
+(목록에 있어도 실제 1프레임 인코딩 테스트를 통과해야 채택)
+"""
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+HW_ENCODERS = ("h264_nvenc", "h264_qsv", "h264_amf", "h264_videotoolbox")
+
+_encoder_lock = threading.Lock()
+_encoder = None
+
+
+def detect_encoder(ffmpeg="ffmpeg") -> str:
+    """사용 가능한 H.264 인코더 (프로세스당 1회 탐지 후 캐시)."""
+    global _encoder
+    with _encoder_lock:
+        if _encoder:
+            return _encoder
+        _encoder = "libx264"
+        try:
+            listing = subprocess.run([ffmpeg, "-hide_banner", "-encoders"],
+                                     capture_output=True, text=True, timeout=10).stdout
+        except Exception:
+            return _encoder
+        for enc in HW_ENCODERS:
+            if enc not in listing:
+                continue
+            probe = subprocess.run(
+                [ffmpeg, "-hide_banner", "-loglevel", "error", "-f", "lavfi",
+                 "-i", "color=c=black:s=256x256:d=0.1", "-frames:v", "1",
+                 "-c:v", enc, "-f", "null", "-"],
+                capture_output=True, timeout=20)
+            if probe.returncode == 0:
+                _encoder = enc
+                break
+        return _encoder
+
+
+def default_workers(encoder: str) -> int:
+    """하드웨어 인코더는 세션 수 제한(소비자용 NVENC 3~5)이 있어 3개, CPU 인코딩은 코어 절반."""
+    if encoder != "libx264":
+        return 3
+    return max(1, (os.cpu_count() or 2) // 2)
+
+
+def encoder_args(encoder: str) -> list:
+    if encoder == "h264_nvenc":
+        return ["-c:v", encoder, "-preset", "p4", "-cq", "21"]
+    if encoder == "h264_qsv":
+        return ["-c:v", encoder, "-global_quality", "21"]
+    if encoder == "libx264":
+        return ["-c:v", encoder, "-preset", "veryfast", "-crf", "19"]
+    return ["-c:v", encoder, "-b:v", "8M"]
+
+
+class IncrementalConcat:
+    """
+    클립 도착 순서와 무관하게 index 순서대로 병합.
+        cat = IncrementalConcat(out_path, width=1024, height=576, fps=8)
+        cat.add(0, "clip0.mp4"); cat.add(1, "clip1.mp4") ...
+        cat.finalize()  → out_path
+    """
+
+    def __init__(self, output_path, width=1024, height=576, fps=8,
+                 ffmpeg="ffmpeg", max_workers=None, work_dir=None):
+        self.output_path = output_path
+        self.width, self.height, self.fps = width, height, fps
+        self.ffmpeg = ffmpeg
+        self.encoder = detect_encoder(ffmpeg)
+        self.work_dir = work_dir or tempfile.mkdtemp(prefix="finish_")
+        self._pool = ThreadPoolExecutor(max_workers=max_workers or default_workers(self.encoder),
+                                        thread_name_prefix="ffmpeg-finish")
+        self._futures = {}   # index → Future[segment path | None]
+
+    def _normalize_cmd(self, src, dst, encoder):
+        w, h = self.width, self.height
+        vf = (f"scale={w}:{h}:force_original_aspect_ratio=decrease,"
+              f"pad={w}:{h}:(ow-iw)/2:(oh-ih)/2,fps={self.fps},format=yuv420p,setpts=PTS-STARTPTS")
+        return ([self.ffmpeg, "-y", "-hide_banner", "-loglevel", "error", "-i", src,
+                 "-map", "0:v:0", "-vf", vf]
+                + encoder_args(encoder)
+                + ["-bsf:v", "h264_mp4toannexb", "-muxdelay", "0", "-f", "mpegts", dst])
+
+    def _normalize(self, index, src):
+        dst = os.path.join(self.work_dir, f"seg_{index:05d}.ts")
+        proc = subprocess.run(self._normalize_cmd(src, dst, self.encoder), capture_output=True)
+        if proc.returncode != 0 and self.encoder != "libx264":
+            # 하드웨어 세션 고갈 등 → 이 세그먼트만 CPU 인코딩으로 재시도
+            proc = subprocess.run(self._normalize_cmd(src, dst, "libx264"), capture_output=True)
+        if proc.returncode != 0:
+            print(f" -> normalize failed [{index}] {os.path.basename(src)}: "
+                  f"{proc.stderr.decode(errors='replace')[-200:]}")
+            return None
+        return dst
+
+    def add(self, index: int, clip_path: str):
+        """클립 도착 즉시 정규화 작업 제출 (비차단)."""
+        self._futures[index] = self._pool.submit(self._normalize, index, clip_path)
+
+    def pending(self) -> int:
+        return sum(1 for f in self._futures.values() if not f.done())
+
+    def cancel(self):
+        """병합 없이 종료 (예: 최종본 캐시 적중)."""
+        for f in self._futures.values():
+            f.cancel()
+        self._pool.shutdown(wait=True)
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def finalize(self, cleanup=True):
+        """남은 정규화 완료 대기 → index 순으로 스트림 복사 병합. 성공 시 출력 경로, 실패 시 None."""
+        segments = []
+        for index in sorted(self._futures):
+            seg = self._futures[index].result()
+            if seg:
+                segments.append(seg)
+        self._pool.shutdown(wait=True)
+        if not segments:
+            return None
+
+        list_path = os.path.join(self.work_dir, "segments.txt")
+        with open(list_path, "w", encoding="utf-8") as f:
+            for seg in segments:
+                f.write(f"file '{seg}'\n")
+        cmd = [self.ffmpeg, "-y", "-hide_banner", "-loglevel", "error",
+               "-f", "concat", "-safe", "0", "-i", list_path,
+               "-c", "copy", "-movflags", "+faststart", self.output_path]
+        proc = subprocess.run(cmd, capture_output=True)
+        if cleanup:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+        if proc.returncode != 0:
+            print(f" -> concat failed: {proc.stderr.decode(errors='replace')[-200:]}")
+            return None
+        return self.output_path
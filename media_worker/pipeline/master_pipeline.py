@@ -1,13 +1,19 @@
 import os
 import json
-import urllib.request
-import urllib.error
-import time
 import shutil
 import glob
 import subprocess
 from datetime import datetime
 
+try:
+    from media_worker.pipeline.stage_cache import get_stage_cache, make_key
+    from media_worker.pipeline.comfy_client import ComfyClient
+    from media_worker.pipeline.finishing import IncrementalConcat
+except ImportError:
+    from stage_cache import get_stage_cache, make_key
+    from comfy_client import ComfyClient
+    from finishing import IncrementalConcat
+
 # 설정
 COMFYUI_SERVER = "http://127.0.0.1:8188"
 BATCH_INPUT_DIR = r"C:\Users\A\Desktop\SVD_Input"
@@ -18,6 +24,8 @@ SVD_WORKFLOW_PATH = r"C:\Users\A\Desktop\AI_Store\core_engine\svd_highres_workfl
 T2I_WORKFLOW_PATH = r"C:\Users\A\Desktop\AI_Store\core_engine\sd15_t2i_workflow.json"
 TARGET_TOTAL_IMAGES = 150
 
+_comfy = None   # ComfyClient (웹소켓 완료 추적, 첫 사용 시 연결)
+
 # 환경변수 파일 파싱 (단순 야매 파싱)
 def get_api_key(env_path=r"C:\Users\A\Desktop\AI_Store\env_vars.yaml"):
     try:
@@ -33,33 +41,14 @@ def load_workflow(path):
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
-def send_prompt(prompt):
-    data = json.dumps({"prompt": prompt}).encode('utf-8')
-    req = urllib.request.Request(f"{COMFYUI_SERVER}/prompt", data=data, headers={'Content-Type': 'application/json'})
-    try:
-        with urllib.request.urlopen(req) as response:
-            return json.loads(response.read())
-    except urllib.error.URLError as e:
-        print(f"Error connecting to ComfyUI: {e}")
-        return None
-
-def get_history(prompt_id):
-    try:
-        with urllib.request.urlopen(f"{COMFYUI_SERVER}/history/{prompt_id}") as response:
-            return json.loads(response.read())
-    except urllib.error.URLError:
-        return None
-
-def free_memory():
-    data = json.dumps({"unload_models": True, "free_memory": True}).encode('utf-8')
-    req = urllib.request.Request(f"{COMFYUI_SERVER}/free", data=data, headers={'Content-Type': 'application/json'})
-    try:
-        urllib.request.urlopen(req)
-        print(" -> Garbage Collection completed.")
-    except Exception:
-        print(" -> Auto GC triggered.")
-
 def generate_prompts(text, mood, count):
+    cache = get_stage_cache()
+    cache_key = make_key("prompts", {"text": text, "mood": mood, "count": count, "model": "gemini-1.5-flash"})
+    hit = cache.get("prompts", cache_key)
+    if hit:
+        print("Prompt cache hit — skipping Gemini call.")
+        return hit[1]["prompts"]
+
     api_key = get_api_key()
     if not api_key:
         print("GOOGLE_API_KEY not found in env_vars.yaml. Cannot generate prompts.")
@@ -89,96 +78,159 @@ def generate_prompts(text, mood, count):
             
         prompts = json.loads(raw_text)
         if isinstance(prompts, list):
-            return prompts[:count]
+            prompts = prompts[:count]
+            cache.put("prompts", cache_key, meta={"prompts": prompts})
+            return prompts
         return []
     except Exception as e:
         print(f"Failed to generate prompts via Gemini: {e}")
         return []
 
+def _workflow_params(workflow, *volatile):
+    """캐시 키용 워크플로우 사본 — 파일명처럼 매 실행마다 바뀌는 입력은 제외."""
+    params = json.loads(json.dumps(workflow))
+    for node_id, field in volatile:
+        params.get(node_id, {}).get("inputs", {}).pop(field, None)
+    return params
+
+def _comfy_client():
+    global _comfy
+    if _comfy is None:
+        _comfy = ComfyClient(COMFYUI_SERVER)
+    return _comfy
+
 def run_t2i_generation(prompts):
     workflow = load_workflow(T2I_WORKFLOW_PATH)
+    cache = get_stage_cache()
     print(f"Generating {len(prompts)} missing images using SD1.5...")
-    
-    for i, p_text in enumerate(prompts, 1):
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        prefix = f"ai_gen_{timestamp}_{i}"
-        
-        workflow["6"]["inputs"]["text"] = p_text
-        workflow["9"]["inputs"]["filename_prefix"] = prefix
-        
-        print(f"[T2I {i}/{len(prompts)}] Generating image for prompt: {p_text[:30]}...")
-        resp = send_prompt(workflow)
-        if not resp:
-            continue
-            
-        pid = resp["prompt_id"]
-        while True:
-            time.sleep(2)
-            hist = get_history(pid)
-            if hist and pid in hist:
-                # ComfyUI outputs to its output dir. Move to SVD_Input
-                comfy_out = os.path.join(COMFYUI_OUTPUT_DIR, prefix + "_00001.png")
-                if os.path.exists(comfy_out):
-                    shutil.move(comfy_out, os.path.join(BATCH_INPUT_DIR, f"{prefix}.png"))
-                break
-        free_memory()
-        time.sleep(3)
-
-def run_svd_rendering():
+
+    def _jobs():
+        for i, p_text in enumerate(prompts, 1):
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            prefix = f"ai_gen_{timestamp}_{i}"
+
+            workflow["6"]["inputs"]["text"] = p_text
+            workflow["9"]["inputs"]["filename_prefix"] = prefix
+
+            cache_key = make_key("t2i", _workflow_params(workflow, ("9", "filename_prefix")))
+            if cache.get_file("t2i", cache_key, "image.png", os.path.join(BATCH_INPUT_DIR, f"{prefix}.png")):
+                print(f"[T2I {i}/{len(prompts)}] cache hit: {p_text[:30]}")
+                continue
+
+            print(f"[T2I {i}/{len(prompts)}] Queued image for prompt: {p_text[:30]}...")
+            yield workflow, _t2i_done(prefix, cache_key)
+
+    # 같은 체크포인트 연속 작업 — /free 없이 모델 재사용, 2건씩 선제출
+    _comfy_client().run_pipeline(_jobs(), depth=2)
+
+def _t2i_done(prefix, cache_key):
+    def _on_done(_history):
+        # ComfyUI outputs to its output dir. Move to SVD_Input
+        comfy_out = os.path.join(COMFYUI_OUTPUT_DIR, prefix + "_00001.png")
+        if os.path.exists(comfy_out):
+            final_png = os.path.join(BATCH_INPUT_DIR, f"{prefix}.png")
+            shutil.move(comfy_out, final_png)
+            _store_single("t2i", cache_key, final_png, "image.png")
+    return _on_done
+
+def run_svd_rendering(finisher=None):
+    """SVD 렌더링. finisher 가 있으면 클립 도착 즉시 정규화 시작. 이번 실행의 클립 경로(순서대로) 반환."""
     valid_exts = ('.png', '.jpg', '.jpeg', '.webp')
     images = [f for f in os.listdir(BATCH_INPUT_DIR) if f.lower().endswith(valid_exts)]
     workflow = load_workflow(SVD_WORKFLOW_PATH)
+    cache = get_stage_cache()
     total = len(images)
     print(f"Starting SVD Video Rendering for {total} images...")
-    
-    for i, img_filename in enumerate(images, 1):
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        safe_name = f"batch_{timestamp}_{img_filename}"
-        
-        src_path = os.path.join(BATCH_INPUT_DIR, img_filename)
-        dest_path = os.path.join(COMFYUI_INPUT_DIR, safe_name)
-        shutil.copy2(src_path, dest_path)
-        
-        workflow["2"]["inputs"]["image"] = safe_name
-        out_prefix = f"svd_hq_{timestamp}_{os.path.splitext(img_filename)[0]}"
-        workflow["10"]["inputs"]["filename_prefix"] = out_prefix
-        
-        print(f"[SVD {i}/{total}] Processing: {img_filename} ...", end="", flush=True)
-        response = send_prompt(workflow)
-        if not response:
-            print(" FAILED")
-            continue
-            
-        pid = response["prompt_id"]
-        while True:
-            time.sleep(2)
-            history = get_history(pid)
-            if history and pid in history:
-                print(f" DONE!")
-                comfy_out_path = os.path.join(COMFYUI_OUTPUT_DIR, out_prefix + ".mp4")
-                if os.path.exists(comfy_out_path):
-                    final_path = os.path.join(DESKTOP_OUTPUT_DIR, out_prefix + ".mp4")
-                    shutil.move(comfy_out_path, final_path)
-                break
-        
-        if i < total:
-            free_memory()
-            time.sleep(5)
+    clips = {}
+
+    def _jobs():
+        for i, img_filename in enumerate(images, 1):
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            safe_name = f"batch_{timestamp}_{img_filename}"
+
+            src_path = os.path.join(BATCH_INPUT_DIR, img_filename)
+            out_prefix = f"svd_hq_{timestamp}_{os.path.splitext(img_filename)[0]}"
+            final_path = os.path.join(DESKTOP_OUTPUT_DIR, out_prefix + ".mp4")
+            clips[i] = final_path
+            cache_key = make_key(
+                "svd", _workflow_params(workflow, ("2", "image"), ("10", "filename_prefix")), [src_path])
+            if cache.get_file("svd", cache_key, "clip.mp4", final_path):
+                print(f"[SVD {i}/{total}] cache hit: {img_filename}")
+                if finisher:
+                    finisher.add(i, final_path)
+                continue
+
+            dest_path = os.path.join(COMFYUI_INPUT_DIR, safe_name)
+            shutil.copy2(src_path, dest_path)
+
+            workflow["2"]["inputs"]["image"] = safe_name
+            workflow["10"]["inputs"]["filename_prefix"] = out_prefix
+
+            print(f"[SVD {i}/{total}] Queued: {img_filename}")
+            yield workflow, _svd_done(i, img_filename, out_prefix, cache_key, finisher)
+
+    ok, failed = _comfy_client().run_pipeline(_jobs(), depth=2)
+    print(f"SVD rendering finished: {ok} done, {failed} failed")
+    return [clips[i] for i in sorted(clips) if os.path.exists(clips[i])]
+
+def _svd_done(index, img_filename, out_prefix, cache_key, finisher):
+    def _on_done(_history):
+        print(f"[SVD] DONE: {img_filename}")
+        comfy_out_path = os.path.join(COMFYUI_OUTPUT_DIR, out_prefix + ".mp4")
+        if os.path.exists(comfy_out_path):
+            final_path = os.path.join(DESKTOP_OUTPUT_DIR, out_prefix + ".mp4")
+            shutil.move(comfy_out_path, final_path)
+            _store_single("svd", cache_key, final_path, "clip.mp4")
+            if finisher:
+                # GPU가 다음 클립을 렌더하는 동안 이 클립 정규화
+                finisher.add(index, final_path)
+    return _on_done
 
-def concatenate_videos():
+def _store_single(stage, cache_key, path, name):
+    """단일 산출 파일을 스테이지 캐시에 저장 (실패해도 파이프라인은 계속)."""
+    try:
+        get_stage_cache().put(stage, cache_key, files={name: path})
+    except Exception as e:
+        print(f" -> cache store skipped ({stage}): {e}")
+
+def concatenate_videos(finisher=None, clips=None):
+    """
+    clips + finisher 가 주어지면 이미 정규화된 세그먼트를 스트림 복사로 병합.
+    없으면 (단독 실행) SVD_Output 의 모든 mp4를 기존 방식으로 병합.
+    """
     print("Concatenating all videos in SVD_Output into one 10-minute clip...")
-    videos = glob.glob(os.path.join(DESKTOP_OUTPUT_DIR, "*.mp4"))
-    if not videos:
+    if clips is None:
+        clips = sorted(v for v in glob.glob(os.path.join(DESKTOP_OUTPUT_DIR, "*.mp4"))
+                       if "final_documentary" not in v)
+    if not clips:
         print("No videos found to concatenate.")
+        if finisher:
+            finisher.cancel()
         return
-        
+
+    cache = get_stage_cache()
+    cache_key = make_key("mux", {"clips": len(clips), "normalized": finisher is not None}, clips)
+    final_output = finisher.output_path if finisher else os.path.join(
+        DESKTOP_OUTPUT_DIR, f"final_documentary_{datetime.now().strftime('%Y%m%d_%H%M')}.mp4")
+    if cache.get_file("mux", cache_key, "final.mp4", final_output):
+        print(f"Mux cache hit — reused: {final_output}")
+        if finisher:
+            finisher.cancel()
+        return
+
+    if finisher:
+        print(f"Waiting for {finisher.pending()} pending normalize jobs ({finisher.encoder})...")
+        if finisher.finalize():
+            print(f"Successfully created: {final_output}")
+            _store_single("mux", cache_key, final_output, "final.mp4")
+        else:
+            print("FFmpeg concatenation failed.")
+        return
+
     concat_list_path = os.path.join(DESKTOP_OUTPUT_DIR, "concat_list.txt")
     with open(concat_list_path, "w", encoding="utf-8") as f:
-        for v in videos:
-            if "final_documentary" in v: continue
+        for v in clips:
             f.write(f"file '{os.path.basename(v)}'\n")
-            
-    final_output = os.path.join(DESKTOP_OUTPUT_DIR, f"final_documentary_{datetime.now().strftime('%Y%m%d_%H%M')}.mp4")
     
     cmd = [
         "ffmpeg", "-y", "-f", "concat", "-safe", "0",
@@ -187,6 +239,7 @@ def concatenate_videos():
     try:
         subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
         print(f"Successfully created: {final_output}")
+        _store_single("mux", cache_key, final_output, "final.mp4")
     except Exception as e:
         print(f"FFmpeg concatenation failed: {e}")
 
@@ -232,12 +285,16 @@ def main():
     else:
         print("Target image count met or exceeded. Skipping T2I generation.")
         
-    # 2. Render all with SVD
-    run_svd_rendering()
+    # 2. Render all with SVD (클립 도착 즉시 병렬 정규화 시작)
+    final_output = os.path.join(
+        DESKTOP_OUTPUT_DIR, f"final_documentary_{datetime.now().strftime('%Y%m%d_%H%M')}.mp4")
+    finisher = IncrementalConcat(final_output)
+    clips = run_svd_rendering(finisher)
     
-    # 3. Concatenate
-    concatenate_videos()
+    # 3. Concatenate (정규화된 세그먼트 스트림 복사)
+    concatenate_videos(finisher, clips)
     
+    print(f"Stage cache: {json.dumps(get_stage_cache().stats())}")
     print("\n🎉 PHASE 2 PIPELINE FULLY COMPLETED!")
 
 if __name__ == "__main__":
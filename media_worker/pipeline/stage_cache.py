@@ -0,0 +1,248 @@
+"""
+렌더 파이프라인 스테이지 캐시 — 내용 주소 기반(content-addressed) 아티팩트 저장소
+
+같은 대본·음성·이미지로 다시 들어온 주문(재시도, task_reject_on_worker_lost 재큐잉,
+반복되는 가맹점 템플릿)은 GPU 작업을 건너뛰고 이전 산출물을 그대로 복사한다.
+
+[키]    sha256(stage + 정규화 JSON 파라미터 + 입력 파일 내용 해시)
+[저장]  {cache_dir}/{stage}/{key[:2]}/{key}/  ← 산출 파일 + _meta.json
+[축출]  전체 용량이 max_bytes 를 넘으면 마지막 사용 시각(mtime) 오래된 순 삭제
+        용량은 put 마다 증분 집계 — 디렉토리 전체 스캔은 상한 초과 시와 RESCAN_SEC 주기
+        (다른 워커 프로세스의 저장분 반영)에만 수행
+[설정]  WorkerConfig.cache_dir / cache_max_gb (MEDIA_WORKER_CACHE_DIR / MEDIA_WORKER_CACHE_MAX_GB)
+[지표]  스테이지별 hit/miss/store/evict — Redis HINCRBY (없으면 프로세스 메모리)
+        Redis 키: tantan:stage_cache:stats  (field = "{stage}:{hit|miss|store|evict}")
+
+스테이지: tts · prompts · t2i · svd · mux
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger("media_worker.stage_cache")
+
+STAGES = ("tts", "prompts", "t2i", "svd", "mux")
+META_FILE = "_meta.json"
+STATS_KEY = "tantan:stage_cache:stats"
+
+RESCAN_SEC = 600           # 증분 집계를 실제 디렉토리 용량으로 다시 맞추는 주기
+
+_HASH_CHUNK = 1024 * 1024
+
+
+def file_digest(path) -> str:
+    """파일 내용 sha256 (1MB 청크 스트리밍 — 대용량 mp4도 메모리 일정)."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def make_key(stage: str, params=None, files=()) -> str:
+    """스테이지 + 파라미터 + 입력 파일 내용으로 캐시 키 생성. 파일 경로/이름은 키에 포함되지 않음."""
+    h = hashlib.sha256()
+    h.update(stage.encode("utf-8"))
+    h.update(json.dumps(params or {}, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8"))
+    for f in files:
+        h.update(file_digest(f).encode("ascii"))
+    return h.hexdigest()
+
+
+class StageCache:
+    """스테이지 아티팩트 캐시. 프로세스 간 공유 가능 (쓰기는 임시 디렉토리 → rename 원자 교체)."""
+
+    def __init__(self, root, max_bytes: int, redis_url: str = None):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size = None          # 증분 집계 용량 (None = 아직 스캔 전)
+        self._scanned_at = 0.0
+        self._local_stats: dict = {}
+        self._rdb = None
+        redis_url = redis_url or os.environ.get("MEDIA_WORKER_REDIS_URL") or os.environ.get("DONGNE_REDIS_URL")
+        if redis_url:
+            try:
+                import redis
+                self._rdb = redis.from_url(redis_url, decode_responses=True)
+            except Exception as e:
+                logger.debug(f"stage_cache: Redis 지표 비활성 ({e})")
+
+    # ── 경로 ───────────────────────────────────────────────────
+    def _entry_dir(self, stage: str, key: str) -> Path:
+        return self.root / stage / key[:2] / key
+
+    # ── 지표 ───────────────────────────────────────────────────
+    def _count(self, stage: str, event: str, n: int = 1):
+        field = f"{stage}:{event}"
+        with self._lock:
+            self._local_stats[field] = self._local_stats.get(field, 0) + n
+        if self._rdb is not None:
+            try:
+                self._rdb.hincrby(STATS_KEY, field, n)
+            except Exception:
+                pass
+
+    def stats(self) -> dict:
+        """스테이지별 {hit, miss, store, evict, hit_rate}. Redis 값 우선."""
+        raw = None
+        if self._rdb is not None:
+            try:
+                raw = self._rdb.hgetall(STATS_KEY)
+            except Exception:
+                raw = None
+        if raw is None:
+            with self._lock:
+                raw = dict(self._local_stats)
+        out = {}
+        for stage in STAGES:
+            row = {ev: int(raw.get(f"{stage}:{ev}", 0)) for ev in ("hit", "miss", "store", "evict")}
+            lookups = row["hit"] + row["miss"]
+            row["hit_rate"] = round(row["hit"] / lookups, 3) if lookups else 0.0
+            out[stage] = row
+        return out
+
+    # ── 조회 / 저장 ────────────────────────────────────────────
+    def get(self, stage: str, key: str):
+        """히트 시 (엔트리 디렉토리 Path, meta dict), 미스 시 None."""
+        entry = self._entry_dir(stage, key)
+        meta_path = entry / META_FILE
+        if not meta_path.exists():
+            self._count(stage, "miss")
+            return None
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            now = time.time()
+            os.utime(entry, (now, now))   # LRU 갱신
+        except Exception as e:
+            logger.warning(f"stage_cache: 손상 엔트리 제거 {stage}/{key[:12]} ({e})")
+            shutil.rmtree(entry, ignore_errors=True)
+            self._count(stage, "miss")
+            return None
+        self._count(stage, "hit")
+        return entry, meta
+
+    def put(self, stage: str, key: str, files=None, src_dir=None, meta=None) -> Path:
+        """
+        산출물 저장. files({저장 이름: 원본 경로}) 또는 src_dir(디렉토리 통째) 중 하나 이상 지정.
+        이미 같은 키가 있으면 기존 엔트리 유지 (동일 내용이므로).
+        """
+        entry = self._entry_dir(stage, key)
+        if (entry / META_FILE).exists():
+            return entry
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        tmp = Path(tempfile.mkdtemp(prefix=f".{key[:12]}-", dir=str(entry.parent)))
+        try:
+            if src_dir is not None:
+                shutil.copytree(str(src_dir), str(tmp), dirs_exist_ok=True)
+            for name, src in (files or {}).items():
+                shutil.copy2(str(src), str(tmp / name))
+            (tmp / META_FILE).write_text(
+                json.dumps(meta or {}, ensure_ascii=False, default=str), encoding="utf-8")
+            added = _dir_size(tmp)
+            try:
+                os.rename(str(tmp), str(entry))
+            except OSError:
+                # 다른 프로세스가 먼저 저장 — 그쪽 엔트리 사용
+                shutil.rmtree(str(tmp), ignore_errors=True)
+                return entry
+        except Exception:
+            shutil.rmtree(str(tmp), ignore_errors=True)
+            raise
+        self._count(stage, "store")
+        with self._lock:
+            if self._size is not None:
+                self._size += added
+            due = (self._size is None or self._size > self.max_bytes
+                   or time.monotonic() - self._scanned_at >= RESCAN_SEC)
+        if due:
+            self.evict()
+        return entry
+
+    def get_file(self, stage: str, key: str, name: str, dest) -> bool:
+        """단일 파일 아티팩트를 dest 로 복사. 히트 여부 반환."""
+        hit = self.get(stage, key)
+        if not hit:
+            return False
+        src = hit[0] / name
+        if not src.exists():
+            return False
+        Path(dest).parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(str(src), str(dest))
+        return True
+
+    # ── 축출 ───────────────────────────────────────────────────
+    def _entries(self):
+        for stage in STAGES:
+            stage_dir = self.root / stage
+            if not stage_dir.is_dir():
+                continue
+            for shard in stage_dir.iterdir():
+                if not shard.is_dir():
+                    continue
+                for entry in shard.iterdir():
+                    if entry.is_dir() and not entry.name.startswith("."):
+                        yield stage, entry, entry.stat().st_mtime, _dir_size(entry)
+
+    def evict(self) -> int:
+        """전체 스캔 후 용량 상한 초과분을 LRU 순으로 삭제하고 증분 집계를 재설정. 삭제한 엔트리 수 반환."""
+        entries = list(self._entries())
+        total = sum(e[3] for e in entries)
+        if total <= self.max_bytes:
+            self._resync(total)
+            return 0
+        removed = 0
+        for stage, entry, _mtime, size in sorted(entries, key=lambda e: e[2]):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(str(entry), ignore_errors=True)
+            total -= size
+            removed += 1
+            self._count(stage, "evict")
+        self._resync(total)
+        logger.info(f"stage_cache: {removed}개 축출 → {total / 1024 ** 3:.2f}GB")
+        return removed
+
+
+    def _resync(self, total: int):
+        with self._lock:
+            self._size = total
+            self._scanned_at = time.monotonic()
+
+
+def _dir_size(path: Path) -> int:
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+_default_cache = None
+
+
+def _worker_config():
+    try:
+        from media_worker.config.worker_config import WorkerConfig
+    except ImportError:
+        # pipeline/ 에서 스크립트로 실행 시 — media_worker 루트를 경로에 추가
+        root = str(Path(__file__).resolve().parent.parent)
+        if root not in sys.path:
+            sys.path.append(root)
+        from config.worker_config import WorkerConfig
+    return WorkerConfig()
+
+
+def get_stage_cache() -> StageCache:
+    """프로세스 공용 캐시 인스턴스 (경로·용량 상한은 WorkerConfig)."""
+    global _default_cache
+    if _default_cache is None:
+        cfg = _worker_config()
+        _default_cache = StageCache(
+            root=cfg.cache_dir or os.path.join(cfg.output_dir, "_stage_cache"),
+            max_bytes=int(cfg.cache_max_gb * 1024 ** 3),
+        )
+    return _default_cache
@@ -1,11 +1,15 @@
 import os
+import sys
 import json
-import urllib.request
-import urllib.error
-import time
 import shutil
 from datetime import datetime
 
+try:
+    from media_worker.pipeline.comfy_client import ComfyClient
+except ImportError:
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "pipeline"))
+    from comfy_client import ComfyClient
+
 # 설정
 COMFYUI_SERVER = "http://127.0.0.1:8188"
 BATCH_INPUT_DIR = r"C:\Users\A\Desktop\SVD_Input"
@@ -18,31 +22,16 @@ def load_workflow(path):
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
-def send_prompt(prompt):
-    data = json.dumps({"prompt": prompt}).encode('utf-8')
-    req = urllib.request.Request(f"{COMFYUI_SERVER}/prompt", data=data, headers={'Content-Type': 'application/json'})
-    try:
-        with urllib.request.urlopen(req) as response:
-            return json.loads(response.read())
-    except urllib.error.URLError as e:
-        print(f"Error connecting to ComfyUI: {e}")
-        return None
-
-def get_history(prompt_id):
-    try:
-        with urllib.request.urlopen(f"{COMFYUI_SERVER}/history/{prompt_id}") as response:
-            return json.loads(response.read())
-    except urllib.error.URLError:
-        return None
-
-def free_memory():
-    data = json.dumps({"unload_models": True, "free_memory": True}).encode('utf-8')
-    req = urllib.request.Request(f"{COMFYUI_SERVER}/free", data=data, headers={'Content-Type': 'application/json'})
-    try:
-        urllib.request.urlopen(req)
-        print(" -> Garbage Collection completed.")
-    except Exception as e:
-        print(" -> Custom GC endpoint failed. Letting ComfyUI auto-manage VRAM.")
+def _on_done(img_filename, out_prefix):
+    def _move(_history):
+        print(f" DONE: {img_filename}")
+        # Move from ComfyUI output to Desktop output
+        comfy_out_path = os.path.join(COMFYUI_OUTPUT_DIR, out_prefix + ".mp4")
+        if os.path.exists(comfy_out_path):
+            final_path = os.path.join(DESKTOP_OUTPUT_DIR, out_prefix + ".mp4")
+            shutil.move(comfy_out_path, final_path)
+            print(f" -> Video saved to Desktop\\SVD_Output\\{out_prefix}.mp4")
+    return _move
 
 def main():
     if not os.path.exists(BATCH_INPUT_DIR):
@@ -61,51 +50,34 @@ def main():
     workflow = load_workflow(WORKFLOW_PATH)
     total = len(images)
     print(f"Found {total} images. Starting batch processing...")
-    
-    for i, img_filename in enumerate(images, 1):
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        safe_name = f"batch_{timestamp}_{img_filename}"
-        
-        # 1. Copy image to ComfyUI input folder
-        src_path = os.path.join(BATCH_INPUT_DIR, img_filename)
-        dest_path = os.path.join(COMFYUI_INPUT_DIR, safe_name)
-        shutil.copy2(src_path, dest_path)
-        
-        # 2. Update Workflow JSON
-        workflow["2"]["inputs"]["image"] = safe_name
-        
-        out_prefix = f"svd_hq_{timestamp}_{os.path.splitext(img_filename)[0]}"
-        workflow["10"]["inputs"]["filename_prefix"] = out_prefix
-        
-        # 3. Send Prompt
-        print(f"[{i}/{total}] Processing: {img_filename} ...", end="", flush=True)
-        response = send_prompt(workflow)
-        
-        if not response or "prompt_id" not in response:
-            print(" FAILED to queue prompt.")
-            continue
-            
-        prompt_id = response["prompt_id"]
-        
-        # 4. Wait for completion
-        while True:
-            time.sleep(2)
-            history = get_history(prompt_id)
-            if history and prompt_id in history:
-                print(f" DONE!")
-                # Move from ComfyUI output to Desktop output
-                comfy_out_path = os.path.join(COMFYUI_OUTPUT_DIR, out_prefix + ".mp4")
-                if os.path.exists(comfy_out_path):
-                    final_path = os.path.join(DESKTOP_OUTPUT_DIR, out_prefix + ".mp4")
-                    shutil.move(comfy_out_path, final_path)
-                    print(f" -> Video saved to Desktop\\SVD_Output\\{out_prefix}.mp4")
-                break
-                
-        # 5. Cool down & GC
-        if i < total:
-            print(" -> Triggering VRAM Cleanup for next image...", end="")
-            free_memory()
-            time.sleep(5) # Give GPU time to settle
+
+    def _jobs():
+        for i, img_filename in enumerate(images, 1):
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            safe_name = f"batch_{timestamp}_{img_filename}"
+
+            # 1. Copy image to ComfyUI input folder
+            src_path = os.path.join(BATCH_INPUT_DIR, img_filename)
+            dest_path = os.path.join(COMFYUI_INPUT_DIR, safe_name)
+            shutil.copy2(src_path, dest_path)
+
+            # 2. Update Workflow JSON
+            workflow["2"]["inputs"]["image"] = safe_name
+
+            out_prefix = f"svd_hq_{timestamp}_{os.path.splitext(img_filename)[0]}"
+            workflow["10"]["inputs"]["filename_prefix"] = out_prefix
+
+            # 3. Queue (다음 이미지가 미리 대기열에 올라가 GPU 유휴 시간 없음)
+            print(f"[{i}/{total}] Queued: {img_filename}")
+            yield workflow, _on_done(img_filename, out_prefix)
+
+    # 4. Wait for completion — 웹소켓 완료 이벤트, 같은 SVD 체크포인트라 /free·쿨다운 생략
+    client = ComfyClient(COMFYUI_SERVER)
+    try:
+        ok, failed = client.run_pipeline(_jobs(), depth=2)
+    finally:
+        client.close()
+    print(f"{ok} done, {failed} failed.")
 
     print("\n🎉 Batch processing completed successfully!")
 
@@ -68,6 +68,10 @@ celery_app.conf.update(
     result_serializer="json",
     accept_content=["json"],
     
+    # 모니터링 이벤트 (Control Tower services/worker_monitor 가 구독)
+    worker_send_task_events=True,
+    task_send_sent_event=True,
+
     # 타임존 (한국 서버 기준)
     timezone="Asia/Seoul",
     enable_utc=True,
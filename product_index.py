@@ -0,0 +1,189 @@
+"""
+🔎 Product Search Index (in-process BM25)
+- /api/search 가 매 요청마다 전체 상품을 LLM 프롬프트에 넣던 구조를 대체합니다.
+- 한글 2글자 단위(bigram) + 초성 bigram 역색인, BM25 점수로 상위 후보만 반환
+  예) "사과즙" → 사과, 과즙 / "ㅅㄱ" → 초성 ㅅㄱ 으로 '사과', '수건' 매칭
+- 1글자 검색어("배", "ㅂ")는 bigram 이 없으므로 상품명·설명 부분 문자열 스캔으로 처리
+- LLM 은 이 후보(top-k)만 재정렬 (routers/search.py)
+- db_manager 의 상품 저장/삭제 시 invalidate(), 재고 차감 시 adjust_inventory() 로 갱신
+- 다른 프로세스(워커)의 변경은 REFRESH_SEC 마다 전체 재색인으로 반영
+"""
+import math
+import re
+import threading
+import time
+from collections import defaultdict
+
+REFRESH_SEC = 300
+BM25_K1 = 1.2
+BM25_B = 0.75
+NAME_WEIGHT = 3          # 상품명 토큰은 설명보다 3배 가중
+
+_CHOSEONG = "ㄱㄲㄴㄷㄸㄹㅁㅂㅃㅅㅆㅇㅈㅉㅊㅋㅌㅍㅎ"
+_CHOSEONG_SET = set(_CHOSEONG)
+_SPLIT_RE = re.compile(r"[^0-9a-zA-Z가-힣ㄱ-ㅎ]+")
+
+
+def to_choseong(text):
+    """'사과즙' → 'ㅅㄱㅈ'. 한글 음절이 아닌 문자는 그대로."""
+    out = []
+    for ch in text:
+        code = ord(ch)
+        if 0xAC00 <= code <= 0xD7A3:
+            out.append(_CHOSEONG[(code - 0xAC00) // 588])
+        else:
+            out.append(ch)
+    return "".join(out)
+
+
+def is_choseong_query(text):
+    chars = [ch for ch in text if not ch.isspace()]
+    return bool(chars) and all(ch in _CHOSEONG_SET for ch in chars)
+
+
+def _words(text):
+    return [w for w in _SPLIT_RE.split(str(text or "").lower()) if w]
+
+
+def _bigrams(word):
+    if len(word) == 1:
+        return [word]
+    return [word[i:i + 2] for i in range(len(word) - 1)]
+
+
+def tokenize(text):
+    """본문 토큰: 단어별 문자 bigram (1글자 단어는 그대로)."""
+    tokens = []
+    for w in _words(text):
+        tokens.extend(_bigrams(w))
+    return tokens
+
+
+def choseong_tokens(text):
+    """초성 토큰: '#' 접두어로 일반 토큰과 구분."""
+    tokens = []
+    for w in _words(text):
+        tokens.extend("#" + t for t in _bigrams(to_choseong(w)))
+    return tokens
+
+
+def product_id_of(p):
+    return p.get("id") if p.get("id") is not None else p.get("product_id")
+
+
+class ProductIndex:
+    def __init__(self, loader=None):
+        self._loader = loader
+        self._lock = threading.RLock()
+        self._postings = defaultdict(dict)   # term → {doc_id: tf}
+        self._doc_len = {}
+        self._docs = {}                      # doc_id → product dict
+        self._avg_len = 0.0
+        self._built_at = 0.0
+        self._dirty = True
+
+    # ── 색인 ───────────────────────────────────────────────────
+    def _doc_terms(self, p):
+        name = p.get("name", "")
+        terms = tokenize(name) * NAME_WEIGHT + choseong_tokens(name) + tokenize(p.get("description", ""))
+        tf = defaultdict(int)
+        for t in terms:
+            tf[t] += 1
+        return tf, len(terms)
+
+    def build(self, products):
+        postings = defaultdict(dict)
+        doc_len, docs = {}, {}
+        for p in products:
+            pid = product_id_of(p)
+            if pid is None:
+                continue
+            tf, length = self._doc_terms(p)
+            for term, n in tf.items():
+                postings[term][pid] = n
+            doc_len[pid] = length
+            docs[pid] = p
+        with self._lock:
+            self._postings, self._doc_len, self._docs = postings, doc_len, docs
+            self._avg_len = (sum(doc_len.values()) / len(doc_len)) if doc_len else 0.0
+            self._built_at = time.time()
+            self._dirty = False
+
+    def _load(self):
+        if self._loader is not None:
+            return self._loader()
+        import db_manager
+        return db_manager.get_all_products()
+
+    def ensure_fresh(self):
+        """변경 표시(invalidate) 또는 REFRESH_SEC 경과 시 재색인."""
+        if self._dirty or time.time() - self._built_at > REFRESH_SEC:
+            self.build(self._load())
+
+    def invalidate(self):
+        self._dirty = True
+
+    def adjust_inventory(self, product_id, delta):
+        """재고 차감을 재색인 없이 반영 (색인 토큰은 바뀌지 않음)."""
+        with self._lock:
+            for pid in (product_id, str(product_id)):
+                doc = self._docs.get(pid)
+                if doc is not None and doc.get("inventory") is not None:
+                    doc["inventory"] = doc["inventory"] + delta
+                    return
+
+    # ── 검색 ───────────────────────────────────────────────────
+    def search(self, q, k=20):
+        """
+        BM25 상위 k개 [(score, product)].
+        검색어가 초성만이면 초성 토큰으로, 본문 매칭이 없으면 초성 토큰으로 한 번 더 시도.
+        모든 단어가 1글자면 부분 문자열 스캔 ("배" → "배추김치").
+        """
+        self.ensure_fresh()
+        words = _words(q)
+        if words and all(len(w) < 2 for w in words):
+            return self._scan(words, k, choseong=is_choseong_query(q))
+        if is_choseong_query(q):
+            return self._rank(["#" + t for w in _words(q) for t in _bigrams(w)], k)
+        return self._rank(tokenize(q), k) or self._rank(choseong_tokens(q), k)
+
+    def _rank(self, terms, k):
+        if not terms:
+            return []
+        with self._lock:
+            n_docs = len(self._docs)
+            avg_len = self._avg_len or 1.0
+            scores = defaultdict(float)
+            for term in set(terms):
+                posting = self._postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+                for pid, tf in posting.items():
+                    norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * self._doc_len[pid] / avg_len)
+                    scores[pid] += idf * tf * (BM25_K1 + 1) / norm
+            ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:k]
+            return [(round(score, 4), self._docs[pid]) for pid, score in ranked]
+
+    def _scan(self, needles, k, choseong=False):
+        """부분 문자열 스캔: 상품명 일치 2점, 설명 일치 1점 (같은 점수면 짧은 상품명 우선)."""
+        with self._lock:
+            hits = []
+            for p in self._docs.values():
+                name = str(p.get("name", "")).lower()
+                desc = str(p.get("description", "") or "").lower()
+                if choseong:
+                    name, desc = to_choseong(name), to_choseong(desc)
+                score = sum(2 if n in name else 1 if n in desc else 0 for n in needles)
+                if score:
+                    hits.append((score, len(name), p))
+            hits.sort(key=lambda h: (-h[0], h[1]))
+            return [(float(score), p) for score, _, p in hits[:k]]
+
+    def stats(self):
+        with self._lock:
+            return {"docs": len(self._docs), "terms": len(self._postings),
+                    "built_at": self._built_at, "dirty": self._dirty}
+
+
+product_index = ProductIndex()
@@ -319,7 +319,7 @@ async def admin_chat(
 
     try:
         import ai_manager
-        result = ai_manager.get_ai_response(
+        result = await ai_manager.get_ai_response_async(
             user_input=user_message,
             system_prompt=system_prompt,
             tool_set='admin'
@@ -422,7 +422,8 @@ async def delegate_commercial_analysis(request: Request, cookie_store_id: Union[
 
 
 @router.get("/admin/wallet", response_class=HTMLResponse)
-async def admin_wallet_page(request: Request, cookie_store_id: Union[str, None] = Cookie(default=None, alias="admin_session")):
+async def admin_wallet_page(request: Request, before_id: Union[int, None] = None, period: Union[str, None] = None,
+                            cookie_store_id: Union[str, None] = Cookie(default=None, alias="admin_session")):
     if not cookie_store_id:
         return RedirectResponse(url="/admin?mode=login", status_code=303)
 
@@ -432,13 +433,15 @@ async def admin_wallet_page(request: Request, cookie_store_id: Union[str, None]
         response.delete_cookie("admin_session")
         return response
 
-    details = db.get_wallet_details(cookie_store_id)
+    # before_id: 이전 페이지 마지막 내역 id (더 보기) / period: 'YYYY-MM' 월별 조회
+    details = db.get_wallet_details(cookie_store_id, before_id=before_id, period=period)
     toss_client_key = os.getenv("TOSS_CLIENT_KEY", "")
 
     return templates.TemplateResponse(request, "admin_wallet.html", {
         "request": request,
         "store_id": cookie_store_id,
         "details": details,
+        "period": period,
         "toss_client_key": toss_client_key
     })
 
@@ -1351,7 +1354,7 @@ async def ai_query(request: Request, query_type: str = Form(None), custom_text:
             "단답형을 피하고, 도구(여행 설계 등)의 결과를 바탕으로 충분한 부연 설명과 가치를 제안하세요. "
             "★중요★ 만약 도구의 반환값에 [ACTIONS] ... [/ACTIONS] 형태의 텍스트가 포함되어 있다면, 절대 이를 수정하지 말고 답변의 맨 마지막에 원본 그대로 똑같이 복사하여 출력해야 합니다."
         )
-        reply = ai_manager.get_ai_response(custom_text, system_prompt=system_prompt, tool_set='admin', user_id=cookie_store_id)
+        reply = await ai_manager.get_ai_response_async(custom_text, system_prompt=system_prompt, tool_set='admin', user_id=cookie_store_id)
         return {"reply": reply, "action": None}
     return {"reply": "잘못된 요청입니다.", "action": None}
 
@@ -1379,6 +1382,41 @@ async def async_ai_query(request: Request, custom_text: str = Form(''), delivery
 async def get_task_status(task_id: str):
     return ai_task_results.get(task_id, {"status": "not_found"})
 
+@router.get("/api/ai/tool-cache/stats")
+async def get_tool_cache_stats(
+    cookie_store_id: Union[str, None] = Cookie(default=None, alias="admin_session")
+):
+    """AI 도구 결과 캐시 지표 (도구별 hit / stale / miss / 갱신)"""
+    MASTER_IDS = {"master", "010-2384-7447", "01023847447", "admin8705"}
+    if cookie_store_id not in MASTER_IDS:
+        raise HTTPException(status_code=403, detail="마스터 관리자 전용")
+    from services.tool_cache import tool_cache
+    return JSONResponse(content=tool_cache.stats())
+
+@router.get("/api/jobs/stats")
+async def get_job_runtime_stats(
+    job: Union[str, None] = None,
+    cookie_store_id: Union[str, None] = Cookie(default=None, alias="admin_session")
+):
+    """정기 작업 런타임 지표 (리더, 작업별 실행 수·소요 시간·다음 실행) — job 지정 시 최근 실행 이력 포함"""
+    MASTER_IDS = {"master", "010-2384-7447", "01023847447", "admin8705"}
+    if cookie_store_id not in MASTER_IDS:
+        raise HTTPException(status_code=403, detail="마스터 관리자 전용")
+    from services.job_runtime import job_runtime
+    stats = job_runtime.stats()
+    if job:
+        stats["history"] = job_runtime.history(job)
+    return JSONResponse(content=stats)
+
+@router.get("/api/security/detector/stats")
+async def get_security_detector_stats(cookie_store_id: Union[str, None] = Cookie(default=None, alias="admin_session")):
+    """실시간 보안 이상 감지기 지표 (규칙별 관측·경보 수, 임계 근접 상위 키, 최근 경보) — 이 워커 기준"""
+    MASTER_IDS = {"master", "010-2384-7447", "01023847447", "admin8705"}
+    if cookie_store_id not in MASTER_IDS:
+        raise HTTPException(status_code=403, detail="마스터 관리자 전용")
+    from services.security_detector import security_detector
+    return JSONResponse(content=security_detector.stats())
+
 @router.post("/api/token_recharge")
 async def process_token_recharge(request: Request, amount: str = Form(...), cookie_store_id: Union[str, None] = Cookie(default=None, alias="admin_session")):
     return {"success": True, "message": f"{amount}원 충전 요청이 접수되었습니다."}
@@ -0,0 +1,260 @@
+"""
+배치 디스패처 (Nightly Batch Dispatcher)
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+batch_scheduler.start_batch_render 의 실제 투입 로직.
+
+기존 방식: 주문 1건마다 db.commit() → Redis GET/SETEX → apply_async (직렬)
+변경 방식:
+  1. 클레임   — UPDATE ... WHERE job_id IN (SELECT ... FOR UPDATE SKIP LOCKED)
+               RETURNING 단일 SQL로 N건을 한 번에 PROCESSING 전환
+               (다중 워커/수동 시작이 겹쳐도 같은 주문을 두 번 집지 않음)
+  2. Redis    — MGET 1회 + pipeline SETEX/INCRBY 1회
+  3. Celery   — group() 으로 N건 일괄 enqueue (실패 시 클레임 일괄 복원)
+  4. 배치 크기 — 고정 35건 대신 "06:30 까지 남은 시간 × 워커 수 ÷ 건당 렌더 시간(EWMA)"
+               에서 이미 PROCESSING 인 건수를 뺀 만큼만 클레임.
+               top_up 잡이 15분마다 재계산하여 윈도우를 빈틈없이 채움.
+  5. 렌더 시간 — 클레임 시점이 아니라 워커가 작업을 시작할 때 render_started_at 을 찍음
+               services.worker_monitor 가 Celery task-started 이벤트로 batch_scheduler.mark_render_started,
+               task-succeeded 이벤트의 runtime 으로 batch_scheduler.record_render_sample 호출
+               (클레임 기준이면 큐 대기 시간이 섞여 EWMA 가 JOB_TIMEOUT_SEC 로 수렴)
+
+Redis 키 구조:
+  tantan:batch:render_sec_ewma = float   (건당 렌더 시간 지수이동평균, 초)
+  tantan:batch:planned_limit   = N       (마지막 계산된 배치 용량)
+"""
+
+from __future__ import annotations
+import json, logging, math, os
+from datetime import datetime, timezone
+
+logger = logging.getLogger("tantan.batch")
+
+# ── 디스패처 상수 ────────────────────────────────────────────────
+WINDOW_END_HOUR, WINDOW_END_MINUTE = 6, 30      # Soft Shutdown 시각 (KST)
+DEFAULT_RENDER_SEC    = 480          # EWMA 표본이 없을 때 건당 렌더 시간 추정치
+MIN_RENDER_SEC        = 30           # 비정상 표본 하한 (즉시 실패 등)
+EWMA_ALPHA            = 0.3          # 최근 표본 가중치
+BATCH_HARD_CAP        = int(os.environ.get("BATCH_HARD_CAP", "300"))      # 1회 클레임 안전 상한
+WORKER_CONCURRENCY    = int(os.environ.get("BATCH_WORKER_CONCURRENCY", "1"))  # GPU 워커 수
+
+EWMA_KEY    = "tantan:batch:render_sec_ewma"
+PLANNED_KEY = "tantan:batch:planned_limit"
+
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+# 배치 크기 산정 (적응형)
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+def get_render_sec_estimate(rdb) -> float:
+    """건당 렌더 시간 추정치(초). 표본이 없으면 DEFAULT_RENDER_SEC."""
+    try:
+        raw = rdb.get(EWMA_KEY)
+        if raw:
+            return max(MIN_RENDER_SEC, float(raw))
+    except Exception as e:
+        logger.debug(f"[Dispatch] EWMA 조회 실패: {e}")
+    return float(DEFAULT_RENDER_SEC)
+
+
+def record_render_duration(rdb, seconds: float, job_timeout_sec: int):
+    """
+    batch_scheduler.record_render_sample 에서 호출 — 워커 시작 시각부터의 실측 렌더 시간을 EWMA에 반영.
+    타임아웃을 넘는 값(재시도 누적 등)은 상한으로 자름.
+    """
+    sample = min(max(seconds, MIN_RENDER_SEC), job_timeout_sec)
+    try:
+        raw = rdb.get(EWMA_KEY)
+        ewma = sample if not raw else (EWMA_ALPHA * sample + (1 - EWMA_ALPHA) * float(raw))
+        rdb.set(EWMA_KEY, f"{ewma:.1f}")
+    except Exception as e:
+        logger.debug(f"[Dispatch] EWMA 기록 실패: {e}")
+
+
+def window_seconds_left(now_kst: datetime) -> int:
+    """현재 시각부터 Soft Shutdown(06:30 KST)까지 남은 초. 윈도우 밖이면 0."""
+    end = now_kst.replace(hour=WINDOW_END_HOUR, minute=WINDOW_END_MINUTE,
+                          second=0, microsecond=0)
+    return max(0, int((end - now_kst).total_seconds()))
+
+
+def plan_batch_size(seconds_left: int, render_sec: float, in_flight: int,
+                    concurrency: int = WORKER_CONCURRENCY,
+                    hard_cap: int = BATCH_HARD_CAP) -> int:
+    """
+    남은 윈도우 안에 끝낼 수 있는 추가 투입 건수.
+      용량 = floor(남은 시간 × 워커 수 ÷ 건당 렌더 시간) − 이미 처리/대기 중인 건수
+    """
+    if seconds_left <= 0 or render_sec <= 0:
+        return 0
+    capacity = math.floor(seconds_left * max(1, concurrency) / render_sec)
+    return max(0, min(hard_cap, capacity - in_flight))
+
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+# 클레임 (단일 UPDATE ... RETURNING, SKIP LOCKED)
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+def _claim_orders(db, limit: int, today) -> list[dict]:
+    """
+    PENDING_BATCH 주문을 오래된 순(테스트 후순위)으로 limit 건 PROCESSING 전환.
+    render_started_at 은 비워 둠 — 워커가 실제로 시작할 때 mark_render_started 가 기록.
+    """
+    from sqlalchemy import select, update
+    from tantan_models import TantanOrder
+
+    picked = (
+        select(TantanOrder.job_id)
+        .where(TantanOrder.batch_status == "PENDING_BATCH")
+        .order_by(TantanOrder.is_test.asc(), TantanOrder.created_at.asc())
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    stmt = (
+        update(TantanOrder)
+        .where(TantanOrder.job_id.in_(picked))
+        .values(
+            batch_status="PROCESSING",
+            render_started_at=None,
+            batch_date=today,
+        )
+        .returning(
+            TantanOrder.job_id,
+            TantanOrder.merchant_facts,
+            TantanOrder.assets,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    rows = db.execute(stmt).all()
+    db.commit()
+    return [
+        {
+            "job_id":         r.job_id,
+            "merchant_facts": r.merchant_facts,
+            "assets":         r.assets,
+        }
+        for r in rows
+    ]
+
+
+def _release_orders(db, job_ids: list[str]):
+    """enqueue 실패 시 클레임 일괄 복원 (PROCESSING → PENDING_BATCH)."""
+    from sqlalchemy import update
+    from tantan_models import TantanOrder
+
+    db.execute(
+        update(TantanOrder)
+        .where(TantanOrder.job_id.in_(job_ids),
+               TantanOrder.batch_status == "PROCESSING")
+        .values(batch_status="PENDING_BATCH", render_started_at=None, batch_date=None)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+
+def _count_in_flight(db, today, job_timeout_sec: int) -> int:
+    """
+    처리/대기 중인 PROCESSING 건수. 오래된 행은 제외:
+      - 시작 전(render_started_at 없음)인데 오늘 배치에서 클레임된 것이 아닌 행
+      - 시작 후 job_timeout_sec 가 지난 행 (워커 사망·타임아웃, 07:00 복원 대상)
+    """
+    from datetime import timedelta
+    from sqlalchemy import and_, or_
+    from tantan_models import TantanOrder
+
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=job_timeout_sec)
+    return (
+        db.query(TantanOrder)
+        .filter(
+            TantanOrder.batch_status == "PROCESSING",
+            or_(
+                and_(TantanOrder.render_started_at.is_(None), TantanOrder.batch_date == today),
+                TantanOrder.render_started_at >= cutoff,
+            ),
+        )
+        .count()
+    )
+
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+# Redis 동기화 (pipeline) + Celery group enqueue
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+def _sync_redis(rdb, claimed: list[dict], order_ttl_sec: int):
+    """tantan:order:{job_id} JSON을 MGET 1회 + pipeline 1회로 PROCESSING 동기화."""
+    keys = [f"tantan:order:{c['job_id']}" for c in claimed]
+    raws = rdb.mget(keys)
+    pipe = rdb.pipeline(transaction=False)
+    for key, raw, c in zip(keys, raws, claimed):
+        if not raw:
+            continue
+        ro = json.loads(raw)
+        ro["batch_status"]      = "PROCESSING"
+        ro["render_started_at"] = None
+        pipe.setex(key, order_ttl_sec, json.dumps(ro))
+    pipe.execute()
+
+
+def _enqueue_group(claimed: list[dict], job_timeout_sec: int):
+    """generate_premium_shortform 서명 N개를 celery group 으로 일괄 투입."""
+    from celery import group
+    from media_worker.tasks.video_tasks import generate_premium_shortform
+
+    sigs = [
+        generate_premium_shortform.s(c["job_id"], c["merchant_facts"], c["assets"]).set(
+            task_id=c["job_id"],
+            queue="video_tasks",
+            time_limit=job_timeout_sec,
+            soft_time_limit=job_timeout_sec - 60,
+        )
+        for c in claimed
+    ]
+    group(sigs).apply_async()
+
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+# 진입점 (동기 — batch_scheduler에서 asyncio.to_thread 로 호출)
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+def dispatch_batch(rdb, db, now_kst: datetime, *,
+                   order_ttl_sec: int, job_timeout_sec: int) -> dict:
+    """
+    남은 윈도우 용량만큼 주문을 클레임하고 일괄 enqueue.
+    반환: {"planned": N, "claimed": N, "dispatched": N, "render_sec": float}
+    """
+    render_sec = get_render_sec_estimate(rdb)
+    in_flight  = _count_in_flight(db, now_kst.date(), job_timeout_sec)
+    planned    = plan_batch_size(window_seconds_left(now_kst), render_sec, in_flight)
+    rdb.set(PLANNED_KEY, planned)
+
+    result = {"planned": planned, "claimed": 0, "dispatched": 0, "render_sec": render_sec}
+    if planned == 0:
+        logger.info(f"[Dispatch] 추가 용량 없음 (in_flight={in_flight}, "
+                    f"render≈{render_sec:.0f}s)")
+        return result
+
+    claimed = _claim_orders(db, planned, now_kst.date())
+    result["claimed"] = len(claimed)
+    if not claimed:
+        return result
+
+    try:
+        _sync_redis(rdb, claimed, order_ttl_sec)
+    except Exception as e:
+        # Redis 미러는 보조 저장소 — DB 클레임은 유지하고 진행
+        logger.warning(f"[Dispatch] Redis 동기화 실패 (DB 기준 진행): {e}")
+
+    try:
+        _enqueue_group(claimed, job_timeout_sec)
+    except Exception as e:
+        logger.error(f"[Dispatch] group enqueue 실패 — {len(claimed)}건 복원: {e}")
+        _release_orders(db, [c["job_id"] for c in claimed])
+        return result
+
+    result["dispatched"] = len(claimed)
+    rdb.incrby("tantan:batch:count_today", len(claimed))
+    logger.info(
+        f"[Dispatch] {len(claimed)}건 투입 (계획 {planned}, in_flight {in_flight}, "
+        f"render≈{render_sec:.0f}s × {WORKER_CONCURRENCY} worker)"
+    )
+    return result
@@ -3,7 +3,8 @@
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 KST 기준 4단계 Staggered Scheduling:
   00:00 → 점검 모드 진입 (kiosk 차단)
-  00:10 → 배치 렌더링 시작 (최대 35건)
+  00:10 → 배치 렌더링 시작 (윈도우 용량만큼 적응형 투입)
+  00:15~06:15 → 15분마다 용량 재계산 후 추가 투입 (top-up)
   06:30 → Soft Shutdown (신규 enqueue 차단)
   07:00 → 정상 운영 복귀
 
@@ -17,28 +18,28 @@ Redis 키 구조:
   tantan:batch:soft_shutdown   = "1"           (신규 차단 중)
   tantan:batch:count_today     = N             (오늘 처리 건수)
   tantan:orders:pending_index  = SortedSet     (score=접수시각, member=job_id)
+
+투입 로직(클레임/파이프라인/group enqueue/배치 크기 산정)은 batch_dispatcher.py 참조.
 """
 
 from __future__ import annotations
-import json, logging, os, time
+import asyncio, json, logging, os, time
 from datetime import datetime, timezone, timedelta, date
 
 import pytz
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.cron import CronTrigger
 
 logger = logging.getLogger("tantan.batch")
 
 KST = pytz.timezone("Asia/Seoul")
 
 # ── 배치 상수 ────────────────────────────────────────────────────
-BATCH_LIMIT           = 35          # 하룻밤 최대 처리 건수 (RTX 4070 안전 상한)
+# 배치 크기는 고정값 대신 batch_dispatcher.plan_batch_size 가 렌더 실측치로 산정
 JOB_TIMEOUT_SEC       = 600         # 1건 최대 10분 (Veo + FFmpeg)
 ORDER_TTL_DAYS        = 10          # 완료 주문 보존 기간 (제작 7일 + 여유 3일)
 VIDEO_EXPIRE_DAYS     = 10          # 영상 파일 만료 기간
 ADMIN_ALERT_PHONE_ENV = "ADMIN_ALERT_PHONE"
 
-scheduler = AsyncIOScheduler(timezone=KST)
+JOB_PREFIX            = "batch."      # services.job_runtime 작업명 접두어
 
 
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
@@ -46,9 +47,8 @@ scheduler = AsyncIOScheduler(timezone=KST)
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 
 def _rdb():
-    import redis as _redis
-    url = os.environ.get("REDIS_URL", "redis://localhost:6379/1")
-    return _redis.from_url(url, decode_responses=True)
+    from services.redis_registry import get_redis
+    return get_redis(os.environ.get("REDIS_URL", "redis://localhost:6379/1"))
 
 
 def _db_session():
@@ -120,9 +120,9 @@ async def enter_maintenance():
 async def start_batch_render():
     """
     KST 00:10 — 배치 렌더링 시작 (10분 Stagger)
-    - PostgreSQL에서 PENDING_BATCH 주문을 오래된 순으로 최대 35건 조회
-    - 각 주문을 PROCESSING으로 업데이트 후 Celery enqueue
-    - Redis 큐와 DB 상태를 동시에 업데이트 (이중 저장)
+    - 06:30까지 처리 가능한 건수를 렌더 시간 실측치(EWMA)로 산정
+    - 단일 UPDATE ... RETURNING (SKIP LOCKED)로 PENDING_BATCH → PROCESSING 클레임
+    - Redis 파이프라인 동기화 + Celery group 일괄 enqueue (이중 저장)
     """
     rdb = _rdb()
     now = _now_kst()
@@ -134,79 +134,44 @@ async def start_batch_render():
     rdb.set("tantan:batch:running", "1")
     logger.info(f"[Batch] 렌더링 배치 시작 KST {now.strftime('%H:%M:%S')}")
 
-    today = now.date()
-    dispatched = 0
-
-    try:
-        from tantan_models import TantanOrder
-        from sqlalchemy import func as sa_func
-        db = _db_session()
-
-        # ── 오래된 순 + 테스트 제외 우선, BATCH_LIMIT 건 ──────
-        pending_orders = (
-            db.query(TantanOrder)
-            .filter(TantanOrder.batch_status == "PENDING_BATCH")
-            .order_by(TantanOrder.is_test.asc(), TantanOrder.created_at.asc())
-            .limit(BATCH_LIMIT)
-            .all()
-        )
-
-        for order in pending_orders:
-            # Soft Shutdown 루프 중 재확인
-            if rdb.get("tantan:batch:soft_shutdown") == "1":
-                logger.info(f"[Batch] Soft Shutdown 감지 — {dispatched}건 투입 후 중단")
-                break
+    result = await asyncio.to_thread(_dispatch, rdb, now)
+    logger.info(f"[Batch] 배치 완료: {result.get('dispatched', 0)}건 투입")
 
-            job_id = order.job_id
-
-            # ── DB 상태 → PROCESSING ───────────────────────────
-            order.batch_status      = "PROCESSING"
-            order.render_started_at = datetime.now(timezone.utc)
-            order.batch_date        = today
-            db.commit()
-
-            # ── Redis 상태도 동기화 ────────────────────────────
-            raw = rdb.get(f"tantan:order:{job_id}")
-            if raw:
-                redis_order = json.loads(raw)
-                redis_order["batch_status"]      = "PROCESSING"
-                redis_order["render_started_at"] = order.render_started_at.isoformat()
-                rdb.setex(
-                    f"tantan:order:{job_id}",
-                    ORDER_TTL_DAYS * 86400,
-                    json.dumps(redis_order)
-                )
 
-            # ── Celery enqueue ─────────────────────────────────
-            try:
-                from media_worker.tasks.video_tasks import generate_premium_shortform
-                generate_premium_shortform.apply_async(
-                    args=[job_id,
-                          order.merchant_facts,
-                          order.assets],
-                    task_id=job_id,
-                    queue="video_tasks",
-                    time_limit=JOB_TIMEOUT_SEC,
-                    soft_time_limit=JOB_TIMEOUT_SEC - 60,
-                )
-                dispatched += 1
-                rdb.incr("tantan:batch:count_today")
-                logger.info(f"[Batch] enqueue: {job_id} ({dispatched}/{len(pending_orders)})")
+async def top_up_batch_render():
+    """
+    KST 00:15~06:15 (15분 간격) — 윈도우 채우기
+    - 배치 가동 중이고 Soft Shutdown 전일 때만 동작
+    - 실제 렌더가 추정보다 빨리 끝나 생긴 여유 용량만큼 추가 클레임
+    """
+    rdb = _rdb()
+    if rdb.get("tantan:batch:running") != "1":
+        return
+    if rdb.get("tantan:batch:soft_shutdown") == "1":
+        return
 
-            except Exception as e:
-                # enqueue 실패 → DB 롤백 (PENDING_BATCH 복원)
-                logger.error(f"[Batch] enqueue 실패 {job_id}: {e}")
-                order.batch_status      = "PENDING_BATCH"
-                order.render_started_at = None
-                order.batch_date        = None
-                db.commit()
+    result = await asyncio.to_thread(_dispatch, rdb, _now_kst())
+    if result.get("dispatched"):
+        logger.info(f"[Batch] top-up: {result['dispatched']}건 추가 투입")
 
-        db.close()
 
+def _dispatch(rdb, now: datetime) -> dict:
+    """batch_dispatcher.dispatch_batch 동기 래퍼 (스레드에서 실행)."""
+    from routers.batch_dispatcher import dispatch_batch
+    db = None
+    try:
+        db = _db_session()
+        return dispatch_batch(
+            rdb, db, now,
+            order_ttl_sec=ORDER_TTL_DAYS * 86400,
+            job_timeout_sec=JOB_TIMEOUT_SEC,
+        )
     except Exception as e:
         logger.error(f"[Batch] DB 처리 오류: {e}", exc_info=True)
-
-    logger.info(f"[Batch] 배치 완료: {dispatched}건 투입")
+        return {}
+    finally:
+        if db is not None:
+            db.close()
 
 
 async def soft_shutdown():
@@ -297,52 +262,38 @@ async def exit_maintenance():
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 
 def register_jobs():
-    """app.py startup에서 호출 — KST 기준 4개 스케줄 등록."""
-
-    scheduler.add_job(
-        enter_maintenance,
-        CronTrigger(hour=0, minute=0, timezone=KST),
-        id="batch_maintenance_on",
-        replace_existing=True,
-        misfire_grace_time=300,
-    )
-    scheduler.add_job(
-        start_batch_render,
-        CronTrigger(hour=0, minute=10, timezone=KST),
-        id="batch_render_start",
-        replace_existing=True,
-        misfire_grace_time=300,
-    )
-    scheduler.add_job(
-        soft_shutdown,
-        CronTrigger(hour=6, minute=30, timezone=KST),
-        id="batch_soft_shutdown",
-        replace_existing=True,
-        misfire_grace_time=300,
-    )
-    scheduler.add_job(
-        exit_maintenance,
-        CronTrigger(hour=7, minute=0, timezone=KST),
-        id="batch_maintenance_off",
-        replace_existing=True,
-        misfire_grace_time=300,
-    )
+    """app.py startup에서 호출 — KST 기준 5개 스케줄 등록 (services.job_runtime, 클러스터당 1회 실행)."""
+    from services.job_runtime import job_runtime, cron, daily
+
+    # 배치 함수는 내부에서 동기 Redis / ORM 호출 → 작업 스레드에서 실행 (런타임 루프 비차단)
+    job_runtime.add(JOB_PREFIX + "maintenance_on", enter_maintenance, daily("00:00"),
+                    timeout=300, misfire_grace=300, in_thread=True)
+    job_runtime.add(JOB_PREFIX + "render_start", start_batch_render, daily("00:10"),
+                    timeout=600, misfire_grace=300, in_thread=True)
+    job_runtime.add(JOB_PREFIX + "render_top_up", top_up_batch_render, cron(hour="0-6", minute="*/15"),
+                    timeout=600, misfire_grace=120, in_thread=True)
+    job_runtime.add(JOB_PREFIX + "soft_shutdown", soft_shutdown, daily("06:30"),
+                    timeout=300, misfire_grace=300, in_thread=True)
+    job_runtime.add(JOB_PREFIX + "maintenance_off", exit_maintenance, daily("07:00"),
+                    timeout=300, misfire_grace=300, in_thread=True)
 
     logger.info(
         "[Batch] 스케줄 등록 완료 (KST): "
-        "00:00 점검ON → 00:10 배치시작 → 06:30 SoftShutdown → 07:00 점검OFF"
+        "00:00 점검ON → 00:10 배치시작 (15분 top-up) → 06:30 SoftShutdown → 07:00 점검OFF"
     )
 
 
 def start():
+    from services.job_runtime import job_runtime
     register_jobs()
-    scheduler.start()
-    logger.info("[Batch] APScheduler 시작 (Asia/Seoul)")
+    job_runtime.start()
+    logger.info("[Batch] 작업 런타임 등록 (Asia/Seoul)")
 
 
 def stop():
-    scheduler.shutdown(wait=False)
-    logger.info("[Batch] APScheduler 종료")
+    from services.job_runtime import job_runtime
+    job_runtime.remove(JOB_PREFIX)
+    logger.info("[Batch] 배치 작업 해제")
 
 
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
@@ -407,9 +358,55 @@ def register_pending_order(
 
 
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-# 완료 처리 헬퍼 (video_tasks.py에서 호출)
+# 시작/완료 처리 헬퍼
+#   services.worker_monitor 가 Celery task-started / task-succeeded 이벤트로 호출
+#   (배치 태스크는 task_id = job_id), 태스크 쪽에서 complete_order 를 호출해도 표본은 1회만 반영
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 
+SAMPLE_DEDUP_PREFIX = "tantan:batch:render_sampled:"
+
+
+def mark_render_started(job_id: str, started_at: float | None = None):
+    """
+    워커가 작업을 실제로 시작할 때 호출 — render_started_at 기록 (DB + Redis).
+    배치 클레임 시점에는 비워 두므로 렌더 시간 EWMA 에 큐 대기 시간이 섞이지 않음.
+    started_at: 이벤트 타임스탬프(epoch 초). 이미 찍힌 값은 덮지 않음 (API 워커 N개가 같은 이벤트 수신).
+    """
+    rdb     = _rdb()
+    now_utc = datetime.fromtimestamp(started_at, timezone.utc) if started_at else datetime.now(timezone.utc)
+
+    try:
+        from tantan_models import TantanOrder
+        db = _db_session()
+        order = db.query(TantanOrder).filter_by(job_id=job_id).first()
+        if order and order.batch_status == "PROCESSING" and order.render_started_at is None:
+            order.render_started_at = now_utc
+            db.commit()
+        db.close()
+    except Exception as e:
+        logger.error(f"[Batch] 시작 시각 기록 실패 {job_id}: {e}", exc_info=True)
+
+    raw = rdb.get(f"tantan:order:{job_id}")
+    if raw:
+        ro = json.loads(raw)
+        if not ro.get("render_started_at"):
+            ro["render_started_at"] = now_utc.isoformat()
+            rdb.setex(f"tantan:order:{job_id}", ORDER_TTL_DAYS * 86400, json.dumps(ro))
+
+
+def record_render_sample(job_id: str, seconds: float, rdb=None) -> bool:
+    """
+    job_id 의 실측 렌더 시간을 EWMA 에 1회만 반영 (SET NX 로 이벤트 중복·complete_order 중복 차단).
+    반환: 반영 여부
+    """
+    rdb = rdb or _rdb()
+    if not rdb.set(f"{SAMPLE_DEDUP_PREFIX}{job_id}", "1", nx=True, ex=JOB_TIMEOUT_SEC * 6):
+        return False
+    from routers.batch_dispatcher import record_render_duration
+    record_render_duration(rdb, seconds, JOB_TIMEOUT_SEC)
+    return True
+
+
 def complete_order(job_id: str, video_url: str):
     """
     렌더링 완료 후 DONE 상태로 업데이트.
@@ -425,11 +422,19 @@ def complete_order(job_id: str, video_url: str):
         db = _db_session()
         order = db.query(TantanOrder).filter_by(job_id=job_id).first()
         if order:
+            started = order.render_started_at
             order.batch_status          = "DONE"
             order.video_url             = video_url
             order.render_completed_at   = now_utc
             order.video_expires_at      = expires
             db.commit()
+
+            # 실측 렌더 시간(워커 시작 → 완료) → 다음 배치 크기 산정에 반영
+            # 시작 시각이 없으면(mark_render_started 미호출) 표본을 버림 — 대기 시간이 섞인 값은 쓰지 않음
+            if started is not None:
+                if started.tzinfo is None:
+                    started = started.replace(tzinfo=timezone.utc)
+                record_render_sample(job_id, (now_utc - started).total_seconds(), rdb)
         db.close()
         logger.info(f"[Batch] DB DONE: {job_id}")
     except Exception as e:
@@ -0,0 +1,308 @@
+"""
+택배 대량 접수 파이프라인 (Bulk Excel/CSV Intake)
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+citizen.api_delivery_bulk_excel 의 실제 처리부.
+
+기존 방식: 업로드 전체를 메모리로 읽음 → 모든 행을 dict 로 변환 →
+          행마다 run_in_threadpool DB 호출 2회 (호출마다 새 연결·커밋), 요청이 끝날 때까지 대기
+변경 방식:
+  1. 업로드   — 1MB 단위로 임시 파일에 스트리밍 저장 후 job_id 즉시 반환
+  2. 파싱     — csv.reader / openpyxl read_only 로 한 행씩 읽음 (전체 목록 생성 안 함)
+  3. 컬럼     — 헤더를 1회만 별칭 맵과 대조해 {필드: 열 번호} 로 컴파일
+  4. 주소     — 카카오 키가 있으면 청크 단위로 주소를 일괄 정제 (services.address_cache, 중복·캐시 제외)
+  5. 저장     — CHUNK_ROWS 행씩 db.save_delivery_batch (연결 1개 / 트랜잭션 1개 / executemany)
+  6. 진행률   — 청크마다 Redis(tantan:bulk_intake:{job_id}) 갱신 → 어느 워커에서든 조회 가능
+               (Redis 불가 시 프로세스 메모리)
+"""
+
+from __future__ import annotations
+import asyncio, csv, json, logging, os, re, tempfile, time, uuid
+from datetime import datetime
+
+import db_manager as db
+
+logger = logging.getLogger("tantan.bulk_intake")
+
+CHUNK_ROWS     = 500
+JOB_TTL_SEC    = 3600
+UPLOAD_CHUNK   = 1024 * 1024
+JOB_KEY        = "tantan:bulk_intake:{job_id}"
+
+# 컬럼 별칭 매핑 (한글/영어 혼용 허용)
+COLUMN_ALIASES = {
+    "sender_name":           ["보내는분이름","보내는 분 이름","송신자","발신자","sender_name","sender name"],
+    "sender_phone":          ["보내는분연락처","보내는 분 연락처","발신자전화","sender_phone","sender phone"],
+    "sender_addr":           ["보내는분주소","보내는 분 주소","수거주소","sender_addr","sender address"],
+    "sender_detail_address": ["보내는분상세주소","보내는 분 상세주소","수거상세","sender_detail"],
+    "sender_postcode":       ["보내는분우편번호","sender_postcode"],
+    "receiver_name":         ["받는분이름","받는 분 이름","수신자","receiver_name","receiver name"],
+    "receiver_phone":        ["받는분연락처","받는 분 연락처","수신자전화","receiver_phone","receiver phone"],
+    "receiver_addr":         ["받는분주소","받는 분 주소","배송주소","receiver_addr","address"],
+    "receiver_detail":       ["받는분상세주소","받는 분 상세주소","배송상세","detail_address","receiver_detail"],
+    "receiver_postcode":     ["받는분우편번호","postcode","receiver_postcode"],
+    "item_type":             ["물품명","품명","물품","item_type","item"],
+}
+REQUIRED = ("sender_name", "sender_phone", "sender_addr", "receiver_name", "receiver_phone", "receiver_addr")
+
+_WS_RE = re.compile(r"\s+")
+
+
+def _norm_header(h) -> str:
+    return _WS_RE.sub("", str(h or "")).lower()
+
+
+_ALIAS_LOOKUP = {_norm_header(a): field for field, aliases in COLUMN_ALIASES.items() for a in aliases}
+
+
+def compile_header_map(headers) -> dict:
+    """헤더 행 → {필드: [열 번호, ...]} (별칭 순서 유지, 공백/대소문자 무시)."""
+    cols: dict = {}
+    for idx, h in enumerate(headers):
+        field = _ALIAS_LOOKUP.get(_norm_header(h))
+        if field:
+            cols.setdefault(field, []).append(idx)
+    return cols
+
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+# 진행 상황 저장소
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+_local_jobs: dict = {}
+_redis_client = None
+
+
+def _rdb():
+    global _redis_client
+    if _redis_client is None:
+        try:
+            from services.redis_registry import get_redis
+            _redis_client = get_redis(os.environ.get("REDIS_URL", "redis://localhost:6379/1"))
+            _redis_client.ping()
+        except Exception as e:
+            logger.debug(f"[BulkIntake] Redis 미사용 (메모리 저장): {e}")
+            _redis_client = False
+    return _redis_client or None
+
+
+def _save_job(job: dict):
+    job["updated_at"] = time.time()
+    rdb = _rdb()
+    if rdb is not None:
+        try:
+            rdb.setex(JOB_KEY.format(job_id=job["job_id"]), JOB_TTL_SEC, json.dumps(job, ensure_ascii=False))
+            return
+        except Exception as e:
+            logger.debug(f"[BulkIntake] Redis 저장 실패: {e}")
+    _local_jobs[job["job_id"]] = dict(job)
+
+
+def get_job(job_id: str):
+    rdb = _rdb()
+    if rdb is not None:
+        try:
+            raw = rdb.get(JOB_KEY.format(job_id=job_id))
+            if raw:
+                return json.loads(raw)
+        except Exception as e:
+            logger.debug(f"[BulkIntake] Redis 조회 실패: {e}")
+    return _local_jobs.get(job_id)
+
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+# 파싱 (행 단위 스트리밍)
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+def _estimate_rows(path: str, is_csv: bool):
+    if is_csv:
+        with open(path, "rb") as f:
+            return max(0, sum(chunk.count(b"\n") for chunk in iter(lambda: f.read(UPLOAD_CHUNK), b"")) - 1)
+    return None
+
+
+def iter_rows(path: str, is_csv: bool):
+    """(행 번호, 값 튜플) 를 한 행씩 생성. 첫 행은 헤더로 간주하고 (1, 헤더) 로 먼저 생성."""
+    if is_csv:
+        with open(path, "r", encoding="utf-8-sig", errors="replace", newline="") as f:
+            for i, r in enumerate(csv.reader(f), start=1):
+                yield i, r
+        return
+    import openpyxl
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        for i, r in enumerate(wb.active.iter_rows(values_only=True), start=1):
+            yield i, r
+    finally:
+        wb.close()
+
+
+def _pick(values, cols: dict, field: str) -> str:
+    for idx in cols.get(field, ()):
+        if idx < len(values) and values[idx] is not None:
+            v = str(values[idx]).strip()
+            if v:
+                return v
+    return ""
+
+
+def normalize_row(row_no: int, values, cols: dict, stamp: int):
+    """값 튜플 → (delivery_data, order_data, 결과 요약) 또는 (None, None, 오류 결과)."""
+    f = {field: _pick(values, cols, field) for field in COLUMN_ALIASES}
+    if not all(f[k] for k in REQUIRED):
+        return None, None, {"row": row_no, "success": False, "error": "필수 항목 누락"}
+    s_post = f["sender_postcode"] or "00000"
+    r_post = f["receiver_postcode"] or "00000"
+    item = f["item_type"] or "일반물품"
+
+    tracking_code = f"BULK-{stamp}-{row_no:04d}"
+    delivery_data = {
+        "store_id": "CITIZEN",
+        "sender_name": f["sender_name"], "sender_phone": f["sender_phone"], "sender_addr": f["sender_addr"],
+        "receiver_name": f["receiver_name"], "receiver_phone": f["receiver_phone"],
+        "receiver_addr": f"{f['receiver_addr']} {f['receiver_detail']}".strip(),
+        "item_type": item,
+        "weight": "small",
+        "tracking_code": tracking_code,
+        "fee": 6000,
+        "status": "접수완료",
+        "payment_type": "착불"
+    }
+    order_data = {
+        "order_id": tracking_code,
+        "sender_name": f["sender_name"], "sender_phone": f["sender_phone"],
+        "sender_postcode": s_post, "sender_base_address": f["sender_addr"],
+        "sender_detail_address": f["sender_detail_address"],
+        "receiver_name": f["receiver_name"], "receiver_phone": f["receiver_phone"],
+        "postcode": r_post, "address": f["receiver_addr"],
+        "detail_address": f["receiver_detail"],
+        "status": "REQUESTED"
+    }
+    result = {"row": row_no, "success": True, "tracking_code": tracking_code,
+              "sender": f["sender_name"], "receiver": f["receiver_name"]}
+    return delivery_data, order_data, result
+
+
+def normalize_addresses(deliveries: list, orders: list):
+    """
+    청크 내 보내는/받는 주소를 도로명으로 일괄 정제 (실패한 주소는 원본 유지).
+    검색 중 떼어낸 상세주소(예: "101동 1203호")는 상세주소 칸 앞에 붙여 송장에서 빠지지 않게 함.
+    """
+    from services.address_cache import address_cache
+    addrs = [o["sender_base_address"] for o in orders] + [o["address"] for o in orders]
+    resolved = address_cache.resolve_many_sync(addrs)
+    for d, o in zip(deliveries, orders):
+        r = resolved.get(o["sender_base_address"])
+        if r and r["success"]:
+            o["sender_base_address"] = r["road_address"]
+            o["sender_detail_address"] = f"{r['detail']} {o['sender_detail_address'] or ''}".strip()
+            d["sender_addr"] = f"{r['road_address']} {r['detail']}".strip()
+            if o["sender_postcode"] == "00000" and r["postcode"]:
+                o["sender_postcode"] = r["postcode"]
+        r = resolved.get(o["address"])
+        if r and r["success"]:
+            o["address"] = r["road_address"]
+            o["detail_address"] = f"{r['detail']} {o['detail_address'] or ''}".strip()
+            d["receiver_addr"] = f"{r['road_address']} {o['detail_address']}".strip()
+            if o["postcode"] == "00000" and r["postcode"]:
+                o["postcode"] = r["postcode"]
+
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+# 실행
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+def run_intake(job: dict, path: str, is_csv: bool):
+    """워커 스레드에서 실행 — 파싱·검증·청크 저장, 청크마다 진행률 갱신."""
+    started = time.monotonic()
+    stamp = int(datetime.now().timestamp())
+    results = []
+    deliveries, orders, pending = [], [], []
+
+    def _flush():
+        if not orders:
+            return
+        if os.environ.get("KAKAO_REST_API_KEY"):
+            try:
+                normalize_addresses(deliveries, orders)
+            except Exception as e:
+                logger.warning(f"[BulkIntake] 주소 정제 건너뜀: {e}")
+        ok, detail = db.save_delivery_batch(deliveries, orders)
+        if ok:
+            results.extend(pending)
+            job["success"] += len(pending)
+        else:
+            results.extend({"row": r["row"], "success": False, "error": f"저장 실패: {detail}"} for r in pending)
+            job["failed"] += len(pending)
+        deliveries.clear(); orders.clear(); pending.clear()
+        job["processed"] = job["success"] + job["failed"]
+        _save_job(job)
+
+    try:
+        job["status"] = "running"
+        job["total_estimate"] = _estimate_rows(path, is_csv)
+        _save_job(job)
+        cols = None
+        for row_no, values in iter_rows(path, is_csv):
+            if cols is None:
+                cols = compile_header_map(values)
+                continue
+            if all(v is None or str(v).strip() == "" for v in values):
+                continue
+            d, o, r = normalize_row(row_no, values, cols, stamp)
+            if d is None:
+                results.append(r)
+                job["failed"] += 1
+                continue
+            deliveries.append(d); orders.append(o); pending.append(r)
+            if len(orders) >= CHUNK_ROWS:
+                _flush()
+        _flush()
+        if not results:
+            job["status"] = "failed"
+            job["error"] = "데이터 행이 없습니다."
+        else:
+            job["status"] = "done"
+    except Exception as e:
+        logger.exception(f"[BulkIntake] job {job['job_id']} 실패: {e}")
+        job["status"] = "failed"
+        job["error"] = f"파일 파싱 실패: {e}"
+    finally:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+    results.sort(key=lambda r: r["row"])
+    job["total"] = len(results)
+    job["processed"] = len(results)
+    job["results"] = results
+    job["elapsed_sec"] = round(time.monotonic() - started, 2)
+    _save_job(job)
+    logger.info(f"[BulkIntake] job {job['job_id']} {job['status']} — {job['success']}건 성공 / "
+                f"{job['failed']}건 실패 ({job['elapsed_sec']}s)")
+    return job
+
+
+_running: set = set()
+
+
+async def start_intake(upload) -> dict:
+    """업로드를 임시 파일로 스트리밍 저장 후 백그라운드 실행. 반환: 초기 job dict."""
+    filename = (upload.filename or "").lower()
+    is_csv = filename.endswith(".csv")
+    fd, path = tempfile.mkstemp(prefix="bulk_", suffix=".csv" if is_csv else ".xlsx")
+    with os.fdopen(fd, "wb") as out:
+        while True:
+            chunk = await upload.read(UPLOAD_CHUNK)
+            if not chunk:
+                break
+            out.write(chunk)
+
+    job = {"job_id": uuid.uuid4().hex[:12], "status": "queued", "filename": upload.filename,
+           "processed": 0, "success": 0, "failed": 0, "total_estimate": None,
+           "created_at": time.time()}
+    _save_job(job)
+    task = asyncio.get_running_loop().create_task(asyncio.to_thread(run_intake, dict(job), path, is_csv))
+    _running.add(task)
+    task.add_done_callback(_running.discard)
+    return job
@@ -24,45 +24,21 @@ async def get_optional_current_user(request: Request):
         return None
 
 
-def convert_to_road_address_and_postcode(address_str: str, default_postcode: str = "") -> (str, str):
+async def convert_to_road_address_and_postcode(address_str: str, default_postcode: str = "") -> (str, str):
     """
     구주소(지번) 또는 임의의 주소 문자열을 입력받아,
     카카오 로컬 API를 사용하여 표준 도로명 주소(road_address)와 우편번호(zone_no)로 자동 변환합니다.
+    검색 과정에서 떼어낸 상세주소(동·호수 등)는 도로명 주소 뒤에 다시 붙입니다.
     변환 실패 시 혹은 데이터가 없는 경우 원래 값을 그대로 반환합니다.
     """
     if not address_str or not address_str.strip():
         return address_str, default_postcode
-    
-    kakao_key = os.environ.get("KAKAO_REST_API_KEY")
-    if not kakao_key:
-        return address_str, default_postcode
-    
-    import requests
-    url = "https://dapi.kakao.com/v2/local/search/address.json"
-    headers = {"Authorization": f"KakaoAK {kakao_key}"}
-    params = {"query": address_str}
-    
-    try:
-        response = requests.get(url, headers=headers, params=params, timeout=5)
-        if response.status_code == 200:
-            res_json = response.json()
-            documents = res_json.get("documents", [])
-            if documents:
-                doc = documents[0]
-                road_addr_info = doc.get("road_address")
-                if road_addr_info:
-                    road_address = road_addr_info.get("address_name")
-                    zone_no = road_addr_info.get("zone_no") or default_postcode
-                    if road_address:
-                        return road_address, zone_no
-                
-                address_info = doc.get("address")
-                if address_info:
-                    zip_code = address_info.get("zip_code") or default_postcode
-                    return address_info.get("address_name") or address_str, zip_code
-    except Exception as e:
-        print(f"[Address Normalization Warning] Failed to convert address: {e}")
-        
+
+    from services.address_cache import address_cache
+    result = await address_cache.resolve(address_str)   # 캐시 I/O 는 스레드, 카카오 호출은 비동기
+    if result["success"]:
+        road = f"{result['road_address'] or address_str} {result.get('detail') or ''}".strip()
+        return road, result["postcode"] or default_postcode
     return address_str, default_postcode
 
 
@@ -142,6 +118,21 @@ async def process_payment_success_api(payload: dict, request: Request):
     print("Process Payment Success API Called with payload:", payload)
     return {"success": True, "message": "결제 처리가 완료되었습니다."}
 
+def _citizen_chat_prompt(store_id: str) -> str:
+    store = db.get_store(store_id)
+    store_name = store.get("name", "해당 매장") if store else "해당 매장"
+    store_type = store.get("store_type", "") if store else ""
+    
+    return f"""당신은 '{store_name}' 매장을 방문한 고객을 응대하는 친절하고 상냥하며 유능한 AI 매니저입니다.
+업종: {store_type}
+
+[응답 지침]
+1. 답변은 고객이 만족할 수 있도록 최대한 길고 상세하게 작성하세요. 단답형이나 너무 짧은 문장은 절대 피하세요.
+2. 친절한 부연 설명, 매장 이용 꿀팁, 환영하는 인사말 등을 적극적으로 덧붙여서 최소 3~5문단 이상의 풍부한 답변을 만드세요.
+3. 예약, 주문, 매장 위치 등에 대해 묻는다면 웹페이지 내의 관련 버튼과 기능을 이용하라고 구체적으로 안내하세요.
+4. 마치 친한 단골손님을 대하듯 정성을 다해 상세히 설명하세요."""
+
+
 @router.post("/api/citizen/chat")
 async def citizen_chat(payload: CitizenChatRequest, request: Request):
     """일반 고객(시민) 전용 AI 매니저 채팅 엔드포인트"""
@@ -154,22 +145,11 @@ async def citizen_chat(payload: CitizenChatRequest, request: Request):
     if not user_message:
          return {"success": False, "error": "질문 내용을 입력해주세요."}
     
-    store = db.get_store(store_id)
-    store_name = store.get("name", "해당 매장") if store else "해당 매장"
-    store_type = store.get("store_type", "") if store else ""
-    
-    system_prompt = f"""당신은 '{store_name}' 매장을 방문한 고객을 응대하는 친절하고 상냥하며 유능한 AI 매니저입니다.
-업종: {store_type}
-
-[응답 지침]
-1. 답변은 고객이 만족할 수 있도록 최대한 길고 상세하게 작성하세요. 단답형이나 너무 짧은 문장은 절대 피하세요.
-2. 친절한 부연 설명, 매장 이용 꿀팁, 환영하는 인사말 등을 적극적으로 덧붙여서 최소 3~5문단 이상의 풍부한 답변을 만드세요.
-3. 예약, 주문, 매장 위치 등에 대해 묻는다면 웹페이지 내의 관련 버튼과 기능을 이용하라고 구체적으로 안내하세요.
-4. 마치 친한 단골손님을 대하듯 정성을 다해 상세히 설명하세요."""
+    system_prompt = _citizen_chat_prompt(store_id)
 
     try:
         import ai_manager
-        result = ai_manager.get_ai_response(
+        result = await ai_manager.get_ai_response_async(
             user_input=user_message,
             system_prompt=system_prompt,
             tool_set='customer',
@@ -185,6 +165,38 @@ async def citizen_chat(payload: CitizenChatRequest, request: Request):
         print(f"[/api/citizen/chat] AI Error: {e}")
         return {"success": False, "error": "AI 서버 오류가 발생했습니다."}
 
+
+@router.post("/api/citizen/chat/stream")
+async def citizen_chat_stream(payload: CitizenChatRequest, request: Request):
+    """
+    /api/citizen/chat 의 SSE 스트리밍 버전
+    event: text (본문 조각) / tool (도구 실행 중) / done (최종 {text, actions})
+    """
+    import json
+    import ai_manager
+    from fastapi.responses import StreamingResponse
+
+    user_message = payload.message.strip()
+    if not user_message:
+        return {"success": False, "error": "질문 내용을 입력해주세요."}
+    user_id = payload.phone.strip() if payload.phone else request.client.host
+    system_prompt = _citizen_chat_prompt(payload.store_id)
+
+    async def _events():
+        stream = ai_manager.stream_ai_response(user_message, system_prompt=system_prompt,
+                                               tool_set='customer', user_id=user_id)
+        try:
+            async for event in stream:
+                if await request.is_disconnected():
+                    break
+                kind = event.pop("type")
+                yield f"event: {kind}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+        finally:
+            await stream.aclose()
+
+    return StreamingResponse(_events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @router.post("/api/delivery/request")
 async def api_delivery_request_zero(data: CourierRequestZero, request: Request):
     # 2nd layer backend validation: check if any required field is empty or missing
@@ -210,8 +222,8 @@ async def api_delivery_request_zero(data: CourierRequestZero, request: Request):
     tracking_code = f"LOGEN-{int(datetime.now().timestamp())}"
 
     # Normalize addresses to Road Name Addresses
-    road_recv_base, postcode_recv = convert_to_road_address_and_postcode(data.address, data.postcode)
-    road_send_base, postcode_send = convert_to_road_address_and_postcode(data.sender_addr, data.sender_postcode)
+    road_recv_base, postcode_recv = await convert_to_road_address_and_postcode(data.address, data.postcode)
+    road_send_base, postcode_send = await convert_to_road_address_and_postcode(data.sender_addr, data.sender_postcode)
 
     # 1. Save to deliveries table (via save_delivery or save_store_delivery)
     delivery_data = {
@@ -264,122 +276,31 @@ async def api_delivery_request_zero(data: CourierRequestZero, request: Request):
 # ─────────────────────────────────────────────────────
 # 엑셀 대량 등록 API
 # ─────────────────────────────────────────────────────
-@router.post("/api/delivery/bulk-excel")
+@router.post("/api/delivery/bulk-excel", status_code=202)
 async def api_delivery_bulk_excel(file: UploadFile = File(...)):
     """
-    엑셀(.xlsx/.xls/.csv) 파일을 받아 다건 택배를 일괄 접수합니다.
+    엑셀(.xlsx/.csv) 파일을 받아 다건 택배를 일괄 접수합니다.
     컬럼: 보내는분이름 | 보내는분연락처 | 보내는분주소 | 보내는분상세주소 |
           받는분이름   | 받는분연락처   | 받는분주소   | 받는분상세주소   | 물품명
+    업로드 즉시 job_id 를 반환하고, 진행률/결과는 status_url 에서 조회합니다.
     """
-    import io, openpyxl, csv
-    from fastapi.concurrency import run_in_threadpool
-
-    content = await file.read()
+    from routers.bulk_intake import start_intake
     filename = (file.filename or "").lower()
-
-    rows = []
-    try:
-        if filename.endswith(".csv"):
-            text = content.decode("utf-8-sig", errors="replace")
-            reader = csv.DictReader(io.StringIO(text))
-            rows = list(reader)
-        else:
-            wb = openpyxl.load_workbook(io.BytesIO(content), read_only=True, data_only=True)
-            ws = wb.active
-            headers = None
-            for r in ws.iter_rows(values_only=True):
-                if headers is None:
-                    headers = [str(c).strip() if c else "" for c in r]
-                    continue
-                if all(v is None for v in r):
-                    continue
-                rows.append(dict(zip(headers, [str(v).strip() if v is not None else "" for v in r])))
-            wb.close()
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"파일 파싱 실패: {e}")
-
-    if not rows:
-        raise HTTPException(status_code=400, detail="데이터 행이 없습니다.")
-
-    # 컬럼 별칭 매핑 (한글/영어 혼용 허용)
-    COL = {
-        "sender_name":           ["보내는분이름","보내는 분 이름","송신자","발신자","sender_name","sender name"],
-        "sender_phone":          ["보내는분연락처","보내는 분 연락처","발신자전화","sender_phone","sender phone"],
-        "sender_addr":           ["보내는분주소","보내는 분 주소","수거주소","sender_addr","sender address"],
-        "sender_detail_address": ["보내는분상세주소","보내는 분 상세주소","수거상세","sender_detail"],
-        "sender_postcode":       ["보내는분우편번호","sender_postcode"],
-        "receiver_name":         ["받는분이름","받는 분 이름","수신자","receiver_name","receiver name"],
-        "receiver_phone":        ["받는분연락처","받는 분 연락처","수신자전화","receiver_phone","receiver phone"],
-        "receiver_addr":         ["받는분주소","받는 분 주소","배송주소","receiver_addr","address"],
-        "receiver_detail":       ["받는분상세주소","받는 분 상세주소","배송상세","detail_address","receiver_detail"],
-        "receiver_postcode":     ["받는분우편번호","postcode","receiver_postcode"],
-        "item_type":             ["물품명","품명","물품","item_type","item"],
-    }
-
-    def pick(row: dict, field: str) -> str:
-        for alias in COL.get(field, [field]):
-            v = row.get(alias, "")
-            if v:
-                return v.strip()
-        return ""
-
-    results = []
-    for i, row in enumerate(rows, start=2):  # 2행부터 (1행=헤더)
-        s_name   = pick(row, "sender_name")
-        s_phone  = pick(row, "sender_phone")
-        s_addr   = pick(row, "sender_addr")
-        s_detail = pick(row, "sender_detail_address")
-        s_post   = pick(row, "sender_postcode") or "00000"
-        r_name   = pick(row, "receiver_name")
-        r_phone  = pick(row, "receiver_phone")
-        r_addr   = pick(row, "receiver_addr")
-        r_detail = pick(row, "receiver_detail")
-        r_post   = pick(row, "receiver_postcode") or "00000"
-        item     = pick(row, "item_type") or "일반물품"
-
-        if not (s_name and s_phone and s_addr and r_name and r_phone and r_addr):
-            results.append({"row": i, "success": False, "error": "필수 항목 누락"})
-            continue
-
-        tracking_code = f"BULK-{int(datetime.now().timestamp())}-{i:04d}"
-        delivery_data = {
-            "store_id": "CITIZEN",
-            "date_time": datetime.now().isoformat(),
-            "sender_name": s_name,
-            "receiver_name": r_name,
-            "receiver_addr": f"{r_addr} {r_detail}".strip(),
-            "item_type": item,
-            "weight": "small",
-            "quantity": 1,
-            "tracking_code": tracking_code,
-            "fee": 6000,
-            "status": "접수완료",
-            "payment_type": "착불"
-        }
-        order_data = {
-            "order_id": tracking_code,
-            "sender_name": s_name, "sender_phone": s_phone,
-            "sender_postcode": s_post, "sender_base_address": s_addr,
-            "sender_detail_address": s_detail,
-            "receiver_name": r_name, "receiver_phone": r_phone,
-            "postcode": r_post, "address": r_addr,
-            "detail_address": r_detail,
-            "status": "REQUESTED"
-        }
-        try:
-            if hasattr(db, "save_store_delivery"):
-                await run_in_threadpool(db.save_store_delivery, delivery_data)
-            else:
-                await run_in_threadpool(db.save_delivery, delivery_data)
-            await run_in_threadpool(db.save_delivery_order, order_data)
-            results.append({"row": i, "success": True, "tracking_code": tracking_code,
-                            "sender": s_name, "receiver": r_name})
-        except Exception as e:
-            results.append({"row": i, "success": False, "error": str(e)})
-
-    ok_count   = sum(1 for r in results if r["success"])
-    fail_count = len(results) - ok_count
-    return {"total": len(results), "success": ok_count, "failed": fail_count, "results": results}
+    if not filename.endswith((".csv", ".xlsx", ".xlsm")):
+        raise HTTPException(status_code=400, detail="지원하지 않는 파일 형식입니다. (.xlsx / .csv)")
+    job = await start_intake(file)
+    return {"job_id": job["job_id"], "status": job["status"],
+            "status_url": f"/api/delivery/bulk-excel/{job['job_id']}"}
+
+
+@router.get("/api/delivery/bulk-excel/{job_id}")
+async def api_delivery_bulk_excel_status(job_id: str):
+    """대량 접수 진행률 — status: queued | running | done | failed (done 시 results 포함)"""
+    from routers.bulk_intake import get_job
+    job = get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="접수 작업을 찾을 수 없습니다.")
+    return job
 
 @router.get("/", response_class=HTMLResponse)
 async def index_page(request: Request):
@@ -564,10 +485,10 @@ async def public_reserve_courier(data: CourierReservationRequest, request: Reque
 
     # Normalize addresses to Road Name Addresses
     recv_base = data.address or data.receiver_addr or ""
-    road_recv_base, postcode_recv = convert_to_road_address_and_postcode(recv_base, data.postcode)
+    road_recv_base, postcode_recv = await convert_to_road_address_and_postcode(recv_base, data.postcode)
     
     send_base = data.sender_base_address or data.sender_addr or ""
-    road_send_base, postcode_send = convert_to_road_address_and_postcode(send_base, data.sender_postcode)
+    road_send_base, postcode_send = await convert_to_road_address_and_postcode(send_base, data.sender_postcode)
 
     delivery_data = {
         "store_id": store_id,
@@ -652,10 +573,10 @@ async def public_reserve_courier_multi(data: CourierMultiReservationRequest, req
             
             # Normalize addresses to Road Name Addresses
             recv_base = res.address or res.receiver_addr or ""
-            road_recv_base, postcode_recv = convert_to_road_address_and_postcode(recv_base, res.postcode)
+            road_recv_base, postcode_recv = await convert_to_road_address_and_postcode(recv_base, res.postcode)
             
             send_base = res.sender_base_address or res.sender_addr or ""
-            road_send_base, postcode_send = convert_to_road_address_and_postcode(send_base, res.sender_postcode)
+            road_send_base, postcode_send = await convert_to_road_address_and_postcode(send_base, res.sender_postcode)
             
             base_fee = 6000
             if res.weight == "medium":
@@ -858,9 +779,9 @@ async def pending_courier_reservation(data: CourierReservationRequest, request:
     amount_to_pay = total_fee if data.pay_type == "prepaid" else 0
 
     # Normalize addresses to Road Name Addresses
-    road_recv_base, postcode_recv = convert_to_road_address_and_postcode(recv_base, data.postcode)
+    road_recv_base, postcode_recv = await convert_to_road_address_and_postcode(recv_base, data.postcode)
     send_base = data.sender_base_address or data.sender_addr or ""
-    road_send_base, postcode_send = convert_to_road_address_and_postcode(send_base, data.sender_postcode)
+    road_send_base, postcode_send = await convert_to_road_address_and_postcode(send_base, data.sender_postcode)
 
     import random
     order_id = f"COURIER-{datetime.now().strftime('%Y%m%d%H%M%S')}-{random.randint(1000, 9999)}"
@@ -1111,80 +1032,22 @@ async def get_courier_order_status(orderId: str):
 async def process_rosen_waybill_queue(order_id: str, store_id: str, sender_dict: dict, receiver_dict: dict,
                                        memo: str, logen_id: str, logen_pw: str,
                                        packages_list: list = None, package_dict: dict = None):
-    """복수 패키지 지원: packages_list 우선, 없으면 단일 package_dict 폴백"""
-    from fastapi.concurrency import run_in_threadpool
-    import logen_delivery
-    import sms_manager
-    import time
-
-    # 멱등성 보장
-    locked = await run_in_threadpool(db.acquire_delivery_order_lock, order_id)
-    if not locked:
-        print(f"[Queue] Order {order_id} is already PROCESSING or completed. Skipping background task.")
-        return
+    """복수 패키지 지원: packages_list 우선, 없으면 단일 package_dict 폴백 → 송장 발급 워커 큐에 투입"""
+    from routers.waybill_worker import waybill_worker
 
     # 단일→복수 정규화
-    if not packages_list:
-        packages_list = [package_dict] if package_dict else [{"type": "박스", "weight": 5.0, "size": "소형", "box_type": "1", "weight_code": "05", "contents": "일반 택배", "price": 10000, "fee": 5000, "is_prepaid": True}]
-
-    max_retries = 3
-    retry_delay = 5
-    all_waybills = []
-
-    for pkg_idx, pkg in enumerate(packages_list):
-        waybill_ok = False
-        err = None
-        for attempt in range(1, max_retries + 1):
-            print(f"[Queue] Pkg {pkg_idx+1}/{len(packages_list)} | Attempt {attempt} | Order {order_id}")
-            try:
-                res_data, err = await run_in_threadpool(
-                    logen_delivery.create_delivery_reservation,
-                    sender=sender_dict,
-                    receiver=receiver_dict,
-                    package=pkg,
-                    pickup_date=datetime.now().strftime("%Y-%m-%d"),
-                    memo=memo,
-                    agent_id=logen_id,
-                    agent_pw=logen_pw
-                )
-                if not err and isinstance(res_data, dict) and res_data.get('waybill_number'):
-                    all_waybills.append(res_data['waybill_number'])
-                    print(f"[Queue] Waybill OK: {res_data['waybill_number']}")
-                    waybill_ok = True
-                    break
-            except Exception as ex:
-                err = str(ex)
-            print(f"[Queue] Attempt {attempt} failed: {err or 'Unknown error'}")
-            if attempt < max_retries:
-                time.sleep(retry_delay)
+    if not packages_list and package_dict:
+        packages_list = [package_dict]
+    await waybill_worker.submit(order_id=order_id, store_id=store_id, sender_dict=sender_dict,
+                                receiver_dict=receiver_dict, memo=memo, logen_id=logen_id,
+                                logen_pw=logen_pw, packages_list=packages_list)
 
-        if not waybill_ok:
-            print(f"[Queue] Pkg {pkg_idx+1} failed after {max_retries} attempts.")
 
-    if all_waybills:
-        waybill_summary = ", ".join(all_waybills)
-        await run_in_threadpool(db.update_delivery_order_status, order_id, 'SUCCESS', waybill_number=waybill_summary)
-
-        # 성공 알림톡
-        try:
-            sender_phone = sender_dict.get('phone')
-            sender_name  = sender_dict.get('name')
-            msg = f"[송장 접수 알림]\n{sender_name}님, 송장번호({waybill_summary})로 접수되었습니다.\n*기사님 대시보드에 알림이 전송되었습니다."
-            sms_manager.send_alimtalk(to_phone=sender_phone, message=msg, template_id="tmp_courier",
-                                      variables={"#{name}": sender_name, "#{track}": waybill_summary})
-        except Exception as sms_err:
-            print(f"[Queue] Alimtalk error: {sms_err}")
-    else:
-        print(f"[Queue] All packages failed for order {order_id}. Storing in Dead Letter Box.")
-        await run_in_threadpool(db.update_delivery_order_status, order_id, 'FAILED', error_message=err or "로젠 API 최종 응답 실패")
-        try:
-            sender_phone = sender_dict.get('phone')
-            sender_name  = sender_dict.get('name')
-            alert_msg = f"[접수 실패 알림]\n{sender_name}님, 택배 접수가 일시적인 오류로 실패했습니다. 관리자가 확인 후 수동 재처리해 드리겠습니다. (주문번호: {order_id})"
-            sms_manager.send_alimtalk(to_phone=sender_phone, message=alert_msg, template_id="tmp_fail_alert",
-                                      variables={"#{name}": sender_name, "#{orderId}": order_id})
-        except Exception as sms_err:
-            print(f"[Queue] Alert Alimtalk error: {sms_err}")
+@router.get("/api/citizen/courier/waybill-worker/stats")
+async def get_waybill_worker_stats():
+    """송장 발급 워커 큐 깊이 / 처리 시간 / 성공·실패 지표"""
+    from routers.waybill_worker import waybill_worker
+    return {"success": True, "data": waybill_worker.stats()}
 
 
 @router.post("/api/citizen/courier/finish-reservation")
@@ -1244,11 +1107,11 @@ async def finish_courier_reservation(request: Request, background_tasks: Backgro
     # Normalize addresses to Road Name Addresses
     sender_address_raw = data.get('sender_base_address') or sender_address
     sender_postcode_raw = data.get('sender_postcode') or ""
-    road_send_base, postcode_send = convert_to_road_address_and_postcode(sender_address_raw, sender_postcode_raw)
+    road_send_base, postcode_send = await convert_to_road_address_and_postcode(sender_address_raw, sender_postcode_raw)
     
     receiver_address_raw = receiver_dict["address"]
     receiver_postcode_raw = data.get('postcode') or ""
-    road_recv_base, postcode_recv = convert_to_road_address_and_postcode(receiver_address_raw, receiver_postcode_raw)
+    road_recv_base, postcode_recv = await convert_to_road_address_and_postcode(receiver_address_raw, receiver_postcode_raw)
 
     sender_dict = {
         "name": sender_name,
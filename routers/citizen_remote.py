@@ -24,45 +24,21 @@ async def get_optional_current_user(request: Request):
         return None
 
 
-def convert_to_road_address_and_postcode(address_str: str, default_postcode: str = "") -> (str, str):
+async def convert_to_road_address_and_postcode(address_str: str, default_postcode: str = "") -> (str, str):
     """
     구주소(지번) 또는 임의의 주소 문자열을 입력받아,
     카카오 로컬 API를 사용하여 표준 도로명 주소(road_address)와 우편번호(zone_no)로 자동 변환합니다.
+    검색 과정에서 떼어낸 상세주소(동·호수 등)는 도로명 주소 뒤에 다시 붙입니다.
     변환 실패 시 혹은 데이터가 없는 경우 원래 값을 그대로 반환합니다.
     """
     if not address_str or not address_str.strip():
         return address_str, default_postcode
-    
-    kakao_key = os.environ.get("KAKAO_REST_API_KEY")
-    if not kakao_key:
-        return address_str, default_postcode
-    
-    import requests
-    url = "https://dapi.kakao.com/v2/local/search/address.json"
-    headers = {"Authorization": f"KakaoAK {kakao_key}"}
-    params = {"query": address_str}
-    
-    try:
-        response = requests.get(url, headers=headers, params=params, timeout=5)
-        if response.status_code == 200:
-            res_json = response.json()
-            documents = res_json.get("documents", [])
-            if documents:
-                doc = documents[0]
-                road_addr_info = doc.get("road_address")
-                if road_addr_info:
-                    road_address = road_addr_info.get("address_name")
-                    zone_no = road_addr_info.get("zone_no") or default_postcode
-                    if road_address:
-                        return road_address, zone_no
-                
-                address_info = doc.get("address")
-                if address_info:
-                    zip_code = address_info.get("zip_code") or default_postcode
-                    return address_info.get("address_name") or address_str, zip_code
-    except Exception as e:
-        print(f"[Address Normalization Warning] Failed to convert address: {e}")
-        
+
+    from services.address_cache import address_cache
+    result = await address_cache.resolve(address_str)   # 캐시 I/O 는 스레드, 카카오 호출은 비동기
+    if result["success"]:
+        road = f"{result['road_address'] or address_str} {result.get('detail') or ''}".strip()
+        return road, result["postcode"] or default_postcode
     return address_str, default_postcode
 
 
@@ -157,8 +133,8 @@ async def api_delivery_request_zero(data: CourierRequestZero, request: Request):
     tracking_code = f"LOGEN-{int(datetime.now().timestamp())}"
 
     # Normalize addresses to Road Name Addresses
-    road_recv_base, postcode_recv = convert_to_road_address_and_postcode(data.address, data.postcode)
-    road_send_base, postcode_send = convert_to_road_address_and_postcode(data.sender_addr, data.sender_postcode)
+    road_recv_base, postcode_recv = await convert_to_road_address_and_postcode(data.address, data.postcode)
+    road_send_base, postcode_send = await convert_to_road_address_and_postcode(data.sender_addr, data.sender_postcode)
 
     # 1. Save to deliveries table (via save_delivery or save_store_delivery)
     delivery_data = {
@@ -511,10 +487,10 @@ async def public_reserve_courier(data: CourierReservationRequest, request: Reque
 
     # Normalize addresses to Road Name Addresses
     recv_base = data.address or data.receiver_addr or ""
-    road_recv_base, postcode_recv = convert_to_road_address_and_postcode(recv_base, data.postcode)
+    road_recv_base, postcode_recv = await convert_to_road_address_and_postcode(recv_base, data.postcode)
     
     send_base = data.sender_base_address or data.sender_addr or ""
-    road_send_base, postcode_send = convert_to_road_address_and_postcode(send_base, data.sender_postcode)
+    road_send_base, postcode_send = await convert_to_road_address_and_postcode(send_base, data.sender_postcode)
 
     delivery_data = {
         "store_id": store_id,
@@ -599,10 +575,10 @@ async def public_reserve_courier_multi(data: CourierMultiReservationRequest, req
             
             # Normalize addresses to Road Name Addresses
             recv_base = res.address or res.receiver_addr or ""
-            road_recv_base, postcode_recv = convert_to_road_address_and_postcode(recv_base, res.postcode)
+            road_recv_base, postcode_recv = await convert_to_road_address_and_postcode(recv_base, res.postcode)
             
             send_base = res.sender_base_address or res.sender_addr or ""
-            road_send_base, postcode_send = convert_to_road_address_and_postcode(send_base, res.sender_postcode)
+            road_send_base, postcode_send = await convert_to_road_address_and_postcode(send_base, res.sender_postcode)
             
             base_fee = 6000
             if res.weight == "medium":
@@ -805,9 +781,9 @@ async def pending_courier_reservation(data: CourierReservationRequest, request:
     amount_to_pay = total_fee if data.pay_type == "prepaid" else 0
 
     # Normalize addresses to Road Name Addresses
-    road_recv_base, postcode_recv = convert_to_road_address_and_postcode(recv_base, data.postcode)
+    road_recv_base, postcode_recv = await convert_to_road_address_and_postcode(recv_base, data.postcode)
     send_base = data.sender_base_address or data.sender_addr or ""
-    road_send_base, postcode_send = convert_to_road_address_and_postcode(send_base, data.sender_postcode)
+    road_send_base, postcode_send = await convert_to_road_address_and_postcode(send_base, data.sender_postcode)
 
     import random
     order_id = f"COURIER-{datetime.now().strftime('%Y%m%d%H%M%S')}-{random.randint(1000, 9999)}"
@@ -1058,80 +1034,15 @@ async def get_courier_order_status(orderId: str):
 async def process_rosen_waybill_queue(order_id: str, store_id: str, sender_dict: dict, receiver_dict: dict,
                                        memo: str, logen_id: str, logen_pw: str,
                                        packages_list: list = None, package_dict: dict = None):
-    """복수 패키지 지원: packages_list 우선, 없으면 단일 package_dict 폴백"""
-    from fastapi.concurrency import run_in_threadpool
-    import logen_delivery
-    import sms_manager
-    import time
-
-    # 멱등성 보장
-    locked = await run_in_threadpool(db.acquire_delivery_order_lock, order_id)
-    if not locked:
-        print(f"[Queue] Order {order_id} is already PROCESSING or completed. Skipping background task.")
-        return
+    """복수 패키지 지원: packages_list 우선, 없으면 단일 package_dict 폴백 → 송장 발급 워커 큐에 투입"""
+    from routers.waybill_worker import waybill_worker
 
     # 단일→복수 정규화
-    if not packages_list:
-        packages_list = [package_dict] if package_dict else [{"type": "박스", "weight": 5.0, "size": "소형", "box_type": "1", "weight_code": "05", "contents": "일반 택배", "price": 10000, "fee": 5000, "is_prepaid": True}]
-
-    max_retries = 3
-    retry_delay = 5
-    all_waybills = []
-
-    for pkg_idx, pkg in enumerate(packages_list):
-        waybill_ok = False
-        err = None
-        for attempt in range(1, max_retries + 1):
-            print(f"[Queue] Pkg {pkg_idx+1}/{len(packages_list)} | Attempt {attempt} | Order {order_id}")
-            try:
-                res_data, err = await run_in_threadpool(
-                    logen_delivery.create_delivery_reservation,
-                    sender=sender_dict,
-                    receiver=receiver_dict,
-                    package=pkg,
-                    pickup_date=datetime.now().strftime("%Y-%m-%d"),
-                    memo=memo,
-                    agent_id=logen_id,
-                    agent_pw=logen_pw
-                )
-                if not err and isinstance(res_data, dict) and res_data.get('waybill_number'):
-                    all_waybills.append(res_data['waybill_number'])
-                    print(f"[Queue] Waybill OK: {res_data['waybill_number']}")
-                    waybill_ok = True
-                    break
-            except Exception as ex:
-                err = str(ex)
-            print(f"[Queue] Attempt {attempt} failed: {err or 'Unknown error'}")
-            if attempt < max_retries:
-                time.sleep(retry_delay)
-
-        if not waybill_ok:
-            print(f"[Queue] Pkg {pkg_idx+1} failed after {max_retries} attempts.")
-
-    if all_waybills:
-        waybill_summary = ", ".join(all_waybills)
-        await run_in_threadpool(db.update_delivery_order_status, order_id, 'SUCCESS', waybill_number=waybill_summary)
-
-        # 성공 알림톡
-        try:
-            sender_phone = sender_dict.get('phone')
-            sender_name  = sender_dict.get('name')
-            msg = f"[송장 접수 알림]\n{sender_name}님, 송장번호({waybill_summary})로 접수되었습니다.\n*기사님 대시보드에 알림이 전송되었습니다."
-            sms_manager.send_alimtalk(to_phone=sender_phone, message=msg, template_id="tmp_courier",
-                                      variables={"#{name}": sender_name, "#{track}": waybill_summary})
-        except Exception as sms_err:
-            print(f"[Queue] Alimtalk error: {sms_err}")
-    else:
-        print(f"[Queue] All packages failed for order {order_id}. Storing in Dead Letter Box.")
-        await run_in_threadpool(db.update_delivery_order_status, order_id, 'FAILED', error_message=err or "로젠 API 최종 응답 실패")
-        try:
-            sender_phone = sender_dict.get('phone')
-            sender_name  = sender_dict.get('name')
-            alert_msg = f"[접수 실패 알림]\n{sender_name}님, 택배 접수가 일시적인 오류로 실패했습니다. 관리자가 확인 후 수동 재처리해 드리겠습니다. (주문번호: {order_id})"
-            sms_manager.send_alimtalk(to_phone=sender_phone, message=alert_msg, template_id="tmp_fail_alert",
-                                      variables={"#{name}": sender_name, "#{orderId}": order_id})
-        except Exception as sms_err:
-            print(f"[Queue] Alert Alimtalk error: {sms_err}")
+    if not packages_list and package_dict:
+        packages_list = [package_dict]
+    await waybill_worker.submit(order_id=order_id, store_id=store_id, sender_dict=sender_dict,
+                                receiver_dict=receiver_dict, memo=memo, logen_id=logen_id,
+                                logen_pw=logen_pw, packages_list=packages_list)
 
 
 @router.post("/api/citizen/courier/finish-reservation")
@@ -1191,11 +1102,11 @@ async def finish_courier_reservation(request: Request, background_tasks: Backgro
     # Normalize addresses to Road Name Addresses
     sender_address_raw = data.get('sender_base_address') or sender_address
     sender_postcode_raw = data.get('sender_postcode') or ""
-    road_send_base, postcode_send = convert_to_road_address_and_postcode(sender_address_raw, sender_postcode_raw)
+    road_send_base, postcode_send = await convert_to_road_address_and_postcode(sender_address_raw, sender_postcode_raw)
     
     receiver_address_raw = receiver_dict["address"]
     receiver_postcode_raw = data.get('postcode') or ""
-    road_recv_base, postcode_recv = convert_to_road_address_and_postcode(receiver_address_raw, receiver_postcode_raw)
+    road_recv_base, postcode_recv = await convert_to_road_address_and_postcode(receiver_address_raw, receiver_postcode_raw)
 
     sender_dict = {
         "name": sender_name,
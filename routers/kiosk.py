@@ -15,7 +15,7 @@ import requests as _req
 from datetime import datetime
 from typing import Optional, AsyncGenerator
 
-import google.generativeai as genai
+from services.llm_gateway import llm_gateway
 from fastapi import APIRouter, HTTPException, Request
 from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
@@ -120,7 +120,7 @@ async def kiosk_health():
 # 2. 동네비서 AI 챗봇 — Gemini Flash 비동기 SSE 스트리밍
 #
 # 핵심 원리:
-#   - generate_content_async(stream=True): AI가 답변을 생성하는 동안 서버가
+#   - llm_gateway.stream(): AI가 답변을 생성하는 동안 서버가
 #     다른 요청(결제, 접수 등)을 블로킹 없이 처리할 수 있습니다.
 #   - SSE 규격: "data: {텍스트}\n\n" 형태의 청크를 브라우저로 흘려보내면
 #     프론트엔드는 글자를 실시간으로 이어 붙입니다.
@@ -182,16 +182,11 @@ async def _gemini_stream(message: str, request: Request) -> AsyncGenerator[str,
       2. SSE 표준 규격 준수           — "data: {text}\n\n"
       3. try-except                  — 통신 오류 시 서버 종료 없이 안내 메시지 전달
     """
-    import config  # 로컬 임포트로 circular import 방지
-    api_key = config.get_secret("GEMINI_API_KEY") or config.get_secret("GOOGLE_API_KEY")
-    if not api_key:
+    if llm_gateway.client() is None:
         yield "data: [안내] AI 설정이 완료되지 않았습니다. 직원에게 문의해 주세요.\n\n"
         yield "event: done\ndata: \n\n"
         return
 
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel("gemini-2.5-flash")
-
     # [핵심] 정적 시스템 프롬프트 + 실시간 날씨 동적 주입
     # cached_weather는 cron_jobs 스케줄러가 1시간마다 갱신함
     dynamic_context = (
@@ -204,30 +199,28 @@ async def _gemini_stream(message: str, request: Request) -> AsyncGenerator[str,
     full_prompt = f"{KIOSK_SYSTEM_PROMPT}{dynamic_context}\n\n사용자: {message}"
 
     try:
-        # [핵심 1] 멱살을 잡지 않는 '비동기(async)' 스트리밍 함수 호출
-        response = await model.generate_content_async(
+        # [핵심 1] 공용 LLM 게이트웨이 스트리밍 (클라이언트 재사용 + 모델별 동시성 제한 + 키오스크 토큰 집계)
+        stream = llm_gateway.stream(
             full_prompt,
-            stream=True,
-            generation_config=genai.types.GenerationConfig(
-                max_output_tokens=500,
-                temperature=0.7,
-            ),
+            model="gemini-2.5-flash",
+            config={"max_output_tokens": 500, "temperature": 0.7},
+            store_id="KIOSK",
         )
 
         # [핵심 2] AI가 생성하는 텍스트 청크(Chunk)를 실시간으로 순회
-        async for chunk in response:
+        async for text in stream:
             # [방어 1] 사용자가 '취소'/'이전' 버튼을 누르거나 화면이 초기화된 경우
             if await request.is_disconnected():
                 logger.info("[키오스크 AI] 사용자 연결 끊김 — 토큰 생성 중단")
+                await stream.aclose()
                 return
 
-            if chunk.text:
-                # [방어 2] SSE 표준 규격에 맞추어 전송
-                # 줄바꾸음은 SSE 프로토콜을 깨뜨리므로 공백으로 치환
-                sse_text = chunk.text.replace("\n", " ")
-                yield f"data: {sse_text}\n\n"
-                # 이벤트 루프에 제어권을 잠시 양보하여 서버 블로킹 방지
-                await asyncio.sleep(0)
+            # [방어 2] SSE 표준 규격에 맞추어 전송
+            # 줄바꾸음은 SSE 프로토콜을 깨뜨리므로 공백으로 치환
+            sse_text = text.replace("\n", " ")
+            yield f"data: {sse_text}\n\n"
+            # 이벤트 루프에 제어권을 잠시 양보하여 서버 블로킹 방지
+            await asyncio.sleep(0)
 
     except Exception as e:
         # [방어 3] 통신 오류가 나더라도 서버가 죽지 않고 클라이언트에게 안내
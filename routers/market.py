@@ -316,8 +316,7 @@ async def parse_photo_order(req: PhotoOrderRequest):
     import base64
     from io import BytesIO
     from PIL import Image
-    import google.generativeai as genai
-    import config
+    from services.llm_gateway import llm_gateway
     import json
     import re
     
@@ -326,20 +325,16 @@ async def parse_photo_order(req: PhotoOrderRequest):
         img_bytes = base64.b64decode(b64_data)
         img = Image.open(BytesIO(img_bytes))
         
-        api_key = config.get_secret("GOOGLE_API_KEY")
-        if not api_key:
+        if llm_gateway.client() is None:
             raise Exception("No API Key configured")
-            
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        
+
         prompt = """
         첨부된 이미지(서류, 쪽지, 송장 등)를 판독하여 배송할 사람의 이름, 전화번호, 주소, 상세주소, 박스 수량을 추출하세요.
         추가 설명이나 마크다운 없이 순수 JSON 배열만 반환해야 합니다. 전화번호가 안 보이면 '010-0000-0000', 수량이 없으면 1로 쓰세요.
         출력형식: [{"name": "김영희", "phone": "010-0000-0000", "addr": "서울 강남구 역삼동", "addrDetail": "111-2", "qty": 2}]
         """
-        response = model.generate_content([prompt, img])
-        ai_text = response.text
+        result = await llm_gateway.generate([prompt, img], model='gemini-1.5-flash', store_id="MARKET", coalesce=False)
+        ai_text = result["text"]
         
         match = re.search(r'\[\s*\{.*\}\s*\]', ai_text, re.DOTALL)
         if match:
@@ -10,12 +10,15 @@ UI 연동:
   - is_auto_corrected: True  → 프론트엔드 자동완성 토스트 표시
   - correction_message       → 토스트 메시지 내용
 """
-import os, base64, json, re, sqlite3
-import httpx
+import os, json, re, sqlite3
 from pathlib import Path
 from fastapi import APIRouter, UploadFile, File, Body
 from fastapi.responses import JSONResponse
 
+from services.address_cache import address_cache
+from services.ocr_pipeline import ocr_pipeline
+from services.correction_index import correction_index
+
 router = APIRouter()
 
 GEMINI_URL = (
@@ -88,10 +91,8 @@ def sanitize_phone_number(phone_str: str) -> str:
 def process_and_sanitize_ocr_data(raw_ai_data: dict) -> dict:
     """
     Gemini가 추출한 raw JSON 데이터를 DB와 대조하여 교정하는 미들웨어 함수
+    (주소록·오답 노트는 services.correction_index 메모리 인덱스에서 조회)
     """
-    conn = _get_db()
-    cursor = conn.cursor()
-
     sanitized_data = dict(raw_ai_data)
     sanitized_data['is_auto_corrected'] = False
     sanitized_data['correction_message'] = ""
@@ -103,48 +104,26 @@ def process_and_sanitize_ocr_data(raw_ai_data: dict) -> dict:
     # ==========================================
     # [1차 방어선] 단골 주소록 (전화번호 기준)
     # ==========================================
-    if phone_number:
-        cursor.execute("""
-            SELECT receiver_name, receiver_address
-            FROM customer_address_book
-            WHERE phone_number = ?
-        """, (phone_number,))
-        customer_row = cursor.fetchone()
-
-        if customer_row:
-            sanitized_data['receiver_name']    = customer_row['receiver_name']
-            sanitized_data['receiver_address'] = customer_row['receiver_address']
-            sanitized_data['is_auto_corrected']  = True
-            sanitized_data['is_address_verified'] = True   # DB 저장된 주소는 신뢰함
-            sanitized_data['correction_message'] = "과거 배송 이력을 바탕으로 주소를 자동 완성했습니다."
-
-            cursor.execute("""
-                UPDATE customer_address_book
-                SET last_used_at = CURRENT_TIMESTAMP
-                WHERE phone_number = ?
-            """, (phone_number,))
-            conn.commit()
-            conn.close()
-            return sanitized_data  # 1차 방어 성공 → 즉시 반환
+    customer = correction_index.lookup_phone(phone_number)
+    if customer:
+        sanitized_data['receiver_name']    = customer[0]
+        sanitized_data['receiver_address'] = customer[1]
+        sanitized_data['is_auto_corrected']  = True
+        sanitized_data['is_address_verified'] = True   # DB 저장된 주소는 신뢰함
+        sanitized_data['correction_message'] = "과거 배송 이력을 바탕으로 주소를 자동 완성했습니다."
+        return sanitized_data  # 1차 방어 성공 → 즉시 반환
 
     # ==========================================
-    # [2차 방어선] 오답 노트 (frequency >= 2)
+    # [2차 방어선] 오답 노트 (frequency >= 2, 한 글자 오독까지 유사 일치)
     # ==========================================
     raw_address = sanitized_data.get('receiver_address', '')
     if raw_address:
-        cursor.execute("""
-            SELECT corrected_text
-            FROM address_correction_log
-            WHERE ai_raw_text = ? AND frequency >= 2
-        """, (raw_address,))
-        correction_row = cursor.fetchone()
-
-        if correction_row:
-            sanitized_data['receiver_address']   = correction_row['corrected_text']
+        correction = correction_index.lookup_correction(raw_address)
+        if correction:
+            sanitized_data['receiver_address']   = correction['corrected']
             sanitized_data['is_auto_corrected']  = True
             sanitized_data['correction_message'] = "AI 오독 패턴이 감지되어 올바른 주소로 자동 교정되었습니다."
 
-    conn.close()
     # 3차 방어(카카오 주소 정제)는 엔드포인트에서 await로 호출
     return sanitized_data
 
@@ -167,6 +146,7 @@ def _record_correction(ai_text: str, corrected: str):
         """, (ai_text.strip(), corrected.strip()))
         conn.commit()
         conn.close()
+        correction_index.add_correction(ai_text, corrected)
     except Exception as e:
         print(f"[correction_log] 기록 오류: {e}")
 
@@ -185,88 +165,23 @@ async def _normalize_address_via_kakao(address: str) -> dict:
     Step C: 공백 기준으로 뒤 단어를 하나씩 제거하며 반복 검색
              → 히트 시 제거된 단어들을 detail(상세주소)로 반환
 
+    실제 검색·캐시·동시 조회 병합은 services.address_cache 가 담당
+    (같은 주소는 카카오 API 를 다시 호출하지 않음).
+
     반환: {success, road_address, postcode, jibun_address, detail}
     """
-    if not address or len(address.strip()) < 4:
-        return {"success": False, "road_address": address, "postcode": "", "jibun_address": address, "detail": ""}
-
-    kakao_key = os.getenv("KAKAO_REST_API_KEY", "")
-    if not kakao_key:
+    if not os.getenv("KAKAO_REST_API_KEY", ""):
         print("[kakao_addr] KAKAO_REST_API_KEY 미설정 — 주소 정제 건너뜀")
-        return {"success": False, "road_address": address, "postcode": "", "jibun_address": address, "detail": ""}
-
-    def _build_result(docs: list, detail: str) -> dict:
-        """카카오 API 결과 doc → 최종 딕셔너리"""
-        doc  = docs[0]
-        road  = doc.get("road_address") or {}
-        jibun = doc.get("address")       or {}
-        road_name  = road.get("address_name",  "").strip()
-        postcode   = road.get("zone_no",        "").strip()
-        jibun_name = jibun.get("address_name", "").strip()
-        final = road_name or jibun_name or address
-        print(f"[kakao_addr] ✅ '{address}' → '{final}' ({postcode}) | detail='{detail}'")
-        return {
-            "success":       True,
-            "road_address":  final,
-            "postcode":      postcode,
-            "jibun_address": jibun_name,
-            "detail":        detail,
-        }
-
     try:
-        async with httpx.AsyncClient(
-            timeout=6.0,
-            headers={"Authorization": f"KakaoAK {kakao_key}"}
-        ) as client:
-
-            async def _search(query: str) -> list:
-                try:
-                    r = await client.get(
-                        "https://dapi.kakao.com/v2/local/search/address.json",
-                        params={"query": query, "analyze_type": "similar", "size": 1}
-                    )
-                    if r.status_code == 200:
-                        return r.json().get("documents", [])
-                    print(f"[kakao_addr] HTTP {r.status_code}")
-                except Exception as e:
-                    print(f"[kakao_addr] 검색 오류: {e}")
-                return []
-
-            # ── Step A: 원본 전체 검색 ─────────────────────────
-            docs = await _search(address)
-            if docs:
-                return _build_result(docs, detail="")
-
-            # ── Step B: '동+숫자+길' → '로+숫자+길' 패턴 교정 ──
-            # 예) "봉곡동 15길" → "봉곡로 15길"
-            corrected = re.sub(r'(\S+)동(\s*\d+\s*길)', r'\1로\2', address)
-            if corrected != address:
-                docs = await _search(corrected)
-                if docs:
-                    return _build_result(docs, detail="")
-            else:
-                corrected = address  # 교정 없음 → 원본으로 Step C 진행
-
-            # ── Step C: 점진적 단어 박리 루프 ────────────────────
-            # 교정된 문자열을 공백 기준으로 분리
-            words = corrected.split()
-            for i in range(len(words) - 1, 0, -1):
-                query = " ".join(words[:i])
-                if len(query.strip()) < 4:
-                    break
-                docs = await _search(query)
-                if docs:
-                    # 박리된 뒷부분 = 상세주소 힌트 (건물명, 동·호수 등)
-                    detail = " ".join(words[i:])
-                    return _build_result(docs, detail=detail)
-
-            # 모든 시도 실패
-            print(f"[kakao_addr] ❌ 검색 실패: '{address}'")
-            return {"success": False, "road_address": address, "postcode": "", "jibun_address": address, "detail": ""}
-
+        result = await address_cache.resolve(address)
     except Exception as e:
         print(f"[kakao_addr] 전체 오류: {e}")
         return {"success": False, "road_address": address, "postcode": "", "jibun_address": address, "detail": ""}
+    if result["success"]:
+        print(f"[kakao_addr] ✅ '{address}' → '{result['road_address']}' ({result['postcode']}) | detail='{result['detail']}'")
+    else:
+        print(f"[kakao_addr] ❌ 검색 실패: '{address}'")
+    return result
 
 
 def _upsert_address_book(phone: str, name: str, address: str):
@@ -286,6 +201,7 @@ def _upsert_address_book(phone: str, name: str, address: str):
         """, (clean, name, address))
         conn.commit()
         conn.close()
+        correction_index.upsert_phone(clean, name, address)
     except Exception as e:
         print(f"[address_book] 저장 오류: {e}")
 
@@ -300,32 +216,16 @@ async def gemini_ocr(image: UploadFile = File(...)):
         return JSONResponse(content={"parsed": {}, "error": "GEMINI_API_KEY 미설정"})
 
     img_bytes = await image.read()
-    b64_image = base64.b64encode(img_bytes).decode("utf-8")
-
-    payload = {
-        "system_instruction": {"parts": [{"text": SYSTEM_INSTRUCTION}]},
-        "contents": [{"parts": [
-            {"inline_data": {"mime_type": "image/jpeg", "data": b64_image}}
-        ]}],
-        "generationConfig": {"temperature": 0, "responseMimeType": "application/json"}
-    }
 
     try:
-        async with httpx.AsyncClient(timeout=20.0) as client:
-            resp = await client.post(
-                f"{GEMINI_URL}?key={api_key}",
-                headers={"Content-Type": "application/json"},
-                json=payload
-            )
-
-        if resp.status_code != 200:
-            return JSONResponse(content={
-                "parsed": {},
-                "error": f"Gemini API HTTP {resp.status_code}: {resp.text[:400]}"
-            })
-
-        data     = resp.json()
-        raw_text = data["candidates"][0]["content"]["parts"][0]["text"].strip()
+        # 축소·재인코딩 → 원본 바이트 sha256(정확 일치) 캐시 조회 → 공용 클라이언트로 Gemini 호출
+        raw_text, err, prep = await ocr_pipeline.extract(
+            img_bytes, image.content_type or "image/jpeg", GEMINI_URL, api_key, SYSTEM_INSTRUCTION
+        )
+        if err:
+            return JSONResponse(content={"parsed": {}, "error": err})
+        print(f"[OCR] 이미지 {prep['orig_bytes']//1024}KB → {prep['bytes']//1024}KB "
+              f"({prep['prep_ms']}ms){' | 캐시' if prep['cached'] else ''}")
 
         # 마크다운 방어
         if raw_text.startswith("```"):
@@ -429,3 +329,23 @@ async def save_correction(
     if phone and receiver_address:
         _upsert_address_book(phone, receiver_name, receiver_address)
     return JSONResponse(content={"ok": True})
+
+
+# ──────────────────────────────────────────────────────────────
+# 주소 정제 캐시 지표
+# GET /api/ocr/address-cache/stats
+# ──────────────────────────────────────────────────────────────
+@router.get("/api/ocr/address-cache/stats")
+async def address_cache_stats():
+    """L1/L2/별칭 적중 수, 카카오 API 호출 수, 적중률 + 교정 인덱스 적중."""
+    return JSONResponse(content={**address_cache.stats(), "correction_index": correction_index.stats()})
+
+
+# ──────────────────────────────────────────────────────────────
+# OCR 전처리/캐시 지표
+# GET /api/ocr/pipeline/stats
+# ──────────────────────────────────────────────────────────────
+@router.get("/api/ocr/pipeline/stats")
+async def ocr_pipeline_stats():
+    """원본/전송 바이트, 평균 전처리 시간, sha256 정확 일치 캐시 적중, Gemini 호출 수."""
+    return JSONResponse(content=ocr_pipeline.stats())
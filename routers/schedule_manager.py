@@ -1,8 +1,11 @@
 from fastapi import APIRouter, Request, Form
 from fastapi.responses import HTMLResponse
+from datetime import datetime
+from zoneinfo import ZoneInfo
 import db_manager as db
 
 router = APIRouter()
+KST = ZoneInfo("Asia/Seoul")   # cron_jobs 의 22:00 / 23:59 작업과 같은 날짜 기준
 
 @router.get("/schedule/confirm", response_class=HTMLResponse)
 async def schedule_confirm_page(store_id: str):
@@ -78,16 +81,12 @@ async def schedule_confirm_submit(store_id: str = Form(...), status: str = Form(
     if not store:
          return HTMLResponse(content="<p>알 수 없는 오류가 발생했습니다.</p>")
 
-    # DB 업데이트 (has_confirmed_schedule, closed_message)
-    # db.update_store가 지원하는 쿼리를 사용하거나, 지원하지 않는다면 새 함수 필요. 
-    # 여기서는 Python 레벨에서 Mocking 또는 존재하는 update_store_partial 가능성 가정
-    try:
-        if status == "normal":
-             db.update_store(store_id, {"closed_message": "현재 매장 부재중이거나 통화가 어렵습니다."})
-        elif status == "closed":
-             db.update_store(store_id, {"closed_message": closed_message})
-    except Exception as e:
-         pass # fallback if db module lacks update_store
+    # DB 업데이트 (closed_message + 오늘 응답 완료 표시 → 23:59 기본 스케줄 전환 대상에서 제외)
+    today = datetime.now(KST).strftime("%Y-%m-%d")
+    if status == "normal":
+        db.confirm_store_schedule(store_id, "현재 매장 부재중이거나 통화가 어렵습니다.", today)
+    elif status == "closed":
+        db.confirm_store_schedule(store_id, closed_message, today)
          
     html = """
     <!DOCTYPE html>
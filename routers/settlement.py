@@ -54,6 +54,17 @@ class StatusTransitionRequest(BaseModel):
         return v
 
 
+class BulkTransitionRequest(BaseModel):
+    settlement_ids: list[int]
+
+    @field_validator("settlement_ids")
+    @classmethod
+    def bounded(cls, v):
+        if not v or len(v) > 1000:
+            raise ValueError("settlement_ids는 1~1000건이어야 합니다.")
+        return v
+
+
 class AdjustmentRequest(BaseModel):
     adj_amount: int    # 양수=추가, 음수=차감
     reason: str
@@ -121,6 +132,33 @@ async def change_settlement_status(
     return {"success": True, "message": msg}
 
 
+# ══════════════════════════════════════
+# 일괄 승인 / 지급 완료 (마스터 전용, 트랜잭션 1개)
+# ══════════════════════════════════════
+@router.post("/bulk/approve")
+async def bulk_approve(
+    data: BulkTransitionRequest,
+    cookie_store_id: Union[str, None] = Cookie(default=None, alias="admin_session")
+):
+    """READY → APPROVED 일괄 전이. 이미 처리된 건은 skipped 로 반환."""
+    if cookie_store_id not in MASTER_IDS:
+        raise HTTPException(status_code=403, detail="마스터 권한이 필요합니다.")
+    result = sdb.approve_many(data.settlement_ids, processed_by=cookie_store_id)
+    return {"success": True, **result}
+
+
+@router.post("/bulk/complete")
+async def bulk_complete(
+    data: BulkTransitionRequest,
+    cookie_store_id: Union[str, None] = Cookie(default=None, alias="admin_session")
+):
+    """APPROVED → COMPLETED 일괄 전이. 이미 처리된 건은 skipped 로 반환."""
+    if cookie_store_id not in MASTER_IDS:
+        raise HTTPException(status_code=403, detail="마스터 권한이 필요합니다.")
+    result = sdb.complete_many(data.settlement_ids, processed_by=cookie_store_id)
+    return {"success": True, **result}
+
+
 # ══════════════════════════════════════
 # 금액 조정 내역 추가 (마스터 전용)
 # ══════════════════════════════════════
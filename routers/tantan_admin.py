@@ -24,6 +24,9 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from pydantic import BaseModel, Field
 
+from services.redis_registry import get_redis, redis_registry
+from services.worker_monitor import worker_monitor
+
 logger = logging.getLogger("tantan.admin")
 
 router = APIRouter(prefix="/api/tantan/admin", tags=["tantan-control-tower"])
@@ -37,15 +40,12 @@ JWT_ALGO       = "HS256"
 JWT_EXPIRE_H   = 4          # 4시간
 TASK_TTL_SEC   = 7 * 86400  # 7일
 
-_redis_client: Optional[redis.Redis] = None
+def _redis_url() -> str:
+    return os.environ.get("CELERY_RESULT_BACKEND",
+                          os.environ.get("REDIS_URL", "redis://localhost:6379/1"))
 
 def _rdb() -> redis.Redis:
-    global _redis_client
-    if _redis_client is None:
-        url = os.environ.get("CELERY_RESULT_BACKEND",
-              os.environ.get("REDIS_URL", "redis://localhost:6379/1"))
-        _redis_client = redis.from_url(url, decode_responses=True)
-    return _redis_client
+    return get_redis(_redis_url())
 
 # ── JWT ─────────────────────────────────────────────────────────
 def _make_jwt(sub: str) -> str:
@@ -114,131 +114,141 @@ async def admin_me(admin: dict = Depends(verify_admin_jwt)):
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 @router.get("/infra/status")
 async def infra_status(admin: dict = Depends(verify_admin_jwt)):
-    rdb = _rdb()
-
-    # Redis 연결 확인
+    # Redis 연결 확인 + 오늘 통계를 파이프라인 1회 왕복으로 조회
+    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
     try:
-        rdb.ping()
+        _, done, failed, total = await redis_registry.apipelined(
+            lambda p: (p.ping(), p.get(f"tantan:stats:done:{today}"), p.get(f"tantan:stats:failed:{today}"),
+                       p.zcard(TASK_INDEX)),
+            url=_redis_url(),
+        )
         redis_ok = True
     except Exception:
         redis_ok = False
+        done = failed = total = 0
 
-    # Celery 큐 깊이 (video_tasks 큐)
-    queue_depth = 0
-    try:
-        queue_depth = rdb.llen("video_tasks") or 0
-        if queue_depth == 0:
-            queue_depth = rdb.llen("celery") or 0
-    except Exception:
-        pass
+    # GPU 워커 상태 · 큐 깊이 — 백그라운드 모니터 스냅샷 (inspect 대기 없음)
+    snapshot     = worker_monitor.snapshot()
+    worker_info  = worker_monitor.worker_summary()
+    queue_depth  = worker_monitor.queue_depth()
 
-    # GPU 워커 상태 (Celery Inspect)
-    worker_info = _get_worker_status()
-
-    # 오늘 통계
-    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-    today_done   = int(rdb.get(f"tantan:stats:done:{today}") or 0)
-    today_failed = int(rdb.get(f"tantan:stats:failed:{today}") or 0)
-    total_tasks  = int(rdb.zcard("tantan:tasks:index") or 0)
+    today_done   = int(done or 0)
+    today_failed = int(failed or 0)
+    total_tasks  = int(total or 0)
 
     return {
         "redis_connected":  redis_ok,
         "queue_depth":      queue_depth,
+        "queues":           snapshot["queue_depth"],
         "worker":           worker_info,
+        "workers":          snapshot["workers"],
+        "active_tasks":     snapshot["active_tasks"],
+        "task_durations":   snapshot["durations"],
+        "snapshot_at":      snapshot["updated_at"],
         "stats": {
             "today_completed": today_done,
             "today_failed":    today_failed,
             "total_tasks":     total_tasks,
         },
+        "redis_pool": redis_registry.stats(),
         "timestamp": datetime.now(timezone.utc).isoformat(),
     }
 
-def _get_worker_status() -> dict:
-    """Celery Inspect로 워커 상태 파악."""
-    base = {
-        "status":   "Offline",
-        "hostname": None,
-        "active_tasks": 0,
-        "last_heartbeat": None,
-    }
-    try:
-        from media_worker.celery_app import app as celery_app
-        inspect = celery_app.control.inspect(timeout=1.5)
 
-        # ping으로 살아있는지 확인
-        pong = inspect.ping()
-        if not pong:
-            return base
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+# 모듈 2: 파이프라인 관제
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+TASK_INDEX        = "tantan:tasks:index"
+TASK_STATUS_INDEX = "tantan:tasks:status:{}"      # 상태별 보조 인덱스 (status 소문자)
+TASK_INDEX_READY  = "tantan:tasks:index_backfilled"   # 보조 인덱스 백필 완료 표시 (상태 인덱스 키 공간 밖)
+_LEGACY_READY_KEY = "tantan:tasks:status:ready"   # 이전 백필 표시 — status "ready" 인덱스와 키가 겹쳐 WRONGTYPE
 
-        hostname = list(pong.keys())[0]
-        base["hostname"] = hostname
 
-        # 활성 태스크
-        active = inspect.active() or {}
-        active_list = active.get(hostname, [])
-        base["active_tasks"] = len(active_list)
+def _status_index(status: str) -> str:
+    return TASK_STATUS_INDEX.format((status or "").lower())
 
-        if active_list:
-            base["status"] = "Rendering"
-        else:
-            # 예약된 태스크
-            reserved = inspect.reserved() or {}
-            reserved_list = reserved.get(hostname, [])
-            base["status"] = "Idle" if not reserved_list else "Idle"
 
-        base["last_heartbeat"] = datetime.now(timezone.utc).isoformat()
-        return base
-    except Exception as e:
-        logger.debug(f"Worker inspect 실패: {e}")
-        # Redis heartbeat로 fallback
-        rdb = _rdb()
-        hb = rdb.get("tantan:worker:heartbeat")
-        if hb:
-            ts = float(hb)
-            if time.time() - ts < 30:
-                base["status"] = "Idle"
-                base["last_heartbeat"] = datetime.fromtimestamp(ts, tz=timezone.utc).isoformat()
-        return base
+def _encode_cursor(score: float, skip: int) -> str:
+    return f"{score!r}:{skip}"
 
 
-# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-# 모듈 2: 파이프라인 관제
-# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-def _paginate_zset(rdb: redis.Redis, key: str,
-                   page: int, size: int, status_filter: Optional[str] = None):
-    """Redis Sorted Set에서 역순(최신 먼저) 페이지네이션."""
-    total_raw = rdb.zcard(key)
+def _decode_cursor(cursor: str):
+    try:
+        score, skip = cursor.rsplit(":", 1)
+        return float(score), int(skip)
+    except (ValueError, AttributeError):
+        raise HTTPException(400, "잘못된 cursor 입니다.")
+
+
+def _fetch_items(rdb: redis.Redis, ids, item_key: str) -> list:
+    """페이지 ID 목록 → MGET 1회 (만료된 항목은 제외)."""
+    if not ids:
+        return []
+    raws = rdb.mget([item_key.format(i) for i in ids])
+    return [json.loads(raw) for raw in raws if raw]
+
+
+def _backfill_status_index(rdb: redis.Redis, chunk: int = 500):
+    """상태별 인덱스 도입 이전 태스크를 1회 재색인 (SET NX 로 한 프로세스만 수행)."""
+    if not rdb.set(TASK_INDEX_READY, "1", nx=True):
+        return
+    if rdb.type(_LEGACY_READY_KEY) == "string":
+        rdb.delete(_LEGACY_READY_KEY)
+    total, offset = 0, 0
+    while True:
+        ids = rdb.zrange(TASK_INDEX, offset, offset + chunk - 1, withscores=True)
+        if not ids:
+            break
+        raws = rdb.mget([f"tantan:task:{tid}" for tid, _ in ids])
+        pipe = rdb.pipeline(transaction=False)
+        for (tid, score), raw in zip(ids, raws):
+            if raw:
+                pipe.zadd(_status_index(json.loads(raw).get("status", "")), {tid: score})
+                total += 1
+        pipe.execute()
+        offset += chunk
+    logger.info(f"[Admin] 태스크 상태 인덱스 백필 {total}건")
+
 
+def _paginate_zset(rdb: redis.Redis, key: str,
+                   page: int, size: int, status_filter: Optional[str] = None,
+                   cursor: Optional[str] = None, item_key: str = "tantan:task:{}"):
+    """
+    Redis Sorted Set에서 역순(최신 먼저) 페이지네이션 — 이력 길이와 무관하게 O(page size).
+    status_filter: 상태별 보조 인덱스(tantan:tasks:status:{status}) 사용
+    cursor: 이전 응답의 next_cursor ("점수:같은 점수에서 건너뛸 개수") — 지정 시 page 무시
+    """
     if status_filter and status_filter != "all":
-        # 상태 필터: 전체 스캔 후 필터 (수량이 많지 않을 때 안전)
-        all_ids = rdb.zrevrange(key, 0, -1)
-        filtered = []
-        for tid in all_ids:
-            raw = rdb.get(f"tantan:task:{tid}")
-            if not raw:
-                continue
-            task = json.loads(raw)
-            if task.get("status", "").lower() == status_filter.lower():
-                filtered.append(task)
-        total = len(filtered)
-        start = (page - 1) * size
-        items = filtered[start:start + size]
+        _backfill_status_index(rdb)
+        key = _status_index(status_filter)
+    total = int(rdb.zcard(key) or 0)
+
+    if cursor:
+        max_score, skip = _decode_cursor(cursor)
+        rows = rdb.zrevrangebyscore(key, max_score, "-inf", start=skip, num=size, withscores=True)
     else:
-        total = total_raw
         start = (page - 1) * size
-        ids   = rdb.zrevrange(key, start, start + size - 1)
-        items = []
-        for tid in ids:
-            raw = rdb.get(f"tantan:task:{tid}")
-            if raw:
-                items.append(json.loads(raw))
+        rows = rdb.zrevrange(key, start, start + size - 1, withscores=True)
+        max_score, skip = None, 0
+
+    next_cursor = None
+    if len(rows) == size:
+        last = rows[-1][1]
+        if cursor:
+            same = sum(1 for _, sc in rows if sc == last)
+            skip = same + (skip if last == max_score else 0)
+        else:
+            # 페이지 이전 구간의 같은 점수 항목까지 포함 → 페이지 모드에서 cursor 로 넘어가도 중복 없음
+            skip = start + len(rows) - int(rdb.zcount(key, f"({last!r}", "+inf"))
+        next_cursor = _encode_cursor(last, skip)
 
     return {
-        "items":  items,
-        "total":  total,
-        "page":   page,
-        "size":   size,
-        "pages":  max(1, math.ceil(total / size)) if total else 1,
+        "items":       _fetch_items(rdb, [member for member, _ in rows], item_key),
+        "total":       total,
+        "page":        page,
+        "size":        size,
+        "pages":       max(1, math.ceil(total / size)) if total else 1,
+        "next_cursor": next_cursor,
     }
 
 @router.get("/tasks")
@@ -246,10 +256,11 @@ async def list_tasks(
     page:   int = Query(1, ge=1),
     size:   int = Query(20, ge=1, le=50),
     status: str = Query("all"),
+    cursor: Optional[str] = Query(None),
     admin: dict = Depends(verify_admin_jwt),
 ):
     rdb = _rdb()
-    return _paginate_zset(rdb, "tantan:tasks:index", page, size, status)
+    return _paginate_zset(rdb, TASK_INDEX, page, size, status, cursor)
 
 @router.get("/tasks/{task_id}")
 async def get_task(task_id: str, admin: dict = Depends(verify_admin_jwt)):
@@ -350,10 +361,12 @@ async def deduct_credits(req: DeductReq, admin: dict = Depends(verify_admin_jwt)
 async def list_sms_logs(
     page: int = Query(1, ge=1),
     size: int = Query(20, ge=1, le=50),
+    cursor: Optional[str] = Query(None),
     admin: dict = Depends(verify_admin_jwt),
 ):
     rdb = _rdb()
-    return _paginate_zset(rdb, "tantan:sms:logs:index", page, size)
+    # 인덱스 멤버가 로그 키 자체 (tantan:sms:log:{ms})
+    return _paginate_zset(rdb, "tantan:sms:logs:index", page, size, cursor=cursor, item_key="{}")
 
 
 # ── 유틸 ────────────────────────────────────────────────────────
@@ -435,18 +448,38 @@ async def recharge_store_tokens(req: StoreRechargeReq, admin: dict = Depends(ver
 
 # ── 외부에서 호출되는 Task 기록 헬퍼 ───────────────────────────
 def record_task(task_id: str, data: dict, ttl: int = TASK_TTL_SEC):
-    """video_tasks.py에서 호출 — 태스크 상태 Redis 기록."""
+    """
+    video_tasks.py에서 호출 — 태스크 상태 Redis 기록.
+    본문 · 전체 인덱스 · 상태별 인덱스를 WATCH/MULTI 트랜잭션 1회로 갱신
+    (이전 상태 인덱스에서 제거 → 새 상태 인덱스에 추가, 보관 기간 지난 인덱스 항목 정리).
+    """
     try:
         rdb = _rdb()
         data["id"] = task_id
-        rdb.setex(f"tantan:task:{task_id}", ttl, json.dumps(data, ensure_ascii=False))
+        body = json.dumps(data, ensure_ascii=False)
         score = data.get("created_ts", time.time())
-        rdb.zadd("tantan:tasks:index", {task_id: score})
-        rdb.expire("tantan:tasks:index", ttl)
+        status = data.get("status", "")
+        task_key = f"tantan:task:{task_id}"
+
+        def _txn(pipe):
+            prev_raw = pipe.get(task_key)
+            prev_status = json.loads(prev_raw).get("status", "") if prev_raw else None
+            cutoff = time.time() - ttl
+            pipe.multi()
+            pipe.setex(task_key, ttl, body)
+            pipe.zadd(TASK_INDEX, {task_id: score})
+            pipe.zremrangebyscore(TASK_INDEX, "-inf", cutoff)
+            pipe.expire(TASK_INDEX, ttl)
+            if prev_status is not None and _status_index(prev_status) != _status_index(status):
+                pipe.zrem(_status_index(prev_status), task_id)
+            pipe.zadd(_status_index(status), {task_id: score})
+            pipe.zremrangebyscore(_status_index(status), "-inf", cutoff)
+            pipe.expire(_status_index(status), ttl)
+
+        rdb.transaction(_txn, task_key)
 
         # 일별 통계
         today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-        status = data.get("status", "")
         if status in ("completed", "Completed", "SUCCESS"):
             rdb.incr(f"tantan:stats:done:{today}")
             rdb.expire(f"tantan:stats:done:{today}", 30 * 86400)
@@ -626,16 +659,12 @@ async def system_health(admin: dict = Depends(verify_admin_jwt)):
     except Exception as e:
         checks["redis"] = {"ok": False, "msg": str(e)}
 
-    # 2. Celery 워커
-    try:
-        from media_worker.celery_app import app as celery_app
-        pong = celery_app.control.inspect(timeout=1.5).ping() or {}
-        if pong:
-            checks["celery_worker"] = {"ok": True, "msg": f"Workers: {list(pong.keys())}"}
-        else:
-            checks["celery_worker"] = {"ok": False, "msg": "No workers online"}
-    except Exception as e:
-        checks["celery_worker"] = {"ok": False, "msg": str(e)}
+    # 2. Celery 워커 (모니터 스냅샷)
+    alive = [h for h, w in worker_monitor.snapshot()["workers"].items() if w["alive"]]
+    if alive:
+        checks["celery_worker"] = {"ok": True, "msg": f"Workers: {alive}"}
+    else:
+        checks["celery_worker"] = {"ok": False, "msg": "No workers online"}
 
     # 3. FFmpeg (서버 로컬)
     try:
@@ -723,7 +752,7 @@ async def batch_status(_: str = Depends(verify_admin_jwt)):
         "soft_shutdown":  soft_shutdown,
         "count_today":    count_today,
         "pending_count":  pending_count,
-        "batch_limit":    35,
+        "batch_limit":    int(rdb.get("tantan:batch:planned_limit") or 0),
         "server_time_kst": now_kst.strftime("%H:%M:%S"),
         "next_batch_eta": eta_str,
         "schedule": {
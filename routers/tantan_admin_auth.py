@@ -19,11 +19,8 @@ _logger = logging.getLogger("tantan.admin_auth")
 admin_auth = APIRouter(prefix="/api/v1/admin", tags=["tantan-admin-auth"])
 
 # ── Redis 연결 (인증번호 임시 저장소) ──────────────────────────
-import redis
-_redis = redis.from_url(
-    os.environ.get("REDIS_URL", "redis://localhost:6379/1"),
-    decode_responses=True,
-)
+from services.redis_registry import get_redis
+_redis = get_redis(os.environ.get("REDIS_URL", "redis://localhost:6379/1"))
 
 # ── 인증번호 유효 시간 ─────────────────────────────────────────
 AUTH_CODE_TTL = 300  # 5분
@@ -11,10 +11,14 @@
   GET  /api/tantan/payment/fail     토스 실패 콜백
   GET  /api/tantan/admin/credits    관리자: 전체 크레딧 현황
   POST /api/tantan/admin/grant      관리자: 수동 크레딧 지급
+
+OTP 검증·소진 / 세션 확인·연장 / 크레딧 확인·차감 / 결제 지급은 Redis Lua 스크립트 1회 호출로 원자 처리
+(GET→DEL, GET→DECR 사이 경쟁으로 인한 OTP 재사용·크레딧 음수·중복 지급 방지, 왕복 횟수 축소)
+검증: python -m routers.tantan_payment --loadtest [동시 요청 수] [초기 크레딧]
 """
 from __future__ import annotations
 
-import base64, logging, os, random, string, uuid
+import asyncio, base64, logging, os, random, string, sys, time, uuid
 from datetime import datetime, timezone
 from typing import Optional
 
@@ -22,22 +26,18 @@ import httpx
 from fastapi import APIRouter, Header, HTTPException, Query, Request
 from fastapi.responses import HTMLResponse, JSONResponse
 from pydantic import BaseModel, Field
-import redis
 
 logger = logging.getLogger("tantan.payment")
 
 router = APIRouter(prefix="/api/tantan", tags=["tantan-payment"])
 
 # ── Redis 연결 ──────────────────────────────────────────────────
-_redis: Optional[redis.Redis] = None
+def _redis_url() -> str:
+    return os.environ.get("CELERY_RESULT_BACKEND", os.environ.get("REDIS_URL", "redis://localhost:6379/1"))
 
-def _get_redis() -> redis.Redis:
-    global _redis
-    if _redis is None:
-        url = os.environ.get("CELERY_RESULT_BACKEND",
-                             os.environ.get("REDIS_URL", "redis://localhost:6379/1"))
-        _redis = redis.from_url(url, decode_responses=True)
-    return _redis
+def _aredis():
+    from services.redis_registry import aget_redis
+    return aget_redis(_redis_url())
 
 # ── 상수 ────────────────────────────────────────────────────────
 PACKAGES = {
@@ -122,12 +122,60 @@ def _redis_key_session(token: str) -> str: return f"tantan:session:{token}"
 def _redis_key_payment(oid: str)   -> str: return f"tantan:payment:{oid}"
 
 
-def _verify_session(token: str) -> Optional[str]:
-    """세션 토큰 → 전화번호 반환. 유효하지 않으면 None."""
+# ── Lua 스크립트 (서버 측 원자 처리) ─────────────────────────────
+# OTP 검증 + 소진 + 세션 발급 + 잔여 크레딧 조회
+# KEYS: otp, session, credit / ARGV: 코드, 전화번호, 세션 TTL → {성공 여부, 크레딧}
+_LUA_OTP_VERIFY = """
+local stored = redis.call('GET', KEYS[1])
+if not stored or stored ~= ARGV[1] then return {0, 0} end
+redis.call('DEL', KEYS[1])
+redis.call('SET', KEYS[2], ARGV[2], 'EX', ARGV[3])
+return {1, tonumber(redis.call('GET', KEYS[3]) or '0')}
+"""
+
+# 세션 확인 + 만료 연장 + 크레딧 조회/차감 (ARGV[3] = 차감 수, 0 이면 조회만)
+# 크레딧 키는 세션 값(전화번호)에서 정해지므로 스크립트 안에서 조립 (단일 Redis 인스턴스 전제)
+# 연장은 남은 TTL 이 더 짧을 때만 (관리자 인증 세션(7일)을 24시간으로 줄이지 않음)
+# KEYS: session / ARGV: 크레딧 키 접두어, 세션 TTL, 차감 수
+# → {-1} 세션 없음 | {0, 잔여, 전화번호} 부족 | {1, 잔여, 전화번호} 성공
+_LUA_SESSION_CREDIT = """
+local phone = redis.call('GET', KEYS[1])
+if not phone then return {-1, 0, ''} end
+local ttl = tonumber(ARGV[2])
+if redis.call('TTL', KEYS[1]) < ttl then redis.call('EXPIRE', KEYS[1], ttl) end
+local ckey = ARGV[1] .. phone
+local n = tonumber(ARGV[3])
+local bal = tonumber(redis.call('GET', ckey) or '0')
+if n > 0 then
+  if bal < n then return {0, bal, phone} end
+  bal = redis.call('DECRBY', ckey, n)
+end
+return {1, bal, phone}
+"""
+
+# 결제 주문 소진 + 크레딧 지급 (중복 성공 콜백이 와도 1회만 지급)
+# KEYS: payment, credit / ARGV: 지급 수 → 지급 후 잔여, 이미 처리된 주문이면 -1
+_LUA_PAYMENT_GRANT = """
+if redis.call('DEL', KEYS[1]) == 0 then return -1 end
+return redis.call('INCRBY', KEYS[2], ARGV[1])
+"""
+
+
+async def _session_credit(token: str, use: int = 0):
+    """세션 확인·연장 + 크레딧 조회(use=0)/차감. 반환: (상태, 잔여, 전화번호) — 상태 -1 세션 없음, 0 부족, 1 성공"""
     if not token:
-        return None
-    rdb = _get_redis()
-    return rdb.get(_redis_key_session(token))
+        return -1, 0, None
+    from services.redis_registry import redis_registry
+    script = redis_registry.ascript(_LUA_SESSION_CREDIT, _redis_url())
+    status, credits, phone = await script(keys=[_redis_key_session(token)],
+                                          args=[_redis_key_credit(""), SESSION_EXPIRE, use])
+    return int(status), int(credits), phone or None
+
+
+async def _verify_session(token: str) -> Optional[str]:
+    """세션 토큰 → 전화번호 반환 (만료 연장). 유효하지 않으면 None."""
+    status, _, phone = await _session_credit(token)
+    return phone if status >= 0 else None
 
 
 # ── 요청 모델 ────────────────────────────────────────────────────
@@ -148,9 +196,9 @@ class PaymentPrepareReq(BaseModel):
 # ─────────────────────────────────────────────────────────────────
 @router.post("/otp/send")
 async def otp_send(req: OtpSendReq):
-    rdb  = _get_redis()
+    rdb  = _aredis()
     code = f"{random.randint(100000, 999999)}"
-    rdb.setex(_redis_key_otp(req.phone), OTP_EXPIRE, code)
+    await rdb.setex(_redis_key_otp(req.phone), OTP_EXPIRE, code)
     ok = _send_sms(req.phone, code)
     if not ok:
         raise HTTPException(503, "SMS 발송 실패. 잠시 후 다시 시도해주세요.")
@@ -166,17 +214,15 @@ async def otp_send(req: OtpSendReq):
 # ─────────────────────────────────────────────────────────────────
 @router.post("/otp/verify")
 async def otp_verify(req: OtpVerifyReq):
-    rdb      = _get_redis()
-    stored   = rdb.get(_redis_key_otp(req.phone))
-    if not stored or stored != req.code.strip():
+    from services.redis_registry import redis_registry
+    token  = str(uuid.uuid4())
+    script = redis_registry.ascript(_LUA_OTP_VERIFY, _redis_url())
+    # 검증과 소진(1회 사용 후 삭제)이 한 번에 → 같은 코드로 세션 2개 발급 불가
+    ok, credits = await script(
+        keys=[_redis_key_otp(req.phone), _redis_key_session(token), _redis_key_credit(req.phone)],
+        args=[req.code.strip(), req.phone, SESSION_EXPIRE])
+    if not ok:
         raise HTTPException(401, "인증번호가 올바르지 않거나 만료됐습니다.")
-
-    rdb.delete(_redis_key_otp(req.phone))  # 1회 사용 후 삭제
-
-    token = str(uuid.uuid4())
-    rdb.setex(_redis_key_session(token), SESSION_EXPIRE, req.phone)
-
-    credits = int(rdb.get(_redis_key_credit(req.phone)) or 0)
     return {"success": True, "session_token": token, "credits": credits}
 
 
@@ -185,11 +231,9 @@ async def otp_verify(req: OtpVerifyReq):
 # ─────────────────────────────────────────────────────────────────
 @router.get("/credit")
 async def get_credit(x_session_token: str = Header(default="")):
-    phone = _verify_session(x_session_token)
-    if not phone:
+    status, credits, phone = await _session_credit(x_session_token)
+    if status < 0:
         raise HTTPException(401, "인증이 필요합니다.")
-    rdb     = _get_redis()
-    credits = int(rdb.get(_redis_key_credit(phone)) or 0)
     return {"phone": phone[-4:], "credits": credits}
 
 
@@ -198,14 +242,11 @@ async def get_credit(x_session_token: str = Header(default="")):
 # ─────────────────────────────────────────────────────────────────
 @router.post("/credit/use")
 async def use_credit(x_session_token: str = Header(default="")):
-    phone = _verify_session(x_session_token)
-    if not phone:
+    status, new_credits, phone = await _session_credit(x_session_token, use=1)
+    if status < 0:
         raise HTTPException(401, "인증이 필요합니다.")
-    rdb     = _get_redis()
-    credits = int(rdb.get(_redis_key_credit(phone)) or 0)
-    if credits <= 0:
+    if status == 0:
         raise HTTPException(402, "크레딧이 부족합니다. 먼저 구매해주세요.")
-    new_credits = rdb.decr(_redis_key_credit(phone))
     logger.info(f"크레딧 차감: {phone} → 잔여 {new_credits}개")
     return {"success": True, "remaining": new_credits}
 
@@ -216,7 +257,7 @@ async def use_credit(x_session_token: str = Header(default="")):
 @router.post("/payment/prepare")
 async def payment_prepare(req: PaymentPrepareReq,
                            x_session_token: str = Header(default="")):
-    phone = _verify_session(x_session_token)
+    phone = await _verify_session(x_session_token)
     if not phone:
         raise HTTPException(401, "인증이 필요합니다.")
     if req.package_id not in PACKAGES:
@@ -225,8 +266,7 @@ async def payment_prepare(req: PaymentPrepareReq,
     pkg      = PACKAGES[req.package_id]
     order_id = f"TT-{uuid.uuid4().hex[:12].upper()}"
 
-    rdb = _get_redis()
-    rdb.setex(_redis_key_payment(order_id), 3600, f"{phone}|{req.package_id}")
+    await _aredis().setex(_redis_key_payment(order_id), 3600, f"{phone}|{req.package_id}")
 
     return {
         "order_id":    order_id,
@@ -247,8 +287,7 @@ async def payment_success(
     orderId:    str = Query(...),
     amount:     int = Query(...),
 ):
-    rdb      = _get_redis()
-    meta     = rdb.get(_redis_key_payment(orderId))
+    meta     = await _aredis().get(_redis_key_payment(orderId))
     if not meta:
         return _result_html(False, "주문 정보를 찾을 수 없습니다.")
 
@@ -273,9 +312,13 @@ async def payment_success(
     except Exception as e:
         return _result_html(False, str(e))
 
-    # 크레딧 지급
-    new_credits = rdb.incrby(_redis_key_credit(phone), pkg["credits"])
-    rdb.delete(_redis_key_payment(orderId))
+    # 크레딧 지급 (주문 소진과 원자 처리)
+    from services.redis_registry import redis_registry
+    grant = redis_registry.ascript(_LUA_PAYMENT_GRANT, _redis_url())
+    new_credits = await grant(keys=[_redis_key_payment(orderId), _redis_key_credit(phone)],
+                              args=[pkg["credits"]])
+    if new_credits < 0:
+        return _result_html(False, "이미 처리된 주문입니다.")
     logger.info(f"결제 완료: {phone} +{pkg['credits']}크레딧 (주문:{orderId})")
 
     return _result_html(True, f"{pkg['label']} 구매 완료! 잔여 크레딧: {new_credits}개",
@@ -297,13 +340,10 @@ async def payment_fail(code: str = "", message: str = ""):
 async def admin_credits(secret: str = Query(...)):
     if secret != ADMIN_SECRET:
         raise HTTPException(403, "관리자 권한 없음")
-    rdb  = _get_redis()
-    keys = rdb.keys("tantan:credit:*")
-    data = []
-    for k in sorted(keys):
-        phone   = k.replace("tantan:credit:", "")
-        credits = int(rdb.get(k) or 0)
-        data.append({"phone": phone, "credits": credits})
+    rdb  = _aredis()
+    keys = sorted([k async for k in rdb.scan_iter(match="tantan:credit:*", count=500)])
+    vals = await rdb.mget(keys) if keys else []
+    data = [{"phone": k.replace("tantan:credit:", ""), "credits": int(v or 0)} for k, v in zip(keys, vals)]
     return {"total_users": len(data), "users": data}
 
 
@@ -319,8 +359,7 @@ class GrantReq(BaseModel):
 async def admin_grant(req: GrantReq):
     if req.secret != ADMIN_SECRET:
         raise HTTPException(403, "관리자 권한 없음")
-    rdb         = _get_redis()
-    new_credits = rdb.incrby(_redis_key_credit(req.phone), req.credits)
+    new_credits = await _aredis().incrby(_redis_key_credit(req.phone), req.credits)
     logger.info(f"[관리자] {req.phone} +{req.credits}크레딧 수동 지급 → 잔여 {new_credits}")
     return {"success": True, "phone": req.phone, "total_credits": new_credits}
 
@@ -356,3 +395,59 @@ def _result_html(success: bool, message: str, credits: int = 0) -> HTMLResponse:
   }}
 </script>
 </body></html>""")
+
+
+# ─────────────────────────────────────────────────────────────────
+# 부하 테스트: 동시 /credit/use 크레딧 정산 검증
+#   python -m routers.tantan_payment --loadtest [동시 요청 수] [초기 크레딧]
+#   REDIS_URL(또는 CELERY_RESULT_BACKEND) 의 Redis 에 임시 세션·크레딧 키를 만들고 끝나면 삭제
+# ─────────────────────────────────────────────────────────────────
+async def _loadtest(n: int = 500, credits: int = 300) -> bool:
+    from fastapi import FastAPI
+    from services.redis_registry import redis_registry
+
+    app   = FastAPI()
+    app.include_router(router)
+    phone = f"loadtest-{uuid.uuid4().hex[:8]}"
+    token = f"loadtest-{uuid.uuid4().hex}"
+    rdb   = _aredis()
+    await rdb.set(_redis_key_credit(phone), credits)
+    await rdb.setex(_redis_key_session(token), SESSION_EXPIRE, phone)
+
+    async def one(client):
+        started = time.perf_counter()
+        resp = await client.post("/api/tantan/credit/use", headers={"x-session-token": token})
+        return resp.status_code, resp.json(), (time.perf_counter() - started) * 1000
+
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as client:
+            started = time.perf_counter()
+            results = await asyncio.gather(*(one(client) for _ in range(n)))
+            elapsed = time.perf_counter() - started
+        final = int(await rdb.get(_redis_key_credit(phone)) or 0)
+    finally:
+        await rdb.delete(_redis_key_credit(phone), _redis_key_session(token))
+        await redis_registry.aclose()
+
+    used      = [body["remaining"] for code, body, _ in results if code == 200]
+    rejected  = sum(1 for code, _, _ in results if code == 402)
+    other     = n - len(used) - rejected
+    expected  = min(n, credits)
+    # 정확한 정산: 성공 수 = min(요청, 크레딧), 잔여 = 초기 - 성공, 응답 잔여값은 모두 다름(중복 차감 없음)
+    exact = (len(used) == expected and final == credits - expected and other == 0
+             and sorted(used) == list(range(credits - expected, credits)))
+    lat = sorted(ms for _, _, ms in results)
+    print(f"[loadtest] 동시 {n}건 | 초기 {credits} | 성공 {len(used)} | 부족(402) {rejected} | 기타 {other} "
+          f"| 최종 잔여 {final} | {elapsed:.2f}s")
+    calls = sum(m["commands"] for m in redis_registry.stats().values())
+    print(f"[loadtest] 지연 p50 {lat[len(lat) // 2]:.1f}ms · p95 {lat[int(len(lat) * 0.95)]:.1f}ms "
+          f"| Redis 명령 {calls}회 (요청당 {calls / n:.2f})")
+    print(f"[loadtest] {'OK' if exact else 'FAIL'}")
+    return exact
+
+
+if __name__ == "__main__":
+    if "--loadtest" in sys.argv:
+        rest = [int(a) for a in sys.argv[sys.argv.index("--loadtest") + 1:] if a.isdigit()]
+        sys.exit(0 if asyncio.run(_loadtest(*rest[:2])) else 1)
@@ -0,0 +1,296 @@
+"""
+송장 발급 워커 (Waybill Worker)
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+citizen.process_rosen_waybill_queue 의 실제 처리부.
+
+기존 방식: BackgroundTasks 안에서 패키지 1개씩 직렬 접수, 재시도 사이 time.sleep(5)
+          (이벤트 루프 전체가 5초씩 멈춤), 알림톡은 주문마다 동기 발송
+변경 방식:
+  1. 큐      — asyncio.Queue + 고정 워커 태스크 N개 (WAYBILL_WORKERS, 기본 4)
+               요청 핸들러는 submit() 으로 넣기만 하고 즉시 반환
+  2. 패키지  — 주문 내 패키지를 세마포어(WAYBILL_PACKAGE_CONCURRENCY, 기본 3)로 동시 접수
+               재시도 대기는 await asyncio.sleep (지수 백오프 + 지터)
+  3. 알림톡  — 완료/실패 알림을 모아 NOTIFY_FLUSH_SEC 마다 send-many 1회로 발송
+  4. 지표    — 큐 깊이, 처리 중 건수, 성공/실패 수, 주문당 처리 시간(p50/p95) → stats()
+  5. 복구    — 투입 내역을 delivery_orders.waybill_job 에 저장, 시작 시 + RESCAN_SEC 마다
+               REQUESTED 로 남은 주문을 다시 큐에 투입 (재시작/크래시로 잃은 큐 복구)
+               로젠 계정은 저장하지 않고 재투입 시 매장 설정에서 다시 읽음
+"""
+
+from __future__ import annotations
+import asyncio, json, logging, os, random, time
+from collections import deque
+from datetime import datetime
+
+import db_manager as db
+
+logger = logging.getLogger("tantan.waybill")
+
+# ── 워커 상수 ────────────────────────────────────────────────────
+WORKERS             = int(os.environ.get("WAYBILL_WORKERS", "4"))
+PACKAGE_CONCURRENCY = int(os.environ.get("WAYBILL_PACKAGE_CONCURRENCY", "3"))
+MAX_RETRIES         = 3
+BACKOFF_BASE_SEC    = 2.0            # 2s → 4s (+ 0~1s 지터)
+NOTIFY_FLUSH_SEC    = 2.0
+NOTIFY_BATCH        = 50
+LATENCY_SAMPLES     = 200
+RESCAN_SEC          = float(os.environ.get("WAYBILL_RESCAN_SEC", "60"))
+RESCAN_GRACE_SEC    = 120.0          # 방금 투입된 주문(다른 프로세스 큐에 있을 수 있음)은 건너뜀
+RESCAN_LIMIT        = 200
+
+DEFAULT_PACKAGE = {"type": "박스", "weight": 5.0, "size": "소형", "box_type": "1", "weight_code": "05",
+                   "contents": "일반 택배", "price": 10000, "fee": 5000, "is_prepaid": True}
+
+
+class WaybillWorker:
+    def __init__(self, workers: int = WORKERS, package_concurrency: int = PACKAGE_CONCURRENCY):
+        self.workers = workers
+        self.package_concurrency = package_concurrency
+        self._queue: asyncio.Queue | None = None
+        self._notify: asyncio.Queue | None = None
+        self._tasks: list = []
+        self._pending: set = set()          # 이 프로세스 큐에 있거나 처리 중인 order_id
+        self._in_flight = 0
+        self._latency = deque(maxlen=LATENCY_SAMPLES)
+        self._wait = deque(maxlen=LATENCY_SAMPLES)
+        self.counters = {"submitted": 0, "succeeded": 0, "failed": 0, "skipped": 0,
+                         "packages_ok": 0, "packages_failed": 0, "retries": 0,
+                         "notified": 0, "notify_failed": 0, "recovered": 0}
+
+    # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+    # 수명 주기
+    # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+    def _ensure_started(self):
+        if self._tasks and not all(t.done() for t in self._tasks):
+            return
+        loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._notify = asyncio.Queue()
+        self._tasks = [loop.create_task(self._worker_loop(i)) for i in range(self.workers)]
+        self._tasks.append(loop.create_task(self._notify_loop()))
+        self._tasks.append(loop.create_task(self._rescan_loop()))
+        logger.info(f"[Waybill] 워커 {self.workers}개 시작 (패키지 동시 {self.package_concurrency})")
+
+    def start(self):
+        """앱 시작 시 (lifespan) — 워커 기동 + REQUESTED 주문 재투입 루프 시작."""
+        self._ensure_started()
+
+    async def stop(self, drain_timeout: float = 10.0):
+        """앱 종료 시 — 남은 큐를 drain_timeout 동안 처리한 뒤 중단."""
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"[Waybill] 종료 시 미처리 {self._queue.qsize()}건 (REQUESTED/PROCESSING 상태로 남음)")
+        await self._flush_notifications(drain=True)
+        for t in self._tasks:
+            t.cancel()
+        self._tasks = []
+
+    # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+    # 투입
+    # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+    async def submit(self, order_id: str, store_id: str, sender_dict: dict, receiver_dict: dict,
+                     memo: str, logen_id: str, logen_pw: str, packages_list: list = None):
+        """비차단 투입 — 투입 내역을 DB 에 남기고 큐에 넣음. 실제 접수는 워커 태스크가 처리."""
+        self._ensure_started()
+        self.counters["submitted"] += 1
+        packages = packages_list or [dict(DEFAULT_PACKAGE)]
+        spec = {"store_id": store_id, "sender": sender_dict, "receiver": receiver_dict,
+                "packages": packages, "memo": memo, "submitted_at": time.time()}
+        try:
+            await asyncio.to_thread(db.save_waybill_job, order_id, json.dumps(spec, ensure_ascii=False))
+        except Exception as e:
+            logger.warning(f"[Waybill] Order {order_id} 투입 내역 저장 실패 (재시작 시 복구 불가): {e}")
+        await self._enqueue(order_id, store_id, sender_dict, receiver_dict, packages, memo, logen_id, logen_pw)
+
+    async def _enqueue(self, order_id, store_id, sender, receiver, packages, memo, logen_id, logen_pw):
+        self._pending.add(order_id)
+        await self._queue.put({
+            "order_id": order_id, "store_id": store_id,
+            "sender": sender, "receiver": receiver, "packages": packages,
+            "memo": memo, "logen_id": logen_id, "logen_pw": logen_pw,
+            "queued_at": time.monotonic(),
+        })
+
+    # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+    # 복구 (REQUESTED 재투입)
+    # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+    @staticmethod
+    def _logen_credentials(store_id: str):
+        """citizen 접수 경로와 같은 방식으로 매장 설정에서 로젠 계정 조회."""
+        settings = (db.get_store_settings(store_id) if hasattr(db, "get_store_settings") else {}) or {}
+        return (settings.get("logen_id") or settings.get("courier_id") or "",
+                settings.get("logen_pw") or settings.get("courier_pw") or "")
+
+    async def _rescan(self) -> int:
+        """REQUESTED 로 남은 주문 중 이 프로세스 큐에 없는 것을 다시 투입. 반환: 재투입 건수"""
+        import logen_delivery
+        rows = await asyncio.to_thread(db.get_requested_waybill_jobs, RESCAN_LIMIT)
+        now, recovered = time.time(), 0
+        for row in rows:
+            order_id = row["order_id"]
+            if order_id in self._pending:
+                continue
+            try:
+                spec = json.loads(row["waybill_job"])
+            except (TypeError, ValueError):
+                logger.warning(f"[Waybill] Order {order_id} 투입 내역 손상 — 재투입 건너뜀")
+                continue
+            if now - float(spec.get("submitted_at") or 0) < RESCAN_GRACE_SEC:
+                continue
+            logen_id, logen_pw = await asyncio.to_thread(self._logen_credentials, spec["store_id"])
+            logen_delivery.USE_REAL_API = True
+            await self._enqueue(order_id, spec["store_id"], spec["sender"], spec["receiver"],
+                                spec.get("packages") or [dict(DEFAULT_PACKAGE)], spec.get("memo", ""),
+                                logen_id, logen_pw)
+            recovered += 1
+        if recovered:
+            self.counters["recovered"] += recovered
+            logger.info(f"[Waybill] REQUESTED 주문 {recovered}건 재투입")
+        return recovered
+
+    async def _rescan_loop(self):
+        while True:
+            try:
+                await self._rescan()
+            except Exception as e:
+                logger.error(f"[Waybill] REQUESTED 재투입 스캔 오류: {e}")
+            await asyncio.sleep(RESCAN_SEC)
+
+    # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+    # 처리
+    # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+    async def _worker_loop(self, idx: int):
+        while True:
+            job = await self._queue.get()
+            self._in_flight += 1
+            started = time.monotonic()
+            self._wait.append(started - job["queued_at"])
+            try:
+                await self._process(job)
+            except Exception as e:
+                logger.exception(f"[Waybill] worker-{idx} 주문 {job['order_id']} 처리 오류: {e}")
+            finally:
+                self._latency.append(time.monotonic() - started)
+                self._in_flight -= 1
+                self._pending.discard(job["order_id"])
+                self._queue.task_done()
+
+    async def _reserve_package(self, job: dict, pkg_idx: int, pkg: dict, sem: asyncio.Semaphore):
+        """패키지 1개 접수 (재시도 포함). 반환: (운송장번호 | None, 마지막 오류)"""
+        import logen_delivery
+        order_id, total = job["order_id"], len(job["packages"])
+        err = None
+        async with sem:
+            for attempt in range(1, MAX_RETRIES + 1):
+                logger.info(f"[Waybill] Pkg {pkg_idx+1}/{total} | Attempt {attempt} | Order {order_id}")
+                try:
+                    res_data, err = await asyncio.to_thread(
+                        logen_delivery.create_delivery_reservation,
+                        sender=job["sender"], receiver=job["receiver"], package=pkg,
+                        pickup_date=datetime.now().strftime("%Y-%m-%d"),
+                        memo=job["memo"], agent_id=job["logen_id"], agent_pw=job["logen_pw"],
+                    )
+                    if not err and isinstance(res_data, dict) and res_data.get("waybill_number"):
+                        return res_data["waybill_number"], None
+                except Exception as ex:
+                    err = str(ex)
+                logger.warning(f"[Waybill] Attempt {attempt} failed: {err or 'Unknown error'}")
+                if attempt < MAX_RETRIES:
+                    self.counters["retries"] += 1
+                    await asyncio.sleep(BACKOFF_BASE_SEC * 2 ** (attempt - 1) + random.random())
+        return None, err
+
+    async def _process(self, job: dict):
+        order_id = job["order_id"]
+
+        # 멱등성 보장
+        locked = await asyncio.to_thread(db.acquire_delivery_order_lock, order_id)
+        if not locked:
+            logger.info(f"[Waybill] Order {order_id} is already PROCESSING or completed. Skipping.")
+            self.counters["skipped"] += 1
+            return
+
+        sem = asyncio.Semaphore(self.package_concurrency)
+        results = await asyncio.gather(*(self._reserve_package(job, i, pkg, sem)
+                                         for i, pkg in enumerate(job["packages"])))
+        # 패키지 순서대로 운송장 나열 (완료 순서와 무관)
+        waybills = [w for w, _ in results if w]
+        last_err = next((e for w, e in reversed(results) if not w and e), None)
+        self.counters["packages_ok"] += len(waybills)
+        self.counters["packages_failed"] += len(results) - len(waybills)
+
+        sender_phone = job["sender"].get("phone")
+        sender_name = job["sender"].get("name")
+        if waybills:
+            waybill_summary = ", ".join(waybills)
+            await asyncio.to_thread(db.update_delivery_order_status, order_id, 'SUCCESS',
+                                    waybill_number=waybill_summary)
+            self.counters["succeeded"] += 1
+            self._notify.put_nowait({
+                "to_phone": sender_phone,
+                "message": f"[송장 접수 알림]\n{sender_name}님, 송장번호({waybill_summary})로 접수되었습니다.\n*기사님 대시보드에 알림이 전송되었습니다.",
+                "template_id": "tmp_courier",
+                "variables": {"#{name}": sender_name, "#{track}": waybill_summary},
+            })
+        else:
+            logger.error(f"[Waybill] All packages failed for order {order_id}. Storing in Dead Letter Box.")
+            await asyncio.to_thread(db.update_delivery_order_status, order_id, 'FAILED',
+                                    error_message=last_err or "로젠 API 최종 응답 실패")
+            self.counters["failed"] += 1
+            self._notify.put_nowait({
+                "to_phone": sender_phone,
+                "message": f"[접수 실패 알림]\n{sender_name}님, 택배 접수가 일시적인 오류로 실패했습니다. 관리자가 확인 후 수동 재처리해 드리겠습니다. (주문번호: {order_id})",
+                "template_id": "tmp_fail_alert",
+                "variables": {"#{name}": sender_name, "#{orderId}": order_id},
+            })
+
+    # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+    # 알림톡 묶음 발송
+    # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+    async def _flush_notifications(self, drain: bool = False):
+        batch = []
+        while not self._notify.empty() and (drain or len(batch) < NOTIFY_BATCH):
+            batch.append(self._notify.get_nowait())
+        if not batch:
+            return
+        import sms_manager
+        try:
+            ok, failed = await asyncio.to_thread(sms_manager.send_alimtalk_many, batch)
+        except Exception as e:
+            logger.error(f"[Waybill] Alimtalk batch error: {e}")
+            ok, failed = 0, len(batch)
+        self.counters["notified"] += ok
+        self.counters["notify_failed"] += failed
+
+    async def _notify_loop(self):
+        while True:
+            await asyncio.sleep(NOTIFY_FLUSH_SEC)
+            await self._flush_notifications()
+
+    # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+    # 지표
+    # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+    @staticmethod
+    def _pct(samples, q):
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 3)
+
+    def stats(self) -> dict:
+        return {
+            "running": bool(self._tasks),
+            "workers": self.workers,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "in_flight": self._in_flight,
+            "notify_pending": self._notify.qsize() if self._notify else 0,
+            "latency_sec": {"p50": self._pct(self._latency, 0.5), "p95": self._pct(self._latency, 0.95)},
+            "queue_wait_sec": {"p50": self._pct(self._wait, 0.5), "p95": self._pct(self._wait, 0.95)},
+            **self.counters,
+        }
+
+
+waybill_worker = WaybillWorker()
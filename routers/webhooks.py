@@ -344,12 +344,14 @@ async def android_app_webhook(request: Request, background_tasks: BackgroundTask
     except Exception as _le:
         print(f"[BlackBox] 초기 기록 실패: {_le}")
 
-    def _log(stage, result_msg='', sms_sent=0, auth_ok=None):
+    def _log(stage, result_msg='', sms_sent=0, auth_ok=None, token=None):
         """처리 단계 업데이트 헬퍼"""
         try:
             kw = dict(stage=stage, result_msg=result_msg, sms_sent=sms_sent)
             if auth_ok is not None:
                 kw['auth_ok'] = auth_ok
+            if token:
+                kw['token'] = token
             db.update_webhook_log(_log_id, **kw)
         except Exception:
             pass
@@ -364,17 +366,8 @@ async def android_app_webhook(request: Request, background_tasks: BackgroundTask
     valid_tokens = {t for t in [_primary, _backup] if t}
 
     if token and token not in valid_tokens:
-        _log('AUTH_FAIL', f'인증 토큰 불일치 (수신: {token[:10]}...)', auth_ok=0)
-        # ★ AUTH_FAIL 발생 즉시 관리자에게 SMS 경보
-        try:
-            admin_phone = os.environ.get("ADMIN_ALERT_PHONE", "01023847447")
-            sms.send_cloud_sms(
-                admin_phone,
-                f"[동네비서 경보] 콜백 인증 실패!\n수신 토큰: {token[:12]}...\nIP: {source_ip}\n→ 앱 토큰이 서버와 달라졌습니다. 즉시 확인 필요.",
-                store_id="SYSTEM"
-            )
-        except Exception:
-            pass
+        # ★ AUTH_FAIL 관리자 경보는 보안 이상 감지기가 담당 (토큰별 첫 건 즉시, 이후 30분 묶음)
+        _log('AUTH_FAIL', f'인증 토큰 불일치 (수신: {token[:10]}...)', auth_ok=0, token=token[:12])
         raise HTTPException(status_code=401, detail="Unauthorized")
     _log('RECEIVED', '인증 통과', auth_ok=1)
 
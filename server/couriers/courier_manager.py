@@ -1,15 +1,25 @@
 import logging
 import asyncio
+import sys
+from pathlib import Path
 from typing import Dict, Any, List
 
+# config / services.tracking_gateway 는 저장소 루트 모듈 — server/ 기준으로 로드될 때도 찾을 수 있도록
+# 루트를 sys.path 뒤쪽에 추가 (server/ 쪽 routers 등을 가리지 않게 append)
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+from config import get_secret
+from services.tracking_gateway import tracking_gateway
+
+# 임포트 경로가 sys.path에 의해 server/ 폴더 기준일 경우 대비
 try:
-    from config import get_secret
     from schemas.courier_schema import DongnaeBiseoStandardSchema, DongnaeBiseoTrackingSchema
     from couriers.logen_adapter import LogenAdapter
     from couriers.mock_adapters import CoupangAdapter, LotteAdapter, CjAdapter
     from couriers.hanjin_adapter import HanjinAdapter
 except ModuleNotFoundError:
-    from server.config import get_secret
     from server.schemas.courier_schema import DongnaeBiseoStandardSchema, DongnaeBiseoTrackingSchema
     from server.couriers.logen_adapter import LogenAdapter
     from server.couriers.mock_adapters import CoupangAdapter, LotteAdapter, CjAdapter
@@ -97,17 +107,19 @@ class CourierManager:
         병렬 비동기 추적 (Asynchronous Parallel Processing)
         tracking_requests = [{"carrier": "LOGEN", "tracking_no": "123"}, {"carrier": "COUPANG", "tracking_no": "456"}]
         응답이 느린 API가 있어도 gather를 통해 영향을 분산시킵니다.
+        같은 (택배사, 송장) 요청은 1회만 조회하며, 다른 요청이 이미 조회 중이면 그 결과를 공유합니다.
         """
-        async def fetch_single(req):
-            courier = req.get("carrier", "").upper()
-            t_no = req.get("tracking_no")
+        async def fetch_single(courier, t_no):
             adapter = self.adapters.get(courier)
             if not adapter:
                 return Exception(f"Unknown courier {courier}")
-            return await adapter.get_tracking_status(t_no)
+            return await tracking_gateway.coalesce(
+                f"adapter:{courier}:{t_no}", lambda: adapter.get_tracking_status(t_no))
 
-        tasks = [fetch_single(req) for req in tracking_requests]
+        keys = [(req.get("carrier", "").upper(), req.get("tracking_no")) for req in tracking_requests]
+        unique = list(dict.fromkeys(keys))
         # return_exceptions=True 로 한 API 오류가 전체 응답 취소를 일으키는 상황 방지
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        return results
+        results = await asyncio.gather(*(fetch_single(c, t) for c, t in unique), return_exceptions=True)
+        by_key = dict(zip(unique, results))
+        return [by_key[k] for k in keys]
 
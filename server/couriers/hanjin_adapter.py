@@ -13,7 +13,7 @@ try:
     from couriers.base_adapter import BaseCourierAdapter
     from couriers.hanjin_offline_queue import push_to_queue, get_pending_requests, mark_success, increment_retry
 except ModuleNotFoundError:
-    from server.config import get_secret
+    from config import get_secret
     from server.schemas.courier_schema import DongnaeBiseoStandardSchema, DongnaeBiseoTrackingSchema
     from server.couriers.base_adapter import BaseCourierAdapter
     from server.couriers.hanjin_offline_queue import push_to_queue, get_pending_requests, mark_success, increment_retry
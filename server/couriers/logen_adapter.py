@@ -7,7 +7,7 @@ try:
     from schemas.courier_schema import DongnaeBiseoStandardSchema, DongnaeBiseoTrackingSchema
     from couriers.base_adapter import BaseCourierAdapter
 except ModuleNotFoundError:
-    from server.config import get_secret
+    from config import get_secret
     from server.schemas.courier_schema import DongnaeBiseoStandardSchema, DongnaeBiseoTrackingSchema
     from server.couriers.base_adapter import BaseCourierAdapter
 
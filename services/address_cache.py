@@ -0,0 +1,349 @@
+"""
+🏠 주소 정제 캐시 + 배치 지오코더 (카카오 Local API)
+
+- 정규화 키: 공백/쉼표 정리 + 소문자 → 같은 주소의 표기 차이를 하나로 묶음
+- L1 = 프로세스 메모리 LRU, L2 = ai_store.db 의 address_resolution_cache (영구)
+  성공 결과는 90일, 실패 결과는 1일 보관 (잘못된 주소로 API 반복 호출 방지)
+- 시드: address_correction_log (frequency >= 2) 의 오답→정답 쌍을 별칭으로 적재,
+        customer_address_book 최근 주소를 백그라운드로 미리 정제 (앱 시작 시 warm(), sqlite 는 스레드에서)
+- 별칭이 있는 주소는 조회·저장 모두 정답 주소의 키를 사용 (오답 표기로 다시 들어와도 캐시 적중)
+- 동일 주소 동시 조회는 1회만 호출 (요청 병합), 대량 접수는 resolve_many 로 동시성 제한 일괄 처리
+- 비동기 경로(resolve)의 sqlite 조회/저장은 asyncio.to_thread 로 실행 (이벤트 루프 비차단)
+- stats(): L1/L2/별칭 적중, API 호출 수, 적중률
+"""
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import httpx
+
+from logger import logger
+
+KAKAO_ADDRESS_URL = "https://dapi.kakao.com/v2/local/search/address.json"
+DB_PATH = Path(__file__).parent.parent / "ai_store.db"
+
+SUCCESS_TTL_SEC = 90 * 86400
+FAILURE_TTL_SEC = 86400
+L1_MAX_ENTRIES = 5000
+BATCH_CONCURRENCY = 8
+SEED_PREFETCH_LIMIT = 300
+
+_WS_RE = re.compile(r"[\s,]+")
+
+
+def normalize_address_key(address: str) -> str:
+    """'서울  강남구,테헤란로 1' → '서울 강남구 테헤란로 1'"""
+    return _WS_RE.sub(" ", (address or "").strip()).lower()
+
+
+def _failure(address: str) -> dict:
+    return {"success": False, "road_address": address, "postcode": "", "jibun_address": address, "detail": ""}
+
+
+def build_result(docs: list, address: str, detail: str) -> dict:
+    """카카오 API 결과 doc → {success, road_address, postcode, jibun_address, detail}"""
+    doc   = docs[0]
+    road  = doc.get("road_address") or {}
+    jibun = doc.get("address")       or {}
+    road_name  = (road.get("address_name") or "").strip()
+    postcode   = (road.get("zone_no") or jibun.get("zip_code") or "").strip()
+    jibun_name = (jibun.get("address_name") or "").strip()
+    return {
+        "success":       True,
+        "road_address":  road_name or jibun_name or address,
+        "postcode":      postcode,
+        "jibun_address": jibun_name,
+        "detail":        detail,
+    }
+
+
+def candidate_queries(address: str):
+    """
+    3단계 검색어 후보 [(query, detail)]
+      Step A: 원본 전체
+      Step B: '동+숫자+길' → '로+숫자+길' 패턴 교정 (예: "봉곡동 15길" → "봉곡로 15길")
+      Step C: 공백 기준으로 뒤 단어를 하나씩 제거 → 제거된 단어들은 상세주소 힌트
+    """
+    yield address, ""
+    corrected = re.sub(r'(\S+)동(\s*\d+\s*길)', r'\1로\2', address)
+    if corrected != address:
+        yield corrected, ""
+    words = corrected.split()
+    for i in range(len(words) - 1, 0, -1):
+        query = " ".join(words[:i])
+        if len(query.strip()) < 4:
+            break
+        yield query, " ".join(words[i:])
+
+
+class AddressCache:
+    def __init__(self, db_path=DB_PATH):
+        self.db_path = str(db_path)
+        self._l1 = OrderedDict()   # key → (expires_at, result)
+        self._aliases = {}         # 오답 키 → 정답 주소
+        self._lock = threading.Lock()
+        self._inflight = {}        # (loop id, key) → Future
+        self._client = None        # 공용 커넥션 풀 (앱 이벤트 루프 전용)
+        self._table_ready = False
+        self._seeded = False
+        self.metrics = {"l1_hit": 0, "db_hit": 0, "alias_hit": 0, "miss": 0,
+                        "api_calls": 0, "coalesced": 0, "stored": 0}
+
+    def _http(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(6.0, connect=3.0),
+                limits=httpx.Limits(max_keepalive_connections=10, max_connections=20),
+            )
+        return self._client
+
+    # ── 영구 저장소 ─────────────────────────────────────────────
+    def _conn(self):
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        conn.row_factory = sqlite3.Row
+        if not self._table_ready:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS address_resolution_cache (
+                    norm_key     TEXT PRIMARY KEY,
+                    result_json  TEXT NOT NULL,
+                    success      INTEGER NOT NULL,
+                    hits         INTEGER DEFAULT 0,
+                    expires_at   REAL NOT NULL,
+                    updated_at   TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            conn.commit()
+            self._table_ready = True
+        return conn
+
+    def _l1_put(self, key, result, expires_at):
+        with self._lock:
+            self._l1[key] = (expires_at, result)
+            self._l1.move_to_end(key)
+            while len(self._l1) > L1_MAX_ENTRIES:
+                self._l1.popitem(last=False)
+
+    def _key(self, address: str, count_alias: bool = False) -> str:
+        """캐시 키 — 별칭이 있으면 정답 주소의 정규화 키 (get/put/요청 병합 공통)."""
+        key = normalize_address_key(address)
+        alias = self._aliases.get(key) if key else None
+        if alias:
+            if count_alias:
+                self.metrics["alias_hit"] += 1
+            return normalize_address_key(alias)
+        return key
+
+    def get(self, address: str):
+        """캐시 조회 (별칭 적용). 없으면 None."""
+        key = self._key(address, count_alias=True)
+        if not key:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._l1.get(key)
+            if entry and entry[0] > now:
+                self._l1.move_to_end(key)
+                self.metrics["l1_hit"] += 1
+                return dict(entry[1])
+        try:
+            conn = self._conn()
+            row = conn.execute("SELECT result_json, expires_at FROM address_resolution_cache WHERE norm_key = ?",
+                               (key,)).fetchone()
+            if row and row["expires_at"] > now:
+                conn.execute("UPDATE address_resolution_cache SET hits = hits + 1 WHERE norm_key = ?", (key,))
+                conn.commit()
+                conn.close()
+                result = json.loads(row["result_json"])
+                self._l1_put(key, result, row["expires_at"])
+                self.metrics["db_hit"] += 1
+                return dict(result)
+            conn.close()
+        except Exception as e:
+            logger.debug(f"address_cache 조회 오류 | {e}")
+        self.metrics["miss"] += 1
+        return None
+
+    def put(self, address: str, result: dict):
+        """결과 저장 (별칭 적용 — get 과 같은 키)."""
+        key = self._key(address)
+        if not key:
+            return
+        expires_at = time.time() + (SUCCESS_TTL_SEC if result.get("success") else FAILURE_TTL_SEC)
+        self._l1_put(key, result, expires_at)
+        try:
+            conn = self._conn()
+            conn.execute("""
+                INSERT INTO address_resolution_cache (norm_key, result_json, success, expires_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(norm_key) DO UPDATE SET
+                    result_json = excluded.result_json,
+                    success     = excluded.success,
+                    expires_at  = excluded.expires_at,
+                    updated_at  = CURRENT_TIMESTAMP
+            """, (key, json.dumps(result, ensure_ascii=False), 1 if result.get("success") else 0, expires_at))
+            conn.commit()
+            conn.close()
+            self.metrics["stored"] += 1
+        except Exception as e:
+            logger.debug(f"address_cache 저장 오류 | {e}")
+
+    # ── 시드 ───────────────────────────────────────────────────
+    def load_aliases(self):
+        """오답 노트(frequency >= 2) → 별칭. 반환: 주소록 최근 주소 목록 (프리패치 대상)."""
+        self._seeded = True
+        recent = []
+        try:
+            conn = self._conn()
+            for row in conn.execute("SELECT ai_raw_text, corrected_text FROM address_correction_log WHERE frequency >= 2"):
+                self._aliases[normalize_address_key(row["ai_raw_text"])] = row["corrected_text"]
+            recent = [r["receiver_address"] for r in conn.execute(
+                "SELECT receiver_address FROM customer_address_book ORDER BY last_used_at DESC LIMIT ?",
+                (SEED_PREFETCH_LIMIT,))]
+            conn.close()
+        except Exception as e:
+            logger.debug(f"address_cache 시드 건너뜀 | {e}")
+        return [a for a in recent if a]
+
+    def add_alias(self, raw: str, corrected: str):
+        if raw and corrected and raw != corrected:
+            self._aliases[normalize_address_key(raw)] = corrected
+
+    async def seed(self):
+        """별칭 적재 + 단골 주소록 주소 미리 정제 (이미 캐시된 주소는 API 호출 없음)."""
+        self._seeded = True
+        recent = await asyncio.to_thread(self.load_aliases)
+        if recent and os.getenv("KAKAO_REST_API_KEY"):
+            await self.resolve_many(recent)
+            logger.info(f"address_cache 시드 완료 | 별칭 {len(self._aliases)}건, 주소록 {len(recent)}건")
+
+    def warm(self):
+        """앱 시작 시 (lifespan) — 시드를 백그라운드 태스크로 시작. 첫 요청이 시드 비용을 떠안지 않음."""
+        self._ensure_seeded()
+
+    def _ensure_seeded(self):
+        if self._seeded:
+            return
+        self._seeded = True
+        try:
+            asyncio.get_running_loop().create_task(self.seed())
+        except RuntimeError:
+            self.load_aliases()
+
+    # ── 정제 (비동기) ───────────────────────────────────────────
+    async def _lookup(self, client, address: str, kakao_key: str) -> dict:
+        for query, detail in candidate_queries(address):
+            self.metrics["api_calls"] += 1
+            try:
+                r = await client.get(KAKAO_ADDRESS_URL, headers={"Authorization": f"KakaoAK {kakao_key}"},
+                                     params={"query": query, "analyze_type": "similar", "size": 1})
+                if r.status_code == 200:
+                    docs = r.json().get("documents", [])
+                    if docs:
+                        return build_result(docs, address, detail)
+                else:
+                    logger.warning(f"[kakao_addr] HTTP {r.status_code}")
+                    return None   # 쿼터/인증 오류는 캐시하지 않음
+            except Exception as e:
+                logger.warning(f"[kakao_addr] 검색 오류: {e}")
+                return None
+        return _failure(address)
+
+    async def resolve(self, address: str, client=None) -> dict:
+        """캐시 → (병합) → 카카오 3단계 검색. 반환: {success, road_address, postcode, jibun_address, detail}"""
+        if not address or len(address.strip()) < 4:
+            return _failure(address)
+        self._ensure_seeded()
+        cached = await asyncio.to_thread(self.get, address)
+        if cached is not None:
+            return cached
+        kakao_key = os.getenv("KAKAO_REST_API_KEY", "")
+        if not kakao_key:
+            return _failure(address)
+
+        flight_key = (id(asyncio.get_running_loop()), self._key(address))
+        fut = self._inflight.get(flight_key)
+        if fut is not None:
+            self.metrics["coalesced"] += 1
+            return dict(await asyncio.shield(fut))
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[flight_key] = fut
+        try:
+            result = await self._lookup(client or self._http(), address, kakao_key)
+            if result is not None:
+                await asyncio.to_thread(self.put, address, result)
+            else:
+                result = _failure(address)
+            fut.set_result(result)
+            return dict(result)
+        except BaseException:
+            fut.cancel()
+            raise
+        finally:
+            self._inflight.pop(flight_key, None)
+
+    async def resolve_many(self, addresses, concurrency: int = BATCH_CONCURRENCY) -> dict:
+        """중복 제거 후 동시성 제한 일괄 정제. 반환: {원본 주소: 결과}"""
+        unique = list(dict.fromkeys(a for a in addresses if a))
+        sem = asyncio.Semaphore(concurrency)
+        # 워커 스레드의 asyncio.run 에서도 호출되므로 배치 전용 클라이언트 사용
+        async with httpx.AsyncClient(timeout=6.0, limits=httpx.Limits(max_connections=concurrency)) as client:
+            async def _one(addr):
+                async with sem:
+                    return await self.resolve(addr, client=client)
+            results = await asyncio.gather(*(_one(a) for a in unique), return_exceptions=True)
+        return {a: (r if isinstance(r, dict) else _failure(a)) for a, r in zip(unique, results)}
+
+    def resolve_many_sync(self, addresses, concurrency: int = BATCH_CONCURRENCY) -> dict:
+        """워커 스레드(이벤트 루프 없음)용 일괄 정제."""
+        if not self._seeded:
+            self.load_aliases()   # 임시 루프에서 주소록 프리패치까지 돌리지 않도록 별칭만 적재
+        from services.redis_registry import redis_registry
+        return redis_registry.run(self.resolve_many(addresses, concurrency))
+
+    # ── 정제 (동기, 단일 검색) ──────────────────────────────────
+    def resolve_sync(self, address: str) -> dict:
+        """동기 경로용 — 캐시 → 원본 1회 검색. 실패 결과는 캐시하지 않음 (3단계 검색 경로에 맡김)."""
+        if not address or not address.strip():
+            return _failure(address)
+        self._ensure_seeded()
+        cached = self.get(address)
+        if cached is not None:
+            return cached
+        kakao_key = os.environ.get("KAKAO_REST_API_KEY")
+        if not kakao_key:
+            return _failure(address)
+        import requests
+        self.metrics["api_calls"] += 1
+        try:
+            response = requests.get(KAKAO_ADDRESS_URL, headers={"Authorization": f"KakaoAK {kakao_key}"},
+                                    params={"query": address}, timeout=5)
+            if response.status_code == 200:
+                docs = response.json().get("documents", [])
+                if docs:
+                    result = build_result(docs, address, "")
+                    self.put(address, result)
+                    return result
+        except Exception as e:
+            print(f"[Address Normalization Warning] Failed to convert address: {e}")
+        return _failure(address)
+
+    def stats(self) -> dict:
+        m = self.metrics
+        hits = m["l1_hit"] + m["db_hit"]
+        lookups = hits + m["miss"]
+        return {**m, "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+                "l1_entries": len(self._l1), "aliases": len(self._aliases)}
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+address_cache = AddressCache()
@@ -0,0 +1,345 @@
+"""
+📒 OCR 주소 교정 인덱스 (단골 주소록 + 오답 노트 메모리 인덱스)
+
+routers/ocr.process_and_sanitize_ocr_data 의 1·2차 방어선을 DB 조회 없이 처리.
+- 단골 주소록: 전화번호 → (이름, 주소) 해시맵
+- 오답 노트: 오독 원문(공백 제거) → {정답: 빈도}. 빈도 >= 2 인 쌍만 교정에 사용
+- 유사 검색: 조각(pigeonhole) 인덱스 — 원문을 SEGMENTS 조각으로 나누면 편집 d 번은 최대 d 조각만
+  깨뜨리므로, 버킷이 가장 작은 d+2 조각 중 2개 이상에 함께 속한 키만 후보 (집합 교집합)
+  → 밴드 Levenshtein 으로 검증 ('서울중구' 같은 흔한 조각 하나로는 후보가 되지 않음)
+  → 30만 건에서도 1ms 미만, OCR 한 글자 오독(「테헤란로」↔「테혜란로」)까지 잡음
+- 갱신: 이 프로세스의 쓰기는 즉시 반영(write-through), 다른 워커의 쓰기는
+  REFRESH_SEC 마다 last_seen_at / last_used_at 워터마크 이후 행만 다시 읽음
+- 로드: 앱 시작 시 warm() 으로 전체 로드, 이후 갱신도 백그라운드 스레드에서 수행
+  → async OCR 핸들러(이벤트 루프)는 SQLite 를 기다리지 않고 현재 인덱스로 즉시 조회
+
+벤치마크: python -m services.correction_index --bench 300000
+"""
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from logger import logger
+
+DB_PATH = Path(__file__).parent.parent / "ai_store.db"
+
+SEGMENTS = 4               # 조각 수 (허용 편집거리 최대 2 → d+2 <= SEGMENTS)
+MIN_FUZZY_LEN = 6          # 이보다 짧은 원문은 정확 일치만
+LONG_KEY_LEN = 20          # 이 길이 이상이면 편집거리 2까지 허용, 미만은 1
+MIN_FREQUENCY = 2
+REFRESH_SEC = 60
+
+_WS_RE = re.compile(r"\s+")
+
+
+def correction_key(text: str) -> str:
+    """OCR 띄어쓰기 차이는 무시 — 공백 제거 + 소문자."""
+    return _WS_RE.sub("", text or "").lower()
+
+
+def allowed_distance(key: str) -> int:
+    if len(key) < MIN_FUZZY_LEN:
+        return 0
+    return 2 if len(key) >= LONG_KEY_LEN else 1
+
+
+def bounded_levenshtein(a: str, b: str, limit: int) -> int:
+    """편집거리 (limit 초과 시 limit+1). 대각선 밴드 폭 2*limit+1 만 계산."""
+    la, lb = len(a), len(b)
+    if abs(la - lb) > limit:
+        return limit + 1
+    if a == b:
+        return 0
+    big = limit + 1
+    prev = [j if j <= limit else big for j in range(lb + 1)]
+    for i in range(1, la + 1):
+        lo, hi = max(1, i - limit), min(lb, i + limit)
+        cur = [big] * (lb + 1)
+        cur[0] = i if i <= limit else big
+        ca = a[i - 1]
+        row_min = cur[0]
+        for j in range(lo, hi + 1):
+            cost = prev[j - 1] + (ca != b[j - 1])
+            if prev[j] + 1 < cost:
+                cost = prev[j] + 1
+            if cur[j - 1] + 1 < cost:
+                cost = cur[j - 1] + 1
+            cur[j] = cost
+            if cost < row_min:
+                row_min = cost
+        if row_min > limit:
+            return big
+        prev = cur
+    return prev[lb] if prev[lb] <= limit else big
+
+
+def _segments(length: int):
+    """길이 length 문자열을 SEGMENTS 조각으로 나눈 (시작, 끝) 목록."""
+    bounds = [length * i // SEGMENTS for i in range(SEGMENTS + 1)]
+    return [(bounds[i], bounds[i + 1]) for i in range(SEGMENTS)]
+
+
+class CorrectionIndex:
+    def __init__(self, db_path=DB_PATH):
+        self.db_path = str(db_path) if db_path else None
+        self._lock = threading.RLock()
+        self._phones = {}          # phone → (name, address)
+        self._corrections = {}     # key → {corrected: frequency}
+        self._segments = {}        # (len, 조각 번호, 조각 문자열) → set(key)
+        self._touched = set()      # last_used_at 지연 갱신 대상 전화번호
+        self._loaded = False
+        self._refreshing = False   # 백그라운드 로드 진행 중 (중복 실행 방지)
+        self._refreshed_at = 0.0
+        self._watermark = {"book": "", "log": ""}
+        self.metrics = {"phone_hit": 0, "exact_hit": 0, "fuzzy_hit": 0, "miss": 0,
+                        "candidates": 0, "refreshes": 0}
+
+    # ── 인덱스 구성 ─────────────────────────────────────────────
+    def _index_key(self, key: str):
+        if len(key) < MIN_FUZZY_LEN:
+            return
+        for i, (s, e) in enumerate(_segments(len(key))):
+            self._segments.setdefault((len(key), i, key[s:e]), set()).add(key)
+
+    def add_correction(self, raw: str, corrected: str, frequency: int = 1, absolute: bool = False):
+        """오답-정답 쌍 반영. absolute=True 면 DB 의 빈도 값으로 덮어씀 (로드/갱신용)."""
+        key = correction_key(raw)
+        corrected = (corrected or "").strip()
+        if not key or not corrected:
+            return
+        with self._lock:
+            targets = self._corrections.get(key)
+            if targets is None:
+                targets = self._corrections[key] = {}
+                self._index_key(key)
+            targets[corrected] = frequency if absolute else targets.get(corrected, 0) + frequency
+
+    def upsert_phone(self, phone: str, name: str, address: str):
+        if phone and address:
+            with self._lock:
+                self._phones[phone] = (name, address)
+
+    # ── 로드 / 증분 갱신 ────────────────────────────────────────
+    def _conn(self):
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _load(self, incremental: bool):
+        if not self.db_path:
+            return
+        started = time.perf_counter()
+        try:
+            conn = self._conn()
+            book_sql = "SELECT phone_number, receiver_name, receiver_address, last_used_at FROM customer_address_book"
+            log_sql = "SELECT ai_raw_text, corrected_text, frequency, last_seen_at FROM address_correction_log"
+            if incremental:
+                books = conn.execute(book_sql + " WHERE last_used_at >= ?", (self._watermark["book"],)).fetchall()
+                logs = conn.execute(log_sql + " WHERE last_seen_at >= ?", (self._watermark["log"],)).fetchall()
+            else:
+                books = conn.execute(book_sql).fetchall()
+                logs = conn.execute(log_sql).fetchall()
+            if self._touched:
+                with self._lock:
+                    touched, self._touched = list(self._touched), set()
+                conn.executemany("UPDATE customer_address_book SET last_used_at = CURRENT_TIMESTAMP "
+                                 "WHERE phone_number = ?", [(p,) for p in touched])
+                conn.commit()
+            conn.close()
+        except Exception as e:
+            logger.warning(f"[correction_index] 로드 실패 | {e}")
+            return
+        for r in books:
+            self.upsert_phone(r["phone_number"], r["receiver_name"], r["receiver_address"])
+            self._watermark["book"] = max(self._watermark["book"], r["last_used_at"] or "")
+        for r in logs:
+            self.add_correction(r["ai_raw_text"], r["corrected_text"], r["frequency"] or 1, absolute=True)
+            self._watermark["log"] = max(self._watermark["log"], r["last_seen_at"] or "")
+        self.metrics["refreshes"] += 1
+        if not incremental:
+            logger.info(f"[correction_index] 로드 | 주소록 {len(books)}건, 오답 노트 {len(logs)}건 "
+                        f"({(time.perf_counter() - started) * 1000:.0f}ms)")
+
+    def _spawn_load(self, incremental: bool):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def _run():
+            try:
+                self._load(incremental)
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=_run, name="correction-index-load", daemon=True).start()
+
+    def warm(self):
+        """앱 시작 시 (lifespan) — 전체 로드를 백그라운드로 시작. 첫 OCR 요청이 로드 비용을 떠안지 않음."""
+        self.ensure_fresh()
+
+    def ensure_fresh(self):
+        """로드/갱신 시점이면 백그라운드 스레드로 넘기고 바로 반환 (조회는 기존 인덱스로 진행)."""
+        now = time.monotonic()
+        if not self._loaded:
+            self._loaded = True
+            self._refreshed_at = now
+            self._spawn_load(incremental=False)
+        elif now - self._refreshed_at >= REFRESH_SEC:
+            self._refreshed_at = now
+            self._spawn_load(incremental=True)
+
+    # ── 조회 ───────────────────────────────────────────────────
+    def lookup_phone(self, phone: str):
+        """전화번호 → (이름, 주소) | None. 히트 시 last_used_at 은 다음 갱신 때 묶어서 기록."""
+        self.ensure_fresh()
+        hit = self._phones.get(phone) if phone else None
+        if hit:
+            self.metrics["phone_hit"] += 1
+            with self._lock:
+                self._touched.add(phone)
+        return hit
+
+    @staticmethod
+    def _best(targets: dict):
+        corrected, freq = max(list(targets.items()), key=lambda kv: kv[1])  # 로드 스레드와 동시 갱신 대비 스냅샷
+        return (corrected, freq) if freq >= MIN_FREQUENCY else None
+
+    def _fuzzy_candidates(self, key: str, limit: int):
+        """
+        길이별로 조각 그룹(위치 이동 ±limit 버킷 합집합)을 만들고, 가장 작은 limit+2 그룹 중
+        2개 이상에 속한 키만 후보로 반환 (편집 limit 번이면 그중 최소 2조각은 온전).
+        """
+        found = set()
+        n = len(key)
+        for length in range(max(MIN_FUZZY_LEN, n - limit), n + limit + 1):
+            groups = []
+            for i, (s, e) in enumerate(_segments(length)):
+                buckets = [b for b in (self._segments.get((length, i, key[s + d:e + d]))
+                                       for d in range(-limit, limit + 1) if s + d >= 0 and e + d <= n) if b]
+                if not buckets:
+                    groups.append(set())
+                else:
+                    groups.append(buckets[0] if len(buckets) == 1 else set().union(*buckets))
+            groups.sort(key=len)
+            picked = groups[:limit + 2]
+            for x in range(len(picked)):
+                if not picked[x]:
+                    continue
+                for y in range(x + 1, len(picked)):
+                    found |= picked[x] & picked[y]
+        found.discard(key)
+        return found
+
+    def lookup_correction(self, raw: str):
+        """
+        오독 원문 → {"corrected", "frequency", "distance"} | None
+        정확 일치 우선, 없으면 편집거리 1(긴 주소는 2) 이내 중 거리↑ 빈도↓ 순 최선.
+        """
+        self.ensure_fresh()
+        key = correction_key(raw)
+        if not key:
+            return None
+        targets = self._corrections.get(key)
+        if targets:
+            best = self._best(targets)
+            if best:
+                self.metrics["exact_hit"] += 1
+                return {"corrected": best[0], "frequency": best[1], "distance": 0}
+        limit = allowed_distance(key)
+        if limit:
+            winner = None
+            candidates = self._fuzzy_candidates(key, limit)
+            self.metrics["candidates"] += len(candidates)
+            for cand in candidates:
+                dist = bounded_levenshtein(key, cand, limit)
+                if dist > limit:
+                    continue
+                best = self._best(self._corrections[cand])
+                if best and (winner is None or (dist, -best[1]) < (winner[2], -winner[1])):
+                    winner = (best[0], best[1], dist)
+            if winner:
+                self.metrics["fuzzy_hit"] += 1
+                return {"corrected": winner[0], "frequency": winner[1], "distance": winner[2]}
+        self.metrics["miss"] += 1
+        return None
+
+    def stats(self) -> dict:
+        return {**self.metrics, "phones": len(self._phones), "corrections": len(self._corrections),
+                "segment_buckets": len(self._segments), "pending_touch": len(self._touched)}
+
+
+correction_index = CorrectionIndex()
+
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+# 벤치마크
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+def _bench(n: int, queries: int = 2000):
+    import random
+    rng = random.Random(7)
+    sido = ["서울", "부산", "대구", "인천", "광주", "대전", "울산", "경기", "강원", "충북", "충남", "전북", "경북", "경남"]
+    gu = ["중구", "동구", "서구", "남구", "북구", "강남구", "수성구", "해운대구", "분당구", "덕양구", "완산구"]
+    syll = "가나다라마바사아자차카타파하강남북동서산천봉곡테헤란중앙평화대학신정"
+
+    def _addr():
+        road = "".join(rng.choice(syll) for _ in range(rng.randint(2, 4)))
+        return f"{rng.choice(sido)} {rng.choice(gu)} {road}로 {rng.randint(1, 300)}번길 {rng.randint(1, 99)}"
+
+    def _typo(s):
+        i = rng.randrange(len(s))
+        while s[i] == " ":
+            i = rng.randrange(len(s))
+        return s[:i] + rng.choice(syll) + s[i + 1:]
+
+    idx = CorrectionIndex(db_path=None)
+    idx._loaded = True
+    idx._refreshed_at = float("inf")
+    raws = []
+    t0 = time.perf_counter()
+    for _ in range(n):
+        correct = _addr()
+        raw = _typo(correct)
+        idx.add_correction(raw, correct, frequency=rng.randint(1, 5), absolute=True)
+        raws.append(raw)
+    build = time.perf_counter() - t0
+
+    def _run(label, items):
+        lat = []
+        hits = 0
+        for q in items:
+            s = time.perf_counter()
+            hits += idx.lookup_correction(q) is not None
+            lat.append((time.perf_counter() - s) * 1e6)
+        lat.sort()
+        print(f"  {label:<10} {len(items):>6}건 | 적중 {hits:>6} | "
+              f"p50 {lat[len(lat) // 2]:7.1f}us  p99 {lat[int(len(lat) * 0.99)]:7.1f}us")
+
+    print(f"[bench] 오답 노트 {n:,}건 인덱스 구성 {build:.2f}s, 조각 버킷 {len(idx._segments):,}개")
+    sample = rng.sample(raws, min(queries, n))
+    _run("정확", sample)
+    _run("1글자 변형", [_typo(s) for s in sample])
+    _run("미등록", [_addr() for _ in range(len(sample))])
+
+    # 비교: 기존 방식 (SQLite 정확 일치, ai_raw_text 인덱스)
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE address_correction_log (ai_raw_text TEXT, corrected_text TEXT, frequency INTEGER, "
+                 "UNIQUE(ai_raw_text, corrected_text))")
+    conn.executemany("INSERT OR IGNORE INTO address_correction_log VALUES (?, ?, 2)", ((r, r) for r in raws))
+    lat = []
+    for q in sample:
+        s = time.perf_counter()
+        conn.execute("SELECT corrected_text FROM address_correction_log WHERE ai_raw_text = ? AND frequency >= 2",
+                     (q,)).fetchone()
+        lat.append((time.perf_counter() - s) * 1e6)
+    lat.sort()
+    print(f"  sqlite(정확, 메모리 DB) p50 {lat[len(lat) // 2]:7.1f}us  p99 {lat[int(len(lat) * 0.99)]:7.1f}us"
+          " — 실제 서버는 요청마다 파일 연결 생성 비용 추가")
+
+
+if __name__ == "__main__":
+    import sys
+    count = int(sys.argv[sys.argv.index("--bench") + 1]) if "--bench" in sys.argv else 300000
+    _bench(count)
@@ -0,0 +1,489 @@
+"""
+⏱️ 정기 작업 런타임 (cron_jobs + 심야 배치 스케줄러 공용)
+
+- 전용 스레드의 asyncio 루프 1개가 모든 정기 작업을 관리 (schedule 루프 / APScheduler 대체)
+  동기 작업은 작업 스레드풀(JOB_WORKERS)에서, 코루틴 작업은 루프에서 직접 실행
+  → 느린 작업 하나가 다른 작업의 실행 시각을 밀지 않음
+- 리더 선출: Redis 리스(tantan:jobs:leader, SET NX PX + 토큰 비교 갱신/해제 Lua)
+  리스를 가진 프로세스 1개만 cluster 작업 실행 → gunicorn 워커 수와 무관하게 클러스터당 1회
+  회차별 실행 키(SET NX)로 리더 교체 시점의 중복 실행도 차단
+  JOB_LEASE_BACKEND=auto(기본) 이면 Redis 불가 시 호스트 파일 락(flock)으로 대체 (단일 서버 배포용)
+  파일 락 사용 중에도 갱신 주기마다 Redis 를 다시 확인 → 복구되면 파일 락을 내려놓고 Redis 리스로 복귀
+  (다른 호스트가 Redis 리스를 잡은 채 이 프로세스가 계속 리더로 남는 split-brain 방지)
+- cluster=False 작업: 모든 프로세스에서 실행 (프로세스 메모리 캐시 갱신 등)
+- 작업별: 동시 실행 상한(초과 회차는 skipped), 제한 시간(timeout), 지터, 지연 허용(misfire_grace)
+- 실행 이력: 작업별 최근 HISTORY_SIZE 건 (시작 시각·소요 ms·상태·오류, 작업이 dict 를 반환하면 회차 지표로 함께 기록)
+  — 로컬 + Redis 목록
+- 시각은 KST 기준: every(초) / cron(hour="0-6", minute="*/15") / daily("03:10")
+  every() 회차는 epoch 기준 정렬(floor(now/초)*초) → 프로세스가 달라도 같은 회차 키
+"""
+import asyncio
+import inspect
+import math
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from logger import logger
+
+KST = ZoneInfo("Asia/Seoul")
+LEASE_KEY = "tantan:jobs:leader"
+RUN_KEY = "tantan:jobs:run:{}:{}"          # 작업명, 회차(예정 시각)
+HISTORY_KEY = "tantan:jobs:history:{}"
+LEASE_BACKEND = os.getenv("JOB_LEASE_BACKEND", "auto")     # auto | redis | file
+LEASE_TTL_SEC = float(os.getenv("JOB_LEASE_TTL_SEC", "30"))
+LEASE_RENEW_SEC = LEASE_TTL_SEC / 3
+LEASE_FILE = os.getenv("JOB_LEASE_FILE", "/tmp/tantan_jobs.lock")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "8"))
+TICK_SEC = 1.0
+HISTORY_SIZE = 50
+REDIS_HISTORY_SIZE = 200
+
+_LUA_RENEW = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_LUA_RELEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def _iso(ts):
+    return datetime.fromtimestamp(ts, tz=KST).isoformat(timespec="seconds") if ts else None
+
+
+# ── 실행 주기 ───────────────────────────────────────────────────
+def _parse_field(spec, lo, hi):
+    """cron 필드 1개 → 정렬된 값 목록. '*', '*/15', '0-6', '1,3,5', 정수 지원."""
+    values = set()
+    for part in str(spec).split(","):
+        part, _, step = part.partition("/")
+        if part == "*":
+            start, end = lo, hi
+        elif "-" in part:
+            start, end = (int(x) for x in part.split("-"))
+        else:
+            start = end = int(part)
+        values.update(range(start, end + 1, int(step or 1)))
+    out = sorted(v for v in values if lo <= v <= hi)
+    if not out:
+        raise ValueError(f"잘못된 cron 필드: {spec}")
+    return out
+
+
+class every:
+    """N초 간격. 회차는 epoch 의 N초 배수 (리더가 바뀌어도 회차 키가 일치)."""
+
+    def __init__(self, seconds: float):
+        self.seconds = float(seconds)
+
+    def next_after(self, ts: float) -> float:
+        return (math.floor(ts / self.seconds) + 1) * self.seconds
+
+    def __repr__(self):
+        return f"every({self.seconds:g}s)"
+
+
+class cron:
+    """KST 시·분 조합 (cron 문법의 hour/minute 필드)."""
+
+    def __init__(self, hour="*", minute=0):
+        self.spec = (hour, minute)
+        self.hours = _parse_field(hour, 0, 23)
+        self.minutes = _parse_field(minute, 0, 59)
+
+    def next_after(self, ts: float) -> float:
+        t = datetime.fromtimestamp(ts, tz=KST).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        for _ in range(2):      # 오늘 → 내일
+            for h in self.hours:
+                if h < t.hour:
+                    continue
+                for m in self.minutes:
+                    if h == t.hour and m < t.minute:
+                        continue
+                    return t.replace(hour=h, minute=m).timestamp()
+            t = (t + timedelta(days=1)).replace(hour=0, minute=0)
+        raise RuntimeError("다음 실행 시각 계산 실패")
+
+    def __repr__(self):
+        return f"cron(hour={self.spec[0]!r}, minute={self.spec[1]!r})"
+
+
+def daily(at: str) -> cron:
+    """매일 KST HH:MM."""
+    h, m = at.split(":")
+    return cron(hour=int(h), minute=int(m))
+
+
+# ── 리더 리스 ───────────────────────────────────────────────────
+class _RedisLease:
+    kind = "redis"
+
+    def __init__(self, token):
+        self.token = token
+
+    def acquire(self) -> bool:
+        from services.redis_registry import get_redis, redis_registry
+        ms = int(LEASE_TTL_SEC * 1000)
+        if get_redis().set(LEASE_KEY, self.token, nx=True, px=ms):
+            return True
+        return bool(redis_registry.script(_LUA_RENEW)(keys=[LEASE_KEY], args=[self.token, ms]))
+
+    def release(self):
+        from services.redis_registry import redis_registry
+        redis_registry.script(_LUA_RELEASE)(keys=[LEASE_KEY], args=[self.token])
+
+    def holder(self):
+        from services.redis_registry import get_redis
+        return get_redis().get(LEASE_KEY)
+
+
+class _FileLease:
+    """호스트 내 프로세스 간 리더 (flock). 다중 서버에서는 서버마다 리더가 생기므로 Redis 사용."""
+    kind = "file"
+
+    def __init__(self, token):
+        self.token = token
+        self._fh = None
+
+    def acquire(self) -> bool:
+        import fcntl
+        if self._fh is not None:
+            return True
+        fh = open(LEASE_FILE, "a+")
+        try:
+            fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            fh.close()
+            return False
+        fh.seek(0)
+        fh.truncate()
+        fh.write(self.token)
+        fh.flush()
+        self._fh = fh
+        return True
+
+    def release(self):
+        if self._fh is not None:
+            self._fh.close()     # 닫으면 flock 해제
+            self._fh = None
+
+    def holder(self):
+        try:
+            with open(LEASE_FILE) as fh:
+                return fh.read().strip() or None
+        except OSError:
+            return None
+
+
+# ── 작업 ───────────────────────────────────────────────────────
+class _Job:
+    def __init__(self, name, func, trigger, timeout, max_concurrency, jitter, misfire_grace,
+                 cluster, run_on_start, in_thread):
+        self.name = name
+        self.func = func
+        self.trigger = trigger
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.jitter = jitter
+        self.misfire_grace = misfire_grace
+        self.cluster = cluster
+        self.run_on_start = run_on_start
+        self.is_coroutine = inspect.iscoroutinefunction(func) and not in_thread
+        self.slot = None          # 다음 회차 예정 시각 (지터 제외)
+        self.next_run = None      # 다음 실행 시각 (지터 포함)
+        self.running = 0
+        self.history = deque(maxlen=HISTORY_SIZE)
+        self.counts = {"runs": 0, "ok": 0, "error": 0, "timeout": 0, "skipped": 0, "missed": 0, "duplicate": 0}
+
+    def schedule_from(self, now, first=False):
+        self.slot = now if (first and self.run_on_start) else self.trigger.next_after(now)
+        self.next_run = self.slot + (random.uniform(0, self.jitter) if self.jitter else 0)
+
+    def call_sync(self):
+        result = self.func()
+        if inspect.isawaitable(result):      # in_thread 코루틴 작업 → 작업 스레드에서 전용 루프로 실행
+            from services.redis_registry import redis_registry
+            return redis_registry.run(result)
+        return result
+
+
+class JobRuntime:
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._loop = None
+        self._stop = None
+        self._executor = None
+        self._lease = None
+        self._lease_checked = 0.0
+        self.token = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
+        self.metrics = {"leader_since": None, "lease_backend": None, "lease_errors": 0, "started_at": None}
+
+    # ── 등록 ───────────────────────────────────────────────────
+    def add(self, name, func, trigger, *, timeout=300, max_concurrency=1, jitter=0, misfire_grace=300,
+            cluster=True, run_on_start=False, in_thread=False):
+        """
+        작업 등록 (같은 이름이면 교체).
+        timeout: 초과 시 timeout 기록 (코루틴은 취소, 동기 작업은 끝날 때까지 동시 실행 슬롯 점유)
+        cluster=False: 리더와 무관하게 모든 프로세스에서 실행
+        in_thread=True: 내부에서 동기 I/O 를 하는 코루틴을 작업 스레드에서 실행
+        """
+        with self._lock:
+            self._jobs[name] = _Job(name, func, trigger, timeout, max_concurrency, jitter, misfire_grace,
+                                    cluster, run_on_start, in_thread)
+
+    def remove(self, prefix: str):
+        with self._lock:
+            for name in [n for n in self._jobs if n.startswith(prefix)]:
+                self._jobs.pop(name, None)
+
+    # ── 수명 ───────────────────────────────────────────────────
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.metrics["started_at"] = _iso(time.time())
+            self._thread = threading.Thread(target=self._thread_main, name="job-runtime", daemon=True)
+            self._thread.start()
+        logger.info(f"[jobs] 런타임 시작 | token={self.token}")
+
+    def stop(self):
+        loop, stop = self._loop, self._stop
+        if loop is not None and stop is not None:
+            loop.call_soon_threadsafe(stop.set)
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=5)
+        with self._lock:
+            self._thread = None
+
+    def _thread_main(self):
+        from services.redis_registry import redis_registry
+        try:
+            redis_registry.run(self._main())
+        except Exception as e:
+            logger.error(f"[jobs] 런타임 종료 (오류) | {e}")
+
+    async def _main(self):
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        self._executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+        tasks = set()
+        try:
+            while not self._stop.is_set():
+                now = time.time()
+                if now - self._lease_checked >= LEASE_RENEW_SEC:
+                    self._lease_checked = now
+                    await self._loop.run_in_executor(None, self._tick_lease)
+                for job in list(self._jobs.values()):
+                    active = self.is_leader or not job.cluster
+                    if not active:
+                        job.slot = job.next_run = None      # 리더가 되면 그 시점부터 다시 계산
+                        continue
+                    if job.next_run is None:
+                        job.schedule_from(now, first=True)
+                    if now < job.next_run:
+                        continue
+                    slot = job.slot
+                    job.schedule_from(now)
+                    if now - slot > job.misfire_grace + job.jitter:
+                        job.counts["missed"] += 1
+                        continue
+                    task = asyncio.create_task(self._run(job, slot))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                try:
+                    await asyncio.wait_for(self._stop.wait(), TICK_SEC)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            if self.is_leader and self._lease is not None:
+                try:
+                    self._lease.release()
+                except Exception as e:
+                    logger.debug(f"[jobs] 리스 해제 실패 | {e}")
+            self.is_leader = False
+            logger.info("[jobs] 런타임 종료")
+
+    # ── 리더 리스 ───────────────────────────────────────────────
+    def _tick_lease(self):
+        """리스 획득/갱신 (기본 실행기 스레드). 실패하면 즉시 리더 아님으로 전환."""
+        if self._lease is None:
+            self._lease = self._pick_lease()
+            self.metrics["lease_backend"] = self._lease.kind
+        elif LEASE_BACKEND == "auto" and self._lease.kind == "file" and self._redis_alive():
+            logger.info("[jobs] Redis 복구 → 파일 락 해제, Redis 리스로 전환")
+            self._lease.release()
+            self._lease = _RedisLease(self.token)
+            self.metrics["lease_backend"] = self._lease.kind
+        try:
+            leader = self._lease.acquire()
+        except Exception as e:
+            self.metrics["lease_errors"] += 1
+            logger.warning(f"[jobs] 리스 확인 실패 ({self._lease.kind}) | {e}")
+            leader = False
+            if LEASE_BACKEND == "auto" and self._lease.kind == "redis":
+                self._lease = None      # 다음 확인 때 백엔드 재선택
+        if leader != self.is_leader:
+            self.metrics["leader_since"] = _iso(time.time()) if leader else None
+            logger.info(f"[jobs] {'리더 획득' if leader else '리더 아님'} | token={self.token}")
+        self.is_leader = leader
+
+    @staticmethod
+    def _redis_alive(log=False) -> bool:
+        try:
+            from services.redis_registry import get_redis
+            get_redis().ping()
+            return True
+        except Exception as e:
+            if log:
+                logger.warning(f"[jobs] Redis 불가 → 파일 락 리더 사용 (단일 서버 전용) | {e}")
+            return False
+
+    def _pick_lease(self):
+        if LEASE_BACKEND == "file":
+            return _FileLease(self.token)
+        if LEASE_BACKEND == "auto" and not self._redis_alive(log=True):
+            return _FileLease(self.token)
+        return _RedisLease(self.token)
+
+    def _claim(self, job, slot) -> bool:
+        """회차 실행권 (SET NX). 파일 락 / 로컬 작업은 확인 생략."""
+        if not job.cluster or self._lease is None or self._lease.kind != "redis":
+            return True
+        from services.redis_registry import get_redis
+        ttl = int(max(job.timeout, LEASE_TTL_SEC) * 2)
+        return bool(get_redis().set(RUN_KEY.format(job.name, int(slot)), self.token, nx=True, ex=ttl))
+
+    # ── 실행 ───────────────────────────────────────────────────
+    async def _run(self, job, slot, manual=False):
+        if job.running >= job.max_concurrency:
+            job.counts["skipped"] += 1
+            logger.warning(f"[jobs] {job.name} 이전 실행 진행 중 → 이번 회차 건너뜀")
+            return
+        loop = asyncio.get_running_loop()
+        if not manual:
+            try:
+                if not await loop.run_in_executor(None, self._claim, job, slot):
+                    job.counts["duplicate"] += 1
+                    return
+            except Exception as e:
+                logger.warning(f"[jobs] {job.name} 실행권 확인 실패 → 건너뜀 | {e}")
+                job.counts["skipped"] += 1
+                return
+        job.running += 1
+        started, t0 = time.time(), time.perf_counter()
+        status, error, result = "ok", None, None
+        try:
+            if job.is_coroutine:
+                result = await asyncio.wait_for(job.func(), job.timeout)
+            else:
+                fut = loop.run_in_executor(self._executor, job.call_sync)
+                try:
+                    result = await asyncio.wait_for(asyncio.shield(fut), job.timeout)
+                except asyncio.TimeoutError:
+                    status = "timeout"
+                    logger.warning(f"[jobs] {job.name} 제한 시간 {job.timeout}s 초과 (완료까지 슬롯 유지)")
+                    result = await fut
+        except asyncio.TimeoutError:
+            status = "timeout"
+            logger.warning(f"[jobs] {job.name} 제한 시간 {job.timeout}s 초과 → 취소")
+        except asyncio.CancelledError:
+            status, error = "cancelled", "runtime stop"
+            raise
+        except Exception as e:
+            status, error = "error", f"{type(e).__name__}: {e}"[:300]
+            logger.error(f"[jobs] {job.name} 실패 | {error}")
+        finally:
+            job.running -= 1
+            self._record(job, started, (time.perf_counter() - t0) * 1000, status, error, manual, result)
+
+    def _record(self, job, started, duration_ms, status, error, manual, result=None):
+        job.counts["runs"] += 1
+        job.counts[status if status in job.counts else "error"] += 1
+        entry = {"job": job.name, "started_at": _iso(started), "duration_ms": round(duration_ms, 1),
+                 "status": status, "error": error, "token": self.token, "manual": manual,
+                 "result": result if isinstance(result, dict) else None}
+        job.history.append(entry)
+        if job.cluster and self._lease is not None and self._lease.kind == "redis":
+            self._loop.run_in_executor(None, self._push_history, job.name, entry)
+
+    @staticmethod
+    def _push_history(name, entry):
+        import json
+        from services.redis_registry import redis_registry
+        key = HISTORY_KEY.format(name)
+        try:
+            redis_registry.pipelined(lambda p: (p.lpush(key, json.dumps(entry, ensure_ascii=False)),
+                                                p.ltrim(key, 0, REDIS_HISTORY_SIZE - 1)))
+        except Exception as e:
+            logger.debug(f"[jobs] 이력 저장 실패 | {e}")
+
+    def run_now(self, name: str) -> bool:
+        """수동 실행 (리더 여부·회차 키와 무관, 동시 실행 상한은 적용). 런타임 미시작이면 False."""
+        job = self._jobs.get(name)
+        if job is None or self._loop is None:
+            return False
+        asyncio.run_coroutine_threadsafe(self._run(job, time.time(), manual=True), self._loop)
+        return True
+
+    # ── 지표 ───────────────────────────────────────────────────
+    def history(self, name: str, limit: int = 20) -> list:
+        """최근 실행 이력 (Redis 목록 → 없으면 이 프로세스 기록). 리더가 아닌 프로세스에서도 조회 가능."""
+        import json
+        try:
+            from services.redis_registry import get_redis
+            rows = get_redis().lrange(HISTORY_KEY.format(name), 0, limit - 1)
+            if rows:
+                return [json.loads(r) for r in rows]
+        except Exception as e:
+            logger.debug(f"[jobs] 이력 조회 실패 | {e}")
+        job = self._jobs.get(name)
+        return list(reversed(job.history))[:limit] if job else []
+
+    def stats(self) -> dict:
+        jobs = {}
+        for name, job in list(self._jobs.items()):
+            durations = sorted(h["duration_ms"] for h in job.history)
+            last = job.history[-1] if job.history else None
+            jobs[name] = {
+                **job.counts,
+                "trigger": repr(job.trigger),
+                "cluster": job.cluster,
+                "running": job.running,
+                "next_run": _iso(job.next_run),
+                "last_status": last["status"] if last else None,
+                "last_started_at": last["started_at"] if last else None,
+                "last_result": last["result"] if last else None,
+                "avg_ms": round(sum(durations) / len(durations), 1) if durations else None,
+                "p95_ms": durations[min(len(durations) - 1, int(len(durations) * 0.95))] if durations else None,
+            }
+        holder = None
+        try:
+            holder = self._lease.holder() if self._lease is not None else None
+        except Exception:
+            pass
+        return {**self.metrics, "token": self.token, "is_leader": self.is_leader, "leader": holder,
+                "running": self._thread is not None, "jobs": jobs}
+
+
+job_runtime = JobRuntime()
@@ -0,0 +1,315 @@
+"""
+🧠 LLM 게이트웨이 (Gemini 공용 진입점)
+
+ai_manager / routers(kiosk·search·market) / dongnebiseo_app.AIService 가 모두 이 모듈을 통해 호출.
+- 공용 클라이언트: API 키별 google-genai Client 1개 재사용 (호출마다 Client/GenerativeModel 생성 제거)
+- 모델별 동시 호출 제한: flash 계열 8, pro 계열 4 (LLM_CONCURRENCY_FLASH / LLM_CONCURRENCY_PRO)
+  동기(스레드)·비동기 경로와 모든 이벤트 루프(작업 스레드의 asyncio.run 포함)가 모델별 한도 1개를 공유
+  비동기 대기는 호출한 루프의 Future 로 — 다른 루프에 묶인 asyncio.Semaphore 를 쓰지 않음
+- 동일 프롬프트 병합: 도구 없는 동일 요청(모델+시스템+본문+설정)이 동시에 들어오면 1회만 호출
+- 스트리밍: 사용자에게 바로 보여주는 경로는 stream() (첫 토큰까지 대기 시간 단축)
+- 매장별 토큰 집계 + 일일 예산: LLM_DAILY_TOKEN_BUDGET (0 = 무제한, 프로세스 단위)
+  초과 시 TokenBudgetExceeded
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from datetime import date
+
+from logger import logger
+
+DEFAULT_MODEL = "gemini-2.5-flash"
+FLASH_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY_FLASH", "8"))
+PRO_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY_PRO", "4"))
+DAILY_TOKEN_BUDGET = int(os.getenv("LLM_DAILY_TOKEN_BUDGET", "0"))
+SYSTEM_STORE = "SYSTEM"
+
+
+class TokenBudgetExceeded(Exception):
+    pass
+
+
+class _LeaderCancelled(Exception):
+    """병합 대기 중 리더 호출이 취소됨 — 팔로워는 실패가 아니라 재시도 대상."""
+
+
+def _api_key():
+    try:
+        from dongnebiseo_app.config.settings import get_settings
+        key = get_settings().app.gemini_api_key
+        if key:
+            return key
+    except Exception as e:
+        logger.debug(f"[LLM] settings 로드 실패, 환경변수 사용 | {e}")
+    return os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY") or ""
+
+
+def _model_limit(model: str) -> int:
+    return PRO_CONCURRENCY if "pro" in model else FLASH_CONCURRENCY
+
+
+def usage_of(response) -> dict:
+    """응답(또는 마지막 스트림 청크)의 usage_metadata → {input_tokens, output_tokens, total_tokens}"""
+    meta = getattr(response, "usage_metadata", None)
+    if meta is None:
+        return {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+    inp = getattr(meta, "prompt_token_count", 0) or 0
+    out = getattr(meta, "candidates_token_count", 0) or 0
+    return {"input_tokens": inp, "output_tokens": out,
+            "total_tokens": getattr(meta, "total_token_count", 0) or inp + out}
+
+
+class _ModelLimit:
+    """스레드·이벤트 루프 공용 카운팅 세마포어. 비동기 대기자는 자기 루프의 Future 로 깨움."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._used = 0
+        self._cond = threading.Condition()
+        self._waiters = deque()   # (loop, Future) — 비동기 대기자
+
+    def acquire(self):
+        with self._cond:
+            while self._used >= self.limit:
+                self._cond.wait()
+            self._used += 1
+
+    async def aacquire(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._cond:
+                if self._used < self.limit:
+                    self._used += 1
+                    return
+                fut = loop.create_future()
+                self._waiters.append((loop, fut))
+            try:
+                await fut
+            except asyncio.CancelledError:
+                with self._cond:
+                    try:
+                        self._waiters.remove((loop, fut))
+                    except ValueError:
+                        self._wake_one()   # 이미 깨워진 뒤 취소 — 깨움을 다음 대기자에게 넘김
+                raise
+
+    def release(self):
+        with self._cond:
+            self._used -= 1
+            self._cond.notify()
+            self._wake_one()
+
+    def _wake_one(self):
+        """잠금 안에서 호출 — 살아 있는 루프의 비동기 대기자 1명을 깨워 재시도하게 함."""
+        while self._waiters:
+            loop, fut = self._waiters.popleft()
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(lambda f=fut: f.done() or f.set_result(None))
+                return
+
+
+class LLMGateway:
+    def __init__(self):
+        self._clients = {}        # api_key → genai.Client
+        self._limits = {}         # model → _ModelLimit (동기·비동기 공용)
+        self._inflight = {}       # (이벤트 루프, 요청 지문) → Future
+        self._lock = threading.Lock()
+        self._usage = {}          # (날짜, store_id) → {requests, input_tokens, output_tokens, total_tokens}
+        self.metrics = {"requests": 0, "streams": 0, "coalesced": 0, "errors": 0, "budget_rejected": 0}
+
+    # ── 클라이언트 / 동시성 ─────────────────────────────────────
+    def client(self):
+        """공용 google-genai Client. 키 미설정 시 None."""
+        key = _api_key()
+        if not key:
+            return None
+        c = self._clients.get(key)
+        if c is None:
+            from google import genai
+            with self._lock:
+                c = self._clients.get(key)
+                if c is None:
+                    c = self._clients[key] = genai.Client(api_key=key)
+        return c
+
+    def _require_client(self):
+        c = self.client()
+        if c is None:
+            raise RuntimeError("GEMINI_API_KEY 미설정")
+        return c
+
+    def _limit(self, model):
+        lim = self._limits.get(model)
+        if lim is None:
+            with self._lock:
+                lim = self._limits.get(model)
+                if lim is None:
+                    lim = self._limits[model] = _ModelLimit(_model_limit(model))
+        return lim
+
+    @asynccontextmanager
+    async def alimit(self, model: str):
+        """비동기 호출용 모델별 동시성 제한 (async with) — 동기 경로와 한도 공유."""
+        lim = self._limit(model)
+        await lim.aacquire()
+        try:
+            yield
+        finally:
+            lim.release()
+
+    @contextmanager
+    def limit(self, model: str):
+        """동기 호출용 모델별 동시성 제한 (ai_manager 채팅 루프 등) — 비동기 경로와 한도 공유."""
+        lim = self._limit(model)
+        lim.acquire()
+        try:
+            yield
+        finally:
+            lim.release()
+
+    @staticmethod
+    def _config(system, config):
+        from google.genai import types
+        cfg = dict(config or {})
+        if system:
+            cfg["system_instruction"] = system
+        return types.GenerateContentConfig(**cfg) if cfg else None
+
+    # ── 토큰 집계 / 예산 ────────────────────────────────────────
+    def check_budget(self, store_id):
+        if not DAILY_TOKEN_BUDGET or not store_id:
+            return
+        used = self._usage.get((date.today().isoformat(), store_id), {}).get("total_tokens", 0)
+        if used >= DAILY_TOKEN_BUDGET:
+            self.metrics["budget_rejected"] += 1
+            raise TokenBudgetExceeded(f"{store_id} 일일 AI 토큰 한도({DAILY_TOKEN_BUDGET:,}) 초과")
+
+    def record_usage(self, store_id, model, response_or_usage) -> dict:
+        usage = response_or_usage if isinstance(response_or_usage, dict) else usage_of(response_or_usage)
+        key = (date.today().isoformat(), store_id or SYSTEM_STORE)
+        with self._lock:
+            if key not in self._usage:
+                for old in [k for k in self._usage if k[0] != key[0]]:
+                    self._usage.pop(old, None)   # 날짜가 바뀌면 전날 집계 정리
+            acc = self._usage.setdefault(key, {"requests": 0, "input_tokens": 0, "output_tokens": 0,
+                                               "total_tokens": 0, "models": {}})
+            acc["requests"] += 1
+            for k in ("input_tokens", "output_tokens", "total_tokens"):
+                acc[k] += usage.get(k, 0)
+            acc["models"][model] = acc["models"].get(model, 0) + usage.get("total_tokens", 0)
+        return usage
+
+    # ── 호출 ───────────────────────────────────────────────────
+    @staticmethod
+    def _fingerprint(model, system, contents, config):
+        try:
+            raw = json.dumps([model, system, contents, config], ensure_ascii=False, sort_keys=True, default=str)
+        except (TypeError, ValueError):
+            return None
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def generate(self, contents, *, model=DEFAULT_MODEL, system=None, config=None,
+                       store_id=None, coalesce=True) -> dict:
+        """
+        비동기 단건 생성. 반환: {"text", "usage", "model"}
+        config: GenerateContentConfig 필드 dict (temperature, max_output_tokens, response_schema ...)
+        """
+        self.check_budget(store_id)
+        key = None
+        if coalesce and not (config or {}).get("tools"):
+            fp = self._fingerprint(model, system, contents, config)
+            key = (asyncio.get_running_loop(), fp) if fp is not None else None   # Future 는 루프 전용
+        while key is not None:
+            fut = self._inflight.get(key)
+            if fut is None:
+                break
+            self.metrics["coalesced"] += 1
+            try:
+                return dict(await asyncio.shield(fut))
+            except _LeaderCancelled:
+                continue    # 리더만 취소됨 — 먼저 깨어난 팔로워가 새 리더, 나머지는 거기에 합류
+        if key is not None:
+            fut = asyncio.get_running_loop().create_future()
+            self._inflight[key] = fut
+        try:
+            result = await self._generate(contents, model, system, config, store_id)
+            if key is not None:
+                fut.set_result(result)
+            return result
+        except BaseException as e:
+            if key is not None:
+                # 취소는 리더 자신의 것 — 팔로워에게 CancelledError 를 넘기지 않고 재시도 신호로 전달
+                fut.set_exception(_LeaderCancelled() if isinstance(e, asyncio.CancelledError) else e)
+                fut.exception()
+            raise
+        finally:
+            if key is not None:
+                self._inflight.pop(key, None)
+
+    async def _generate(self, contents, model, system, config, store_id):
+        client = self._require_client()
+        self.metrics["requests"] += 1
+        async with self.alimit(model):
+            try:
+                response = await client.aio.models.generate_content(
+                    model=model, contents=contents, config=self._config(system, config))
+            except Exception:
+                self.metrics["errors"] += 1
+                raise
+        usage = self.record_usage(store_id, model, response)
+        return {"text": (response.text or "").strip(), "usage": usage, "model": model}
+
+    async def stream(self, contents, *, model=DEFAULT_MODEL, system=None, config=None, store_id=None):
+        """비동기 스트리밍 생성 — 텍스트 청크를 순서대로 생성. 중단(aclose) 시 업스트림도 즉시 종료."""
+        self.check_budget(store_id)
+        client = self._require_client()
+        self.metrics["requests"] += 1
+        self.metrics["streams"] += 1
+        last = None
+        async with self.alimit(model):
+            try:
+                async for chunk in await client.aio.models.generate_content_stream(
+                        model=model, contents=contents, config=self._config(system, config)):
+                    last = chunk
+                    if chunk.text:
+                        yield chunk.text
+            except Exception:
+                self.metrics["errors"] += 1
+                raise
+            finally:
+                if last is not None:
+                    self.record_usage(store_id, model, last)
+
+    def generate_sync(self, contents, *, model=DEFAULT_MODEL, system=None, config=None, store_id=None) -> dict:
+        """동기 단건 생성 (스레드/동기 함수용). 반환 형식은 generate() 와 동일."""
+        self.check_budget(store_id)
+        client = self._require_client()
+        self.metrics["requests"] += 1
+        with self.limit(model):
+            try:
+                response = client.models.generate_content(
+                    model=model, contents=contents, config=self._config(system, config))
+            except Exception:
+                self.metrics["errors"] += 1
+                raise
+        usage = self.record_usage(store_id, model, response)
+        return {"text": (response.text or "").strip(), "usage": usage, "model": model}
+
+    # ── 지표 ───────────────────────────────────────────────────
+    def usage_report(self, day: str = None) -> dict:
+        day = day or date.today().isoformat()
+        return {store: dict(acc) for (d, store), acc in self._usage.items() if d == day}
+
+    def stats(self) -> dict:
+        limits = {m: {"in_use": lim._used, "limit": lim.limit, "async_waiting": len(lim._waiters)}
+                  for m, lim in list(self._limits.items())}
+        return {**self.metrics, "inflight": len(self._inflight), "limits": limits, "budget": DAILY_TOKEN_BUDGET,
+                "usage_today": self.usage_report(), "at": int(time.time())}
+
+
+llm_gateway = LLMGateway()
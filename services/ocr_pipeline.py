@@ -0,0 +1,177 @@
+"""
+📷 송장 OCR 전처리 + Gemini 호출 fast path (routers/ocr.gemini_ocr 공용)
+
+- 축소/재인코딩: 휴대폰 원본(4~12MB)을 픽셀 예산(OCR_MAX_PIXELS, 기본 약 2MP) 이하로 줄여 JPEG 재인코딩
+  JPEG 는 draft() 로 디코딩 단계에서 먼저 축소 → 큰 사진도 수십 ms, 업로드 용량은 보통 1/10 이하
+  OCR_GRAYSCALE=1 이면 흑백 변환 (송장 판독에는 색 정보가 거의 필요 없음)
+- 중복 제거: 원본 이미지 바이트의 sha256 으로 결과 캐시 조회 (완전히 같은 파일만 일치)
+  키오스크 더블탭/재전송처럼 같은 송장 사진이면 Gemini 를 다시 호출하지 않음, 동시 요청은 병합
+  지각 해시 근사 일치는 쓰지 않음 — 번호 한 자리만 다른 송장이 같은 해시가 되어 다른 고객 정보가 반환됨
+- 공용 클라이언트: Gemini 호출은 프로세스 단위 httpx.AsyncClient (HTTP/2 가능 시 사용, keep-alive 재사용)
+"""
+import asyncio
+import base64
+import hashlib
+import io
+import os
+import time
+from collections import OrderedDict
+
+import httpx
+
+from logger import logger
+
+MAX_PIXELS = int(os.getenv("OCR_MAX_PIXELS", str(1600 * 1200)))
+JPEG_QUALITY = int(os.getenv("OCR_JPEG_QUALITY", "82"))
+GRAYSCALE = os.getenv("OCR_GRAYSCALE", "0") == "1"
+
+RESULT_TTL_SEC = 600
+RESULT_MAX_ENTRIES = 256
+
+
+def prepare_image(raw: bytes, mime_type: str = "image/jpeg") -> dict:
+    """
+    원본 이미지 → {data, mime_type, digest, orig_bytes, bytes, size}
+    digest 는 원본 바이트의 sha256. Pillow 가 없거나 디코딩에 실패하면 원본을 그대로 사용.
+    """
+    digest = hashlib.sha256(raw).hexdigest()
+    try:
+        from PIL import Image, ImageOps
+        img = Image.open(io.BytesIO(raw))
+        scale = (MAX_PIXELS / (img.width * img.height)) ** 0.5
+        if scale < 1 and img.format == "JPEG":
+            img.draft("L" if GRAYSCALE else "RGB", (int(img.width * scale), int(img.height * scale)))
+        img = ImageOps.exif_transpose(img)
+        if img.width * img.height > MAX_PIXELS:
+            scale = (MAX_PIXELS / (img.width * img.height)) ** 0.5
+            img = img.resize((max(1, int(img.width * scale)), max(1, int(img.height * scale))), Image.LANCZOS)
+        img = img.convert("L" if GRAYSCALE else "RGB")
+        out = io.BytesIO()
+        img.save(out, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+        data = out.getvalue()
+        if len(data) >= len(raw) and mime_type == "image/jpeg":
+            data = raw   # 이미 작은 JPEG 는 재인코딩본이 더 크면 원본 유지
+        return {"data": data, "mime_type": "image/jpeg", "digest": digest,
+                "orig_bytes": len(raw), "bytes": len(data), "size": img.size}
+    except Exception as e:
+        logger.warning(f"[ocr_pipeline] 이미지 전처리 건너뜀 | {e}")
+        return {"data": raw, "mime_type": mime_type or "image/jpeg", "digest": digest,
+                "orig_bytes": len(raw), "bytes": len(raw), "size": None}
+
+
+class OcrPipeline:
+    def __init__(self):
+        self._client = None
+        self._results = OrderedDict()   # sha256 → (expires_at, gemini 응답 텍스트)
+        self._inflight = {}             # sha256 → Future
+        self.metrics = {"requests": 0, "cache_hit": 0, "coalesced": 0, "gemini_calls": 0,
+                        "orig_bytes": 0, "sent_bytes": 0, "prep_ms": 0.0}
+
+    def _http(self):
+        if self._client is None:
+            try:
+                import h2  # noqa: F401  httpx[http2]
+                http2 = True
+            except ImportError:
+                http2 = False
+            self._client = httpx.AsyncClient(
+                http2=http2,
+                timeout=httpx.Timeout(20.0, connect=5.0),
+                limits=httpx.Limits(max_keepalive_connections=10, max_connections=20),
+            )
+        return self._client
+
+    # ── 결과 캐시 ──────────────────────────────────────────────
+    def _cache_get(self, digest):
+        entry = self._results.get(digest)
+        if entry is None:
+            return None
+        if entry[0] <= time.time():
+            self._results.pop(digest, None)
+            return None
+        self._results.move_to_end(digest)
+        return entry[1]
+
+    def _cache_put(self, digest, text):
+        self._results[digest] = (time.time() + RESULT_TTL_SEC, text)
+        while len(self._results) > RESULT_MAX_ENTRIES:
+            self._results.popitem(last=False)
+
+    # ── Gemini 호출 ────────────────────────────────────────────
+    async def _call_gemini(self, url: str, api_key: str, system_instruction: str, prepared: dict):
+        """반환: (응답 텍스트 | None, 오류 메시지 | None)"""
+        self.metrics["gemini_calls"] += 1
+        payload = {
+            "system_instruction": {"parts": [{"text": system_instruction}]},
+            "contents": [{"parts": [
+                {"inline_data": {"mime_type": prepared["mime_type"],
+                                 "data": base64.b64encode(prepared["data"]).decode("utf-8")}}
+            ]}],
+            "generationConfig": {"temperature": 0, "responseMimeType": "application/json"}
+        }
+        resp = await self._http().post(f"{url}?key={api_key}", json=payload)
+        if resp.status_code != 200:
+            return None, f"Gemini API HTTP {resp.status_code}: {resp.text[:400]}"
+        data = resp.json()
+        return data["candidates"][0]["content"]["parts"][0]["text"].strip(), None
+
+    async def extract(self, raw: bytes, mime_type: str, url: str, api_key: str, system_instruction: str):
+        """
+        이미지 → Gemini 판독 텍스트. 반환: (텍스트 | None, 오류 | None, 메타)
+        메타: {cached, orig_bytes, bytes, prep_ms}
+        """
+        self.metrics["requests"] += 1
+        started = time.perf_counter()
+        prepared = await asyncio.to_thread(prepare_image, raw, mime_type)
+        prep_ms = round((time.perf_counter() - started) * 1000, 1)
+        self.metrics["prep_ms"] += prep_ms
+        self.metrics["orig_bytes"] += prepared["orig_bytes"]
+        meta = {"cached": False, "orig_bytes": prepared["orig_bytes"],
+                "bytes": prepared["bytes"], "prep_ms": prep_ms}
+
+        digest = prepared["digest"]
+        cached = self._cache_get(digest)
+        if cached is not None:
+            self.metrics["cache_hit"] += 1
+            return cached, None, {**meta, "cached": True}
+
+        fut = self._inflight.get(digest)
+        if fut is not None:
+            self.metrics["coalesced"] += 1
+            text, err = await asyncio.shield(fut)
+            return text, err, {**meta, "cached": True}
+
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[digest] = fut
+        try:
+            self.metrics["sent_bytes"] += prepared["bytes"]
+            text, err = await self._call_gemini(url, api_key, system_instruction, prepared)
+            if text is not None:
+                self._cache_put(digest, text)
+            fut.set_result((text, err))
+            return text, err, meta
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                fut.cancel()
+            else:
+                fut.set_exception(e)
+                fut.exception()
+            raise
+        finally:
+            self._inflight.pop(digest, None)
+
+    def stats(self) -> dict:
+        m = self.metrics
+        calls = max(1, m["requests"])
+        return {**m, "prep_ms": round(m["prep_ms"], 1),
+                "avg_prep_ms": round(m["prep_ms"] / calls, 1),
+                "bytes_saved_ratio": round(1 - m["sent_bytes"] / m["orig_bytes"], 3) if m["orig_bytes"] else 0.0,
+                "cached_results": len(self._results)}
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+ocr_pipeline = OcrPipeline()
@@ -0,0 +1,262 @@
+"""
+🔌 Redis 클라이언트 레지스트리 (프로세스 공용)
+
+- URL 별 동기 클라이언트 1개 + BlockingConnectionPool (REDIS_POOL_MAX, 기본 32)
+  호출마다 redis.from_url() 로 클라이언트/풀을 새로 만들던 경로(batch_scheduler, tantan_admin,
+  tantan_payment, tantan_admin_auth, bulk_intake)를 하나의 풀로 통합
+  풀이 가득 차면 REDIS_POOL_TIMEOUT 초까지 대기 (연결 수 상한 보장)
+- 비동기(redis.asyncio) 클라이언트: FastAPI 핸들러용, (URL, 이벤트 루프) 별 1개
+  루프 객체를 WeakKeyDictionary 키로 보관 (id() 재사용으로 닫힌 루프의 클라이언트를 돌려주지 않음)
+  닫힌 루프의 항목은 다음 aget() 때 정리, 임시 루프는 run() 으로 실행하면 종료 직전에 클라이언트를 닫음
+- 파이프라인 헬퍼: pipelined()/apipelined() — 여러 명령을 1회 왕복으로 실행
+- Lua 스크립트: script()/ascript() — (URL, 소스) 별 Script 객체 캐시, 비동기는 루프 항목 안에 보관
+  (SHA1 은 로컬 계산, EVALSHA 호출, 서버에 없으면(NOSCRIPT) 자동 SCRIPT LOAD 후 재시도)
+- 지표: 명령 수·오류·평균/최대 지연, 파이프라인 수, 풀 연결 생성/사용 중/대기 시간
+"""
+import asyncio
+import os
+import threading
+import time
+import weakref
+
+from logger import logger
+
+DEFAULT_URL = "redis://localhost:6379/1"
+POOL_MAX = int(os.getenv("REDIS_POOL_MAX", "32"))
+POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", "5"))
+SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "5"))
+CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", "2"))
+
+
+def default_url() -> str:
+    return os.environ.get("REDIS_URL", DEFAULT_URL)
+
+
+def _new_metrics():
+    return {"commands": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0, "pipelines": 0,
+            "pool_created": 0, "pool_in_use": 0, "pool_wait_max_ms": 0.0}
+
+
+class RedisRegistry:
+    def __init__(self):
+        self._sync = {}        # url → redis.Redis
+        self._async = weakref.WeakKeyDictionary()   # 이벤트 루프 → {"clients": {url: Redis}, "scripts": {(url, 소스): AsyncScript}}
+        self._scripts = {}     # (url, 소스) → Script
+        self._lock = threading.Lock()
+        self.metrics = {}      # url → 지표
+
+    # ── 지표 ───────────────────────────────────────────────────
+    def _m(self, url):
+        m = self.metrics.get(url)
+        if m is None:
+            m = self.metrics.setdefault(url, _new_metrics())
+        return m
+
+    def _observe(self, url, started, ok=True, pipeline=False):
+        m = self._m(url)
+        ms = (time.perf_counter() - started) * 1000
+        m["pipelines" if pipeline else "commands"] += 1
+        m["total_ms"] += ms
+        if ms > m["max_ms"]:
+            m["max_ms"] = ms
+        if not ok:
+            m["errors"] += 1
+
+    def _pool_checkout(self, url, started):
+        m = self._m(url)
+        m["pool_in_use"] += 1
+        wait_ms = (time.perf_counter() - started) * 1000
+        if wait_ms > m["pool_wait_max_ms"]:
+            m["pool_wait_max_ms"] = wait_ms
+
+    # ── 동기 클라이언트 ─────────────────────────────────────────
+    def get(self, url: str = None):
+        """동기 redis.Redis (decode_responses=True). 같은 URL 은 같은 클라이언트/풀을 공유."""
+        url = url or default_url()
+        client = self._sync.get(url)
+        if client is None:
+            with self._lock:
+                client = self._sync.get(url)
+                if client is None:
+                    client = self._sync[url] = self._build_sync(url)
+                    logger.info(f"[redis] 공용 풀 생성 | max={POOL_MAX}")
+        return client
+
+    def _build_sync(self, url):
+        import redis
+        registry = self
+
+        class _Pool(redis.BlockingConnectionPool):
+            def make_connection(self):
+                registry._m(url)["pool_created"] += 1
+                return super().make_connection()
+
+            def get_connection(self, *args, **kwargs):
+                started = time.perf_counter()
+                conn = super().get_connection(*args, **kwargs)
+                registry._pool_checkout(url, started)
+                return conn
+
+            def release(self, connection):
+                registry._m(url)["pool_in_use"] -= 1
+                super().release(connection)
+
+        class _Redis(redis.Redis):
+            def execute_command(self, *args, **options):
+                started, ok = time.perf_counter(), False
+                try:
+                    result = super().execute_command(*args, **options)
+                    ok = True
+                    return result
+                finally:
+                    registry._observe(url, started, ok)
+
+        pool = _Pool.from_url(url, max_connections=POOL_MAX, timeout=POOL_TIMEOUT, decode_responses=True,
+                              socket_timeout=SOCKET_TIMEOUT, socket_connect_timeout=CONNECT_TIMEOUT,
+                              health_check_interval=30)
+        return _Redis(connection_pool=pool)
+
+    def pipelined(self, build, url: str = None, transaction: bool = False) -> list:
+        """build(pipe) 로 명령 적재 → 1회 왕복 실행, 결과 리스트 반환."""
+        pipe = self.get(url).pipeline(transaction=transaction)
+        build(pipe)
+        started, ok = time.perf_counter(), False
+        try:
+            result = pipe.execute()
+            ok = True
+            return result
+        finally:
+            self._observe(url or default_url(), started, ok, pipeline=True)
+
+    # ── 비동기 클라이언트 ───────────────────────────────────────
+    def _loop_entry(self):
+        loop = asyncio.get_running_loop()
+        entry = self._async.get(loop)
+        if entry is None:
+            with self._lock:
+                self._prune_closed()
+                entry = self._async.setdefault(loop, {"clients": {}, "scripts": {}})
+        return entry
+
+    def _prune_closed(self):
+        """닫힌 루프의 클라이언트 제거 (그 루프에서만 await 가능하므로 참조만 끊고 소켓은 GC 에 맡김)."""
+        for loop in [lp for lp in list(self._async.keys()) if lp.is_closed()]:
+            entry = self._async.pop(loop, None)
+            if entry and entry["clients"]:
+                logger.debug(f"[redis] 닫힌 루프의 비동기 클라이언트 {len(entry['clients'])}개 정리")
+
+    def aget(self, url: str = None):
+        """redis.asyncio.Redis — 현재 이벤트 루프 전용 (루프마다 별도 풀)."""
+        url = url or default_url()
+        clients = self._loop_entry()["clients"]
+        client = clients.get(url)
+        if client is None:
+            client = clients[url] = self._build_async(url)
+        return client
+
+    def _build_async(self, url):
+        import redis.asyncio as aioredis
+        registry = self
+
+        class _Pool(aioredis.BlockingConnectionPool):
+            def make_connection(self):
+                registry._m(url)["pool_created"] += 1
+                return super().make_connection()
+
+            async def get_connection(self, *args, **kwargs):
+                started = time.perf_counter()
+                conn = await super().get_connection(*args, **kwargs)
+                registry._pool_checkout(url, started)
+                return conn
+
+            async def release(self, connection):
+                registry._m(url)["pool_in_use"] -= 1
+                await super().release(connection)
+
+        class _Redis(aioredis.Redis):
+            async def execute_command(self, *args, **options):
+                started, ok = time.perf_counter(), False
+                try:
+                    result = await super().execute_command(*args, **options)
+                    ok = True
+                    return result
+                finally:
+                    registry._observe(url, started, ok)
+
+        pool = _Pool.from_url(url, max_connections=POOL_MAX, timeout=POOL_TIMEOUT, decode_responses=True,
+                              socket_timeout=SOCKET_TIMEOUT, socket_connect_timeout=CONNECT_TIMEOUT)
+        return _Redis(connection_pool=pool)
+
+    async def apipelined(self, build, url: str = None, transaction: bool = False) -> list:
+        """비동기 pipelined()."""
+        pipe = self.aget(url).pipeline(transaction=transaction)
+        build(pipe)
+        started, ok = time.perf_counter(), False
+        try:
+            result = await pipe.execute()
+            ok = True
+            return result
+        finally:
+            self._observe(url or default_url(), started, ok, pipeline=True)
+
+    # ── Lua 스크립트 ───────────────────────────────────────────
+    def script(self, source: str, url: str = None):
+        """동기 Script — script(keys=[...], args=[...]) 로 호출."""
+        key = (url or default_url(), source)
+        script = self._scripts.get(key)
+        if script is None:
+            script = self._scripts[key] = self.get(url).register_script(source)
+        return script
+
+    def ascript(self, source: str, url: str = None):
+        """비동기 AsyncScript — await script(keys=[...], args=[...])."""
+        key = (url or default_url(), source)
+        scripts = self._loop_entry()["scripts"]
+        script = scripts.get(key)
+        if script is None:
+            script = scripts[key] = self.aget(url).register_script(source)
+        return script
+
+    # ── 지표 / 종료 ────────────────────────────────────────────
+    def stats(self) -> dict:
+        out = {}
+        for url, m in self.metrics.items():
+            calls = m["commands"] + m["pipelines"]
+            host = url.rsplit("@", 1)[-1]   # 비밀번호 노출 방지
+            out[host] = {**m, "total_ms": round(m["total_ms"], 1), "max_ms": round(m["max_ms"], 1),
+                         "avg_ms": round(m["total_ms"] / calls, 2) if calls else 0.0,
+                         "pool_wait_max_ms": round(m["pool_wait_max_ms"], 1), "pool_max": POOL_MAX}
+        return out
+
+    async def aclose_loop(self):
+        """현재 이벤트 루프의 비동기 클라이언트를 닫고 항목 제거."""
+        entry = self._async.pop(asyncio.get_running_loop(), None)
+        for client in (entry or {}).get("clients", {}).values():
+            try:
+                await client.aclose() if hasattr(client, "aclose") else await client.close()
+            except Exception as e:
+                logger.debug(f"[redis] 비동기 클라이언트 종료 오류 | {e}")
+
+    def run(self, coro):
+        """asyncio.run() 대체 — 임시 루프(작업 스레드)가 끝나기 전에 그 루프의 클라이언트를 닫음."""
+        async def _main():
+            try:
+                return await coro
+            finally:
+                await self.aclose_loop()
+        return asyncio.run(_main())
+
+    async def aclose(self):
+        """앱 종료 — 현재 루프의 비동기 클라이언트와 동기 풀 정리 (다른 루프 항목은 참조만 제거)."""
+        await self.aclose_loop()
+        with self._lock:
+            self._async.clear()
+        for url, client in list(self._sync.items()):
+            client.connection_pool.disconnect()
+            self._sync.pop(url, None)
+        self._scripts.clear()
+
+
+redis_registry = RedisRegistry()
+get_redis = redis_registry.get
+aget_redis = redis_registry.aget
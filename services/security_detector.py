@@ -0,0 +1,343 @@
+"""
+🚨 실시간 보안 이상 감지기 (webhook_logs / security_logs 스트리밍 감시)
+
+- 기록 시점에 바로 관측: db_manager 의 save_webhook_log / update_webhook_log / log_security_event 래퍼가
+  observe_*() 를 호출 → 1시간/30분마다 최근 로그를 다시 집계하던 cron_jobs.check_security_anomalies /
+  watch_auth_fail 대체
+- 규칙별 슬라이딩 윈도 카운터: 링 버킷(BUCKETS 칸) × count-min sketch(DEPTH × WIDTH)
+  키(IP · 토큰 앞자리 · 전화번호 · 가맹점+이벤트) 수와 무관하게 규칙당 메모리 상한 고정 (DEPTH×WIDTH×4B × (BUCKETS+1))
+  버킷 합계 테이블을 유지해 관측 1건당 O(DEPTH) — 윈도 전체 재집계 없음 (추정치는 실제 이상, 과소 추정 없음)
+- 경보: 규칙 임계 도달 시 (규칙, 키) 별 cooldown 동안 1회만. ALERT_BATCH_SEC 안의 경보는 SMS 1건으로 묶어
+  전용 스레드에서 발송 (요청 경로 비차단), SMS 1건당 ALERT_SMS_LINES 줄까지 + "외 N건" 요약.
+  Redis SET NX 로 워커 간 중복 경보 차단 (Redis 불가 시 프로세스 단위)
+- 카운트는 프로세스(워커)별 — 단, 키가 "*" 인 전체 합계 규칙(auth_fail_total, webhook_error)은
+  Redis INCR 윈도 카운터(BUCKETS 칸, 파이프라인 1회 왕복)로 클러스터 전체 건수를 셈 (Redis 불가 시 로컬 추정치)
+- stats(): 규칙별 관측·경보 수, 임계 근접 상위 키(TOP_KEYS), 발송 대기/실패
+"""
+import hashlib
+import os
+import queue
+import threading
+import time
+from array import array
+from collections import Counter, OrderedDict, deque
+
+from logger import logger
+
+DEPTH = 4
+WIDTH = 2048
+BUCKETS = 12
+TOP_KEYS = 20
+PENDING_LOGS_MAX = 4096        # log_id → (IP, 전화번호) — 단계 갱신 시 출처 복원용
+ALERT_BATCH_SEC = float(os.getenv("SECURITY_ALERT_BATCH_SEC", "5"))
+ALERT_HISTORY = 50
+ALERT_SMS_LINES = int(os.getenv("SECURITY_ALERT_SMS_LINES", "5"))
+ALERT_KEY_PREFIX = "tantan:secdet:alert:"
+COUNT_KEY_PREFIX = "tantan:secdet:count:"
+
+
+class SlidingSketch:
+    """window_sec 를 BUCKETS 칸으로 나눈 링 버킷, 칸마다 count-min 테이블. add() 가 윈도 내 추정 건수를 반환."""
+
+    def __init__(self, window_sec, buckets=BUCKETS, depth=DEPTH, width=WIDTH):
+        self.window_sec = window_sec
+        self.span = window_sec / buckets
+        self.depth, self.width = depth, width
+        self._slots = [None] * buckets   # 칸별 테이블 — 처음 쓰일 때 할당 (이벤트 없는 규칙은 메모리 0)
+        self._total = None
+        self._epoch = None         # 마지막으로 반영한 칸 번호
+
+    def _cells(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=4 * self.depth).digest()
+        return [row * self.width + int.from_bytes(digest[4 * row:4 * row + 4], "little") % self.width
+                for row in range(self.depth)]
+
+    def _table(self):
+        return array("I", bytes(4 * self.depth * self.width))
+
+    def _advance(self, now):
+        epoch = int(now // self.span)
+        if self._epoch is None:
+            self._epoch = epoch
+            self._total = self._table()
+        n = len(self._slots)
+        # 지나간 칸(최대 n칸)만 비움 — 오래 조용했어도 한 바퀴 이상 돌지 않음
+        for e in range(max(self._epoch + 1, epoch - n + 1), epoch + 1):
+            slot = self._slots[e % n]
+            if slot is not None:
+                total = self._total
+                for i, v in enumerate(slot):
+                    if v:
+                        total[i] -= v
+                self._slots[e % n] = None
+        if epoch > self._epoch:
+            self._epoch = epoch
+        slot = self._slots[epoch % n]
+        if slot is None:
+            slot = self._slots[epoch % n] = self._table()
+        return slot
+
+    def add(self, key, now=None) -> int:
+        slot = self._advance(time.time() if now is None else now)
+        cells = self._cells(key)
+        for i in cells:
+            slot[i] += 1
+            self._total[i] += 1
+        return min(self._total[i] for i in cells)
+
+    def estimate(self, key, now=None) -> int:
+        if self._epoch is None:
+            return 0
+        self._advance(time.time() if now is None else now)
+        return min(self._total[i] for i in self._cells(key))
+
+
+class Rule:
+    def __init__(self, name, source, window_sec, threshold, cooldown_sec, label, key_fn, when=None):
+        self.name = name
+        self.source = source        # "webhook" | "security"
+        self.window_sec = window_sec
+        self.threshold = threshold
+        self.cooldown_sec = cooldown_sec
+        self.label = label
+        self.key_fn = key_fn        # 이벤트 dict → 키 문자열 | None(해당 없음)
+        self.when = when            # 이벤트 dict → bool
+        self.sketch = SlidingSketch(window_sec)
+        self.top = {}               # 키 → (추정 건수, 마지막 관측) — TOP_KEYS 개 유지
+        self.metrics = {"observed": 0, "alerts": 0, "suppressed": 0}
+
+
+def _minutes(sec):
+    return f"{sec // 60}분" if sec < 3600 else f"{sec // 3600}시간"
+
+
+def _default_rules():
+    auth_fail = lambda ev: ev.get("stage") == "AUTH_FAIL"
+    return [
+        # 기존 watch_auth_fail: 30분 내 AUTH_FAIL 3건 이상
+        Rule("auth_fail_total", "webhook", 1800, 3, 1800, "콜백 인증 실패 다발",
+             lambda ev: "*", auth_fail),
+        # 기존 즉시 경보(토큰 불일치) — 새 토큰은 첫 건에 알리고 30분간 반복 억제
+        Rule("auth_fail_token", "webhook", 1800, 1, 1800, "앱 토큰 불일치",
+             lambda ev: ev.get("token") or None, auth_fail),
+        Rule("auth_fail_ip", "webhook", 300, 5, 900, "동일 IP 인증 실패 반복",
+             lambda ev: ev.get("source_ip") or None, auth_fail),
+        Rule("webhook_ip_flood", "webhook", 60, 120, 600, "동일 IP 웹훅 폭주",
+             lambda ev: ev.get("source_ip") or None, lambda ev: ev.get("stage") == "RECEIVED" and ev.get("new")),
+        Rule("phone_invalid_ip", "webhook", 600, 20, 1800, "잘못된 번호 대량 유입",
+             lambda ev: ev.get("source_ip") or None, lambda ev: ev.get("stage") == "PHONE_INVALID"),
+        Rule("rate_limited_phone", "webhook", 600, 10, 1800, "동일 번호 발송 제한 반복",
+             lambda ev: ev.get("customer_phone") or None, lambda ev: ev.get("stage") == "RATE_LIMITED"),
+        Rule("webhook_error", "webhook", 600, 10, 1800, "콜백 처리 오류 다발",
+             lambda ev: "*", lambda ev: ev.get("stage") == "ERROR"),
+        # 기존 check_security_anomalies: 1시간 내 (가맹점, 이벤트) 5건 이상
+        Rule("security_event", "security", 3600, 5, 3600, "보안 이벤트 다수 발생",
+             lambda ev: f"{ev.get('store_id') or 'UNKNOWN'}|{ev.get('event_type') or 'UNKNOWN'}"),
+        Rule("security_phone", "security", 600, 10, 1800, "동일 번호 보안 이벤트 반복",
+             lambda ev: ev.get("customer_phone") or None),
+    ]
+
+
+class SecurityDetector:
+    def __init__(self, rules=None):
+        self.rules = rules if rules is not None else _default_rules()
+        self._pending = OrderedDict()       # webhook log_id → (source_ip, customer_phone)
+        self._cooldown = {}                 # (규칙, 키) → 경보 가능 시각
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._sender = None
+        self._recent = deque(maxlen=ALERT_HISTORY)
+        self.enabled = os.getenv("SECURITY_DETECTOR", "on").lower() not in ("0", "off", "false")
+        self.metrics = {"webhook_events": 0, "security_events": 0, "alerts": 0, "sms_sent": 0,
+                        "sms_failed": 0, "dedup_remote": 0, "cluster_fallback": 0, "errors": 0}
+
+    # ── 입력 ───────────────────────────────────────────────────
+    def observe_webhook_saved(self, log_id, source_ip="", customer_phone="", stage="RECEIVED", **_):
+        if not self.enabled:
+            return
+        if log_id:
+            with self._lock:
+                self._pending[log_id] = (source_ip or "", customer_phone or "")
+                if len(self._pending) > PENDING_LOGS_MAX:
+                    self._pending.popitem(last=False)
+        self._observe("webhook", {"stage": stage, "source_ip": source_ip, "customer_phone": customer_phone,
+                                  "new": True})
+
+    def observe_webhook_updated(self, log_id, stage=None, customer_phone=None, token=None, **_):
+        """단계 갱신. 전화번호만 바뀐 갱신은 출처 정보만 보정하고 카운트하지 않음."""
+        if not self.enabled:
+            return
+        with self._lock:
+            source_ip, phone = self._pending.get(log_id, ("", ""))
+            if customer_phone and log_id in self._pending:
+                self._pending[log_id] = (source_ip, customer_phone)
+        if not stage:
+            return
+        self._observe("webhook", {"stage": stage, "source_ip": source_ip,
+                                  "customer_phone": customer_phone or phone, "token": token})
+
+    def observe_security_event(self, store_id, customer_phone, event_type):
+        if not self.enabled:
+            return
+        self._observe("security", {"store_id": store_id, "customer_phone": customer_phone,
+                                   "event_type": event_type})
+
+    def _observe(self, source, event):
+        now = time.time()
+        self.metrics[f"{source}_events"] += 1
+        try:
+            fired, cluster = [], []
+            with self._lock:
+                for rule in self.rules:
+                    if rule.source != source or (rule.when and not rule.when(event)):
+                        continue
+                    key = rule.key_fn(event)
+                    if key is None:
+                        continue
+                    rule.metrics["observed"] += 1
+                    count = rule.sketch.add(key, now)
+                    if key == "*":
+                        cluster.append((rule, key, count))   # 전체 합계 — 잠금 밖에서 Redis 카운트로 대체
+                        continue
+                    self._check(rule, key, count, now, fired)
+                self._prune_cooldown(now)
+            for rule, key, local_count in cluster:
+                count = self._cluster_count(rule, now)
+                with self._lock:
+                    self._check(rule, key, local_count if count is None else count, now, fired)
+            for rule, key, count in fired:
+                self._raise(rule, key, count, event, now)
+        except Exception as e:
+            self.metrics["errors"] += 1
+            logger.debug(f"[security_detector] 관측 오류 | {e}")
+
+    def _check(self, rule, key, count, now, fired):
+        """임계 도달 + cooldown 밖이면 fired 에 추가 (잠금 안에서 호출)."""
+        self._track(rule, key, count, now)
+        if count < rule.threshold:
+            return
+        if self._cooldown.get((rule.name, key), 0) > now:
+            rule.metrics["suppressed"] += 1
+            return
+        self._cooldown[(rule.name, key)] = now + rule.cooldown_sec
+        fired.append((rule, key, count))
+
+    def _cluster_count(self, rule, now):
+        """전체 합계 규칙의 클러스터 윈도 건수 — 현재 칸 INCR + 윈도 칸 MGET (1회 왕복). Redis 불가 시 None."""
+        try:
+            from services.redis_registry import redis_registry
+            span = rule.sketch.span
+            epoch = int(now // span)
+            keys = [f"{COUNT_KEY_PREFIX}{rule.name}:{e}" for e in range(epoch - BUCKETS + 1, epoch + 1)]
+
+            def build(pipe):
+                pipe.incr(keys[-1])
+                pipe.expire(keys[-1], int(rule.window_sec + span) + 1)
+                pipe.mget(keys)
+
+            _, _, values = redis_registry.pipelined(build)
+            return sum(int(v) for v in values if v)
+        except Exception as e:
+            self.metrics["cluster_fallback"] += 1
+            logger.debug(f"[security_detector] 클러스터 카운터 불가, 로컬 추정치 사용 | {e}")
+            return None
+
+    @staticmethod
+    def _track(rule, key, count, now):
+        """임계 절반 이상 도달한 키만 상위 목록에 유지 (TOP_KEYS 초과 시 가장 적은 키 제거)."""
+        if count * 2 < rule.threshold and key not in rule.top:
+            return
+        rule.top[key] = (count, now)
+        if len(rule.top) > TOP_KEYS:
+            horizon = now - rule.window_sec
+            victim = min(rule.top, key=lambda k: (rule.top[k][1] >= horizon, rule.top[k][0]))
+            rule.top.pop(victim, None)
+
+    def _prune_cooldown(self, now):
+        if len(self._cooldown) > 4 * TOP_KEYS * len(self.rules):
+            for k in [k for k, until in self._cooldown.items() if until <= now]:
+                self._cooldown.pop(k, None)
+
+    # ── 경보 ───────────────────────────────────────────────────
+    def _claim_remote(self, rule, key):
+        """워커 간 중복 경보 차단 — Redis 불가 시 로컬 cooldown 만 적용."""
+        try:
+            from services.redis_registry import get_redis
+            digest = hashlib.blake2b(key.encode(), digest_size=8).hexdigest()
+            return bool(get_redis().set(f"{ALERT_KEY_PREFIX}{rule.name}:{digest}", "1",
+                                        nx=True, ex=rule.cooldown_sec))
+        except Exception:
+            return True
+
+    def _raise(self, rule, key, count, event, now):
+        if not self._claim_remote(rule, key):
+            self.metrics["dedup_remote"] += 1
+            return
+        rule.metrics["alerts"] += 1
+        self.metrics["alerts"] += 1
+        shown = "전체" if key == "*" else key
+        line = f"{rule.label}: {shown} — 최근 {_minutes(rule.window_sec)} {count}건"
+        if event.get("source_ip") and rule.name in ("auth_fail_token", "auth_fail_total"):
+            line += f" (IP {event['source_ip']})"
+        alert = {"rule": rule.name, "label": rule.label, "key": shown, "count": count, "at": now, "message": line}
+        self._recent.append(alert)
+        logger.warning(f"[security_detector] {line}")
+        self._queue.put(alert)
+        self._ensure_sender()
+
+    def _ensure_sender(self):
+        if self._sender is not None and self._sender.is_alive():
+            return
+        with self._lock:
+            if self._sender is None or not self._sender.is_alive():
+                self._sender = threading.Thread(target=self._send_loop, name="security-alert", daemon=True)
+                self._sender.start()
+
+    def _send_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.time() + ALERT_BATCH_SEC
+            while True:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._send(batch)
+
+    def _send(self, batch):
+        try:
+            import config
+            import sms_manager
+            admin_phone = config.get_secret("ADMIN_ALERT_PHONE", "01023847447")
+            body = "\n".join(f"- {a['message']}" for a in batch[:ALERT_SMS_LINES])
+            if len(batch) > ALERT_SMS_LINES:
+                rest = Counter(a["label"] for a in batch[ALERT_SMS_LINES:])
+                body += f"\n- 외 {len(batch) - ALERT_SMS_LINES}건 (" + ", ".join(f"{k} {n}" for k, n in rest.most_common()) + ")"
+            sms_manager.send_cloud_sms(
+                admin_phone,
+                f"[동네비서 보안 경보]\n{body}\n→ tantanfab.com/admin/webhook-monitor 확인 요망.",
+                store_id="SYSTEM"
+            )
+            self.metrics["sms_sent"] += 1
+        except Exception as e:
+            self.metrics["sms_failed"] += 1
+            logger.error(f"[security_detector] 경보 발송 실패 | {e}")
+
+    # ── 조회 ───────────────────────────────────────────────────
+    def stats(self) -> dict:
+        now = time.time()
+        rules = {}
+        for rule in self.rules:
+            horizon = now - rule.window_sec
+            top = sorted(((k, c) for k, (c, seen) in rule.top.items() if seen >= horizon),
+                         key=lambda kc: -kc[1])
+            rules[rule.name] = {**rule.metrics, "window_sec": rule.window_sec, "threshold": rule.threshold,
+                                "top": [{"key": k, "count": c} for k, c in top]}
+        return {**self.metrics, "enabled": self.enabled, "pending_logs": len(self._pending),
+                "queued_alerts": self._queue.qsize(), "recent_alerts": list(self._recent), "rules": rules}
+
+
+security_detector = SecurityDetector()
@@ -0,0 +1,251 @@
+"""
+🧰 AI 도구 결과 캐시 (공공데이터 조회: KAMIS 시세 · 농축수산물 표준코드 · 코레일 시간표 · 관광지 해설)
+
+- 도구별 TTL + stale 구간: TTL 이 지나도 stale 구간 안이면 이전 결과를 즉시 반환하고 백그라운드에서 갱신
+  갱신이 실패하면 기존 결과 유지 (외부 API 장애 중에도 마지막 정상 결과 제공)
+- L1 = 프로세스 메모리, L2 = ai_store.db 의 tool_result_cache (재시작 후에도 warm)
+- 같은 인자 동시 호출은 1회만 실행 (스레드 간 병합), 예외(APIRequestError 등)는 캐시하지 않음
+- warm(): 자주 묻는 항목(지역 농산물 시세, 태백역 노선)을 만료 전에 미리 갱신 — cron_jobs 에서 주기 호출
+- stats(): 도구별 hit / stale / miss / db_hit / coalesced / refresh / error
+"""
+import functools
+import inspect
+import json
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from logger import logger
+
+DB_PATH = Path(__file__).parent.parent / "ai_store.db"
+
+REFRESH_WORKERS = 2
+WAIT_INFLIGHT_SEC = 30
+PREFETCH_AGE_RATIO = 0.5        # TTL 의 절반이 지난 항목부터 미리 갱신
+L1_MAX_ENTRIES = 2000
+
+
+def _new_counters():
+    return {"hit": 0, "stale": 0, "miss": 0, "db_hit": 0, "coalesced": 0,
+            "refresh": 0, "refresh_error": 0, "error": 0}
+
+
+class ToolResultCache:
+    def __init__(self, db_path=DB_PATH):
+        self.db_path = str(db_path)
+        self._l1 = {}              # cache_key → (stored_at, result)
+        self._policies = {}        # 도구명 → (ttl, stale)
+        self._inflight = {}        # cache_key → threading.Event
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._executor = None
+        self._table_ready = False
+        self.metrics = {}          # 도구명 → 카운터
+
+    # ── 영구 저장소 ─────────────────────────────────────────────
+    def _conn(self):
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        conn.row_factory = sqlite3.Row
+        if not self._table_ready:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS tool_result_cache (
+                    cache_key    TEXT PRIMARY KEY,
+                    tool         TEXT NOT NULL,
+                    result_json  TEXT NOT NULL,
+                    stored_at    REAL NOT NULL,
+                    expires_at   REAL NOT NULL,
+                    hits         INTEGER DEFAULT 0
+                )
+            """)
+            conn.commit()
+            self._table_ready = True
+        return conn
+
+    def _db_get(self, key):
+        try:
+            conn = self._conn()
+            row = conn.execute("SELECT result_json, stored_at, expires_at FROM tool_result_cache WHERE cache_key = ?",
+                               (key,)).fetchone()
+            if row and row["expires_at"] > time.time():
+                conn.execute("UPDATE tool_result_cache SET hits = hits + 1 WHERE cache_key = ?", (key,))
+                conn.commit()
+                conn.close()
+                return row["stored_at"], json.loads(row["result_json"])
+            conn.close()
+        except Exception as e:
+            logger.debug(f"tool_cache 조회 오류 | {e}")
+        return None
+
+    def _db_put(self, tool, key, stored_at, result, ttl, stale):
+        try:
+            conn = self._conn()
+            conn.execute("""
+                INSERT INTO tool_result_cache (cache_key, tool, result_json, stored_at, expires_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(cache_key) DO UPDATE SET
+                    result_json = excluded.result_json,
+                    stored_at   = excluded.stored_at,
+                    expires_at  = excluded.expires_at
+            """, (key, tool, json.dumps(result, ensure_ascii=False), stored_at, stored_at + ttl + stale))
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logger.debug(f"tool_cache 저장 오류 | {e}")
+
+    def purge_expired(self) -> int:
+        try:
+            conn = self._conn()
+            deleted = conn.execute("DELETE FROM tool_result_cache WHERE expires_at <= ?", (time.time(),)).rowcount
+            conn.commit()
+            conn.close()
+            return deleted
+        except Exception as e:
+            logger.debug(f"tool_cache 정리 오류 | {e}")
+            return 0
+
+    # ── 내부 ───────────────────────────────────────────────────
+    def _count(self, tool, name):
+        self.metrics.setdefault(tool, _new_counters())[name] += 1
+
+    @staticmethod
+    def _key(tool, func, args, kwargs):
+        """기본값을 채운 인자 기준 키 → get_train_schedule() 와 get_train_schedule("태백역") 가 같은 항목."""
+        try:
+            bound = inspect.signature(func).bind(*args, **kwargs)
+            bound.apply_defaults()
+            params = bound.arguments
+        except TypeError:
+            params = {"args": args, "kwargs": kwargs}
+        return tool + ":" + json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+
+    def _lookup(self, tool, key):
+        """L1 → L2. 반환: (stored_at, result) | None"""
+        entry = self._l1.get(key)
+        if entry is not None:
+            return entry
+        entry = self._db_get(key)
+        if entry is not None:
+            self._count(tool, "db_hit")
+            self._l1_put(key, entry)
+        return entry
+
+    def _l1_put(self, key, entry):
+        with self._lock:
+            self._l1[key] = entry
+            if len(self._l1) > L1_MAX_ENTRIES:
+                oldest = min(self._l1, key=lambda k: self._l1[k][0])
+                self._l1.pop(oldest, None)
+
+    def _store(self, tool, key, result):
+        ttl, stale = self._policies[tool]
+        stored_at = time.time()
+        self._l1_put(key, (stored_at, result))
+        self._db_put(tool, key, stored_at, result, ttl, stale)
+
+    def _call(self, tool, key, func, args, kwargs):
+        """원본 호출 (병합). 선행 호출이 실패하면 대기하던 쪽이 직접 호출."""
+        with self._lock:
+            event = self._inflight.get(key)
+            leader = event is None
+            if leader:
+                event = self._inflight[key] = threading.Event()
+        if not leader:
+            self._count(tool, "coalesced")
+            event.wait(WAIT_INFLIGHT_SEC)
+            entry = self._l1.get(key)
+            if entry is not None:
+                return entry[1]
+            return func(*args, **kwargs)
+        try:
+            result = func(*args, **kwargs)
+            self._store(tool, key, result)
+            return result
+        except Exception:
+            self._count(tool, "error")
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            event.set()
+
+    def _refresh(self, tool, key, func, args, kwargs):
+        try:
+            self._call(tool, key, func, args, kwargs)
+            self._count(tool, "refresh")
+        except Exception as e:
+            self._count(tool, "refresh_error")
+            logger.warning(f"[tool_cache] {tool} 갱신 실패 (이전 결과 유지) | {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _schedule_refresh(self, tool, key, func, args, kwargs) -> bool:
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=REFRESH_WORKERS, thread_name_prefix="tool-cache")
+        self._executor.submit(self._refresh, tool, key, func, args, kwargs)
+        return True
+
+    # ── 공개 API ───────────────────────────────────────────────
+    def cached(self, tool: str, ttl: int, stale: int = 0):
+        """
+        도구 함수 데코레이터. 시그니처/docstring 은 그대로 유지되어 Gemini 도구 선언에 영향 없음.
+          나이 < ttl            → 캐시 결과
+          ttl <= 나이 < ttl+stale → 캐시 결과 + 백그라운드 갱신
+          그 외                  → 원본 호출 후 저장
+        """
+        self._policies[tool] = (ttl, stale)
+
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                key = self._key(tool, func, args, kwargs)
+                entry = self._lookup(tool, key)
+                if entry is not None:
+                    age = time.time() - entry[0]
+                    if age < ttl:
+                        self._count(tool, "hit")
+                        return entry[1]
+                    if age < ttl + stale:
+                        self._count(tool, "stale")
+                        self._schedule_refresh(tool, key, func, args, kwargs)
+                        return entry[1]
+                self._count(tool, "miss")
+                return self._call(tool, key, func, args, kwargs)
+
+            wrapper.cache_tool = tool
+            return wrapper
+        return decorator
+
+    def warm(self, wrapper, calls) -> int:
+        """
+        미리 갱신: calls = [kwargs, ...]. 없거나 TTL 의 절반 이상 지난 항목만 백그라운드 갱신.
+        반환: 갱신 예약 건수
+        """
+        tool = wrapper.cache_tool
+        ttl, _ = self._policies[tool]
+        func = wrapper.__wrapped__
+        scheduled = 0
+        for kwargs in calls:
+            key = self._key(tool, func, (), kwargs)
+            entry = self._lookup(tool, key)
+            if entry is None or time.time() - entry[0] >= ttl * PREFETCH_AGE_RATIO:
+                scheduled += self._schedule_refresh(tool, key, func, (), kwargs)
+        return scheduled
+
+    def stats(self) -> dict:
+        tools = {}
+        for tool, m in self.metrics.items():
+            served = m["hit"] + m["stale"]
+            lookups = served + m["miss"]
+            tools[tool] = {**m, "hit_rate": round(served / lookups, 3) if lookups else 0.0}
+        return {"tools": tools, "l1_entries": len(self._l1), "refreshing": len(self._refreshing),
+                "policies": {t: {"ttl": p[0], "stale": p[1]} for t, p in self._policies.items()}}
+
+
+tool_cache = ToolResultCache()
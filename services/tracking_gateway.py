@@ -0,0 +1,245 @@
+"""
+📦 배송 조회 게이트웨이 (tracker.delivery + 택배사 어댑터 공용)
+
+- 공용 httpx.AsyncClient 커넥션 풀 (요청마다 urlopen 연결 생성 제거, 이벤트 루프 비차단)
+- 동일 운송장 동시 조회 병합: 진행 중인 조회가 있으면 같은 Future 를 기다림
+- 배송 단계별 캐시 TTL: 배송완료는 길게(24h), 배송출발은 짧게(2분)
+  L1 = 프로세스 메모리, L2 = Redis (tantan:track:{carrier}:{no}) — 워커 간 공유
+- 백그라운드 리프레셔: 최근 조회된 미완료 운송장을 만료 직전에 묶음 단위로 미리 갱신
+  → 키오스크/문자 링크 조회는 대부분 캐시에서 즉시 응답
+"""
+import asyncio
+import json
+import os
+import time
+
+import httpx
+
+from logger import logger
+
+TRACKER_URL = "https://apis.tracker.delivery/carriers/{carrier_id}/tracks/{track_id}"
+REDIS_PREFIX = "tantan:track:"
+
+# tracker.delivery state.id → 캐시 TTL(초)
+STAGE_TTL = {
+    "delivered": 24 * 3600,
+    "out_for_delivery": 120,
+    "in_transit": 600,
+    "at_pickup": 900,
+    "information_received": 1800,
+}
+DEFAULT_TTL = 600
+NOT_FOUND_TTL = 300
+
+REFRESH_INTERVAL_SEC = 60
+REFRESH_AHEAD_SEC = 90          # 만료 90초 전부터 미리 갱신
+REFRESH_BATCH = 20
+REFRESH_CONCURRENCY = 5
+WATCH_IDLE_SEC = 6 * 3600       # 6시간 동안 아무도 안 본 운송장은 갱신 대상에서 제외
+L1_MAX_ENTRIES = 5000
+
+
+def stage_ttl(result):
+    """조회 결과 → TTL. 실패(통신 오류)는 캐시하지 않음(0)."""
+    if not result.get("success"):
+        return NOT_FOUND_TTL if result.get("error_code") == 404 else 0
+    state = ((result.get("data") or {}).get("state") or {}).get("id")
+    return STAGE_TTL.get(state, DEFAULT_TTL)
+
+
+def is_final(result):
+    return result.get("success") and ((result.get("data") or {}).get("state") or {}).get("id") == "delivered"
+
+
+class TrackingGateway:
+    def __init__(self, redis_url=None):
+        self._client = None
+        self._cache = {}       # key → (expires_at, result)
+        self._inflight = {}    # key → asyncio.Future
+        self._watch = {}       # key → (carrier_id, track_id, last_access)
+        self._refresher = None
+        self._redis = None
+        self._redis_url = redis_url if redis_url is not None else os.environ.get(
+            "DONGNE_REDIS_URL", os.environ.get("REDIS_URL", ""))
+        self.metrics = {"hit": 0, "miss": 0, "coalesced": 0, "refreshed": 0, "upstream_error": 0}
+
+    # ── 연결 ───────────────────────────────────────────────────
+    def _http(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(5.0, connect=3.0),
+                limits=httpx.Limits(max_keepalive_connections=20, max_connections=50),
+                headers={"User-Agent": "Mozilla/5.0"},
+            )
+        return self._client
+
+    def _rdb(self):
+        if self._redis is None and self._redis_url:
+            try:
+                import redis.asyncio as aioredis
+                self._redis = aioredis.from_url(self._redis_url, decode_responses=True,
+                                                socket_timeout=1.0, socket_connect_timeout=1.0)
+            except Exception as e:
+                logger.warning(f"TrackingGateway Redis 비활성 | {e}")
+                self._redis_url = ""
+        return self._redis
+
+    # ── 캐시 ───────────────────────────────────────────────────
+    async def _cache_get(self, key):
+        entry = self._cache.get(key)
+        if entry and entry[0] > time.time():
+            return entry[1]
+        rdb = self._rdb()
+        if rdb is None:
+            return None
+        try:
+            raw = await rdb.get(REDIS_PREFIX + key)
+            if raw:
+                ttl = await rdb.ttl(REDIS_PREFIX + key)
+                result = json.loads(raw)
+                self._cache_local(key, result, max(ttl, 1))
+                return result
+        except Exception as e:
+            logger.debug(f"TrackingGateway Redis 조회 실패 | {e}")
+        return None
+
+    def _cache_local(self, key, result, ttl):
+        if len(self._cache) >= L1_MAX_ENTRIES:
+            now = time.time()
+            for k in [k for k, (exp, _) in self._cache.items() if exp <= now]:
+                self._cache.pop(k, None)
+            if len(self._cache) >= L1_MAX_ENTRIES:
+                self._cache.pop(next(iter(self._cache)))
+        self._cache[key] = (time.time() + ttl, result)
+
+    async def _cache_put(self, key, result):
+        ttl = stage_ttl(result)
+        if ttl <= 0:
+            return
+        self._cache_local(key, result, ttl)
+        rdb = self._rdb()
+        if rdb is not None:
+            try:
+                await rdb.setex(REDIS_PREFIX + key, ttl, json.dumps(result, ensure_ascii=False))
+            except Exception as e:
+                logger.debug(f"TrackingGateway Redis 저장 실패 | {e}")
+
+    # ── 조회 ───────────────────────────────────────────────────
+    async def _fetch_tracker(self, carrier_id, track_id):
+        url = TRACKER_URL.format(carrier_id=carrier_id, track_id=track_id)
+        try:
+            resp = await self._http().get(url)
+        except Exception as e:
+            self.metrics["upstream_error"] += 1
+            return {"success": False, "error_code": 500, "message": f"배송 정보 가져오기 실패: {str(e)}"}
+        if resp.status_code == 200:
+            return {"success": True, "source": "tracker.delivery", "data": resp.json()}
+        if resp.status_code == 404:
+            return {"success": False, "error_code": 404, "message": "해당 운송장 번호의 배송 정보가 존재하지 않거나 조회가 만료되었습니다."}
+        self.metrics["upstream_error"] += 1
+        return {"success": False, "error_code": resp.status_code, "message": f"택배사 시스템 통신 실패 (상태코드: {resp.status_code})"}
+
+    async def coalesce(self, key, fetch):
+        """같은 key 조회가 진행 중이면 그 결과를 함께 기다림. fetch: 인자 없는 코루틴 함수."""
+        fut = self._inflight.get(key)
+        if fut is not None:
+            self.metrics["coalesced"] += 1
+            return await asyncio.shield(fut)
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            result = await fetch()
+            fut.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except Exception as e:
+            fut.set_exception(e)
+            fut.exception()   # 대기자가 없어도 'never retrieved' 경고 방지
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    async def track(self, carrier_id, track_id, force=False):
+        """tracker.delivery 조회 (캐시 → 병합 → 업스트림). 기존 /api/track 응답 형식 유지 + cached 플래그."""
+        key = f"{carrier_id}:{track_id}"
+        self._ensure_refresher()
+        if not force:
+            cached = await self._cache_get(key)
+            if cached is not None:
+                self.metrics["hit"] += 1
+                self._remember(key, carrier_id, track_id, cached)
+                return {**cached, "cached": True}
+        self.metrics["miss"] += 1
+
+        async def _load():
+            result = await self._fetch_tracker(carrier_id, track_id)
+            await self._cache_put(key, result)
+            return result
+
+        result = await self.coalesce(key, _load)
+        self._remember(key, carrier_id, track_id, result)
+        return {**result, "cached": False}
+
+    def _remember(self, key, carrier_id, track_id, result):
+        if result.get("success") and not is_final(result):
+            self._watch[key] = (carrier_id, track_id, time.time())
+        else:
+            self._watch.pop(key, None)
+
+    # ── 백그라운드 갱신 ────────────────────────────────────────
+    def _ensure_refresher(self):
+        if self._refresher is None or self._refresher.done():
+            self._refresher = asyncio.get_running_loop().create_task(self._refresh_loop())
+
+    def _due(self):
+        now = time.time()
+        due = []
+        for key, (carrier_id, track_id, seen) in list(self._watch.items()):
+            if now - seen > WATCH_IDLE_SEC:
+                self._watch.pop(key, None)
+                continue
+            entry = self._cache.get(key)
+            if entry is None or entry[0] - now <= REFRESH_AHEAD_SEC:
+                due.append((key, carrier_id, track_id))
+        return due
+
+    async def _refresh_loop(self):
+        sem = asyncio.Semaphore(REFRESH_CONCURRENCY)
+
+        async def _one(key, carrier_id, track_id):
+            async with sem:
+                async def _load():
+                    result = await self._fetch_tracker(carrier_id, track_id)
+                    await self._cache_put(key, result)
+                    return result
+                result = await self.coalesce(key, _load)
+                if is_final(result) or not result.get("success"):
+                    self._watch.pop(key, None)
+                self.metrics["refreshed"] += 1
+
+        while True:
+            await asyncio.sleep(REFRESH_INTERVAL_SEC)
+            due = self._due()
+            for i in range(0, len(due), REFRESH_BATCH):
+                await asyncio.gather(*(_one(*item) for item in due[i:i + REFRESH_BATCH]),
+                                     return_exceptions=True)
+
+    def stats(self):
+        return {**self.metrics, "cached": len(self._cache), "watching": len(self._watch),
+                "inflight": len(self._inflight)}
+
+    async def aclose(self):
+        if self._refresher is not None:
+            self._refresher.cancel()
+            self._refresher = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+
+tracking_gateway = TrackingGateway()
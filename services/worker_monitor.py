@@ -0,0 +1,213 @@
+"""
+🛰️ GPU 워커 상태 모니터 (Control Tower 인프라 감시용)
+
+- 요청 경로에서 celery inspect(ping/active/reserved, 각 1.5초 대기)를 호출하지 않고
+  백그라운드 스레드가 유지하는 스냅샷을 그대로 반환 → 워커가 꺼져 있어도 이벤트 루프 비차단
+- 이벤트 스레드: Celery 이벤트(worker-heartbeat / task-*)를 브로커에서 구독해 celery.events.State 갱신
+  시작 시 enable_events 브로드캐스트 (응답 대기 없음) — -E 없이 띄운 워커도 이벤트 송신
+- 폴링 스레드: POLL_SEC 마다 큐 깊이(LLEN) + tantan:worker:heartbeat 를 파이프라인 1회로 조회,
+  워커 생존 여부(하트비트 만료) 재계산
+- 스냅샷: workers / active_tasks / queue_depth / durations(태스크별 최근 실행 시간 avg·p95·last)
+- 배치 렌더 시간: 배치 태스크(BATCH_TASK, task_id = job_id)의 task-started → batch_scheduler.mark_render_started,
+  task-succeeded runtime → batch_scheduler.record_render_sample (다음 배치 크기 산정 EWMA)
+"""
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from logger import logger
+
+QUEUES = ("media_tasks", "video_tasks", "celery")
+HEARTBEAT_KEY = "tantan:worker:heartbeat"
+HEARTBEAT_FRESH_SEC = 30
+POLL_SEC = float(os.getenv("WORKER_MONITOR_POLL_SEC", "5"))
+RETRY_SEC = 10
+DURATION_SAMPLES = 50
+MAX_TASKS_IN_MEMORY = 1000
+BATCH_TASK = "generate_premium_shortform"
+
+
+def _broker_url() -> str:
+    return os.environ.get("CELERY_BROKER_URL",
+                          os.environ.get("CELERY_RESULT_BACKEND",
+                                         os.environ.get("REDIS_URL", "redis://localhost:6379/1")))
+
+
+def _iso(ts):
+    return datetime.fromtimestamp(ts, tz=timezone.utc).isoformat() if ts else None
+
+
+class WorkerMonitor:
+    def __init__(self, broker_url: str = None):
+        self.broker_url = broker_url or _broker_url()
+        self._state = None
+        self._receiver = None
+        self._threads = []
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._durations = {}        # 태스크명 → deque(실행 시간 초)
+        self._queue_depth = {}
+        self._heartbeat_ts = None
+        self.metrics = {"events": 0, "last_event_at": None, "polls": 0, "errors": 0, "started_at": None}
+        self._snapshot = self._empty_snapshot()
+
+    @staticmethod
+    def _empty_snapshot():
+        return {"workers": {}, "active_tasks": [], "queue_depth": {}, "durations": {}, "updated_at": None}
+
+    # ── 수명 ───────────────────────────────────────────────────
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            self._stop.clear()
+            self.metrics["started_at"] = _iso(time.time())
+            for target, name in ((self._event_loop, "worker-monitor-events"), (self._poll_loop, "worker-monitor-poll")):
+                t = threading.Thread(target=target, name=name, daemon=True)
+                t.start()
+                self._threads.append(t)
+        logger.info("[worker_monitor] 시작")
+
+    def stop(self):
+        self._stop.set()
+        if self._receiver is not None:
+            self._receiver.should_stop = True
+        with self._lock:
+            self._threads = []
+
+    # ── 이벤트 구독 ─────────────────────────────────────────────
+    def _event_loop(self):
+        from celery import Celery
+        app = Celery("worker_monitor", broker=self.broker_url)
+        self._state = app.events.State(max_tasks_in_memory=MAX_TASKS_IN_MEMORY)
+        while not self._stop.is_set():
+            try:
+                with app.connection() as conn:
+                    app.control.enable_events()
+                    self._receiver = app.events.Receiver(conn, handlers={"*": self._on_event})
+                    self._receiver.capture(limit=None, timeout=None, wakeup=True)
+            except Exception as e:
+                self.metrics["errors"] += 1
+                logger.debug(f"[worker_monitor] 이벤트 구독 재시도 | {e}")
+                self._stop.wait(RETRY_SEC)
+
+    def _on_event(self, event):
+        self._state.event(event)
+        self.metrics["events"] += 1
+        self.metrics["last_event_at"] = _iso(time.time())
+        kind = event.get("type", "")
+        if kind in ("task-succeeded", "task-failed"):
+            task = self._state.tasks.get(event.get("uuid"))
+            runtime = event.get("runtime")
+            if runtime is None and task is not None and task.started:
+                runtime = event.get("timestamp", time.time()) - task.started
+            if task is not None and task.name and runtime is not None:
+                self._durations.setdefault(task.name, deque(maxlen=DURATION_SAMPLES)).append(float(runtime))
+                if kind == "task-succeeded" and self._is_batch(task):
+                    self._feed_batch(kind, task.uuid, runtime=float(runtime))
+        elif kind == "task-started":
+            task = self._state.tasks.get(event.get("uuid"))
+            if task is not None and self._is_batch(task):
+                self._feed_batch(kind, task.uuid, started_at=event.get("timestamp"))
+        if kind.startswith("task-") or kind in ("worker-online", "worker-offline"):
+            self._rebuild()
+
+    @staticmethod
+    def _is_batch(task):
+        return bool(task.name) and task.name.rsplit(".", 1)[-1] == BATCH_TASK
+
+    def _feed_batch(self, kind, job_id, started_at=None, runtime=None):
+        """배치 태스크 시작 시각 / 실측 렌더 시간 → batch_scheduler (실패해도 모니터는 계속)."""
+        try:
+            from routers import batch_scheduler
+            if kind == "task-started":
+                batch_scheduler.mark_render_started(job_id, started_at=started_at)
+            elif runtime is not None:
+                batch_scheduler.record_render_sample(job_id, runtime)
+        except Exception as e:
+            self.metrics["errors"] += 1
+            logger.debug(f"[worker_monitor] 배치 렌더 시간 반영 실패 {job_id} | {e}")
+
+    # ── 큐 깊이 / 하트비트 폴링 ─────────────────────────────────
+    def _poll_loop(self):
+        from services.redis_registry import redis_registry
+        while not self._stop.is_set():
+            try:
+                *depths, hb = redis_registry.pipelined(
+                    lambda p: ([p.llen(q) for q in QUEUES], p.get(HEARTBEAT_KEY)), url=self.broker_url)
+                self._queue_depth = {q: int(n or 0) for q, n in zip(QUEUES, depths)}
+                self._heartbeat_ts = float(hb) if hb else None
+                self.metrics["polls"] += 1
+            except Exception as e:
+                self.metrics["errors"] += 1
+                logger.debug(f"[worker_monitor] 큐 조회 실패 | {e}")
+            self._rebuild()
+            self._stop.wait(POLL_SEC)
+
+    # ── 스냅샷 ─────────────────────────────────────────────────
+    def _rebuild(self):
+        now = time.time()
+        workers, active = {}, []
+        state = self._state
+        if state is not None:
+            for hostname, w in list(state.workers.items()):
+                workers[hostname] = {
+                    "alive":          w.alive,
+                    "active":         w.active or 0,
+                    "processed":      w.processed or 0,
+                    "loadavg":        w.loadavg,
+                    "last_heartbeat": _iso(w.heartbeats[-1]) if w.heartbeats else None,
+                }
+            for task in list(state.tasks.values()):
+                if task.state == "STARTED":
+                    active.append({
+                        "id":          task.uuid,
+                        "name":        task.name,
+                        "worker":      task.worker.hostname if task.worker else None,
+                        "started_at":  _iso(task.started),
+                        "elapsed_sec": round(now - task.started, 1) if task.started else None,
+                    })
+        durations = {}
+        for name, samples in list(self._durations.items()):
+            ordered = sorted(samples)
+            durations[name] = {
+                "count": len(ordered),
+                "avg_sec": round(sum(ordered) / len(ordered), 2),
+                "p95_sec": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2),
+                "last_sec": round(samples[-1], 2),
+            }
+        self._snapshot = {"workers": workers, "active_tasks": active, "queue_depth": dict(self._queue_depth),
+                          "durations": durations, "updated_at": _iso(now)}
+
+    def snapshot(self) -> dict:
+        """현재 스냅샷 (호출 시 모니터 미시작이면 시작만 하고 즉시 반환)."""
+        if not self._threads:
+            self.start()
+        return self._snapshot
+
+    def worker_summary(self) -> dict:
+        """infra_status 호환 요약: {status, hostname, active_tasks, last_heartbeat}"""
+        snap = self.snapshot()
+        base = {"status": "Offline", "hostname": None, "active_tasks": 0, "last_heartbeat": None}
+        alive = {h: w for h, w in snap["workers"].items() if w["alive"]}
+        if alive:
+            hostname, w = next(iter(alive.items()))
+            base.update(hostname=hostname, last_heartbeat=w["last_heartbeat"],
+                        active_tasks=len(snap["active_tasks"]) or w["active"])
+            base["status"] = "Rendering" if base["active_tasks"] else "Idle"
+        elif self._heartbeat_ts and time.time() - self._heartbeat_ts < HEARTBEAT_FRESH_SEC:
+            base["status"] = "Idle"
+            base["last_heartbeat"] = _iso(self._heartbeat_ts)
+        return base
+
+    def queue_depth(self) -> int:
+        depth = self._snapshot["queue_depth"]
+        return sum(depth.values())
+
+    def stats(self) -> dict:
+        return {**self.metrics, "running": bool(self._threads), "broker": self.broker_url.rsplit("@", 1)[-1]}
+
+
+worker_monitor = WorkerMonitor()
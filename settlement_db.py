@@ -1,21 +1,29 @@
 # settlement_db.py
 # 동네비서 정산 시스템 전용 DB 모듈
-# 원칙: 원자성(트랜잭션) / 정수형 금액 / 상태 머신 / 동시성 락
+# 원칙: 원자성(트랜잭션) / 정수형 금액 / 상태 머신 / 조건부 UPDATE(CAS)
 #
 # 상태 흐름: READY → APPROVED → COMPLETED
 #                         └──→ FAILED
+#
+# 동시성: 프로세스 락 없이 "UPDATE ... WHERE status = 이전상태" 의 영향 행 수로만 판정
+#         → 서로 다른 정산은 병렬 처리, gunicorn 워커(프로세스) 간에도 이중 전이 불가
+# 요약: settlement_summary (매장 × 상태) 를 쓰기 트랜잭션 안에서 증분 갱신
+# 검증: python settlement_db.py --stress [프로세스 수] [정산 수]
+#       python settlement_db.py --reconcile [--fix]   (요약 ↔ 원본 대사)
 
+import json
 import sqlite3
 import os
 import threading
+from contextlib import contextmanager
 from datetime import datetime
 from logger import logger
 
 DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "db", "settlements.db")
 os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
 
-# ── 동시성 보호: 프로세스 수준 Lock (SQLite 전체 락 보완) ──
-_settlement_lock = threading.Lock()
+# ── 스레드별 재사용 연결 (호출마다 connect + PRAGMA 반복 제거) ──
+_local = threading.local()
 
 # ── 허용된 상태 전이 (State Machine) ──
 VALID_TRANSITIONS = {
@@ -34,6 +42,67 @@ def get_conn() -> sqlite3.Connection:
     return conn
 
 
+def _db() -> sqlite3.Connection:
+    """
+    스레드별 공용 연결 (자동 커밋 모드, 쓰기 트랜잭션은 _write_txn 으로 명시).
+    fork 된 자식 프로세스는 부모 연결을 쓰지 않고 새로 연결.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.pid != os.getpid() or _local.path != DB_PATH:
+        conn = sqlite3.connect(DB_PATH, timeout=10, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        conn.execute("PRAGMA synchronous=NORMAL")   # WAL 에서는 커밋 내구성 유지
+        _local.conn, _local.pid, _local.path = conn, os.getpid(), DB_PATH
+    return conn
+
+
+@contextmanager
+def _write_txn(conn):
+    """BEGIN IMMEDIATE: 쓰기 잠금을 시작 시점에 확보 (읽기→쓰기 승격 중 SQLITE_BUSY 방지)."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _sources_for(new_status: str) -> list:
+    """new_status 로 전이 가능한 이전 상태 목록"""
+    return [src for src, targets in VALID_TRANSITIONS.items() if new_status in targets]
+
+
+def _time_column(new_status: str) -> str:
+    return {"APPROVED": "approved_at", "COMPLETED": "completed_at"}.get(new_status, "")
+
+
+def _bump_summary(conn, deltas: dict):
+    """요약 증분 반영. deltas: {(store_id, status): [건수, net 합, 조정액 합]} — 호출자 트랜잭션 안에서 실행"""
+    conn.executemany("""
+        INSERT INTO settlement_summary (store_id, status, cnt, total_net, adj_total)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(store_id, status) DO UPDATE SET
+            cnt       = cnt       + excluded.cnt,
+            total_net = total_net + excluded.total_net,
+            adj_total = adj_total + excluded.adj_total
+    """, [(store, status, *d) for (store, status), d in deltas.items() if any(d)])
+
+
+def _adjustment_totals(conn, settlement_ids) -> dict:
+    """{settlement_id: 조정액 합}"""
+    if not settlement_ids:
+        return {}
+    rows = conn.execute("""
+        SELECT settlement_id, SUM(adj_amount) AS total FROM settlement_adjustments
+        WHERE settlement_id IN (SELECT value FROM json_each(?))
+        GROUP BY settlement_id
+    """, (json.dumps(list(settlement_ids)),)).fetchall()
+    return {r["settlement_id"]: r["total"] or 0 for r in rows}
+
+
 # ══════════════════════════════════════════
 # 1. 테이블 초기화
 # ══════════════════════════════════════════
@@ -75,13 +144,31 @@ def init_settlement_tables():
             FOREIGN KEY (settlement_id) REFERENCES settlements(settlement_id)
         );
 
-        -- 인덱스 (조회 성능)
-        CREATE INDEX IF NOT EXISTS idx_settlements_store   ON settlements(store_id);
-        CREATE INDEX IF NOT EXISTS idx_settlements_status  ON settlements(status);
+        -- 매장 × 상태별 요약 (생성/전이/조정 트랜잭션 안에서 증분 갱신)
+        CREATE TABLE IF NOT EXISTS settlement_summary (
+            store_id        TEXT NOT NULL,
+            status          TEXT NOT NULL,
+            cnt             INTEGER NOT NULL DEFAULT 0,
+            total_net       INTEGER NOT NULL DEFAULT 0,    -- 해당 상태 정산들의 net_amount 합
+            adj_total       INTEGER NOT NULL DEFAULT 0,    -- 해당 상태 정산들의 조정액 합
+            PRIMARY KEY (store_id, status)
+        );
+
+        -- 인덱스 (조회 성능: 매장별/관리자 목록은 created_at 정렬까지 인덱스로 처리)
+        DROP INDEX IF EXISTS idx_settlements_store;      -- store_created 의 접두사
+        DROP INDEX IF EXISTS idx_settlements_status;     -- status_role_created 의 접두사
+        CREATE INDEX IF NOT EXISTS idx_settlements_store_created       ON settlements(store_id, created_at);
+        CREATE INDEX IF NOT EXISTS idx_settlements_status_role_created ON settlements(status, role_type, created_at);
+        CREATE INDEX IF NOT EXISTS idx_settlements_created             ON settlements(created_at);
         CREATE INDEX IF NOT EXISTS idx_settlements_order   ON settlements(order_id);
         CREATE INDEX IF NOT EXISTS idx_adj_settlement      ON settlement_adjustments(settlement_id);
         """)
         conn.commit()
+        # 요약 테이블 도입 이전 DB → 기존 행으로 1회 구축
+        has_rows = conn.execute("SELECT 1 FROM settlements LIMIT 1").fetchone()
+        has_summary = conn.execute("SELECT 1 FROM settlement_summary LIMIT 1").fetchone()
+        if has_rows and not has_summary:
+            rebuild_settlement_summary()
         logger.info("정산 테이블 초기화 완료")
     except Exception as e:
         logger.error(f"정산 테이블 초기화 실패: {e}")
@@ -113,9 +200,9 @@ def create_settlement(
         logger.warning(f"정산 생성 거부: net_amount 음수 | order={order_id} store={store_id}")
         return None
 
-    conn = get_conn()
+    conn = _db()
     try:
-        with conn:  # context manager → 예외 시 자동 ROLLBACK
+        with _write_txn(conn):  # 예외 시 자동 ROLLBACK
             cur = conn.execute("""
                 INSERT INTO settlements
                     (order_id, store_id, role_type, total_amount,
@@ -124,6 +211,7 @@ def create_settlement(
             """, (order_id, store_id, role_type,
                   total_amount, platform_fee, service_fee, net_amount, memo))
             settlement_id = cur.lastrowid
+            _bump_summary(conn, {(store_id, "READY"): [1, net_amount, 0]})
             logger.info(
                 f"정산 생성 | id={settlement_id} order={order_id} "
                 f"store={store_id} net={net_amount:,}원"
@@ -135,13 +223,53 @@ def create_settlement(
     except Exception as e:
         logger.error(f"정산 생성 실패 | order={order_id}: {e}")
         return None
-    finally:
-        conn.close()
 
 
 # ══════════════════════════════════════════
-# 3. 상태 전이 (State Machine + 동시성 락)
+# 3. 상태 전이 (State Machine + 조건부 UPDATE)
 # ══════════════════════════════════════════
+def _transition(conn, settlement_id: int, new_status: str, processed_by: str = ""):
+    """
+    단건 CAS 전이. 반환: (성공 여부, 메시지, 이전 상태)
+    현재 상태를 읽고 "WHERE status = 읽은 상태" 로 UPDATE — 그 사이 다른 프로세스가
+    먼저 바꿨다면 영향 행 0 → 충돌로 보고 (락 없이 이중 전이 차단).
+    """
+    row = conn.execute("SELECT status FROM settlements WHERE settlement_id = ?",
+                       (settlement_id,)).fetchone()
+    if not row:
+        return False, "정산 레코드를 찾을 수 없습니다.", None
+
+    current = row["status"]
+    if new_status not in VALID_TRANSITIONS.get(current, set()):
+        return False, (
+            f"허용되지 않은 상태 전이: {current} → {new_status}. "
+            f"가능한 전이: {VALID_TRANSITIONS.get(current, set())}"
+        ), current
+
+    time_col = _time_column(new_status)
+    time_set = f", {time_col} = ?" if time_col else ""
+    params = [new_status, processed_by]
+    if time_col:
+        params.append(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    params += [settlement_id, current]
+
+    with _write_txn(conn):
+        rows = conn.execute(f"""
+            UPDATE settlements
+            SET status = ?, processed_by = ? {time_set}
+            WHERE settlement_id = ? AND status = ?
+            RETURNING store_id, net_amount
+        """, params).fetchall()
+        if not rows:
+            # 다른 요청이 먼저 변경한 경우 (Race Condition 방어)
+            return False, "동시 처리 감지: 다른 요청이 이미 상태를 변경했습니다.", current
+        store_id, net = rows[0]["store_id"], rows[0]["net_amount"]
+        adj = _adjustment_totals(conn, [settlement_id]).get(settlement_id, 0)
+        _bump_summary(conn, {(store_id, current): [-1, -net, -adj],
+                             (store_id, new_status): [1, net, adj]})
+    return True, f"{current} → {new_status} 전환 완료", current
+
+
 def transition_settlement(
     settlement_id: int,
     new_status: str,
@@ -150,62 +278,78 @@ def transition_settlement(
     """
     정산 상태 변경.
     - State Machine: 허용된 전이만 실행
-    - 동시성: threading.Lock + SQLite timeout으로 이중 차단
+    - 동시성: 조건부 UPDATE(status 비교) 단일 문장 — 프로세스/스레드 락 없음
     - 불변성: COMPLETED/FAILED 상태는 변경 불가
     """
-    with _settlement_lock:  # 스레드 수준 동시성 보호
-        conn = get_conn()
-        try:
-            with conn:
-                # 현재 상태 조회 (FOR UPDATE 역할: Lock 내에서 조회)
-                row = conn.execute(
-                    "SELECT status FROM settlements WHERE settlement_id = ?",
-                    (settlement_id,)
-                ).fetchone()
-
-                if not row:
-                    return False, "정산 레코드를 찾을 수 없습니다."
-
-                current = row["status"]
-                if new_status not in VALID_TRANSITIONS.get(current, set()):
-                    return False, (
-                        f"허용되지 않은 상태 전이: {current} → {new_status}. "
-                        f"가능한 전이: {VALID_TRANSITIONS.get(current, set())}"
-                    )
-
-                now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                time_field = ""
-                if new_status == "APPROVED":
-                    time_field = ", approved_at = ?"
-                elif new_status == "COMPLETED":
-                    time_field = ", completed_at = ?"
-
-                sql = f"""
-                    UPDATE settlements
-                    SET status = ?, processed_by = ? {time_field}
-                    WHERE settlement_id = ? AND status = ?
-                """
-                params = [new_status, processed_by]
-                if time_field:
-                    params.append(now)
-                params += [settlement_id, current]
-
-                affected = conn.execute(sql, params).rowcount
-                if affected == 0:
-                    # 다른 요청이 먼저 변경한 경우 (Race Condition 방어)
-                    return False, "동시 처리 감지: 다른 요청이 이미 상태를 변경했습니다."
-
-                logger.info(
-                    f"정산 상태 전이 | id={settlement_id} "
-                    f"{current} → {new_status} | by={processed_by}"
-                )
-                return True, f"{current} → {new_status} 전환 완료"
-
-        except Exception as e:
-            logger.error(f"정산 상태 전이 실패 | id={settlement_id}: {e}")
-            return False, f"시스템 오류: {str(e)}"
-        finally:
-            conn.close()
+    try:
+        ok, msg, current = _transition(_db(), settlement_id, new_status, processed_by)
+        if ok:
+            logger.info(
+                f"정산 상태 전이 | id={settlement_id} "
+                f"{current} → {new_status} | by={processed_by}"
+            )
+        return ok, msg
+    except Exception as e:
+        logger.error(f"정산 상태 전이 실패 | id={settlement_id}: {e}")
+        return False, f"시스템 오류: {str(e)}"
+
+
+def _transition_many(settlement_ids, new_status: str, processed_by: str = "") -> dict:
+    """
+    일괄 전이 — 트랜잭션 1개, UPDATE 1문장.
+    쓰기 잠금 안에서 대상 행(이전 상태 포함)을 읽고, 이전 상태가 허용 목록에 있는 행만 전이 (CAS).
+    반환: {"updated": [전이된 ID], "skipped": [상태 불일치/미존재 ID]}
+    """
+    ids = sorted({int(i) for i in settlement_ids})
+    if not ids:
+        return {"updated": [], "skipped": []}
+    sources = _sources_for(new_status)
+    time_col = _time_column(new_status)
+    time_set = f", {time_col} = ?" if time_col else ""
+    params = [new_status, processed_by]
+    if time_col:
+        params.append(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    params += sources + [json.dumps(ids)]
+    marks = ",".join("?" * len(sources))
+    conn = _db()
+    with _write_txn(conn):
+        before = conn.execute(f"""
+            SELECT settlement_id, store_id, status, net_amount FROM settlements
+            WHERE status IN ({marks})
+              AND settlement_id IN (SELECT value FROM json_each(?))
+        """, sources + [json.dumps(ids)]).fetchall()
+        rows = conn.execute(f"""
+            UPDATE settlements
+            SET status = ?, processed_by = ? {time_set}
+            WHERE status IN ({marks})
+              AND settlement_id IN (SELECT value FROM json_each(?))
+            RETURNING settlement_id
+        """, params).fetchall()
+        adj = _adjustment_totals(conn, [r["settlement_id"] for r in before])
+        deltas = {}
+        for r in before:
+            a = adj.get(r["settlement_id"], 0)
+            for key, sign in (((r["store_id"], r["status"]), -1), ((r["store_id"], new_status), 1)):
+                d = deltas.setdefault(key, [0, 0, 0])
+                d[0] += sign
+                d[1] += sign * r["net_amount"]
+                d[2] += sign * a
+        _bump_summary(conn, deltas)
+    updated = sorted(r["settlement_id"] for r in rows)
+    done = set(updated)
+    skipped = [i for i in ids if i not in done]
+    logger.info(f"정산 일괄 전이 | → {new_status} {len(updated)}건 (건너뜀 {len(skipped)}건) | by={processed_by}")
+    return {"updated": updated, "skipped": skipped}
+
+
+def approve_many(settlement_ids, processed_by: str = "") -> dict:
+    """READY → APPROVED 일괄 승인 (수백 건도 트랜잭션 1개)"""
+    return _transition_many(settlement_ids, "APPROVED", processed_by)
+
+
+def complete_many(settlement_ids, processed_by: str = "") -> dict:
+    """APPROVED → COMPLETED 일괄 지급 완료"""
+    return _transition_many(settlement_ids, "COMPLETED", processed_by)
 
 
 # ══════════════════════════════════════════
@@ -227,14 +371,17 @@ def add_settlement_adjustment(
         logger.warning("정산 조정 거부: 사유 미입력")
         return False
 
-    conn = get_conn()
+    conn = _db()
     try:
-        with conn:
+        with _write_txn(conn):
             conn.execute("""
                 INSERT INTO settlement_adjustments
                     (settlement_id, store_id, adj_amount, reason, created_by)
                 VALUES (?, ?, ?, ?, ?)
             """, (settlement_id, store_id, adj_amount, reason, created_by))
+            owner = conn.execute("SELECT store_id, status FROM settlements WHERE settlement_id = ?",
+                                 (settlement_id,)).fetchone()
+            _bump_summary(conn, {(owner["store_id"], owner["status"]): [0, 0, adj_amount]})
             logger.info(
                 f"정산 조정 추가 | settle={settlement_id} "
                 f"금액={adj_amount:+,}원 | 사유={reason}"
@@ -243,8 +390,6 @@ def add_settlement_adjustment(
     except Exception as e:
         logger.error(f"정산 조정 실패 | settle={settlement_id}: {e}")
         return False
-    finally:
-        conn.close()
 
 
 # ══════════════════════════════════════════
@@ -252,90 +397,213 @@ def add_settlement_adjustment(
 # ══════════════════════════════════════════
 def get_settlement(settlement_id: int, _conn=None) -> dict | None:
     """단건 조회"""
-    close_after = _conn is None
-    conn = _conn or get_conn()
-    try:
-        row = conn.execute(
-            "SELECT * FROM settlements WHERE settlement_id = ?",
-            (settlement_id,)
-        ).fetchone()
-        return dict(row) if row else None
-    finally:
-        if close_after:
-            conn.close()
+    conn = _conn or _db()
+    row = conn.execute(
+        "SELECT * FROM settlements WHERE settlement_id = ?",
+        (settlement_id,)
+    ).fetchone()
+    return dict(row) if row else None
 
 
 def get_store_settlements(store_id: str, status: str = None, limit: int = 50) -> list:
     """특정 매장의 정산 목록 조회 (선택적 상태 필터)"""
-    conn = get_conn()
-    try:
-        if status:
-            rows = conn.execute("""
-                SELECT * FROM settlements
-                WHERE store_id = ? AND status = ?
-                ORDER BY created_at DESC LIMIT ?
-            """, (store_id, status, limit)).fetchall()
-        else:
-            rows = conn.execute("""
-                SELECT * FROM settlements
-                WHERE store_id = ?
-                ORDER BY created_at DESC LIMIT ?
-            """, (store_id, limit)).fetchall()
-        return [dict(r) for r in rows]
-    finally:
-        conn.close()
+    conn = _db()
+    if status:
+        rows = conn.execute("""
+            SELECT * FROM settlements
+            WHERE store_id = ? AND status = ?
+            ORDER BY created_at DESC LIMIT ?
+        """, (store_id, status, limit)).fetchall()
+    else:
+        rows = conn.execute("""
+            SELECT * FROM settlements
+            WHERE store_id = ?
+            ORDER BY created_at DESC LIMIT ?
+        """, (store_id, limit)).fetchall()
+    return [dict(r) for r in rows]
 
 
 def get_all_settlements_admin(status: str = None, role_type: str = None, limit: int = 100) -> list:
     """마스터 관리자용 전체 정산 목록"""
-    conn = get_conn()
-    try:
-        filters, params = [], []
-        if status:
-            filters.append("status = ?")
-            params.append(status)
-        if role_type:
-            filters.append("role_type = ?")
-            params.append(role_type)
-        where = ("WHERE " + " AND ".join(filters)) if filters else ""
-        params.append(limit)
-        rows = conn.execute(f"""
-            SELECT * FROM settlements
-            {where}
-            ORDER BY created_at DESC LIMIT ?
-        """, params).fetchall()
-        return [dict(r) for r in rows]
-    finally:
-        conn.close()
+    conn = _db()
+    filters, params = [], []
+    if status:
+        filters.append("status = ?")
+        params.append(status)
+    if role_type:
+        filters.append("role_type = ?")
+        params.append(role_type)
+    where = ("WHERE " + " AND ".join(filters)) if filters else ""
+    params.append(limit)
+    rows = conn.execute(f"""
+        SELECT * FROM settlements
+        {where}
+        ORDER BY created_at DESC LIMIT ?
+    """, params).fetchall()
+    return [dict(r) for r in rows]
 
 
 def get_settlement_adjustments(settlement_id: int) -> list:
     """특정 정산의 조정 이력 전체 조회"""
-    conn = get_conn()
-    try:
-        rows = conn.execute("""
-            SELECT * FROM settlement_adjustments
-            WHERE settlement_id = ?
-            ORDER BY created_at ASC
-        """, (settlement_id,)).fetchall()
-        return [dict(r) for r in rows]
-    finally:
-        conn.close()
+    conn = _db()
+    rows = conn.execute("""
+        SELECT * FROM settlement_adjustments
+        WHERE settlement_id = ?
+        ORDER BY created_at ASC
+    """, (settlement_id,)).fetchall()
+    return [dict(r) for r in rows]
 
 
 def get_settlement_summary(store_id: str) -> dict:
-    """매장별 정산 요약 (상태별 건수 + 총액)"""
-    conn = get_conn()
+    """매장별 정산 요약 (상태별 건수 + 총액 + 조정액) — 요약 테이블 조회 (PK 범위 읽기)"""
+    conn = _db()
+    rows = conn.execute("""
+        SELECT status, cnt, total_net, adj_total
+        FROM settlement_summary
+        WHERE store_id = ? AND cnt > 0
+    """, (store_id,)).fetchall()
+    return {r["status"]: {"count": r["cnt"], "total_net": r["total_net"], "adj_total": r["adj_total"]}
+            for r in rows}
+
+
+# ══════════════════════════════════════════
+# 6. 요약 재구축 / 대사 (reconciliation)
+# ══════════════════════════════════════════
+_SUMMARY_FROM_BASE = """
+    SELECT s.store_id, s.status,
+           COUNT(*)                   AS cnt,
+           SUM(s.net_amount)          AS total_net,
+           COALESCE(SUM(a.adj), 0)    AS adj_total
+    FROM settlements s
+    LEFT JOIN (SELECT settlement_id, SUM(adj_amount) AS adj
+               FROM settlement_adjustments GROUP BY settlement_id) a
+           ON a.settlement_id = s.settlement_id
+    GROUP BY s.store_id, s.status
+"""
+
+
+def rebuild_settlement_summary() -> int:
+    """원본 행으로 요약 테이블 전체 재구축 (트랜잭션 1개). 반환: 요약 행 수"""
+    conn = _db()
+    with _write_txn(conn):
+        conn.execute("DELETE FROM settlement_summary")
+        conn.execute(f"""
+            INSERT INTO settlement_summary (store_id, status, cnt, total_net, adj_total)
+            {_SUMMARY_FROM_BASE}
+        """)
+        count = conn.execute("SELECT COUNT(*) FROM settlement_summary").fetchone()[0]
+    logger.info(f"정산 요약 재구축 | {count}행")
+    return count
+
+
+def reconcile_settlement_summary(fix: bool = False) -> list:
+    """
+    요약 테이블 ↔ 원본 행 대사. 반환: 불일치 목록
+    [{store_id, status, expected: (건수, net, 조정), actual: (...)}]
+    fix=True 이면 불일치 발견 시 재구축.
+    """
+    conn = _db()
+    conn.execute("BEGIN")   # 두 조회를 같은 스냅샷에서 (WAL 읽기 트랜잭션)
     try:
-        rows = conn.execute("""
-            SELECT status,
-                   COUNT(*)        AS cnt,
-                   SUM(net_amount) AS total_net
-            FROM settlements
-            WHERE store_id = ?
-            GROUP BY status
-        """, (store_id,)).fetchall()
-        return {r["status"]: {"count": r["cnt"], "total_net": r["total_net"] or 0}
-                for r in rows}
+        expected = {(r["store_id"], r["status"]): (r["cnt"], r["total_net"], r["adj_total"])
+                    for r in conn.execute(_SUMMARY_FROM_BASE)}
+        actual = {(r["store_id"], r["status"]): (r["cnt"], r["total_net"], r["adj_total"])
+                  for r in conn.execute("SELECT * FROM settlement_summary WHERE cnt != 0 OR total_net != 0 OR adj_total != 0")}
     finally:
-        conn.close()
+        conn.execute("COMMIT")
+    mismatches = [{"store_id": key[0], "status": key[1],
+                   "expected": expected.get(key, (0, 0, 0)), "actual": actual.get(key, (0, 0, 0))}
+                  for key in sorted(set(expected) | set(actual))
+                  if expected.get(key, (0, 0, 0)) != actual.get(key, (0, 0, 0))]
+    if mismatches:
+        logger.warning(f"정산 요약 불일치 {len(mismatches)}건" + (" → 재구축" if fix else ""))
+        if fix:
+            rebuild_settlement_summary()
+    return mismatches
+
+
+# ══════════════════════════════════════════
+# 7. 동시성 스트레스 테스트 (python settlement_db.py --stress [프로세스 수] [정산 수])
+#    전이 재생 검증 + 마지막에 요약 대사
+# ══════════════════════════════════════════
+def _stress_worker(args):
+    """무작위 단건/일괄 전이를 반복하고, 성공한 전이 목록 [(id, 이전, 이후)] 반환."""
+    import logging
+    import random
+    db_path, seed, ids, rounds = args
+    global DB_PATH
+    DB_PATH = db_path
+    logger.setLevel(logging.WARNING)
+    rng = random.Random(seed)
+    done = []
+    for _ in range(rounds):
+        op = rng.random()
+        if op < 0.1:
+            add_settlement_adjustment(rng.choice(ids), f"w{seed}", rng.randint(-500, 500), "stress", f"w{seed}")
+        elif op < 0.6:
+            sid = rng.choice(ids)
+            target = rng.choice(["APPROVED", "APPROVED", "COMPLETED", "FAILED"])
+            ok, _, prev = _transition(_db(), sid, target, f"w{seed}")
+            if ok:
+                done.append((sid, prev, target))
+        elif op < 0.8:
+            for sid in approve_many(rng.sample(ids, min(50, len(ids))), f"w{seed}")["updated"]:
+                done.append((sid, "READY", "APPROVED"))
+        else:
+            for sid in complete_many(rng.sample(ids, min(50, len(ids))), f"w{seed}")["updated"]:
+                done.append((sid, "APPROVED", "COMPLETED"))
+    return done
+
+
+def _stress(procs: int = 8, count: int = 300, rounds: int = 400):
+    import multiprocessing
+    import tempfile
+    import time
+    global DB_PATH
+    DB_PATH = os.path.join(tempfile.mkdtemp(), "settlements_stress.db")
+    init_settlement_tables()
+    ids = [create_settlement(f"STRESS-{i}", f"store{i % 7}", "BUSINESS", 10000 + i)["settlement_id"]
+           for i in range(count)]
+
+    started = time.perf_counter()
+    with multiprocessing.get_context("spawn").Pool(procs) as pool:
+        results = pool.map(_stress_worker, [(DB_PATH, seed, ids, rounds) for seed in range(procs)])
+    elapsed = time.perf_counter() - started
+
+    # 성공 전이를 정산별로 모아 재생 → DB 최종 상태와 비교
+    per_id = {sid: [] for sid in ids}
+    for worker_done in results:
+        for sid, prev, target in worker_done:
+            per_id[sid].append((prev, target))
+    double, lost, broken = 0, 0, 0
+    for sid, steps in per_id.items():
+        targets = [t for _, t in steps]
+        if targets.count("APPROVED") > 1 or sum(t in ("COMPLETED", "FAILED") for t in targets) > 1:
+            double += 1
+        expected = "READY"
+        for prev, target in sorted(steps, key=lambda st: st[1] != "APPROVED"):
+            if prev != expected:
+                broken += 1
+            expected = target
+        if get_settlement(sid)["status"] != expected:
+            lost += 1
+    transitions = sum(len(r) for r in results)
+    drift = len(reconcile_settlement_summary())
+    failed = double or lost or broken or drift
+    print(f"[stress] 프로세스 {procs} × {rounds}회 | 정산 {count}건 | 성공 전이 {transitions}건 | {elapsed:.2f}s")
+    print(f"[stress] 이중 전이 {double}건, 유실 {lost}건, 순서 위반 {broken}건, 요약 불일치 {drift}건 "
+          f"→ {'FAIL' if failed else 'OK'}")
+    return not failed
+
+
+if __name__ == "__main__":
+    import sys
+    if "--stress" in sys.argv:
+        rest = [int(a) for a in sys.argv[sys.argv.index("--stress") + 1:] if a.isdigit()]
+        sys.exit(0 if _stress(*rest[:2]) else 1)
+    if "--reconcile" in sys.argv:
+        found = reconcile_settlement_summary(fix="--fix" in sys.argv)
+        for m in found:
+            print(f"  {m['store_id']} {m['status']}: 원본 {m['expected']} / 요약 {m['actual']}")
+        print(f"[reconcile] 불일치 {len(found)}건")
+        sys.exit(1 if found else 0)
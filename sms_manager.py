@@ -176,15 +176,10 @@ def send_cloud_sms(to_phone, message, store_id="SYSTEM"):
 
 
 def _apply_message_charge(store_id, unit_cost, memo):
-    balance = db.get_wallet_balance(store_id)
-    if balance < unit_cost:
-        return False, balance
-    new_balance = balance - unit_cost
-    db.update_wallet_balance(store_id, new_balance)
-    try:
-        db.append_wallet_log(store_id, "sms", -unit_cost, new_balance, memo)
-    except Exception:
-        pass
+    # 잔액 확인·차감·원장 기록을 한 번의 원자 갱신으로 (동시 발송 시 이중 차감/음수 잔액 방지)
+    new_balance = db.wallet_post(store_id, -unit_cost, "sms", memo, tier="wallet")
+    if new_balance is None:
+        return False, db.get_wallet_balance(store_id)
     return True, new_balance
 
 
@@ -281,10 +276,11 @@ def process_missed_call_webhook(payload: dict):
     return ok, err, message
 
 
-def send_alimtalk(to_phone, message, template_id=None, pf_id=None, variables=None):
+def send_alimtalk(to_phone, message, template_id=None, pf_id=None, variables=None, store_id="MASTER"):
     """
     알림톡 발송 (Solapi)
     - template_id, pf_id가 없으면 SMS로 폴백
+    - store_id: 발송 이력에 기록할 매장 (기본 MASTER)
     """
     config = get_solapi_config()
     api_key = config.get('api_key', '')
@@ -348,7 +344,7 @@ def send_alimtalk(to_phone, message, template_id=None, pf_id=None, variables=Non
                 try:
                     # 도메인별 발송 통계 분리를 위해 template_id나 기타 변수로 식별하여 로그 저장
                     domain_tag = "ALIMTALK_" + str(template_id)
-                    db.log_sms("MASTER", to_phone, domain_tag, message, "SUCCESS", "OK")
+                    db.log_sms(store_id, to_phone, domain_tag, message, "SUCCESS", "OK")
                 except: pass
                 return True, "알림톡 발송 성공!"
             
@@ -373,6 +369,157 @@ def send_alimtalk(to_phone, message, template_id=None, pf_id=None, variables=Non
             return False, f"알림톡 발송 오류: {str(e)}"
 
 
+def send_alimtalk_many(messages, failed_out=None):
+    """
+    알림톡 묶음 발송 (Solapi send-many, 요청 1회)
+    - messages: [{"to_phone", "message", "template_id", "variables", "store_id"}, ...]
+    - 묶음 요청 자체가 실패하면 건별 send_alimtalk 로 폴백 (브랜드 채널 폴백 포함)
+    - failedMessageList 수신자도 건별 send_alimtalk 로 한 번 더 시도
+    - 발송 이력: 매장별 store_id 로, 건별 재시도까지 실패한 수신자는 FAIL 로 기록
+    - failed_out: 리스트를 넘기면 실패한 메시지 dict 를 담아 줌 (호출 측 재처리용)
+    - 반환: (성공 건수, 실패 건수)
+    """
+    if not messages:
+        return 0, 0
+    config = get_solapi_config()
+    api_key = config.get('api_key', '')
+    api_secret = config.get('api_secret', '')
+    sender_phone = config.get('sender_phone', '')
+    pf_id = _get_secret("SOLAPI_PF_ID", "")
+
+    def _one_by_one(batch):
+        """건별 발송 (성공 이력은 send_alimtalk 가 기록). 반환: 실패한 메시지 목록"""
+        failed = []
+        for m in batch:
+            sent, _ = send_alimtalk(to_phone=m['to_phone'], message=m['message'],
+                                    template_id=m.get('template_id'), variables=m.get('variables'),
+                                    store_id=m.get('store_id', "MASTER"))
+            if not sent:
+                failed.append(m)
+        if failed_out is not None:
+            failed_out.extend(failed)
+        return failed
+
+    if not api_key or not api_secret or not sender_phone or not pf_id:
+        failed = _one_by_one(messages)
+        return len(messages) - len(failed), len(failed)
+
+    payload_messages = []
+    for m in messages:
+        template_id = m.get('template_id') or _get_secret("SOLAPI_TEMPLATE_ID", "")
+        payload_messages.append({
+            "to": m['to_phone'],
+            "from": sender_phone,
+            "text": m['message'],
+            "kakaoOptions": {"pfId": pf_id, "templateId": template_id, "variables": m.get('variables') or {}}
+        })
+
+    try:
+        date = datetime.datetime.now().astimezone().isoformat()
+        salt = str(uuid.uuid4().hex)
+        signature = hmac.new(api_secret.encode("utf-8"), (date + salt).encode("utf-8"), hashlib.sha256).hexdigest()
+        headers = {
+            "Authorization": f"HMAC-SHA256 apiKey={api_key}, date={date}, salt={salt}, signature={signature}",
+            "Content-Type": "application/json"
+        }
+        response = requests.post("https://api.solapi.com/messages/v4/send-many", headers=headers,
+                                 json={"messages": payload_messages}, timeout=15)
+    except Exception as e:
+        print(f"[알림톡 묶음 발송 오류] {e} → 건별 발송으로 전환")
+        failed = _one_by_one(messages)
+        return len(messages) - len(failed), len(failed)
+
+    if response.status_code != 200:
+        print(f"[알림톡 묶음 발송 실패] {response.status_code} {response.text[:200]} → 건별 발송으로 전환")
+        failed = _one_by_one(messages)
+        return len(messages) - len(failed), len(failed)
+
+    failed_to = {f.get("to") for f in (response.json() or {}).get("failedMessageList") or []}
+    sent_ok = [m for m in messages if m['to_phone'] not in failed_to]
+    retry = [m for m in messages if m['to_phone'] in failed_to]
+    if retry:
+        print(f"[알림톡 묶음 발송] failedMessageList {len(retry)}건 → 건별 재시도")
+    failed = _one_by_one(retry)
+    log_rows = [(m.get('store_id', "MASTER"), m['to_phone'], "ALIMTALK_" + str(m.get('template_id')),
+                 m['message'], "SUCCESS", "OK") for m in sent_ok]
+    log_rows += [(m.get('store_id', "MASTER"), m['to_phone'], "ALIMTALK_" + str(m.get('template_id')),
+                  m['message'], "FAIL", "failedMessageList") for m in failed]
+    try:
+        db.log_sms_many(log_rows)
+    except: pass
+    return len(messages) - len(failed), len(failed)
+
+
+SEND_MANY_CHUNK = 1000      # Solapi send-many 1회 요청당 메시지 수
+
+
+def send_sms_many(messages, category="SMS", failed_out=None):
+    """
+    SMS 묶음 발송 (Solapi send-many, SEND_MANY_CHUNK 건당 요청 1회) + 발송 이력 일괄 저장
+    - messages: [{"to_phone", "message", "store_id"}, ...]
+    - 건별 실패는 응답의 failedMessageList 로 구분, 묶음 요청 실패 시 해당 묶음 전체 FAIL 기록
+    - failed_out: 리스트를 넘기면 실패한 메시지 dict 를 담아 줌 (호출 측 재처리용)
+    - 반환: (성공 건수, 실패 건수)
+    """
+    if not messages:
+        return 0, 0
+    config = get_solapi_config()
+    api_key = config.get('api_key', '')
+    api_secret = config.get('api_secret', '')
+    sender_phone = config.get('sender_phone', '')
+
+    # 🧪 Mock Mode (For Testing without API Keys)
+    if not api_key or not api_secret:
+        print(f"[Mock SMS] {len(messages)}건 묶음 발송 ({category})")
+        try:
+            db.log_sms_many([(m.get('store_id', "SYSTEM"), m['to_phone'], category, m['message'], "SUCCESS", "Mock Mode")
+                             for m in messages])
+        except: pass
+        return len(messages), 0
+
+    if not sender_phone:
+        if failed_out is not None:
+            failed_out.extend(messages)
+        return 0, len(messages)
+
+    ok, log_rows = 0, []
+    for i in range(0, len(messages), SEND_MANY_CHUNK):
+        chunk = messages[i:i + SEND_MANY_CHUNK]
+        failed_to, error = set(), None
+        try:
+            date = datetime.datetime.now().astimezone().isoformat()
+            salt = str(uuid.uuid4().hex)
+            signature = hmac.new(api_secret.encode("utf-8"), (date + salt).encode("utf-8"), hashlib.sha256).hexdigest()
+            headers = {
+                "Authorization": f"HMAC-SHA256 apiKey={api_key}, date={date}, salt={salt}, signature={signature}",
+                "Content-Type": "application/json"
+            }
+            payload = {"messages": [{"to": m['to_phone'], "from": sender_phone, "text": m['message']} for m in chunk]}
+            response = requests.post("https://api.solapi.com/messages/v4/send-many", headers=headers,
+                                     json=payload, timeout=30)
+            if response.status_code == 200:
+                failed_to = {f.get("to") for f in (response.json() or {}).get("failedMessageList") or []}
+            else:
+                error = response.text[:200]
+        except Exception as e:
+            error = str(e)
+        if error:
+            print(f"[SMS 묶음 발송 실패] {len(chunk)}건 | {error}")
+        for m in chunk:
+            sent = error is None and m['to_phone'] not in failed_to
+            ok += 1 if sent else 0
+            if not sent and failed_out is not None:
+                failed_out.append(m)
+            log_rows.append((m.get('store_id', "SYSTEM"), m['to_phone'], category, m['message'],
+                             "SUCCESS" if sent else "FAIL", "OK" if sent else (error or "failedMessageList")))
+    try:
+        db.log_sms_many(log_rows)
+    except: pass
+    if ok < len(messages):
+        _notify_alert("문자 묶음 발송 일부 실패", f"category={category} 실패 {len(messages) - ok}/{len(messages)}건")
+    return ok, len(messages) - ok
+
+
 def send_order_notification(store_phone, order_data):
     """
     주문 알림 문자 발송 (사장님에게)
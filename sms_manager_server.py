@@ -176,15 +176,10 @@ def send_cloud_sms(to_phone, message, store_id="SYSTEM"):
 
 
 def _apply_message_charge(store_id, unit_cost, memo):
-    balance = db.get_wallet_balance(store_id)
-    if balance < unit_cost:
-        return False, balance
-    new_balance = balance - unit_cost
-    db.update_wallet_balance(store_id, new_balance)
-    try:
-        db.append_wallet_log(store_id, "sms", -unit_cost, new_balance, memo)
-    except Exception:
-        pass
+    # 잔액 확인·차감·원장 기록을 한 번의 원자 갱신으로 (동시 발송 시 이중 차감/음수 잔액 방지)
+    new_balance = db.wallet_post(store_id, -unit_cost, "sms", memo, tier="wallet")
+    if new_balance is None:
+        return False, db.get_wallet_balance(store_id)
     return True, new_balance
 
 
@@ -548,26 +548,9 @@ def api_gpu_job():
             }
         }
     }
-import queue
-import json
-
-class MessageAnnouncer:
-    def __init__(self):
-        self.listeners = []
-
-    def listen(self):
-        q = queue.Queue(maxsize=100)
-        self.listeners.append(q)
-        return q
-
-    def announce(self, msg):
-        for i in reversed(range(len(self.listeners))):
-            try:
-                self.listeners[i].put_nowait(msg)
-            except queue.Full:
-                del self.listeners[i]
-
-gpu_announcer = MessageAnnouncer()
+# GPU 진행 상황 버스 — Redis Streams 공유 (TANTAN_REDIS_URL 없으면 프로세스 메모리)
+# 다른 gunicorn 워커로 들어온 상태 갱신도 모든 SSE 클라이언트에 전달됨
+from tantan_progress import progress_bus
 
 # GPU Worker 스크립트가 작업 상태 및 렌더링 결과를 갱신하는 API
 @app.route('/api/gpu/upload', methods=['POST'])
@@ -599,28 +582,56 @@ def api_gpu_upload():
     file.save(file_path)
     
     # Convert image to a short video with zoom-pan effect using FFmpeg
+    # → 피니싱 풀에 넘기고 job_id 즉시 반환 (요청 스레드에서 인코딩 대기하지 않음)
+    #   영상은 아직 없으므로 url 은 원본 이미지, 영상 URL 은 완료 후 SSE / status_url 로 전달
     if ext.lower() in ['.png', '.jpg', '.jpeg']:
-        import subprocess
-        video_filename = f"{name}_{int(time.time())}.mp4"
-        video_path = os.path.join(upload_folder, video_filename)
-        try:
+        from tantan_finishing import finishing_pool, ken_burns_cmd
+        image_url = f"/static/outputs/{unique_filename}"
+        video_stem = f"{name}_{int(time.time())}"
+        video_path = os.path.join(upload_folder, f"{video_stem}.mp4")
+        staging_path = os.path.join(upload_folder, f"{video_stem}.part.mp4")
+        video_url = f"/static/outputs/{video_stem}.mp4"
+
+        def _announce(job):
+            # 완료/실패를 SSE로 알림 — 실패 시 원본 이미지 URL로 대체
+            ok = job["status"] == "done"
+            progress_bus.publish({'type': 'finish', 'finish_job_id': job['job_id'], 'status': job['status'], 'url': video_url if ok else image_url})
+
+        job_id = finishing_pool.submit(
             # Apply a slow zoom-in (Ken Burns) effect for 5 seconds at 25fps (125 frames)
-            cmd = [
-                'ffmpeg', '-y', '-loop', '1', '-i', file_path,
-                '-vf', "zoompan=z='min(zoom+0.0015,1.5)':d=125:x='iw/2-(iw/zoom/2)':y='ih/2-(ih/zoom/2)':s=1280x720",
-                '-c:v', 'libx264', '-t', '5', '-pix_fmt', 'yuv420p', video_path
-            ]
-            subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            unique_filename = video_filename
-        except Exception as e:
-            print(f"FFmpeg video conversion failed: {e}")
-            # If it fails, fallback to the original image
+            ken_burns_cmd(file_path, staging_path),
+            video_path,
+            on_done=_announce,
+            meta={"video_url": video_url, "fallback_url": image_url},
+            staging_path=staging_path,
+        )
+        return {
+            "success": True,
+            "url": image_url,
+            "status": "queued",
+            "finish_job_id": job_id,
+            "status_url": f"/api/gpu/finish/{job_id}",
+        }
     
     return {
         "success": True, 
         "url": f"/static/outputs/{unique_filename}"
     }
 
+@app.route('/api/gpu/finish/<job_id>', methods=['GET'])
+def api_gpu_finish_status(job_id):
+    auth = request.headers.get('Authorization')
+    if auth != "Bearer tantan-secure-tunnel-token-2026":
+        return {"success": False, "error": "Unauthorized Tunnel Access"}, 401
+
+    from tantan_finishing import finishing_pool
+    job = finishing_pool.status(job_id)
+    if not job:
+        return {"success": False, "error": "Unknown job"}, 404
+    # url: 완료 시 영상, 실패 시 원본 이미지, 진행 중이면 없음
+    url = {"done": job.get("video_url"), "failed": job.get("fallback_url")}.get(job["status"])
+    return {"success": True, **job, "url": url}
+
 @app.route('/api/gpu/status', methods=['POST'])
 def api_gpu_status():
     auth = request.headers.get('Authorization')
@@ -633,8 +644,7 @@ def api_gpu_status():
     message = data.get('message', '')
     
     # Broadcast to SSE
-    sse_msg = f"data: {json.dumps({'job_id': job_id, 'status': status, 'message': message})}\n\n"
-    gpu_announcer.announce(sse_msg)
+    progress_bus.publish({'job_id': job_id, 'status': status, 'message': message})
     
     # If completed, extract URL and update database
     if status == 'COMPLETED':
@@ -662,23 +672,17 @@ def api_gpu_metrics():
     vram_total = data.get('vram_total', 12282)
     
     # Broadcast to SSE
-    sse_msg = f"data: {json.dumps({'type': 'metrics', 'vram_used': vram_used, 'vram_total': vram_total})}\n\n"
-    gpu_announcer.announce(sse_msg)
+    progress_bus.publish({'type': 'metrics', 'vram_used': vram_used, 'vram_total': vram_total})
     
     return {"success": True, "message": "Metrics updated"}
 
 @app.route('/api/gpu/stream')
 def api_gpu_stream():
-    def stream():
-        messages = gpu_announcer.listen()
-        while True:
-            try:
-                msg = messages.get(timeout=15)
-                yield msg
-            except queue.Empty:
-                yield ": heartbeat\n\n"
-            
-    return Response(stream(), mimetype='text/event-stream')
+    # 재접속 시 브라우저가 보내는 Last-Event-ID(또는 ?cursor=) 이후 이벤트부터 재생
+    # 대시보드가 많으면 tantan_progress_asgi (비동기, 스레드 미점유) 로 프록시할 것
+    cursor = request.headers.get('Last-Event-ID') or request.args.get('cursor')
+    return Response(progress_bus.stream(cursor), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 # 404 에러 핸들러 (사용자 친화적 페이지)
 
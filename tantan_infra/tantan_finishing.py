@@ -0,0 +1,222 @@
+"""
+탄탄제작소 FFmpeg 피니싱 풀 — 요청 스레드 밖에서 인코딩
+
+/api/gpu/upload 가 Ken Burns 변환(ffmpeg, 수 초~수십 초)을 Flask 요청 안에서
+subprocess.run 으로 기다리던 구조를 대체한다.
+
+  job_id = finishing_pool.submit(cmd, output_path, on_done=..., staging_path=...)   # 즉시 반환
+  finishing_pool.status(job_id) → {"status": queued|running|done|failed, ...}
+
+- 동시 인코딩 수 상한 (TANTAN_FFMPEG_WORKERS, 기본: 하드웨어 인코더 3 / CPU 코어 절반)
+- 하드웨어 인코더 자동 탐지 (h264_nvenc → h264_qsv → h264_videotoolbox, 모두 불가 시 libx264)
+- 작업 상태 저장소: Redis(TANTAN_REDIS_URL, 작업당 키 1개, JOB_TTL_SEC 보관) → 어느 gunicorn 워커로
+  조회가 들어와도 같은 상태. 미설정/연결 실패 시 최근 MAX_JOBS 건 프로세스 메모리
+- staging_path 로 인코딩 후 성공 시에만 output_path 로 교체 → done 이전에는 output 파일이 없음
+- 인코더 탐지·실행기·저장소 연결은 첫 사용 시점에 수행 (임포트 시 ffmpeg 프로브 없음)
+"""
+import json
+import os
+import subprocess
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_JOBS = 500
+JOB_TIMEOUT_SEC = 300
+JOB_TTL_SEC = 86400
+JOB_KEY_PREFIX = "tantan:finish:job:"
+HW_ENCODERS = ("h264_nvenc", "h264_qsv", "h264_videotoolbox")
+
+_encoder = None
+_encoder_lock = threading.Lock()
+
+
+def detect_encoder():
+    """사용 가능한 H.264 인코더 (1프레임 테스트 통과 기준, 프로세스당 1회)."""
+    global _encoder
+    with _encoder_lock:
+        if _encoder:
+            return _encoder
+        _encoder = "libx264"
+        try:
+            listing = subprocess.run(["ffmpeg", "-hide_banner", "-encoders"],
+                                     capture_output=True, text=True, timeout=10).stdout
+        except Exception:
+            return _encoder
+        for enc in HW_ENCODERS:
+            if enc in listing and subprocess.run(
+                    ["ffmpeg", "-hide_banner", "-loglevel", "error", "-f", "lavfi",
+                     "-i", "color=c=black:s=256x256:d=0.1", "-frames:v", "1",
+                     "-c:v", enc, "-f", "null", "-"],
+                    capture_output=True, timeout=20).returncode == 0:
+                _encoder = enc
+                break
+        return _encoder
+
+
+def ken_burns_cmd(image_path, video_path, seconds=5, fps=25, size="1280x720"):
+    """정지 이미지 → 천천히 줌인하는 짧은 영상 (기존 api_gpu_upload 변환과 동일한 필터)."""
+    frames = seconds * fps
+    return [
+        'ffmpeg', '-y', '-loop', '1', '-i', image_path,
+        '-vf', f"zoompan=z='min(zoom+0.0015,1.5)':d={frames}:x='iw/2-(iw/zoom/2)':y='ih/2-(ih/zoom/2)':s={size}",
+        '-c:v', detect_encoder(), '-t', str(seconds), '-pix_fmt', 'yuv420p',
+        '-movflags', '+faststart', video_path
+    ]
+
+
+class MemoryJobStore:
+    """단일 프로세스 작업 기록 (최근 MAX_JOBS 건)."""
+
+    name = "memory"
+
+    def __init__(self, maxlen=MAX_JOBS):
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self.maxlen = maxlen
+
+    def put(self, job):
+        with self._lock:
+            self._jobs[job["job_id"]] = dict(job)
+            while len(self._jobs) > self.maxlen:
+                self._jobs.popitem(last=False)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+
+class RedisJobStore:
+    """작업당 JSON 키 1개 (JOB_TTL_SEC 만료). 모든 워커·프로세스가 같은 상태를 봄."""
+
+    name = "redis"
+
+    def __init__(self, client, prefix=JOB_KEY_PREFIX, ttl=JOB_TTL_SEC):
+        self._r = client
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def put(self, job):
+        self._r.set(self.prefix + job["job_id"], json.dumps(job, ensure_ascii=False), ex=self.ttl)
+
+    def get(self, job_id):
+        raw = self._r.get(self.prefix + job_id)
+        return json.loads(raw) if raw else None
+
+
+def _job_store(redis_url=None):
+    redis_url = redis_url if redis_url is not None else os.environ.get("TANTAN_REDIS_URL", "")
+    if redis_url:
+        try:
+            import redis
+            client = redis.Redis.from_url(redis_url, decode_responses=True, socket_timeout=5, socket_connect_timeout=3)
+            client.ping()
+            return RedisJobStore(client)
+        except Exception as e:
+            print(f"FinishingPool: Redis unavailable, keeping job status in memory ({e})")
+    return MemoryJobStore()
+
+
+class FinishingPool:
+    def __init__(self, max_workers=None, store=None):
+        self._max_workers = max_workers
+        self._store = store
+        self._executor = None
+        self._init_lock = threading.Lock()
+        self._local = OrderedDict()          # 이 프로세스가 받은 작업 job_id → status (stats 용)
+        self._lock = threading.Lock()
+
+    @property
+    def max_workers(self):
+        if not self._max_workers:
+            self._max_workers = int(os.environ.get("TANTAN_FFMPEG_WORKERS", "0")) or (
+                3 if detect_encoder() != "libx264" else max(1, (os.cpu_count() or 2) // 2))
+        return self._max_workers
+
+    @property
+    def store(self):
+        if self._store is None:
+            with self._init_lock:
+                if self._store is None:
+                    self._store = _job_store()
+        return self._store
+
+    def _get_executor(self):
+        with self._init_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="ffmpeg")
+            return self._executor
+
+    def _save(self, job):
+        with self._lock:
+            self._local[job["job_id"]] = job["status"]
+            self._local.move_to_end(job["job_id"])
+            while len(self._local) > MAX_JOBS:
+                self._local.popitem(last=False)
+        try:
+            self.store.put(job)
+        except Exception as e:
+            print(f"FFmpeg job {job['job_id']} status save failed: {e}")
+
+    def submit(self, cmd, output_path, on_done=None, meta=None, staging_path=None):
+        """
+        FFmpeg 명령 제출 → job_id 즉시 반환. on_done(job_dict)은 워커 스레드에서 호출.
+        staging_path: cmd 가 이 경로에 쓰면 성공 시 output_path 로 교체 (done 전에는 output 없음)
+        """
+        job_id = uuid.uuid4().hex[:12]
+        job = {
+            "job_id": job_id,
+            "status": "queued",
+            "output": output_path,
+            "queued_at": time.time(),
+            **(meta or {}),
+        }
+        self._save(job)
+        self._get_executor().submit(self._run, job, cmd, on_done, staging_path)
+        return job_id
+
+    def _run(self, job, cmd, on_done, staging_path):
+        started = time.time()
+        job = {**job, "status": "running", "started_at": started}
+        self._save(job)
+        try:
+            subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                           timeout=JOB_TIMEOUT_SEC)
+            if staging_path:
+                os.replace(staging_path, job["output"])
+            job = {**job, "status": "done", "elapsed_sec": round(time.time() - started, 2)}
+        except Exception as e:
+            err = e.stderr.decode(errors="replace")[-300:] if getattr(e, "stderr", None) else str(e)
+            print(f"FFmpeg job {job['job_id']} failed: {err}")
+            if staging_path:
+                try:
+                    os.remove(staging_path)
+                except OSError:
+                    pass
+            job = {**job, "status": "failed", "error": err, "elapsed_sec": round(time.time() - started, 2)}
+        self._save(job)
+        if on_done:
+            try:
+                on_done(dict(job))
+            except Exception as e:
+                print(f"FFmpeg job {job['job_id']} callback failed: {e}")
+
+    def status(self, job_id):
+        try:
+            return self.store.get(job_id)
+        except Exception as e:
+            print(f"FFmpeg job {job_id} status read failed: {e}")
+            return None
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for status in self._local.values():
+                counts[status] = counts.get(status, 0) + 1
+        return {"workers": self.max_workers, "encoder": detect_encoder(), "store": self.store.name, "jobs": counts}
+
+
+finishing_pool = FinishingPool()
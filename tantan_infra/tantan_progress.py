@@ -0,0 +1,179 @@
+"""
+탄탄제작소 GPU 진행 상황 버스 — Redis Streams (없으면 프로세스 메모리)
+
+기존 MessageAnnouncer 의 한계:
+  - gunicorn 워커마다 리스너 목록이 따로 → 다른 워커로 들어온 상태 갱신은 전달되지 않음
+  - 리스너 큐(100건)가 차면 해당 대시보드를 조용히 제거
+  - 재접속한 대시보드는 그 사이 이벤트를 놓침
+
+변경:
+  progress_bus.publish({"job_id": ..., "status": ...})  → 이벤트 ID ("{ms}-{seq}")
+  progress_bus.read(cursor, block_ms=15000)             → [(id, event), ...]  cursor 이후만
+  - Redis:  XADD tantan:gpu:progress MAXLEN ~ STREAM_MAXLEN / XREAD BLOCK
+            → 모든 워커·프로세스(비동기 SSE 서버 포함)가 같은 스트림을 봄
+  - 메모리: 최근 STREAM_MAXLEN 건 링 버퍼 + Condition (단일 프로세스 개발 환경용)
+  - 커서는 두 백엔드 모두 같은 형식 → SSE 의 Last-Event-ID 로 그대로 재생
+
+Redis 주소: TANTAN_REDIS_URL (미설정/연결 실패 시 메모리 백엔드)
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+
+STREAM_KEY = "tantan:gpu:progress"
+STREAM_MAXLEN = 1000
+READ_COUNT = 200
+
+
+def parse_cursor(cursor):
+    """'1718000000000-3' → (1718000000000, 3). 비어 있거나 잘못된 값은 (0, 0) = 처음부터."""
+    if not cursor or cursor == "0":
+        return (0, 0)
+    try:
+        ms, _, seq = str(cursor).partition("-")
+        return (int(ms), int(seq or 0))
+    except ValueError:
+        return (0, 0)
+
+
+def sse_frame(event_id, event):
+    """SSE 프레임 — id 줄을 넣어 브라우저 EventSource 가 재접속 시 Last-Event-ID 를 보내게 함."""
+    return f"id: {event_id}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+class MemoryBackend:
+    """단일 프로세스 링 버퍼. 읽기 쪽이 느려도 이벤트를 버리지 않고 커서로 따라잡음."""
+
+    name = "memory"
+
+    def __init__(self, maxlen=STREAM_MAXLEN):
+        self._events = deque(maxlen=maxlen)
+        self._cond = threading.Condition()
+        self._last = (0, 0)
+
+    def _next_id(self):
+        ms = int(time.time() * 1000)
+        last_ms, last_seq = self._last
+        self._last = (ms, 0) if ms > last_ms else (last_ms, last_seq + 1)
+        return "%d-%d" % self._last
+
+    def publish(self, event):
+        with self._cond:
+            event_id = self._next_id()
+            self._events.append((event_id, event))
+            self._cond.notify_all()
+        return event_id
+
+    def last_id(self):
+        with self._cond:
+            return self._events[-1][0] if self._events else "0-0"
+
+    def _after(self, cursor, count):
+        after = parse_cursor(cursor)
+        out = [(eid, evt) for eid, evt in self._events if parse_cursor(eid) > after]
+        return out[:count]
+
+    def read(self, cursor, block_ms=0, count=READ_COUNT):
+        deadline = time.monotonic() + block_ms / 1000.0
+        with self._cond:
+            while True:
+                out = self._after(cursor, count)
+                remaining = deadline - time.monotonic()
+                if out or remaining <= 0:
+                    return out
+                self._cond.wait(remaining)
+
+
+class RedisBackend:
+    """Redis Streams. 프로세스 간 공유, MAXLEN ~ 로 길이 제한."""
+
+    name = "redis"
+
+    def __init__(self, client, key=STREAM_KEY, maxlen=STREAM_MAXLEN):
+        self._r = client
+        self.key = key
+        self.maxlen = maxlen
+
+    def publish(self, event):
+        return self._r.xadd(self.key, {"data": json.dumps(event, ensure_ascii=False)},
+                            maxlen=self.maxlen, approximate=True)
+
+    def last_id(self):
+        info = self._r.xrevrange(self.key, count=1)
+        return info[0][0] if info else "0-0"
+
+    def read(self, cursor, block_ms=0, count=READ_COUNT):
+        resp = self._r.xread({self.key: cursor or "0-0"}, count=count, block=block_ms or None)
+        return decode_entries(resp)
+
+
+def decode_entries(resp):
+    """XREAD 응답 → [(id, event dict)]."""
+    out = []
+    for _key, entries in resp or []:
+        for event_id, fields in entries:
+            try:
+                out.append((event_id, json.loads(fields.get("data", "{}"))))
+            except ValueError:
+                continue
+    return out
+
+
+def _redis_client(url):
+    import redis
+    # XREAD BLOCK(최대 15초)보다 소켓 타임아웃이 길어야 함
+    client = redis.Redis.from_url(url, decode_responses=True, socket_timeout=30, socket_connect_timeout=3)
+    client.ping()
+    return client
+
+
+class ProgressBus:
+    def __init__(self, redis_url=None):
+        redis_url = redis_url if redis_url is not None else os.environ.get("TANTAN_REDIS_URL", "")
+        self.backend = None
+        if redis_url:
+            try:
+                self.backend = RedisBackend(_redis_client(redis_url))
+            except Exception as e:
+                print(f"ProgressBus: Redis unavailable, using in-memory bus ({e})")
+        if self.backend is None:
+            self.backend = MemoryBackend()
+
+    def publish(self, event):
+        """이벤트 발행 → 이벤트 ID. 버스 장애가 상태 갱신 API를 실패시키지 않도록 예외는 로그만."""
+        try:
+            return self.backend.publish(event)
+        except Exception as e:
+            print(f"ProgressBus publish failed: {e}")
+            return None
+
+    def read(self, cursor, block_ms=0, count=READ_COUNT):
+        return self.backend.read(cursor, block_ms=block_ms, count=count)
+
+    def last_id(self):
+        return self.backend.last_id()
+
+    def stream(self, cursor=None, heartbeat_sec=15):
+        """
+        SSE 제너레이터. cursor(Last-Event-ID)가 있으면 그 이후 이벤트부터 재생,
+        없으면 현재 시점 이후만. 이벤트가 없으면 heartbeat_sec 마다 주석 프레임.
+        """
+        cursor = cursor or self.last_id()
+        while True:
+            try:
+                events = self.read(cursor, block_ms=heartbeat_sec * 1000)
+            except Exception as e:
+                print(f"ProgressBus read failed: {e}")
+                time.sleep(1)
+                events = []
+            if not events:
+                yield ": heartbeat\n\n"
+                continue
+            for event_id, event in events:
+                cursor = event_id
+                yield sse_frame(event_id, event)
+
+
+progress_bus = ProgressBus()
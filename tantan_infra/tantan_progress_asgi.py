@@ -0,0 +1,227 @@
+"""
+탄탄제작소 GPU 진행 상황 비동기 스트림 서버 (ASGI, uvicorn)
+
+Flask /api/gpu/stream 은 SSE 클라이언트마다 gunicorn 스레드(총 10개)를 하나씩 점유한다.
+이 서버는 단일 이벤트 루프에서 수백 명의 대시보드를 처리한다.
+
+  GET /api/gpu/stream          SSE   (Last-Event-ID 헤더 또는 ?cursor= 이후부터 재생)
+  WS  /api/gpu/ws?cursor=...   WebSocket (텍스트 프레임: {"id": ..., **event})
+
+구조:
+  - Redis XREAD BLOCK 루프 1개가 tantan:gpu:progress 를 읽어 구독자별 asyncio.Queue 로 분배
+  - 구독자 큐가 넘치면 끊지 않고 lagging 표시 → 해당 구독자만 XRANGE 로 자기 커서부터 재동기화
+  - 재접속 시 커서 이후 이벤트를 XRANGE 로 먼저 재생 (스트림 최대 길이: STREAM_MAXLEN)
+
+Redis(TANTAN_REDIS_URL) 필수 — gunicorn 워커와 이벤트를 공유하는 유일한 경로이기 때문.
+실행: uvicorn tantan_progress_asgi:app --host 0.0.0.0 --port 5002
+"""
+import asyncio
+import json
+import os
+from urllib.parse import parse_qs
+
+from tantan_progress import (STREAM_KEY, READ_COUNT, decode_entries, parse_cursor, sse_frame)
+
+HEARTBEAT_SEC = 15
+SUBSCRIBER_QUEUE = 256
+
+
+class _Subscriber:
+    __slots__ = ("queue", "lagging")
+
+    def __init__(self):
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE)
+        self.lagging = False
+
+
+class ProgressHub:
+    """Redis 스트림 1개 → 구독자 N명 분배."""
+
+    def __init__(self, redis_url):
+        self.redis_url = redis_url
+        self._r = None
+        self._subs = set()
+        self._reader = None
+        self._start_lock = None
+
+    async def _client(self):
+        if self._r is None:
+            import redis.asyncio as aioredis
+            self._r = aioredis.from_url(self.redis_url, decode_responses=True,
+                                        socket_timeout=HEARTBEAT_SEC + 15)
+        return self._r
+
+    async def _read_loop(self, last):
+        r = await self._client()
+        while self._subs:
+            try:
+                resp = await r.xread({STREAM_KEY: last}, count=READ_COUNT, block=HEARTBEAT_SEC * 1000)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"ProgressHub read failed: {e}")
+                await asyncio.sleep(1)
+                continue
+            for event_id, event in decode_entries(resp):
+                last = event_id
+                for sub in self._subs:
+                    if sub.lagging:
+                        continue
+                    try:
+                        sub.queue.put_nowait((event_id, event))
+                    except asyncio.QueueFull:
+                        sub.lagging = True
+        self._reader = None
+
+    async def subscribe(self):
+        sub = _Subscriber()
+        self._subs.add(sub)
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if self._reader is None:
+                # 리더 시작 위치를 구독자 재생보다 먼저 확정 → 재생과 실시간 사이에 빈틈 없음
+                last = await self.last_id()
+                self._reader = asyncio.get_running_loop().create_task(self._read_loop(last))
+        return sub
+
+    def unsubscribe(self, sub):
+        self._subs.discard(sub)
+
+    async def last_id(self):
+        r = await self._client()
+        entries = await r.xrevrange(STREAM_KEY, count=1)
+        return entries[0][0] if entries else "0-0"
+
+    async def replay(self, cursor):
+        """cursor 이후 이벤트 (스트림에 남아 있는 범위)."""
+        r = await self._client()
+        out = []
+        while True:
+            entries = await r.xrange(STREAM_KEY, min=f"({cursor}", count=READ_COUNT)
+            batch = decode_entries([(STREAM_KEY, entries)])
+            out.extend(batch)
+            if len(entries) < READ_COUNT:
+                return out
+            cursor = entries[-1][0]
+
+    async def events(self, cursor):
+        """
+        구독자 1명의 이벤트 이터레이터. (id, event) 또는 하트비트 시 None.
+        cursor 가 없으면 현재 시점 이후만.
+        """
+        sub = await self.subscribe()
+        try:
+            cursor = cursor or await self.last_id()
+            pending = await self.replay(cursor)
+            while True:
+                for event_id, event in pending:
+                    # 재생분과 실시간 큐가 겹칠 수 있으므로 커서 이후만 전달
+                    if parse_cursor(event_id) > parse_cursor(cursor):
+                        cursor = event_id
+                        yield event_id, event
+                if sub.lagging:
+                    while not sub.queue.empty():
+                        sub.queue.get_nowait()
+                    sub.lagging = False
+                    pending = await self.replay(cursor)
+                    continue
+                try:
+                    pending = [await asyncio.wait_for(sub.queue.get(), HEARTBEAT_SEC)]
+                except asyncio.TimeoutError:
+                    pending = []
+                    yield None
+        finally:
+            self.unsubscribe(sub)
+
+
+hub = ProgressHub(os.environ.get("TANTAN_REDIS_URL", ""))
+
+
+def _query_cursor(scope):
+    qs = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    return (qs.get("cursor") or [None])[0]
+
+
+async def _sse(scope, receive, send):
+    headers = dict(scope.get("headers") or [])
+    cursor = headers.get(b"last-event-id", b"").decode("latin-1") or _query_cursor(scope)
+
+    await send({"type": "http.response.start", "status": 200, "headers": [
+        (b"content-type", b"text/event-stream"),
+        (b"cache-control", b"no-cache"),
+        (b"x-accel-buffering", b"no"),
+    ]})
+
+    async def _pump():
+        async for item in hub.events(cursor):
+            frame = ": heartbeat\n\n" if item is None else sse_frame(*item)
+            await send({"type": "http.response.body", "body": frame.encode("utf-8"), "more_body": True})
+
+    async def _wait_disconnect():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    pump = asyncio.ensure_future(_pump())
+    watcher = asyncio.ensure_future(_wait_disconnect())
+    await asyncio.wait({pump, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    for task in (pump, watcher):
+        task.cancel()
+
+
+async def _websocket(scope, receive, send):
+    if (await receive())["type"] != "websocket.connect":
+        return
+    await send({"type": "websocket.accept"})
+    cursor = _query_cursor(scope)
+
+    async def _pump():
+        async for item in hub.events(cursor):
+            if item is None:
+                continue   # 웹소켓은 자체 ping 으로 연결 유지
+            event_id, event = item
+            await send({"type": "websocket.send", "text": json.dumps({"id": event_id, **event}, ensure_ascii=False)})
+
+    async def _wait_disconnect():
+        while (await receive())["type"] != "websocket.disconnect":
+            pass
+
+    pump = asyncio.ensure_future(_pump())
+    watcher = asyncio.ensure_future(_wait_disconnect())
+    await asyncio.wait({pump, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    for task in (pump, watcher):
+        task.cancel()
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    path = scope.get("path", "")
+    if scope["type"] == "websocket" and path == "/api/gpu/ws":
+        if not hub.redis_url:
+            await send({"type": "websocket.close", "code": 1011})
+            return
+        await _websocket(scope, receive, send)
+        return
+
+    if scope["type"] == "http" and path == "/api/gpu/stream":
+        if not hub.redis_url:
+            await send({"type": "http.response.start", "status": 503,
+                        "headers": [(b"content-type", b"application/json")]})
+            await send({"type": "http.response.body",
+                        "body": b'{"success": false, "error": "TANTAN_REDIS_URL not configured"}'})
+            return
+        await _sse(scope, receive, send)
+        return
+
+    if scope["type"] == "http":
+        await send({"type": "http.response.start", "status": 404,
+                    "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": b'{"success": false, "error": "Not found"}'})
@@ -0,0 +1,55 @@
+"""주소 정제 캐시 — 별칭 주소의 조회/저장 키 일치 (services.address_cache)."""
+import asyncio
+import types
+
+import pytest
+
+pytest.importorskip("httpx")
+
+from services.address_cache import AddressCache
+
+RAW = "서울 강남구 테헤란노 152"          # 오답 표기 (별칭)
+CORRECT = "서울 강남구 테헤란로 152"
+DOC = {"road_address": {"address_name": CORRECT, "zone_no": "06236"}, "address": {"address_name": "서울 강남구 역삼동 737"}}
+
+
+class FakeKakao:
+    def __init__(self):
+        self.calls = 0
+
+    async def get(self, url, headers=None, params=None):
+        self.calls += 1
+        return types.SimpleNamespace(status_code=200, json=lambda: {"documents": [DOC]})
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("KAKAO_REST_API_KEY", "test-key")
+    c = AddressCache(db_path=tmp_path / "cache.db")
+    c._seeded = True
+    c.add_alias(RAW, CORRECT)
+    return c
+
+
+def test_aliased_address_hits_cache_on_second_resolve(cache):
+    kakao = FakeKakao()
+
+    async def run():
+        first = await cache.resolve(RAW, client=kakao)
+        second = await cache.resolve(RAW, client=kakao)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert kakao.calls == 1
+    assert first["success"] and second["road_address"] == CORRECT
+    assert cache.get(CORRECT)["postcode"] == "06236"   # 정답 표기도 같은 항목
+
+
+def test_aliased_address_hits_cache_in_sync_path(cache, monkeypatch):
+    import requests
+    calls = []
+    monkeypatch.setattr(requests, "get", lambda *a, **k: calls.append(1) or types.SimpleNamespace(
+        status_code=200, json=lambda: {"documents": [DOC]}))
+    for _ in range(3):
+        assert cache.resolve_sync(RAW)["road_address"] == CORRECT
+    assert len(calls) == 1
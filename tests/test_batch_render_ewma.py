@@ -0,0 +1,42 @@
+"""배치 렌더 시간 표본 → EWMA → 배치 크기 산정 (routers.batch_scheduler / batch_dispatcher)."""
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("pytz")
+
+from routers import batch_dispatcher, batch_scheduler
+from services.worker_monitor import WorkerMonitor
+
+
+@pytest.fixture
+def rdb(monkeypatch):
+    r = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(batch_scheduler, "_rdb", lambda: r)
+    return r
+
+
+def _planned(rdb, seconds_left=3600, in_flight=0):
+    return batch_dispatcher.plan_batch_size(seconds_left, batch_dispatcher.get_render_sec_estimate(rdb),
+                                            in_flight, concurrency=1)
+
+
+def test_recorded_duration_moves_batch_size(rdb):
+    before = _planned(rdb)
+    assert before == 3600 // batch_dispatcher.DEFAULT_RENDER_SEC
+
+    assert batch_scheduler.record_render_sample("job-1", 120, rdb)
+    assert batch_dispatcher.get_render_sec_estimate(rdb) == 120
+    assert _planned(rdb) == 30 > before
+
+
+def test_task_succeeded_event_feeds_ewma_once(rdb):
+    monitor = WorkerMonitor(broker_url="memory://")
+    for _ in range(3):      # API 워커 N개가 같은 이벤트를 받아도 표본은 1회
+        monitor._feed_batch("task-succeeded", "job-2", runtime=240.0)
+    assert batch_dispatcher.get_render_sec_estimate(rdb) == 240
+    assert _planned(rdb) == 15
+
+    monitor._feed_batch("task-succeeded", "job-3", runtime=60.0)
+    ewma = batch_dispatcher.EWMA_ALPHA * 60 + (1 - batch_dispatcher.EWMA_ALPHA) * 240
+    assert batch_dispatcher.get_render_sec_estimate(rdb) == pytest.approx(ewma)
+    assert _planned(rdb) == int(3600 // float(f"{ewma:.1f}"))
@@ -0,0 +1,69 @@
+"""OCR 교정 인덱스 — 로드/갱신이 호출 스레드(이벤트 루프)를 막지 않음 (services.correction_index)."""
+import sqlite3
+import threading
+
+import pytest
+
+from services import correction_index as ci
+from services.correction_index import CorrectionIndex
+
+RAW = "서울 강남구 테혜란로 152"
+CORRECT = "서울 강남구 테헤란로 152"
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = tmp_path / "ai_store.db"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE customer_address_book (phone_number TEXT, receiver_name TEXT, "
+                 "receiver_address TEXT, last_used_at TEXT)")
+    conn.execute("CREATE TABLE address_correction_log (ai_raw_text TEXT, corrected_text TEXT, "
+                 "frequency INTEGER, last_seen_at TEXT)")
+    conn.execute("INSERT INTO customer_address_book VALUES ('01012345678', '홍길동', ?, '2026-01-01')", (CORRECT,))
+    conn.execute("INSERT INTO address_correction_log VALUES (?, ?, 3, '2026-01-01')", (RAW, CORRECT))
+    conn.commit()
+    conn.close()
+    return path
+
+
+def _blocked_load(idx, monkeypatch):
+    """DB 로드를 gate 가 열릴 때까지 붙잡아 둠 — 조회가 로드를 기다리면 테스트가 멈춤."""
+    gate, done = threading.Event(), threading.Event()
+    real = idx._load
+
+    def _load(incremental):
+        gate.wait(5)
+        real(incremental)
+        done.set()
+
+    monkeypatch.setattr(idx, "_load", _load)
+    return gate, done
+
+
+def test_warm_loads_in_background(db, monkeypatch):
+    idx = CorrectionIndex(db_path=db)
+    gate, done = _blocked_load(idx, monkeypatch)
+    idx.warm()
+    assert idx.lookup_phone("01012345678") is None      # 로드 중에도 즉시 반환
+    gate.set()
+    assert done.wait(5)
+    assert idx.lookup_phone("01012345678") == ("홍길동", CORRECT)
+    assert idx.lookup_correction(RAW)["corrected"] == CORRECT
+
+
+def test_refresh_runs_off_caller(db, monkeypatch):
+    idx = CorrectionIndex(db_path=db)
+    idx.warm()
+    while idx._refreshing:
+        threading.Event().wait(0.01)
+    conn = sqlite3.connect(db)
+    conn.execute("INSERT INTO customer_address_book VALUES ('01099998888', '김철수', '부산 중구 중앙대로 1', "
+                 "'2026-02-01')")
+    conn.commit()
+    conn.close()
+    gate, done = _blocked_load(idx, monkeypatch)
+    monkeypatch.setattr(ci, "REFRESH_SEC", 0)
+    assert idx.lookup_phone("01099998888") is None      # 갱신 시작, 결과는 기다리지 않음
+    gate.set()
+    assert done.wait(5)
+    assert idx.lookup_phone("01099998888") == ("김철수", "부산 중구 중앙대로 1")
@@ -0,0 +1,31 @@
+"""LLM 게이트웨이 — 동일 요청 병합 중 리더 취소 처리 (services.llm_gateway)."""
+import asyncio
+
+from services.llm_gateway import LLMGateway
+
+
+def test_leader_cancel_does_not_cancel_followers(monkeypatch):
+    gw = LLMGateway()
+    calls = []
+
+    async def _generate(contents, model, system, config, store_id):
+        calls.append(contents)
+        await asyncio.sleep(0.05)
+        return {"text": "ok", "usage": {}, "model": model}
+
+    monkeypatch.setattr(gw, "_generate", _generate)
+
+    async def main():
+        leader = asyncio.create_task(gw.generate("같은 질문"))
+        await asyncio.sleep(0.01)
+        followers = [asyncio.create_task(gw.generate("같은 질문")) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        results = await asyncio.gather(*followers)
+        assert leader.cancelled()
+        return results
+
+    results = asyncio.run(main())
+    assert [r["text"] for r in results] == ["ok"] * 3
+    assert len(calls) == 2          # 취소된 리더 1회 + 팔로워 중 새 리더 1회 (나머지는 병합)
+    assert gw.stats()["inflight"] == 0
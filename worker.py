@@ -29,13 +29,25 @@ app.conf.update(
 # ComfyUI 서버 기본 주소 (로컬 PC)
 COMFYUI_SERVER_URL = "http://127.0.0.1:8188"
 
+_comfy_client = None
+
+def _comfy():
+    """웹소켓 완료 추적 ComfyUI 클라이언트 (프로세스당 1개, 로드된 모델 재사용)"""
+    global _comfy_client
+    if _comfy_client is None:
+        from media_worker.pipeline.comfy_client import ComfyClient
+        _comfy_client = ComfyClient(COMFYUI_SERVER_URL)
+    return _comfy_client
+
 def queue_prompt(prompt_workflow):
     """ComfyUI에 렌더링 작업을 큐(Queue)에 넣는 함수"""
-    p = {"prompt": prompt_workflow}
-    data = json.dumps(p).encode('utf-8')
-    req = urllib.request.Request(f"{COMFYUI_SERVER_URL}/prompt", data=data, headers={'Content-Type': 'application/json'})
-    response = urllib.request.urlopen(req)
-    return json.loads(response.read())
+    client = _comfy()
+    client.prepare_model(prompt_workflow)
+    return {"prompt_id": client.submit(prompt_workflow)}
+
+def wait_prompt(prompt_id, timeout=None):
+    """작업 완료 이벤트까지 대기 후 history 반환 (폴링 없음)"""
+    return _comfy().wait(prompt_id, timeout)
 
 def get_history(prompt_id):
     """ComfyUI의 작업 완료 기록을 확인하는 함수"""
@@ -62,6 +74,8 @@ def render_short_form_video(self, user_id, script_json, image_urls=None):
     
     from media_worker.pipeline.tts_sync import generate_sync_metadata
     from media_worker.renderer.video_renderer import render_premium_shortform_video
+    from media_worker.pipeline.stage_cache import get_stage_cache, make_key
+    stage_cache = get_stage_cache()
     
     print(f"[작업 시작] 사용자 {user_id}의 프리미엄 영상 렌더링 지시 수신 완료")
     
@@ -72,15 +86,38 @@ def render_short_form_video(self, user_id, script_json, image_urls=None):
         TTS_DIR = ROOT / "media_worker" / "output" / f"{JOB_ID}_tts"
         TTS_DIR.mkdir(parents=True, exist_ok=True)
         
-        print(f"[{user_id}] 1. TTS 생성 시작...")
-        sync_metadata = generate_sync_metadata(
-            script=script_json,
-            work_dir=TTS_DIR,
-            google_voice="ko-KR-Neural2-C",
-            openai_voice="onyx",
-            openai_model="tts-1-hd",
-            bgm_preset=1
-        )
+        tts_params = {
+            "script": script_json,
+            "google_voice": "ko-KR-Neural2-C",
+            "openai_voice": "onyx",
+            "openai_model": "tts-1-hd",
+            "bgm_preset": 1,
+        }
+        tts_key = make_key("tts", tts_params)
+        tts_hit = stage_cache.get("tts", tts_key)
+        if tts_hit:
+            # 동일 대본·음성 → 캐시된 음성 파일 복원, 메타데이터의 작업 경로만 치환
+            print(f"[{user_id}] 1. TTS 캐시 적중 — 합성 생략")
+            cached_dir, cached_meta = tts_hit
+            shutil.copytree(str(cached_dir), str(TTS_DIR), dirs_exist_ok=True)
+            sync_metadata = json.loads(
+                json.dumps(cached_meta["sync_metadata"]).replace(
+                    json.dumps(cached_meta["work_dir"])[1:-1], json.dumps(str(TTS_DIR))[1:-1]))
+        else:
+            print(f"[{user_id}] 1. TTS 생성 시작...")
+            sync_metadata = generate_sync_metadata(
+                script=script_json,
+                work_dir=TTS_DIR,
+                google_voice="ko-KR-Neural2-C",
+                openai_voice="onyx",
+                openai_model="tts-1-hd",
+                bgm_preset=1
+            )
+            try:
+                stage_cache.put("tts", tts_key, src_dir=TTS_DIR,
+                                meta={"work_dir": str(TTS_DIR), "sync_metadata": sync_metadata})
+            except Exception as e:
+                print(f"[{user_id}] - TTS 캐시 저장 생략: {e}")
         
         # 2. 프리미엄 렌더링
         print(f"[{user_id}] 2. GPU 가속 영상 렌더링 시작...")
@@ -103,20 +140,29 @@ def render_short_form_video(self, user_id, script_json, image_urls=None):
             }
         }
         
-        render_result = render_premium_shortform_video(
-            job_id=JOB_ID,
-            script_json=script_json,
-            sync_metadata=sync_metadata,
-            assets=assets
-        )
-        
-        # 3. 완성된 영상을 정적 서빙 폴더로 이동
-        final_video_path = Path(render_result["output_path"])
         static_video_dir = ROOT / "static" / "videos"
         static_video_dir.mkdir(parents=True, exist_ok=True)
-        
         serve_path = static_video_dir / f"{JOB_ID}.mp4"
-        shutil.copy(str(final_video_path), str(serve_path))
+
+        # 최종 먹스 캐시: TTS 키 + 대본 + 렌더 설정이 같으면 GPU 렌더 생략
+        mux_key = make_key("mux", {"tts": tts_key, "script": script_json, "assets": assets})
+        if stage_cache.get_file("mux", mux_key, "final.mp4", serve_path):
+            print(f"[{user_id}] 2. 최종 영상 캐시 적중 — 렌더링 생략")
+        else:
+            render_result = render_premium_shortform_video(
+                job_id=JOB_ID,
+                script_json=script_json,
+                sync_metadata=sync_metadata,
+                assets=assets
+            )
+
+            # 3. 완성된 영상을 정적 서빙 폴더로 이동
+            final_video_path = Path(render_result["output_path"])
+            shutil.copy(str(final_video_path), str(serve_path))
+            try:
+                stage_cache.put("mux", mux_key, files={"final.mp4": final_video_path})
+            except Exception as e:
+                print(f"[{user_id}] - 최종 영상 캐시 저장 생략: {e}")
         print(f"[{user_id}] 3. 영상 렌더링 성공! 웹 서빙 경로: {serve_path}")
         
         base_url = os.environ.get("APP_BASE_URL", "https://dongnebiseo.com")
@@ -127,7 +173,6 @@ def render_short_form_video(self, user_id, script_json, image_urls=None):
         import uuid
         import hmac
         import hashlib
-        import json
         
         api_key = os.environ.get("SOLAPI_API_KEY")
         api_secret = os.environ.get("SOLAPI_API_SECRET")